@@ -0,0 +1,9 @@
+-- Live request timing (request_timing.py) columns for performance_metrics
+-- Existing rows and the hourly synthetic checks default to source = 'synthetic'.
+
+ALTER TABLE performance_metrics ADD COLUMN IF NOT EXISTS db_time_ms INTEGER;
+ALTER TABLE performance_metrics ADD COLUMN IF NOT EXISTS redis_hits INTEGER;
+ALTER TABLE performance_metrics ADD COLUMN IF NOT EXISTS redis_misses INTEGER;
+ALTER TABLE performance_metrics ADD COLUMN IF NOT EXISTS source VARCHAR(20) DEFAULT 'synthetic';
+
+CREATE INDEX IF NOT EXISTS idx_performance_source_timestamp ON performance_metrics(source, timestamp);
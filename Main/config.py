@@ -32,6 +32,7 @@ class Config:
     JSON_CACHE_DIR = "/var/www/html/json-cache"
     MERAKI_DATA_DIR = "/var/www/html/meraki-data"
     TRACKING_DATA_DIR = "/var/www/html/circuitinfo"
+    OUI_REGISTRY_DIR = "/var/www/html/oui-registry"
     
     # Performance Settings
     JSON_SORT_KEYS = False
@@ -57,11 +58,23 @@ config = {
     'default': DevelopmentConfig
 }
 
+class InstrumentedRedis(redis.Redis):
+    """Redis client that reports each command's result to an optional observer
+    (set by request_timing to count per-request cache hits/misses)"""
+    
+    observer = None
+    
+    def execute_command(self, *args, **options):
+        result = super().execute_command(*args, **options)
+        if InstrumentedRedis.observer and args:
+            InstrumentedRedis.observer(str(args[0]).upper(), result)
+        return result
+
 # Redis connection helper
 def get_redis_connection():
     """Get Redis connection with error handling"""
     try:
-        r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+        r = InstrumentedRedis(host='localhost', port=6379, db=0, decode_responses=True)
         r.ping()
         return r
     except Exception as e:
@@ -13,6 +13,7 @@ from dotenv import load_dotenv
 from flask import jsonify
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
+from meraki_action_batches import device_update_action, run_action_batches
 
 # Load environment variables
 load_dotenv('/usr/local/bin/meraki.env')
@@ -443,76 +444,85 @@ def reset_confirmation(site_name):
 def push_to_meraki(sites):
     """
     Push confirmed circuit data to Meraki device notes
+    
+    Site rows are prefetched in one query and the notes are written through
+    Meraki action batches (see meraki_action_batches.py).
     """
     session = Session()
-    results = []
+    results = {}
     
     try:
+        # Get confirmed data and the MX serial for every requested site in one query
+        rows = session.execute(text("""
+            SELECT LOWER(ec.network_name),
+                   ec.wan1_provider, ec.wan1_speed, ec.wan2_provider, ec.wan2_speed,
+                   ec.wan1_confirmed, ec.wan2_confirmed, mx.device_serial
+            FROM enriched_circuits ec
+            LEFT JOIN LATERAL (
+                SELECT device_serial
+                FROM meraki_inventory mi
+                WHERE LOWER(mi.network_name) = LOWER(ec.network_name)
+                AND mi.device_model LIKE 'MX%'
+                LIMIT 1
+            ) mx ON TRUE
+            WHERE LOWER(ec.network_name) = ANY(:site_names)
+        """), {'site_names': [site_name.lower() for site_name in sites]}).fetchall()
+        
+        site_rows = {}
+        for row in rows:
+            site_rows.setdefault(row[0], row)
+        
+        pending = []  # (site_name, device_serial, notes)
         for site_name in sites:
-            # Get confirmed data from enriched_circuits
-            result = session.execute(text("""
-                SELECT wan1_provider, wan1_speed, wan2_provider, wan2_speed,
-                       wan1_confirmed, wan2_confirmed
-                FROM enriched_circuits
-                WHERE LOWER(network_name) = LOWER(:site_name)
-            """), {'site_name': site_name})
-            
-            enriched = result.fetchone()
+            enriched = site_rows.get(site_name.lower())
             if not enriched:
-                results.append({"site": site_name, "error": "No enriched data found"})
+                results[site_name] = {"site": site_name, "error": "No enriched data found"}
                 continue
             
+            wan1_provider, wan1_speed, wan2_provider, wan2_speed, wan1_confirmed, wan2_confirmed, device_serial = enriched[1:]
+            
             # Only proceed if at least one WAN is confirmed
-            if not enriched[4] and not enriched[5]:
-                results.append({"site": site_name, "error": "No confirmed circuits"})
+            if not wan1_confirmed and not wan2_confirmed:
+                results[site_name] = {"site": site_name, "error": "No confirmed circuits"}
                 continue
             
-            # Get device serial from meraki_inventory
-            result = session.execute(text("""
-                SELECT device_serial
-                FROM meraki_inventory
-                WHERE LOWER(network_name) = LOWER(:site_name)
-                AND device_model LIKE 'MX%'
-            """), {'site_name': site_name})
-            
-            device_data = result.fetchone()
-            if not device_data or not device_data[0]:
-                results.append({"site": site_name, "error": "No device serial found"})
+            if not device_serial:
+                results[site_name] = {"site": site_name, "error": "No device serial found"}
                 continue
             
-            device_serial = device_data[0]
-            
             # Build notes string
             notes_parts = []
-            if enriched[4] and enriched[0] and enriched[1]:  # wan1_confirmed
-                notes_parts.append(f"WAN 1\n{enriched[0]}\n{enriched[1]}")
-            if enriched[5] and enriched[2] and enriched[3]:  # wan2_confirmed
-                notes_parts.append(f"WAN 2\n{enriched[2]}\n{enriched[3]}")
+            if wan1_confirmed and wan1_provider and wan1_speed:
+                notes_parts.append(f"WAN 1\n{wan1_provider}\n{wan1_speed}")
+            if wan2_confirmed and wan2_provider and wan2_speed:
+                notes_parts.append(f"WAN 2\n{wan2_provider}\n{wan2_speed}")
             
             if not notes_parts:
-                results.append({"site": site_name, "error": "No valid circuit data to push"})
+                results[site_name] = {"site": site_name, "error": "No valid circuit data to push"}
                 continue
             
-            notes = "\n".join(notes_parts)
-            
-            # Update device notes via Meraki API
-            device_url = f"{BASE_URL}/devices/{device_serial}"
-            update_result = make_api_update(device_url, {"notes": notes})
-            
+            pending.append((site_name, device_serial, "\n".join(notes_parts)))
+        
+        # Update device notes via Meraki action batches
+        actions = [device_update_action(device_serial, {"notes": notes}) for _, device_serial, notes in pending]
+        pushed_sites = []
+        for (site_name, _, notes), update_result in zip(pending, run_action_batches(actions)):
             if "error" in update_result:
-                results.append({"site": site_name, "error": update_result["error"]})
+                results[site_name] = {"site": site_name, "error": update_result["error"]}
             else:
-                results.append({"site": site_name, "success": True, "notes": notes})
-                
-                # Update confirmed status in database
-                session.execute(text("""
-                    UPDATE enriched_circuits
-                    SET last_updated = CURRENT_TIMESTAMP
-                    WHERE LOWER(network_name) = LOWER(:site_name)
-                """), {'site_name': site_name})
+                results[site_name] = {"site": site_name, "success": True, "notes": notes}
+                pushed_sites.append(site_name.lower())
+        
+        if pushed_sites:
+            session.execute(text("""
+                UPDATE enriched_circuits
+                SET last_updated = CURRENT_TIMESTAMP
+                WHERE LOWER(network_name) = ANY(:site_names)
+            """), {'site_names': pushed_sites})
         
         session.commit()
         
+        results = [results[site_name] for site_name in sites]
         return {
             "success": True,
             "results": results,
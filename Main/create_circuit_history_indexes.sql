@@ -0,0 +1,7 @@
+-- Covering index for the circuit changelog (historical.py /api/circuit-changelog)
+-- Date-range scans, the join to circuits and the keyset order
+-- (change_date, circuit_id, id) are all served from this one index.
+CREATE INDEX IF NOT EXISTS idx_circuit_history_date_circuit
+    ON circuit_history (change_date, circuit_id, id);
+
+ANALYZE circuit_history;
@@ -0,0 +1,49 @@
+-- Typed tags + precomputed site_class for inventory_devices and meraki_inventory
+-- Page filters become index lookups instead of per-row unnest()/LIKE tag scans.
+-- The CASE below mirrors site_classification.classify_site(); nightly jobs keep
+-- site_class current after this one-time backfill.
+
+-- inventory_devices: tags TEXT (JSON string) -> JSONB
+ALTER TABLE inventory_devices
+    ALTER COLUMN tags TYPE JSONB USING (
+        CASE
+            WHEN tags IS NULL OR tags = '' OR tags = 'null' THEN '[]'::jsonb
+            ELSE tags::jsonb
+        END
+    );
+ALTER TABLE inventory_devices ALTER COLUMN tags SET DEFAULT '[]'::jsonb;
+ALTER TABLE inventory_devices ADD COLUMN IF NOT EXISTS site_class VARCHAR(10);
+
+UPDATE inventory_devices d SET site_class = (
+    SELECT CASE
+        WHEN bool_or(LOWER(tag) LIKE '%hub%') THEN 'hub'
+        WHEN bool_or(LOWER(tag) LIKE '%lab%') THEN 'lab'
+        WHEN bool_or(LOWER(tag) LIKE '%voice%') THEN 'voice'
+        WHEN bool_or(LOWER(tag) LIKE '%test%') THEN 'test'
+        ELSE 'store'
+    END
+    FROM jsonb_array_elements_text(COALESCE(d.tags, '[]'::jsonb)) AS tag
+);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_devices_tags_gin ON inventory_devices USING GIN (tags);
+CREATE INDEX IF NOT EXISTS idx_inventory_devices_site_class_org ON inventory_devices(site_class, organization);
+
+-- meraki_inventory: device_tags is already TEXT[]; add GIN index and site_class
+ALTER TABLE meraki_inventory ADD COLUMN IF NOT EXISTS site_class VARCHAR(10);
+
+UPDATE meraki_inventory m SET site_class = (
+    SELECT CASE
+        WHEN bool_or(LOWER(tag) LIKE '%hub%') THEN 'hub'
+        WHEN bool_or(LOWER(tag) LIKE '%lab%') THEN 'lab'
+        WHEN bool_or(LOWER(tag) LIKE '%voice%') THEN 'voice'
+        WHEN bool_or(LOWER(tag) LIKE '%test%') THEN 'test'
+        ELSE 'store'
+    END
+    FROM unnest(COALESCE(m.device_tags, ARRAY[]::varchar[])) AS tag
+);
+
+CREATE INDEX IF NOT EXISTS idx_meraki_inventory_device_tags_gin ON meraki_inventory USING GIN (device_tags);
+CREATE INDEX IF NOT EXISTS idx_meraki_inventory_site_class ON meraki_inventory(site_class);
+
+ANALYZE inventory_devices;
+ANALYZE meraki_inventory;
@@ -0,0 +1,57 @@
+-- Subnet index and /16, /24 rollups read by subnets_blueprint.py and network_analysis_blueprint.py
+-- Same objects as subnet_index.CREATE_SUBNET_INDEX_SQL; the nightly Meraki job (or
+-- python3 subnet_index.py) creates and refreshes them too. Run this once on a fresh database
+-- so the subnets pages work before the first nightly run:
+--   psql -d dsrcircuits -f create_subnet_index.sql
+ALTER TABLE network_vlans ADD COLUMN IF NOT EXISTS subnet_cidr CIDR;
+CREATE INDEX IF NOT EXISTS idx_network_vlans_subnet_cidr
+    ON network_vlans USING gist (subnet_cidr inet_ops);
+
+-- Subnets inet would reject (bad octet or mask) are left NULL
+UPDATE network_vlans
+SET subnet_cidr = CASE WHEN subnet ~ '^(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)(\.(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)){3}/(3[0-2]|[12]?\d)$' THEN network(subnet::inet) END
+WHERE subnet_cidr IS DISTINCT FROM
+      (CASE WHEN subnet ~ '^(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)(\.(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)){3}/(3[0-2]|[12]?\d)$' THEN network(subnet::inet) END);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS subnet_rollup_24 AS
+SELECT set_masklen(subnet_cidr, 24) AS parent_network,
+       COUNT(DISTINCT network_name) AS network_count,
+       string_agg(DISTINCT network_name, ', ' ORDER BY network_name) AS networks,
+       array_agg(DISTINCT network_name ORDER BY network_name) AS network_list,
+       COUNT(*) AS total_vlans,
+       CASE
+           WHEN set_masklen(subnet_cidr, 24) <<= '10.0.0.0/8' THEN 'Private 10/8'
+           WHEN set_masklen(subnet_cidr, 24) <<= '192.168.0.0/16' THEN 'Private 192.168/16'
+           ELSE 'Public'
+       END AS network_type
+FROM network_vlans
+WHERE subnet_cidr IS NOT NULL
+  AND family(subnet_cidr) = 4
+  AND NOT subnet_cidr <<= '172.0.0.0/8'
+  AND network_name NOT ILIKE '%hub%'
+  AND network_name NOT ILIKE '%voice%'
+  AND network_name NOT ILIKE '%lab%'
+GROUP BY set_masklen(subnet_cidr, 24);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_subnet_rollup_24_network
+    ON subnet_rollup_24 (parent_network);
+CREATE INDEX IF NOT EXISTS idx_subnet_rollup_24_gist
+    ON subnet_rollup_24 USING gist (parent_network inet_ops);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS subnet_rollup_16 AS
+SELECT set_masklen(parent_network, 16) AS parent_16_network,
+       COUNT(DISTINCT site) AS site_count,
+       string_agg(DISTINCT site, ', ' ORDER BY site) AS sites,
+       array_agg(DISTINCT site ORDER BY site) AS site_list,
+       COUNT(DISTINCT parent_network) AS unique_24_networks,
+       array_to_string(array_agg(DISTINCT parent_network ORDER BY parent_network), ', ')
+           AS all_24_networks
+FROM subnet_rollup_24, unnest(network_list) AS site
+GROUP BY set_masklen(parent_network, 16);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_subnet_rollup_16_network
+    ON subnet_rollup_16 (parent_16_network);
+CREATE INDEX IF NOT EXISTS idx_subnet_rollup_16_gist
+    ON subnet_rollup_16 USING gist (parent_16_network inet_ops);
+
+ANALYZE network_vlans;
@@ -0,0 +1,8 @@
+-- Keyset pagination index for the switch visibility page (/api/switch-port-clients)
+-- Matches SwitchPortClient.__table_args__ idx_switch_port_clients_keyset; db.create_all()
+-- does not add indexes to an existing table, so run this once on existing databases:
+--   psql -d dsrcircuits -f create_switch_port_clients_keyset_index.sql
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_switch_port_clients_keyset
+    ON switch_port_clients ((COALESCE(store_name, '')), (COALESCE(switch_name, '')), (COALESCE(port_id, '')), id);
+
+ANALYZE switch_port_clients;
@@ -20,6 +20,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import config, get_redis_connection
 from models import db, Circuit, CircuitHistory, DailySummary, ProviderMapping, CircuitAssignment
+from firewall_rulesets import get_ruleset_summary, get_template_hash
 
 # Import existing modules
 from dsrcircuits_blueprint import dsrcircuits_bp
@@ -40,6 +41,7 @@ from dsrcircuits_test import dsrcircuits_test_bp
 from dsrcircuits_dev import dsrcircuits_dev_bp
 from inventory_working import inventory_working_bp
 from database_viewer import database_viewer_bp
+from request_timing import init_request_timing
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -54,6 +56,14 @@ except ImportError:
     logger.warning("VLAN migration module not available")
     vlan_migration_available = False
 
+# Import multi-site connectivity monitor (requires httpx)
+try:
+    from site_connectivity_monitor import site_monitor_bp
+    site_monitor_available = True
+except ImportError:
+    logger.warning("Site connectivity monitor not available")
+    site_monitor_available = False
+
 # Import VLAN migration test blueprints
 try:
     from vlan_migration_test_routes import vlan_migration_test_routes
@@ -74,6 +84,9 @@ def create_app(config_name='production'):
     # Initialize extensions
     db.init_app(app)
     
+    # Time every real request into performance_metrics, and profile its SQL per route
+    init_request_timing(app)
+    
     # Initialize cache
     cache = Cache()
     cache.init_app(app)
@@ -115,6 +128,10 @@ def create_app(config_name='production'):
         app.register_blueprint(vlan_migration_bp)
         logger.info("✓ VLAN Migration module registered")
     
+    if site_monitor_available:
+        app.register_blueprint(site_monitor_bp)
+        logger.info("✓ Site connectivity monitor registered")
+    
     # Register VLAN test blueprints if available
     if vlan_test_available:
         app.register_blueprint(vlan_migration_test_routes)
@@ -502,6 +519,59 @@ def create_app(config_name='production'):
                 'error': str(e)
             }), 500
 
+    @app.route('/api/firewall/rulesets')
+    def get_firewall_rulesets():
+        """Distinct L3 rulesets in use and the networks running each one"""
+        try:
+            engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+            with engine.connect() as conn:
+                rulesets = get_ruleset_summary(conn)
+                
+                return jsonify({
+                    'success': True,
+                    'rulesets': rulesets,
+                    'rulesetCount': len(rulesets),
+                    'networkCount': sum(r['networkCount'] for r in rulesets)
+                })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+
+    @app.route('/api/firewall/template/<template_name>/drift')
+    def get_template_drift(template_name):
+        """Networks whose L3 ruleset deviates from a template, grouped by ruleset"""
+        try:
+            engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+            with engine.connect() as conn:
+                template_hash, template_rule_count = get_template_hash(conn, template_name)
+                if not template_hash:
+                    return jsonify({
+                        'success': False,
+                        'error': f'Template {template_name} has no rules'
+                    }), 404
+                
+                matching_count = conn.execute(text("""
+                    SELECT COUNT(*) FROM network_firewall_rulesets WHERE ruleset_hash = :hash
+                """), {'hash': template_hash}).scalar()
+                deviating = get_ruleset_summary(conn, exclude_hash=template_hash)
+                
+                return jsonify({
+                    'success': True,
+                    'templateName': template_name,
+                    'templateHash': template_hash,
+                    'templateRuleCount': template_rule_count,
+                    'matchingNetworks': matching_count,
+                    'deviatingNetworks': sum(r['networkCount'] for r in deviating),
+                    'deviatingRulesets': deviating
+                })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+
     @app.route('/api/firewall/template/<template_name>/update', methods=['POST'])
     def update_template_rule(template_name):
         """Update a template rule with revision tracking"""
@@ -51,6 +51,7 @@ Features:
 from flask import Blueprint, render_template, jsonify, request, current_app
 from sqlalchemy import and_, or_, func
 from models import db, Circuit, EnrichedCircuit, MerakiInventory
+from site_classification import classify_site, SITE_CLASS_STORE
 from sqlalchemy import func
 from dsrcircuits_beta_combined import ProviderMatcher, assign_costs_improved
 from datetime import datetime
@@ -106,19 +107,8 @@ def dsrcircuits():
                 db.text("meraki_inventory.device_tags @> ARRAY['Discount-Tire']")
             ).filter(
                 # Exclude sites with lab/hub/voice/test tags even if they have Discount-Tire
-                db.text("""
-                    NOT EXISTS (
-                        SELECT 1 FROM unnest(meraki_inventory.device_tags) AS tag 
-                        WHERE LOWER(tag) LIKE '%hub%' 
-                           OR LOWER(tag) LIKE '%lab%' 
-                           OR LOWER(tag) LIKE '%voice%'
-                           OR LOWER(tag) LIKE '%test%'
-                           OR LOWER(tag) = 'hub'
-                           OR LOWER(tag) = 'lab'
-                           OR LOWER(tag) = 'voice'
-                           OR LOWER(tag) = 'test'
-                    )
-                """)
+                # (site_class is classified from tags at ingest)
+                MerakiInventory.site_class == SITE_CLASS_STORE
             )
             logger.info("Filtering for Discount-Tire tag only, excluding lab/hub/voice/test tagged sites")
         else:
@@ -1576,6 +1566,7 @@ def update_device_tags(device_serial):
         
         # Update database
         meraki_device.device_tags = new_tags  # SQLAlchemy handles the array conversion
+        meraki_device.site_class = classify_site(new_tags)
         meraki_device.last_updated = datetime.utcnow()
         db.session.commit()
         
@@ -1644,6 +1635,7 @@ def update_device_tags(device_serial):
         if check_response.status_code == 404:
             # Device not found in Meraki, skip API update but update database
             meraki_device.device_tags = new_tags
+            meraki_device.site_class = classify_site(new_tags)
             db.session.commit()
             
             return jsonify({
@@ -1665,6 +1657,7 @@ def update_device_tags(device_serial):
         if update_response.status_code == 200:
             # Update database
             meraki_device.device_tags = new_tags
+            meraki_device.site_class = classify_site(new_tags)
             db.session.commit()
             
             return jsonify({
@@ -1725,6 +1718,7 @@ def mark_remodeling(site_name):
         
         # Update device tags
         meraki_device.device_tags = tags
+        meraki_device.site_class = classify_site(tags)
         
         # Update device notes - add "Remodeling" to the bottom if not already there
         current_notes = meraki_device.device_notes or ""
@@ -1803,6 +1797,7 @@ def mark_remodeling_done(site_name):
         
         # Update device tags
         meraki_device.device_tags = tags
+        meraki_device.site_class = classify_site(tags)
         
         # Update device notes - remove "Remodeling" from notes
         current_notes = meraki_device.device_notes or ""
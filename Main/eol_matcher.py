@@ -0,0 +1,232 @@
+"""
+EOL MATCHER - PRECOMPILED MODEL-TO-EOL INDEX
+============================================
+
+Purpose:
+    - Resolve a device model (e.g. "MR33-HW", "MS220-8P") to its EOL record without
+      scanning every EOL key for every model
+    - Built once per run; each distinct model is resolved once and memoized
+
+Matching (same rules as the original get_eol() linear scan):
+    1. Exact match on the normalized (stripped, upper-case) model
+    2. MS220 variants fall back to their port-count base: MS220-8P -> MS220-8
+    3. An EOL key that is a prefix of the model ending at a '-' boundary:
+       MR33-HW -> MR33, but MX67C-NA does not match MX67
+    Rule 3 walks a character trie of the keys, so a lookup is O(len(model)). When
+    several keys qualify the longest wins (the old scan took the first in key order).
+
+Sources (load_eol_records):
+    meraki_eol_enhanced, then meraki_eol, then meraki_eol_pdf - a model takes its
+    dates from the first table that has it. Missing tables are skipped.
+
+Used By:
+    - nightly/nightly_inventory_db.py (inventory summary EOL dates)
+    - CLI benchmark: python3 eol_matcher.py --benchmark [--models 13000]
+"""
+
+import re
+import time
+import random
+import argparse
+
+MS220_BASE_PATTERN = re.compile(r'(MS220-\d+)')
+
+# (table, query) in precedence order; each returns model, announcement, end of sale, end of support
+EOL_SOURCES = (
+    ('meraki_eol_enhanced', """
+        SELECT model, announcement_date, end_of_sale, end_of_support
+        FROM meraki_eol_enhanced
+    """),
+    ('meraki_eol', """
+        SELECT model, announcement_date, end_of_sale_date, end_of_support_date
+        FROM meraki_eol
+    """),
+    ('meraki_eol_pdf', """
+        SELECT model, MAX(announcement_date), MAX(end_of_sale), MAX(end_of_support)
+        FROM meraki_eol_pdf
+        GROUP BY model
+    """),
+)
+
+def normalize_model(model):
+    """Normalize model name"""
+    return model.strip().upper() if model else ""
+
+def load_eol_records(cursor):
+    """EOL dates per normalized model from every available EOL table
+
+    Returns {model: {'announcement_date', 'end_of_sale', 'end_of_support', 'source'}}.
+    """
+    records = {}
+    for table, query in EOL_SOURCES:
+        cursor.execute("SELECT to_regclass(%s)", (table,))
+        if cursor.fetchone()[0] is None:
+            continue
+        cursor.execute(query)
+        for model, ann_date, eos_date, eol_date in cursor.fetchall():
+            model = normalize_model(model)
+            if not model or model in records or not (ann_date or eos_date or eol_date):
+                continue
+            records[model] = {
+                'announcement_date': ann_date,
+                'end_of_sale': eos_date,
+                'end_of_support': eol_date,
+                'source': table
+            }
+    return records
+
+class EolMatcher:
+    """
+    Model -> EOL record index
+
+    Args:
+        records: {eol_model: record} - record can be any value (dict of dates, row, ...)
+    """
+
+    def __init__(self, records):
+        self.records = {}
+        self.trie = {}
+        self.cache = {}
+        for key, record in records.items():
+            key = normalize_model(key)
+            if key and key not in self.records:
+                self.records[key] = record
+                self._insert(key)
+
+    def _insert(self, key):
+        node = self.trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[None] = key  # None marks the end of a key
+
+    def _longest_dash_prefix(self, model):
+        """Longest key that equals model or is followed by '-' in it"""
+        best = None
+        node = self.trie
+        for i, char in enumerate(model):
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node and (i + 1 == len(model) or model[i + 1] == '-'):
+                best = node[None]
+        return best
+
+    def resolve(self, model):
+        """The EOL key a model matches, or None"""
+        if model in self.records:
+            return model
+
+        if model.startswith("MS220-"):
+            base_match = MS220_BASE_PATTERN.match(model)
+            if base_match and base_match.group(1) in self.records:
+                return base_match.group(1)
+
+        return self._longest_dash_prefix(model)
+
+    def match(self, model, default=None):
+        """EOL record for a model (memoized per distinct model)"""
+        model = normalize_model(model)
+        if model not in self.cache:
+            self.cache[model] = self.resolve(model)
+        key = self.cache[model]
+        return self.records[key] if key is not None else default
+
+    def __len__(self):
+        return len(self.records)
+
+def legacy_get_eol(model, eol_lookup):
+    """The original linear-scan matcher, kept for the benchmark and parity checks"""
+    model = normalize_model(model)
+    if model in eol_lookup:
+        return eol_lookup[model]
+    if model.startswith("MS220-"):
+        base_match = MS220_BASE_PATTERN.match(model)
+        if base_match and base_match.group(1) in eol_lookup:
+            return eol_lookup[base_match.group(1)]
+    for key in eol_lookup:
+        if model == key or (model.startswith(key) and len(model) > len(key) and model[len(key)] == '-'):
+            return eol_lookup[key]
+    return None
+
+def synthetic_eol_keys(count):
+    """EOL keys shaped like real Meraki models (MR33, MS220-8, MX64W, ...)"""
+    rng = random.Random(42)
+    families = ['MR', 'MS', 'MX', 'MV', 'MG', 'MT', 'Z', 'GR', 'GS']
+    keys = set()
+    while len(keys) < count:
+        family = rng.choice(families)
+        key = f"{family}{rng.randint(10, 450)}"
+        if family == 'MS' and rng.random() < 0.6:
+            key += f"-{rng.choice([8, 24, 48])}{rng.choice(['', 'P', 'LP', 'FP'])}"
+        elif rng.random() < 0.2:
+            key += rng.choice(['W', 'C', 'E'])
+        keys.add(key)
+    return sorted(keys)
+
+def synthetic_models(keys, count):
+    """Device models: mostly EOL keys with hardware/region suffixes, some unknown"""
+    rng = random.Random(7)
+    models = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            models.append(rng.choice(keys) + rng.choice(['', '-HW', '-HW-NA', '-HW-US']))
+        else:
+            models.append(f"CW{rng.randint(9000, 9999)}-{rng.choice(['MR', 'HW'])}")
+    return models
+
+def run_benchmark(eol_keys, models):
+    """Time legacy scan vs. index on the same models and check they agree"""
+    eol_lookup = {key: {'model': key} for key in eol_keys}
+
+    started = time.perf_counter()
+    legacy = [legacy_get_eol(model, eol_lookup) for model in models]
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matcher = EolMatcher(eol_lookup)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    indexed = [matcher.match(model) for model in models]
+    match_seconds = time.perf_counter() - started
+
+    mismatches = sum(1 for a, b in zip(legacy, indexed) if a is not b)
+    print(f"EOL keys: {len(eol_keys)}, device models: {len(models)} "
+          f"({len(set(models))} distinct), matched: {sum(1 for r in indexed if r)}")
+    print(f"  legacy linear scan: {legacy_seconds * 1000:9.1f} ms")
+    print(f"  index build:        {build_seconds * 1000:9.1f} ms")
+    print(f"  index lookups:      {match_seconds * 1000:9.1f} ms "
+          f"({legacy_seconds / max(build_seconds + match_seconds, 1e-9):.0f}x faster incl. build)")
+    print(f"  mismatches vs legacy: {mismatches}"
+          f"{' (longest prefix wins where several keys match)' if mismatches else ''}")
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description='EOL matcher benchmark')
+    parser.add_argument('--benchmark', action='store_true', help='Compare against the legacy linear scan')
+    parser.add_argument('--models', type=int, default=13000, help='Device models to resolve')
+    parser.add_argument('--eol-keys', type=int, default=800, help='Synthetic EOL keys (without --db)')
+    parser.add_argument('--db', action='store_true', help='Use EOL keys and inventory models from the database')
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    if args.db:
+        import psycopg2
+        from config import Config
+        conn = psycopg2.connect(Config.SQLALCHEMY_DATABASE_URI)
+        cursor = conn.cursor()
+        eol_keys = sorted(load_eol_records(cursor))
+        cursor.execute("SELECT model FROM inventory_devices WHERE model IS NOT NULL")
+        models = [row[0] for row in cursor.fetchall()]
+        conn.close()
+    else:
+        eol_keys = synthetic_eol_keys(args.eol_keys)
+        models = synthetic_models(eol_keys, args.models)
+
+    run_benchmark(eol_keys, models)
+
+if __name__ == "__main__":
+    main()
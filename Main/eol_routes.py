@@ -18,6 +18,35 @@ def eol_dashboard():
     """Render EOL dashboard page"""
     return render_template('eol_dashboard.html')
 
+# Per-model inventory counts: the nightly cube, or inventory_summary (no per-org
+# breakdown) until the cube has been built
+INVENTORY_COUNTS_CUBE_SQL = """
+                SELECT 
+                    model,
+                    SUM(device_count) as inventory_count,
+                    jsonb_object_agg(organization, device_count) as org_counts
+                FROM inventory_summary_cube
+                GROUP BY model
+            """
+
+INVENTORY_COUNTS_SUMMARY_SQL = """
+                SELECT 
+                    model,
+                    total_count as inventory_count,
+                    '{}'::jsonb as org_counts
+                FROM inventory_summary
+            """
+
+def inventory_counts_sql(session):
+    """Inventory counts subquery, falling back to inventory_summary when the cube is missing or empty"""
+    try:
+        if session.execute(text("SELECT EXISTS (SELECT 1 FROM inventory_summary_cube)")).scalar():
+            return INVENTORY_COUNTS_CUBE_SQL
+    except Exception as e:
+        logger.warning(f"inventory_summary_cube unavailable, using inventory_summary: {e}")
+        session.rollback()
+    return INVENTORY_COUNTS_SUMMARY_SQL
+
 @eol_bp.route('/api/eol/summary')
 def api_eol_summary():
     """Get EOL summary data with inventory counts"""
@@ -25,7 +54,7 @@ def api_eol_summary():
     
     try:
         # Get EOL data with inventory counts
-        query = text("""
+        query = text(f"""
             WITH eol_latest AS (
                 SELECT DISTINCT ON (model) 
                     model,
@@ -45,15 +74,11 @@ def api_eol_summary():
                 FROM meraki_eol
                 ORDER BY model, updated_at DESC
             ),
-            inventory_counts AS (
-                SELECT 
-                    model,
-                    total_count as inventory_count
-                FROM inventory_summary
-            )
+            inventory_counts AS ({inventory_counts_sql(db.session)})
             SELECT 
                 e.*,
-                COALESCE(i.inventory_count, 0) as inventory_count
+                COALESCE(i.inventory_count, 0) as inventory_count,
+                COALESCE(i.org_counts, '{{}}'::jsonb) as org_counts
             FROM eol_latest e
             LEFT JOIN inventory_counts i ON e.model = i.model
             ORDER BY 
@@ -89,6 +114,7 @@ def api_eol_summary():
                 'pdf_filename': row.pdf_filename,
                 'eol_source': row.eol_source,
                 'inventory_count': row.inventory_count,
+                'org_counts': row.org_counts or {},
                 'updated_at': row.updated_at.isoformat() if row.updated_at else None
             }
             models.append(model_data)
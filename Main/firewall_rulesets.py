@@ -0,0 +1,128 @@
+"""
+FIREWALL RULESET HASHING - CONTENT-ADDRESSED L3 RULESETS
+=======================================================
+
+Purpose:
+    - Canonicalize Meraki MX L3 firewall rulesets and hash them (SHA-256)
+    - Store each distinct ruleset once (firewall_rulesets) and reference it per
+      network by hash (network_firewall_rulesets)
+    - Find networks whose ruleset deviates from a firewall template
+
+Canonical Form:
+    - Rules keep their order; each rule is reduced to comment, policy, protocol,
+      srcPort, srcCidr, destPort, destCidr, syslogEnabled
+    - policy/protocol are lower-cased, missing ports/CIDRs become 'Any', whitespace
+      is collapsed
+    - Meraki's trailing implicit 'Default rule' is dropped (it is always present
+      and cannot be edited)
+
+Tables:
+    firewall_rulesets          - one row per distinct ruleset hash (rules as JSONB)
+    network_firewall_rulesets  - network_id -> ruleset_hash, updated only on change
+
+Used By:
+    - nightly/nightly_meraki_db.py, nightly_meraki_enriched_merged.py (collect_firewall_rules)
+    - dsrcircuits.py firewall routes (/api/firewall/rulesets, template drift)
+"""
+
+import json
+import hashlib
+from sqlalchemy import text
+
+CREATE_RULESET_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS firewall_rulesets (
+        ruleset_hash CHAR(64) PRIMARY KEY,
+        rules JSONB NOT NULL,
+        rule_count INTEGER NOT NULL,
+        first_seen TIMESTAMP DEFAULT NOW(),
+        last_seen TIMESTAMP DEFAULT NOW()
+    );
+    CREATE TABLE IF NOT EXISTS network_firewall_rulesets (
+        network_id VARCHAR(50) PRIMARY KEY,
+        network_name VARCHAR(255),
+        ruleset_hash CHAR(64) NOT NULL REFERENCES firewall_rulesets(ruleset_hash),
+        rule_count INTEGER NOT NULL,
+        changed_at TIMESTAMP DEFAULT NOW(),
+        last_synced TIMESTAMP DEFAULT NOW()
+    );
+    CREATE INDEX IF NOT EXISTS idx_network_firewall_rulesets_hash
+        ON network_firewall_rulesets (ruleset_hash);
+"""
+
+def _clean(value, default='Any'):
+    if value is None or str(value).strip() == '':
+        return default
+    return ' '.join(str(value).split())
+
+def is_default_rule(rule):
+    """Meraki appends an implicit 'Default rule' (allow any any) to every ruleset"""
+    return (rule.get('comment') or '').strip().lower() == 'default rule'
+
+def canonicalize_rules(rules):
+    """Reduce a list of Meraki L3 rules to the canonical form that gets hashed"""
+    rules = list(rules or [])
+    if rules and is_default_rule(rules[-1]):
+        rules = rules[:-1]
+
+    return [{
+        'comment': _clean(rule.get('comment'), ''),
+        'policy': _clean(rule.get('policy'), 'allow').lower(),
+        'protocol': _clean(rule.get('protocol'), 'any').lower(),
+        'srcPort': _clean(rule.get('srcPort')),
+        'srcCidr': _clean(rule.get('srcCidr')),
+        'destPort': _clean(rule.get('destPort')),
+        'destCidr': _clean(rule.get('destCidr')),
+        'syslogEnabled': bool(rule.get('syslogEnabled'))
+    } for rule in rules]
+
+def ruleset_hash(canonical_rules):
+    """SHA-256 of a canonical ruleset"""
+    payload = json.dumps(canonical_rules, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def rows_to_rules(rows):
+    """Convert firewall_rules rows (ordered by rule_order) to Meraki-style rule dicts"""
+    return [{
+        'comment': row.comment,
+        'policy': row.policy,
+        'protocol': row.protocol,
+        'srcPort': row.src_port,
+        'srcCidr': row.src_cidr,
+        'destPort': row.dest_port,
+        'destCidr': row.dest_cidr,
+        'syslogEnabled': row.syslog_enabled
+    } for row in rows]
+
+def get_template_hash(conn, template_name):
+    """Hash of a firewall template's rules as stored in firewall_rules"""
+    rows = conn.execute(text("""
+        SELECT comment, policy, protocol, src_port, src_cidr,
+               dest_port, dest_cidr, syslog_enabled
+        FROM firewall_rules
+        WHERE template_source = :template_name AND is_template = true
+        ORDER BY rule_order
+    """), {'template_name': template_name}).fetchall()
+
+    if not rows:
+        return None, 0
+    canonical = canonicalize_rules(rows_to_rules(rows))
+    return ruleset_hash(canonical), len(canonical)
+
+def get_ruleset_summary(conn, exclude_hash=None):
+    """Distinct rulesets in use with their network counts (optionally excluding one hash)"""
+    result = conn.execute(text("""
+        SELECT n.ruleset_hash, MAX(n.rule_count) AS rule_count,
+               COUNT(*) AS network_count,
+               ARRAY_AGG(n.network_name ORDER BY n.network_name) AS networks
+        FROM network_firewall_rulesets n
+        WHERE (:exclude_hash IS NULL OR n.ruleset_hash <> :exclude_hash)
+        GROUP BY n.ruleset_hash
+        ORDER BY COUNT(*) DESC
+    """), {'exclude_hash': exclude_hash})
+
+    return [{
+        'hash': row.ruleset_hash,
+        'ruleCount': row.rule_count,
+        'networkCount': row.network_count,
+        'networks': row.networks
+    } for row in result]
@@ -16,6 +16,7 @@ Templates Used:
 
 API Endpoints:
     - /api/circuit-changelog (POST) - Generate change log for specified time period
+      (keyset-paginated: perPage/cursor; the summary comes with the first page)
 
 Key Functions:
     - Database-driven change detection using CircuitHistory table
@@ -30,7 +31,8 @@ Dependencies:
     - utils.py for utility functions
 
 Data Processing:
-    - Query CircuitHistory table for time-based filtering
+    - One CircuitHistory/Circuit outer join per page (idx_circuit_history_date_circuit)
+    - Summary counts are aggregated in the database (GROUP BY change_type, field_changed)
     - Change categorization from historical records
     - Impact assessment and statistical analysis
     - Time-based filtering and validation
@@ -46,9 +48,25 @@ Features:
 
 from flask import Blueprint, render_template, jsonify, request
 from models import db, Circuit, CircuitHistory
-from sqlalchemy import func, and_, or_, desc
-from datetime import datetime, timedelta
+from sqlalchemy import func, and_, or_, desc, distinct, tuple_
+from datetime import datetime, date, timedelta
 from utils import safe_str
+import base64
+import json
+
+CHANGELOG_PAGE_SIZE = 5000
+MAX_CHANGELOG_PAGE_SIZE = 20000
+
+CHANGELOG_COLUMNS = (
+    CircuitHistory.id, CircuitHistory.circuit_id, CircuitHistory.change_date,
+    CircuitHistory.change_type, CircuitHistory.field_changed,
+    CircuitHistory.old_value, CircuitHistory.new_value, CircuitHistory.csv_file_source,
+    Circuit.site_name, Circuit.site_id, Circuit.circuit_purpose, Circuit.provider_name,
+    Circuit.details_ordered_service_speed, Circuit.billing_monthly_cost
+)
+
+# Newest first; matches idx_circuit_history_date_circuit scanned backwards
+CHANGELOG_SORT_KEYS = (CircuitHistory.change_date, CircuitHistory.circuit_id, CircuitHistory.id)
 
 def get_change_category(change_type):
     """Map change type to category"""
@@ -84,6 +102,61 @@ def get_change_impact(change_type):
     }
     return impact_map.get(change_type, "Circuit updated")
 
+def change_row_to_dict(row):
+    """Convert a CHANGELOG_COLUMNS row to the change format the frontend expects"""
+    change_description = f"{row.field_changed or 'status'} changed"
+    if row.old_value and row.new_value:
+        change_description = f"{row.field_changed or 'status'} changed: {row.old_value} → {row.new_value}"
+    
+    return {
+        "site_name": row.site_name if row.site_name is not None else "Unknown",
+        "site_id": row.site_id or "",
+        "circuit_purpose": row.circuit_purpose or "",
+        "change_type": row.change_type or "STATUS_CHANGE",
+        "field_changed": row.field_changed or "status",
+        "before_value": row.old_value or "",  # Map old_value to before_value
+        "after_value": row.new_value or "",   # Map new_value to after_value
+        "change_time": row.change_date.strftime('%Y-%m-%d'),
+        "change_category": get_change_category(row.change_type),
+        "description": change_description,
+        "impact": get_change_impact(row.change_type),
+        "csv_file_source": row.csv_file_source or "database",
+        "provider_name": row.provider_name or "",
+        "details_ordered_service_speed": row.details_ordered_service_speed or "",
+        "billing_monthly_cost": str(row.billing_monthly_cost) if row.billing_monthly_cost else ""
+    }
+
+def encode_changelog_cursor(row):
+    """Encode the keyset position of a changelog row as an opaque URL-safe cursor"""
+    key = [row.change_date.isoformat(), row.circuit_id, row.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_changelog_cursor(cursor):
+    """Decode a cursor produced by encode_changelog_cursor()"""
+    key = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    if not isinstance(key, list) or len(key) != 3:
+        raise ValueError('Invalid cursor')
+    return [date.fromisoformat(key[0]), int(key[1]), int(key[2])]
+
+def get_changelog_page(start_date, end_date, per_page, cursor=None):
+    """One page of changes joined to their circuits, newest first
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = db.session.query(*CHANGELOG_COLUMNS).outerjoin(
+        Circuit, Circuit.id == CircuitHistory.circuit_id
+    ).filter(
+        CircuitHistory.change_date >= start_date,
+        CircuitHistory.change_date <= end_date
+    )
+    if cursor:
+        query = query.filter(tuple_(*CHANGELOG_SORT_KEYS) < tuple_(*decode_changelog_cursor(cursor)))
+    
+    rows = query.order_by(*[key.desc() for key in CHANGELOG_SORT_KEYS]).limit(per_page + 1).all()
+    if len(rows) > per_page:
+        return rows[:per_page], encode_changelog_cursor(rows[per_page - 1])
+    return rows, None
+
 # Create Blueprint
 historical_bp = Blueprint('historical', __name__)
 
@@ -114,35 +187,37 @@ def circuit_changelog():
                          'last_quarter', 'last_year', 'custom'
         customStart (str): Start date for custom range (YYYY-MM-DD)
         customEnd (str): End date for custom range (YYYY-MM-DD)
+        perPage (int): Changes per page (default CHANGELOG_PAGE_SIZE)
+        cursor (str): pagination.next_cursor from the previous page
     
     Returns:
         JSON response with:
-        - Detailed change data from database
-        - Summary statistics
-        - Period information
+        - One page of change data from database
+        - Summary statistics (first page only; null when a cursor is given)
+        - Period information and pagination (has_next, next_cursor)
         OR error information with helpful guidance
     """
     try:
         time_period = request.form.get('timePeriod', 'last_week')
         custom_start = request.form.get('customStart')
         custom_end = request.form.get('customEnd')
+        cursor = request.form.get('cursor')
+        per_page = max(min(int(request.form.get('perPage', CHANGELOG_PAGE_SIZE)), MAX_CHANGELOG_PAGE_SIZE), 1)
         
         print(f"🔍 Generating changelog from database for period: {time_period}")
         
-        # Get available data range from database
-        oldest_change = CircuitHistory.query.order_by(CircuitHistory.change_date.asc()).first()
-        newest_change = CircuitHistory.query.order_by(CircuitHistory.change_date.desc()).first()
+        # Get available data range from database (both ends of the change_date index)
+        oldest_date, newest_date = db.session.query(
+            func.min(CircuitHistory.change_date), func.max(CircuitHistory.change_date)
+        ).one()
         
-        if not oldest_change or not newest_change:
+        if not oldest_date or not newest_date:
             return jsonify({
                 "error": "No Historical Data Available",
                 "detailed_error": "No circuit history data found in database. Historical data is generated during nightly processing.",
                 "suggested_action": "Wait for nightly processing to complete or check database connectivity."
             }), 400
         
-        oldest_date = oldest_change.change_date
-        newest_date = newest_change.change_date
-        
         print(f"📊 Available history data from {oldest_date} to {newest_date}")
         
         # Calculate requested date range
@@ -207,30 +282,15 @@ def circuit_changelog():
                 "suggested_action": f"Select dates up to today ({today.strftime('%B %d, %Y')})"
             }), 400
         
-        # Query changes from database within date range
-        changes_query = CircuitHistory.query.filter(
-            and_(
-                CircuitHistory.change_date >= start_date,
-                CircuitHistory.change_date <= end_date
-            )
-        ).order_by(CircuitHistory.change_date.desc(), CircuitHistory.id.desc())
+        # Summary is aggregated in the database and only sent with the first page
+        summary = None if cursor else summarize_changelog(start_date, end_date)
         
-        circuit_changes = changes_query.all()
-        
-        print(f"📂 Found {len(circuit_changes)} changes in database for requested range")
-        
-        if len(circuit_changes) == 0:
+        if summary and summary['total_changes'] == 0:
             period_desc = time_period.replace('_', ' ').title()
             return jsonify({
                 "message": f"No circuit changes were detected during the {period_desc} period ({start_date} to {end_date}).",
                 "data": [],
-                "summary": {
-                    "total_changes": 0,
-                    "changes_by_type": {},
-                    "period_days": (end_date - start_date).days,
-                    "changes_per_day": 0,
-                    "most_common_change": "None"
-                },
+                "summary": summary,
                 "period": {
                     "description": period_desc,
                     "start": start_date.strftime('%Y-%m-%d'),
@@ -238,39 +298,13 @@ def circuit_changelog():
                 }
             }), 200
         
-        # Convert database records to change format
-        changes = []
-        for change_record in circuit_changes:
-            # Get circuit information
-            circuit = Circuit.query.get(change_record.circuit_id)
-            
-            # Map database fields to match frontend expectations
-            change_category = get_change_category(change_record.change_type)
-            change_description = f"{change_record.field_changed or 'status'} changed"
-            if change_record.old_value and change_record.new_value:
-                change_description = f"{change_record.field_changed or 'status'} changed: {change_record.old_value} → {change_record.new_value}"
-            
-            change_data = {
-                "site_name": circuit.site_name if circuit else "Unknown",
-                "site_id": circuit.site_id if circuit else "",
-                "circuit_purpose": circuit.circuit_purpose if circuit else "",
-                "change_type": change_record.change_type or "STATUS_CHANGE",
-                "field_changed": change_record.field_changed or "status",
-                "before_value": change_record.old_value or "",  # Map old_value to before_value
-                "after_value": change_record.new_value or "",   # Map new_value to after_value
-                "change_time": change_record.change_date.strftime('%Y-%m-%d'),
-                "change_category": change_category,
-                "description": change_description,
-                "impact": get_change_impact(change_record.change_type),
-                "csv_file_source": change_record.csv_file_source or "database",
-                "provider_name": circuit.provider_name if circuit else "",
-                "details_ordered_service_speed": circuit.details_ordered_service_speed if circuit else "",
-                "billing_monthly_cost": str(circuit.billing_monthly_cost) if circuit and circuit.billing_monthly_cost else ""
-            }
-            changes.append(change_data)
+        # One joined query per page instead of a Circuit lookup per change
+        try:
+            rows, next_cursor = get_changelog_page(start_date, end_date, per_page, cursor)
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid cursor"}), 400
         
-        # Generate summary statistics
-        summary = generate_summary_from_db_changes(changes, start_date, end_date)
+        changes = [change_row_to_dict(row) for row in rows]
         
         response = {
             "data": changes,
@@ -280,10 +314,16 @@ def circuit_changelog():
                 "start": start_date.strftime('%Y-%m-%d'),
                 "end": end_date.strftime('%Y-%m-%d')
             },
+            "pagination": {
+                "per_page": per_page,
+                "has_next": next_cursor is not None,
+                "next_cursor": next_cursor
+            },
             "data_source": "database"
         }
         
-        print(f"✅ Generated {len(changes)} changes from database")
+        print(f"✅ Generated {len(changes)} changes from database"
+              f"{' (more pages follow)' if next_cursor else ''}")
         return jsonify(response)
         
     except Exception as e:
@@ -296,19 +336,31 @@ def circuit_changelog():
             "suggested_action": "Please try again or contact support if the problem persists."
         }), 500
 
-def generate_summary_from_db_changes(changes, start_date, end_date):
+def summarize_changelog(start_date, end_date):
     """
-    Generate summary statistics from database change records
+    Generate summary statistics for a period with database-side aggregation
+    
+    Changes are counted per (change_type, field_changed) in one GROUP BY; the few
+    resulting groups are rolled up into type, field, category and impact counts.
     
     Args:
-        changes: List of change dictionaries from database
         start_date: Start date of analysis period
         end_date: End date of analysis period
     
     Returns:
         Dictionary containing summary statistics
     """
-    if not changes:
+    in_period = and_(
+        CircuitHistory.change_date >= start_date,
+        CircuitHistory.change_date <= end_date
+    )
+    
+    groups = db.session.query(
+        CircuitHistory.change_type, CircuitHistory.field_changed, func.count(CircuitHistory.id)
+    ).filter(in_period).group_by(CircuitHistory.change_type, CircuitHistory.field_changed).all()
+    
+    period_days = max((end_date - start_date).days, 1)
+    if not groups:
         return {
             "total_changes": 0,
             "changes_by_type": {},
@@ -317,30 +369,42 @@ def generate_summary_from_db_changes(changes, start_date, end_date):
             "most_common_change": "None"
         }
     
-    # Count changes by type
+    unique_sites = db.session.query(
+        func.count(distinct(func.coalesce(Circuit.site_name, 'Unknown')))
+    ).select_from(CircuitHistory).outerjoin(
+        Circuit, Circuit.id == CircuitHistory.circuit_id
+    ).filter(in_period).scalar() or 0
+    
+    # Roll the groups up into the summary counts
+    total_changes = 0
     changes_by_type = {}
     changes_by_field = {}
+    changes_by_category = {}
+    changes_by_impact = {}
     
-    for change in changes:
-        change_type = change.get('change_type', 'unknown')
-        field_changed = change.get('field_changed', 'unknown')
+    for change_type, field_changed, count in groups:
+        total_changes += count
+        type_key = change_type or "STATUS_CHANGE"
+        field_key = field_changed or "status"
+        category = get_change_category(change_type)
+        impact = get_change_impact(change_type)
         
-        changes_by_type[change_type] = changes_by_type.get(change_type, 0) + 1
-        changes_by_field[field_changed] = changes_by_field.get(field_changed, 0) + 1
-    
-    # Calculate daily average
-    period_days = max((end_date - start_date).days, 1)
-    changes_per_day = round(len(changes) / period_days, 2)
+        changes_by_type[type_key] = changes_by_type.get(type_key, 0) + count
+        changes_by_field[field_key] = changes_by_field.get(field_key, 0) + count
+        changes_by_category[category] = changes_by_category.get(category, 0) + count
+        changes_by_impact[impact] = changes_by_impact.get(impact, 0) + count
     
     # Find most common change type
-    most_common_change = max(changes_by_type.items(), key=lambda x: x[1])[0] if changes_by_type else "None"
+    most_common_change = max(changes_by_type.items(), key=lambda x: x[1])[0]
     
     return {
-        "total_changes": len(changes),
+        "total_changes": total_changes,
         "changes_by_type": changes_by_type,
         "changes_by_field": changes_by_field,
+        "changes_by_category": changes_by_category,
+        "changes_by_impact": changes_by_impact,
         "period_days": period_days,
-        "changes_per_day": changes_per_day,
+        "changes_per_day": round(total_changes / period_days, 2),
         "most_common_change": most_common_change,
-        "unique_circuits_affected": len(set(change.get('site_name', '') for change in changes))
-    }
\ No newline at end of file
+        "unique_circuits_affected": unique_sites
+    }
@@ -48,9 +48,14 @@ import json
 import psycopg2
 import re
 from config import Config
+from sql_profiler import ProfilingConnection
+from site_classification import INVENTORY_VISIBLE_CLASSES
 # Import tab functions
 from inventory_tabs_functions import get_corp_network_summary, get_datacenter_inventory
 
+# WHERE fragment limiting inventory_devices to the classes the pages show
+VISIBLE_SITE_CLASS_SQL = "site_class IN ({})".format(", ".join(f"'{c}'" for c in INVENTORY_VISIBLE_CLASSES))
+
 # Create Blueprint
 inventory_bp = Blueprint('inventory', __name__)
 
@@ -62,7 +67,8 @@ def get_db_connection():
         port=5432,
         database='dsrcircuits',
         user='dsruser',
-        password='T3dC$gLp9'
+        password='T3dC$gLp9',
+        connection_factory=ProfilingConnection
     )
 
 def get_device_type_from_model(model):
@@ -214,6 +220,14 @@ def calculate_eol_summary(summary_data):
             # If we can't parse dates, consider as active
             device_stats[device_type]['active'] += total_devices
     
+    return build_eol_summary(device_stats, eol_timeline, today)
+
+def build_eol_summary(device_stats, eol_timeline, today):
+    """Build the EOL summary payload from per-device-type stats and an EOL year timeline
+    
+    device_stats maps device type to total_devices / end_of_life / end_of_sale / active
+    counts; eol_timeline maps year -> device type -> devices reaching end of support.
+    """
     # Calculate percentages and create summary
     eol_summary = []
     overall_totals = {'total': 0, 'eol': 0, 'eos': 0, 'active': 0}
@@ -296,12 +310,94 @@ def calculate_eol_summary(summary_data):
         'critical_insights': critical_insights
     }
 
+def get_inventory_summary_from_cube(cursor):
+    """
+    Build inventory summary data from the pre-aggregated inventory_summary_cube
+    
+    The nightly inventory job writes one row per (model, organization) with typed
+    DATE columns and the EOL bucket already resolved, so no org_counts or date
+    string parsing is needed here.
+    
+    Returns:
+        dict in the get_inventory_summary_data() shape, or None if the cube is empty
+    """
+    from datetime import datetime
+    
+    cursor.execute("""
+        SELECT model, organization, device_type, device_count, announcement_date,
+               end_of_sale, end_of_support, eol_bucket, eol_year
+        FROM inventory_summary_cube
+        ORDER BY model, organization
+    """)
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    
+    def format_date_meraki(date_obj):
+        return date_obj.strftime('%b %d, %Y') if date_obj else ''
+    
+    summary_by_model = {}
+    org_names = set()
+    device_stats = {}
+    eol_timeline = {}
+    bucket_fields = {'eol': 'end_of_life', 'eos': 'end_of_sale', 'active': 'active'}
+    
+    for model, org_name, device_type, count, ann_date, eos_date, eol_date, eol_bucket, eol_year in rows:
+        org_names.add(org_name)
+        
+        entry = summary_by_model.get(model)
+        if entry is None:
+            entry = summary_by_model[model] = {
+                'model': model,
+                'total': 0,
+                'org_counts': {},
+                'announcement_date': format_date_meraki(ann_date),
+                'end_of_sale': format_date_meraki(eos_date),
+                'end_of_support': format_date_meraki(eol_date),
+                'highlight': eol_bucket if eol_bucket != 'active' else ''
+            }
+        entry['total'] += count
+        entry['org_counts'][org_name] = count
+        
+        stats = device_stats.setdefault(device_type, {
+            'total_devices': 0,
+            'end_of_life': 0,
+            'end_of_sale': 0,
+            'active': 0
+        })
+        stats['total_devices'] += count
+        stats[bucket_fields.get(eol_bucket, 'active')] += count
+        
+        if eol_year:
+            year_counts = eol_timeline.setdefault(eol_year, {})
+            year_counts[device_type] = year_counts.get(device_type, 0) + count
+    
+    return {
+        'summary': list(summary_by_model.values()),
+        'org_names': sorted(org_names),
+        'eol_summary': build_eol_summary(device_stats, eol_timeline, datetime.now().date()),
+        'data_source': 'database-cube'
+    }
+
 def get_inventory_summary_data():
     """Get inventory summary data from database"""
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
+        # Prefer the pre-aggregated cube written by the nightly inventory job
+        try:
+            cube_data = get_inventory_summary_from_cube(cursor)
+        except psycopg2.Error as e:
+            print(f"⚠️ inventory_summary_cube unavailable, using inventory_summary: {e}")
+            conn.rollback()
+            cube_data = None
+        
+        if cube_data:
+            cursor.close()
+            conn.close()
+            return cube_data
+        
         cursor.execute("""
             SELECT model, total_count, org_counts, announcement_date, 
                    end_of_sale, end_of_support, highlight
@@ -401,7 +497,7 @@ def get_inventory_details_data(org_filter=None, model_filter=None):
         cursor = conn.cursor()
         
         # Ultra-optimized query - let database handle JSON validation and defaults
-        query = """
+        query = f"""
             SELECT serial, model, organization, 
                    COALESCE(network_id, '') as network_id, 
                    COALESCE(network_name, '') as network_name,
@@ -410,28 +506,15 @@ def get_inventory_details_data(org_filter=None, model_filter=None):
                    COALESCE(lan_ip, '') as lan_ip, 
                    COALESCE(firmware, '') as firmware, 
                    COALESCE(product_type, '') as product_type,
-                   CASE 
-                     WHEN tags IS NULL OR tags = '' OR tags = 'null' THEN '[]'
-                     ELSE tags 
-                   END as tags,
+                   COALESCE(tags, '[]'::jsonb) as tags,
                    COALESCE(notes, '') as notes,
                    CASE 
-                     WHEN details IS NULL OR details = '' OR details = 'null' THEN '{}'
+                     WHEN details IS NULL OR details = '' OR details = 'null' THEN '{{}}'
                      ELSE details 
                    END as details
             FROM inventory_devices
             WHERE 1=1
-            AND NOT EXISTS (
-                SELECT 1 FROM jsonb_array_elements_text(
-                    CASE 
-                        WHEN tags IS NULL OR tags = '' OR tags = 'null' THEN '[]'::jsonb
-                        ELSE tags::jsonb 
-                    END
-                ) tag
-                WHERE LOWER(tag) LIKE '%hub%' 
-                   OR LOWER(tag) LIKE '%lab%' 
-                   OR LOWER(tag) LIKE '%voice%'
-            )
+            AND {VISIBLE_SITE_CLASS_SQL}
         """
         params = []
         
@@ -469,12 +552,10 @@ def get_inventory_details_data(org_filter=None, model_filter=None):
             if organization not in inventory_data:
                 inventory_data[organization] = []
             
-            # Fast JSON parsing - database already provided defaults
-            try:
-                parsed_tags = json_loads(tags) if tags != '[]' else []
-            except (json.JSONDecodeError, TypeError):
-                parsed_tags = []
+            # tags is JSONB - psycopg2 already returns a list
+            parsed_tags = tags or []
             
+            # Fast JSON parsing - database already provided defaults
             try:
                 parsed_details = json_loads(details) if details != '{}' else {}
             except (json.JSONDecodeError, TypeError):
@@ -669,7 +750,7 @@ def api_inventory_org_data(org_name):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        query = """
+        query = f"""
             SELECT serial, model, 
                    COALESCE(network_id, '') as network_id, 
                    COALESCE(network_name, '') as network_name,
@@ -678,24 +759,11 @@ def api_inventory_org_data(org_name):
                    COALESCE(lan_ip, '') as lan_ip, 
                    COALESCE(firmware, '') as firmware, 
                    COALESCE(product_type, '') as product_type,
-                   CASE 
-                     WHEN tags IS NULL OR tags = '' OR tags = 'null' THEN '[]'
-                     ELSE tags 
-                   END as tags,
+                   COALESCE(tags, '[]'::jsonb) as tags,
                    COALESCE(notes, '') as notes
             FROM inventory_devices
             WHERE organization = %s
-            AND NOT EXISTS (
-                SELECT 1 FROM jsonb_array_elements_text(
-                    CASE 
-                        WHEN tags IS NULL OR tags = '' OR tags = 'null' THEN '[]'::jsonb
-                        ELSE tags::jsonb 
-                    END
-                ) tag
-                WHERE LOWER(tag) LIKE '%hub%' 
-                   OR LOWER(tag) LIKE '%lab%' 
-                   OR LOWER(tag) LIKE '%voice%'
-            )
+            AND {VISIBLE_SITE_CLASS_SQL}
             ORDER BY model, name
             LIMIT %s OFFSET %s
         """
@@ -704,20 +772,10 @@ def api_inventory_org_data(org_name):
         results = cursor.fetchall()
         
         # Get total count for this organization
-        count_query = """
+        count_query = f"""
             SELECT COUNT(*) FROM inventory_devices
             WHERE organization = %s
-            AND NOT EXISTS (
-                SELECT 1 FROM jsonb_array_elements_text(
-                    CASE 
-                        WHEN tags IS NULL OR tags = '' OR tags = 'null' THEN '[]'::jsonb
-                        ELSE tags::jsonb 
-                    END
-                ) tag
-                WHERE LOWER(tag) LIKE '%hub%' 
-                   OR LOWER(tag) LIKE '%lab%' 
-                   OR LOWER(tag) LIKE '%voice%'
-            )
+            AND {VISIBLE_SITE_CLASS_SQL}
         """
         cursor.execute(count_query, (org_name,))
         total_count = cursor.fetchone()[0]
@@ -726,16 +784,12 @@ def api_inventory_org_data(org_name):
         
         # Fast processing
         devices = []
-        json_loads = json.loads
         
         for row in results:
             serial, model, network_id, network_name, name, mac, lan_ip, firmware, product_type, tags, notes = row
             
-            # Fast JSON parsing
-            try:
-                parsed_tags = json_loads(tags) if tags != '[]' else []
-            except (json.JSONDecodeError, TypeError):
-                parsed_tags = []
+            # tags is JSONB - psycopg2 already returns a list
+            parsed_tags = tags or []
             
             devices.append({
                 'serial': serial,
@@ -840,20 +894,10 @@ def api_inventory_details():
             conn = get_db_connection()
             cursor = conn.cursor()
             
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT organization, COUNT(*) as device_count
                 FROM inventory_devices
-                WHERE NOT EXISTS (
-                    SELECT 1 FROM jsonb_array_elements_text(
-                        CASE 
-                            WHEN tags IS NULL OR tags = '' OR tags = 'null' THEN '[]'::jsonb
-                            ELSE tags::jsonb 
-                        END
-                    ) tag
-                    WHERE LOWER(tag) LIKE '%hub%' 
-                       OR LOWER(tag) LIKE '%lab%' 
-                       OR LOWER(tag) LIKE '%voice%'
-                )
+                WHERE {VISIBLE_SITE_CLASS_SQL}
                 GROUP BY organization
                 ORDER BY organization
             """)
@@ -894,19 +938,9 @@ def api_inventory_details():
         cursor = conn.cursor()
         
         # Count total matching records first
-        count_query = """SELECT COUNT(*) FROM inventory_devices 
+        count_query = f"""SELECT COUNT(*) FROM inventory_devices 
                          WHERE 1=1
-                         AND NOT EXISTS (
-                             SELECT 1 FROM jsonb_array_elements_text(
-                                 CASE 
-                                     WHEN tags IS NULL OR tags = '' OR tags = 'null' THEN '[]'::jsonb
-                                     ELSE tags::jsonb 
-                                 END
-                             ) tag
-                             WHERE LOWER(tag) LIKE '%hub%' 
-                                OR LOWER(tag) LIKE '%lab%' 
-                                OR LOWER(tag) LIKE '%voice%'
-                         )"""
+                         AND {VISIBLE_SITE_CLASS_SQL}"""
         params = []
         
         if org_filter:
@@ -926,42 +960,22 @@ def api_inventory_details():
         # Get paginated data - exclude heavy JSON fields if not needed
         if limit <= 50 or request.args.get('minimal') == 'true':
             # Minimal data for fast loading
-            query = """
+            query = f"""
                 SELECT serial, model, organization, network_id, network_name,
                        name, mac, lan_ip, firmware, product_type
                 FROM inventory_devices
                 WHERE 1=1
-                AND NOT EXISTS (
-                    SELECT 1 FROM jsonb_array_elements_text(
-                        CASE 
-                            WHEN tags IS NULL OR tags = '' OR tags = 'null' THEN '[]'::jsonb
-                            ELSE tags::jsonb 
-                        END
-                    ) tag
-                    WHERE LOWER(tag) LIKE '%hub%' 
-                       OR LOWER(tag) LIKE '%lab%' 
-                       OR LOWER(tag) LIKE '%voice%'
-                )
+                AND {VISIBLE_SITE_CLASS_SQL}
             """
             include_json = False
         else:
             # Full data including JSON fields
-            query = """
+            query = f"""
                 SELECT serial, model, organization, network_id, network_name,
                        name, mac, lan_ip, firmware, product_type, tags, notes, details
                 FROM inventory_devices
                 WHERE 1=1
-                AND NOT EXISTS (
-                    SELECT 1 FROM jsonb_array_elements_text(
-                        CASE 
-                            WHEN tags IS NULL OR tags = '' OR tags = 'null' THEN '[]'::jsonb
-                            ELSE tags::jsonb 
-                        END
-                    ) tag
-                    WHERE LOWER(tag) LIKE '%hub%' 
-                       OR LOWER(tag) LIKE '%lab%' 
-                       OR LOWER(tag) LIKE '%voice%'
-                )
+                AND {VISIBLE_SITE_CLASS_SQL}
             """
             include_json = True
         
@@ -986,16 +1000,12 @@ def api_inventory_details():
             if include_json:
                 serial, model, organization, network_id, network_name, name, mac, lan_ip, firmware, product_type, tags, notes, details = row
                 
+                # tags is JSONB - psycopg2 already returns a list
+                parsed_tags = tags or []
+                
                 # Optimized JSON parsing - only parse if not empty/null
-                parsed_tags = []
                 parsed_details = {}
                 
-                if tags and tags.strip() and tags != 'null':
-                    try:
-                        parsed_tags = json.loads(tags)
-                    except (json.JSONDecodeError, TypeError):
-                        parsed_tags = []
-                
                 if details and details.strip() and details != 'null':
                     try:
                         parsed_details = json.loads(details)
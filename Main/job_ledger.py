@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Job Run Ledger for the nightly scripts
+======================================
+
+One row per job run in job_runs and one row per named phase in job_run_phases,
+so run time, Meraki API usage and row churn can be charted on the performance
+page (/api/performance/jobs) instead of grepped out of /var/log.
+
+Usage:
+    from job_ledger import JobRun, begin_phase, record_api_call, record_rows
+
+    with JobRun('nightly_inventory_db') as run:
+        with run.phase('fetch'):
+            ...                             # API helpers call record_api_call(resp.status_code)
+        with run.phase('write'):
+            ...
+            record_rows(inserted=len(rows))
+        if not ok:
+            run.fail('inventory processing failed')
+
+Linear job code can use begin_phase('parse') instead of a with block: each call
+ends the previous begin_phase phase, and the last one ends with the run.
+
+Phase times exclude nested phases. Counters recorded while a phase is open
+count toward the innermost phase and the run; outside a phase only toward the
+run. Entering the same phase again adds to it. The module-level phase /
+begin_phase / record_api_call / record_rows are no-ops when no run is open, so
+shared helpers can call them unconditionally.
+
+The ledger writes through its own autocommit connection: a job rolling back its
+transaction does not lose the run, and a ledger database error is logged and
+disables the ledger instead of failing the job. Runs started by
+nightly/nightly_pipeline.py are linked to the pipeline run (NIGHTLY_PIPELINE_RUN_ID).
+"""
+
+import os
+import time
+import socket
+import logging
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+import psycopg2
+from psycopg2.extras import execute_values
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('api_calls', 'api_429s', 'rows_inserted', 'rows_updated', 'rows_deleted')
+
+CREATE_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS job_runs (
+        id SERIAL PRIMARY KEY,
+        job_name VARCHAR(100) NOT NULL,
+        host VARCHAR(255),
+        pipeline_run_id INTEGER,
+        started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        finished_at TIMESTAMP,
+        status VARCHAR(20) NOT NULL DEFAULT 'running',
+        duration_seconds NUMERIC(10, 2),
+        api_calls INTEGER NOT NULL DEFAULT 0,
+        api_429s INTEGER NOT NULL DEFAULT 0,
+        rows_inserted INTEGER NOT NULL DEFAULT 0,
+        rows_updated INTEGER NOT NULL DEFAULT 0,
+        rows_deleted INTEGER NOT NULL DEFAULT 0,
+        error TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_job_runs_job_started
+        ON job_runs(job_name, started_at DESC);
+
+    CREATE TABLE IF NOT EXISTS job_run_phases (
+        id SERIAL PRIMARY KEY,
+        run_id INTEGER NOT NULL REFERENCES job_runs(id) ON DELETE CASCADE,
+        phase VARCHAR(50) NOT NULL,
+        started_at TIMESTAMP,
+        duration_seconds NUMERIC(10, 2),
+        entries INTEGER NOT NULL DEFAULT 1,
+        api_calls INTEGER NOT NULL DEFAULT 0,
+        api_429s INTEGER NOT NULL DEFAULT 0,
+        rows_inserted INTEGER NOT NULL DEFAULT 0,
+        rows_updated INTEGER NOT NULL DEFAULT 0,
+        rows_deleted INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (run_id, phase)
+    );
+"""
+
+_active_run = None
+
+def _default_connect():
+    return psycopg2.connect(Config.SQLALCHEMY_DATABASE_URI)
+
+class JobRun:
+    """
+    A single run of a nightly job
+
+    Args:
+        job_name: script name without .py (e.g. 'nightly_meraki_db')
+        connect: connection factory (defaults to Config.SQLALCHEMY_DATABASE_URI)
+    """
+
+    def __init__(self, job_name, connect=None):
+        self.job_name = job_name
+        self.connect = connect or _default_connect
+        self.conn = None
+        self.run_id = None
+        self.status = 'succeeded'
+        self.error = None
+        self.totals = dict.fromkeys(COUNTERS, 0)
+        self.phases = {}
+        self.current_phase = None
+        self.sequential_phase = None
+        self.lock = threading.Lock()
+        self.started = None
+
+    def start(self):
+        global _active_run
+        self.started = time.perf_counter()
+        pipeline_run_id = os.getenv('NIGHTLY_PIPELINE_RUN_ID')
+        try:
+            self.conn = self.connect()
+            self.conn.autocommit = True
+            with self.conn.cursor() as cursor:
+                cursor.execute(CREATE_TABLES_SQL)
+                cursor.execute("""
+                    INSERT INTO job_runs (job_name, host, pipeline_run_id)
+                    VALUES (%s, %s, %s) RETURNING id
+                """, (self.job_name, socket.gethostname(), int(pipeline_run_id) if pipeline_run_id else None))
+                self.run_id = cursor.fetchone()[0]
+        except Exception as e:
+            logger.warning(f"Job ledger unavailable, {self.job_name} run not recorded: {e}")
+            self._close()
+        _active_run = self
+        return self
+
+    @contextmanager
+    def phase(self, name):
+        """Time a named phase (fetch, parse, write, ...)"""
+        with self.lock:
+            entry = self.phases.get(name)
+            if entry is None:
+                entry = self.phases[name] = dict(
+                    dict.fromkeys(COUNTERS, 0), started_at=datetime.now(), seconds=0.0, entries=0
+                )
+            entry['entries'] += 1
+            previous, self.current_phase = self.current_phase, entry
+        started = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                entry['seconds'] += elapsed
+                if previous is not None:
+                    previous['seconds'] -= elapsed  # Exclusive times: phases add up to the run
+                self.current_phase = previous
+
+    def begin_phase(self, name):
+        """End the running begin_phase() phase (if any) and start `name` - for linear job code"""
+        self.end_phase()
+        self.sequential_phase = self.phase(name)
+        self.sequential_phase.__enter__()
+
+    def end_phase(self):
+        if self.sequential_phase is not None:
+            sequential, self.sequential_phase = self.sequential_phase, None
+            sequential.__exit__(None, None, None)
+
+    def add(self, **counts):
+        with self.lock:
+            for key, value in counts.items():
+                self.totals[key] += value
+                if self.current_phase is not None:
+                    self.current_phase[key] += value
+
+    def api_call(self, status_code=None):
+        self.add(api_calls=1, api_429s=1 if status_code == 429 else 0)
+
+    def rows(self, inserted=0, updated=0, deleted=0):
+        self.add(rows_inserted=inserted or 0, rows_updated=updated or 0, rows_deleted=deleted or 0)
+
+    def fail(self, error=None):
+        """Mark the run failed without raising (for jobs that return False)"""
+        self.status = 'failed'
+        self.error = error
+
+    def finish(self, status=None, error=None):
+        global _active_run
+        if _active_run is self:
+            _active_run = None
+        self.end_phase()
+        if status:
+            self.status = status
+        if error:
+            self.error = error
+        if self.conn is None:
+            return
+
+        duration = round(time.perf_counter() - self.started, 2)
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE job_runs SET
+                        finished_at = NOW(),
+                        status = %s,
+                        duration_seconds = %s,
+                        api_calls = %s,
+                        api_429s = %s,
+                        rows_inserted = %s,
+                        rows_updated = %s,
+                        rows_deleted = %s,
+                        error = %s
+                    WHERE id = %s
+                """, (self.status, duration, *(self.totals[key] for key in COUNTERS),
+                      str(self.error)[:2000] if self.error else None, self.run_id))
+                if self.phases:
+                    execute_values(cursor, """
+                        INSERT INTO job_run_phases (
+                            run_id, phase, started_at, duration_seconds, entries,
+                            api_calls, api_429s, rows_inserted, rows_updated, rows_deleted
+                        ) VALUES %s
+                        ON CONFLICT (run_id, phase) DO NOTHING
+                    """, [
+                        (self.run_id, name, entry['started_at'], round(entry['seconds'], 2), entry['entries'],
+                         *(entry[key] for key in COUNTERS))
+                        for name, entry in self.phases.items()
+                    ])
+            logger.info(f"Job ledger: {self.job_name} run {self.run_id} {self.status} in {duration}s "
+                        + ', '.join(f"{name}={entry['seconds']:.1f}s" for name, entry in self.phases.items()))
+        except Exception as e:
+            logger.warning(f"Job ledger: could not record {self.job_name} run {self.run_id}: {e}")
+        finally:
+            self._close()
+
+    def _close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None or (exc_type is SystemExit and exc.code in (0, None)):
+            self.finish()
+        elif exc_type in (SystemExit, KeyboardInterrupt):
+            self.finish('failed', f"{exc_type.__name__}: {getattr(exc, 'code', '')}")
+        else:
+            self.finish('failed', f"{exc_type.__name__}: {exc}")
+        return False
+
+def current_run():
+    """The open JobRun, or None"""
+    return _active_run
+
+@contextmanager
+def phase(name):
+    """Time a block as a phase of the open run"""
+    if _active_run is None:
+        yield None
+    else:
+        with _active_run.phase(name) as entry:
+            yield entry
+
+def begin_phase(name):
+    """Start the next phase of the open run (ends the previous begin_phase phase)"""
+    if _active_run is not None:
+        _active_run.begin_phase(name)
+
+def record_api_call(status_code=None):
+    """Count one API request (and a 429 if status_code is 429) against the open run"""
+    if _active_run is not None:
+        _active_run.api_call(status_code)
+
+def record_rows(inserted=0, updated=0, deleted=0):
+    """Count written rows against the open run"""
+    if _active_run is not None:
+        _active_run.rows(inserted, updated, deleted)
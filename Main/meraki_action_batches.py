@@ -0,0 +1,206 @@
+"""
+MERAKI ACTION BATCH ENGINE
+==========================
+
+Purpose:
+    - Apply many Meraki configuration writes through organization action batches
+      instead of one PUT per device
+    - Used for bulk device notes pushes and bulk tag updates
+
+How It Works:
+    1. Callers build actions with device_update_action(serial, body)
+    2. run_action_batches() splits them into batches of up to 100 actions
+       (Meraki's limit for asynchronous batches; 20 or fewer run synchronously)
+    3. Up to MAX_CONCURRENT_BATCHES batches are submitted in parallel, matching
+       Meraki's limit of 5 running batches per organization
+    4. Each asynchronous batch is polled until it completes or fails
+    5. Batches are atomic, so a failed batch is split in half and resubmitted
+       until the failing actions are isolated
+    6. One result per action is returned in input order: {'success': True} or {'error': ...}
+    7. Every API call is paced by the process-wide rate_budget, which other Meraki
+       writers in the same process (e.g. VLAN migrations) share
+
+API Reference:
+    POST /organizations/{organizationId}/actionBatches
+    GET  /organizations/{organizationId}/actionBatches/{actionBatchId}
+"""
+
+import os
+import time
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv('/usr/local/bin/meraki.env')
+
+MERAKI_API_KEY = os.getenv("MERAKI_API_KEY")
+BASE_URL = "https://api.meraki.com/api/v1"
+ORG_NAME = "DTC-Store-Inventory-All"
+
+# Meraki action batch limits
+MAX_ACTIONS_PER_BATCH = 100
+MAX_SYNCHRONOUS_ACTIONS = 20
+MAX_CONCURRENT_BATCHES = 5
+
+API_CALLS_PER_SECOND = 8  # process-wide pacing, below Meraki's 10 calls/s per organization
+POLL_INTERVAL = 2  # seconds between batch status checks
+BATCH_TIMEOUT = 600  # seconds to wait for a single batch to finish
+MAX_RETRIES = 5
+
+_organization_ids = {}
+
+class RateBudget:
+    """Thread-safe request pacing shared by every Meraki call made in this process"""
+    
+    def __init__(self, calls_per_second):
+        self.interval = 1.0 / calls_per_second
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+        self.calls = 0
+        self.rate_limited = 0
+    
+    def acquire(self):
+        """Block until the next request slot is free"""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+            self.calls += 1
+        if slot > now:
+            time.sleep(slot - now)
+    
+    def penalize(self, delay):
+        """Push every caller back after a 429"""
+        with self.lock:
+            self.rate_limited += 1
+            self.next_slot = max(self.next_slot, time.monotonic() + delay)
+
+rate_budget = RateBudget(API_CALLS_PER_SECOND)
+
+def get_headers():
+    return {
+        "X-Cisco-Meraki-API-Key": MERAKI_API_KEY,
+        "Content-Type": "application/json"
+    }
+
+def api_call(method, url, data=None):
+    """Make a Meraki API call, honouring Retry-After on 429. Returns (json, error)."""
+    for attempt in range(MAX_RETRIES):
+        try:
+            rate_budget.acquire()
+            response = requests.request(method, url, headers=get_headers(), json=data, timeout=30)
+        except requests.exceptions.RequestException as e:
+            if attempt == MAX_RETRIES - 1:
+                return None, str(e)
+            time.sleep(2 ** attempt)
+            continue
+
+        if response.status_code == 429:
+            wait_time = int(response.headers.get('Retry-After', 2 ** attempt))
+            print(f"Rate limit hit, backing off for {wait_time} seconds")
+            rate_budget.penalize(wait_time)
+            continue
+        if response.status_code >= 400:
+            try:
+                errors = response.json().get('errors') or [response.text]
+            except ValueError:
+                errors = [response.text]
+            return None, '; '.join(str(e) for e in errors)
+        return response.json(), None
+
+    return None, "Max retries exceeded"
+
+def get_organization_id(org_name=ORG_NAME):
+    """Get (and remember) the Meraki organization ID for org_name"""
+    if org_name not in _organization_ids:
+        orgs, error = api_call('GET', f"{BASE_URL}/organizations")
+        for org in orgs or []:
+            if org.get("name") == org_name:
+                _organization_ids[org_name] = org.get("id")
+                break
+        else:
+            return None
+    return _organization_ids[org_name]
+
+def device_update_action(serial, body):
+    """Action that updates a device's attributes (notes, tags, name, ...)"""
+    return {
+        "resource": f"/devices/{serial}",
+        "operation": "update",
+        "body": body
+    }
+
+def wait_for_batch(org_id, batch):
+    """Poll an action batch until it completes or fails; returns the final batch
+
+    On timeout the batch is returned with status.timedOut set - Meraki may still be
+    running it, so it must not be resubmitted.
+    """
+    deadline = time.time() + BATCH_TIMEOUT
+    url = f"{BASE_URL}/organizations/{org_id}/actionBatches/{batch['id']}"
+
+    while not (batch['status'].get('completed') or batch['status'].get('failed')):
+        if time.time() > deadline:
+            batch['status']['errors'] = [f"Action batch {batch['id']} timed out after {BATCH_TIMEOUT}s"]
+            batch['status']['timedOut'] = True
+            break
+        time.sleep(POLL_INTERVAL)
+        polled, error = api_call('GET', url)
+        if polled:
+            batch = polled
+
+    return batch
+
+def submit_batch(org_id, actions, split_on_failure=True):
+    """Run one action batch to completion; returns one result per action
+
+    Actions run in order within a batch. Pass split_on_failure=False for batches of
+    dependent actions (e.g. delete then re-create a VLAN) that must stay atomic.
+    """
+    synchronous = len(actions) <= MAX_SYNCHRONOUS_ACTIONS
+    batch, error = api_call('POST', f"{BASE_URL}/organizations/{org_id}/actionBatches", {
+        "confirmed": True,
+        "synchronous": synchronous,
+        "actions": actions
+    })
+
+    if batch and not synchronous:
+        batch = wait_for_batch(org_id, batch)
+
+    if batch and batch['status'].get('completed'):
+        return [{"success": True} for _ in actions]
+
+    if batch:
+        error = '; '.join(batch['status'].get('errors') or []) or "Action batch failed"
+
+    # Batches are all-or-nothing: split to find the actions that actually fail. Only a
+    # batch Meraki reports as failed is split - after a timeout it may still be running,
+    # and a transport/auth error would fail every half the same way.
+    failed = bool(batch) and batch['status'].get('failed') and not batch['status'].get('timedOut')
+    if failed and split_on_failure and len(actions) > 1:
+        middle = len(actions) // 2
+        return submit_batch(org_id, actions[:middle]) + submit_batch(org_id, actions[middle:])
+    return [{"error": error} for _ in actions]
+
+def run_action_batches(actions, org_id=None, max_workers=MAX_CONCURRENT_BATCHES):
+    """Apply actions through parallel action batches; returns results aligned with actions"""
+    if not actions:
+        return []
+
+    org_id = org_id or get_organization_id()
+    if not org_id:
+        return [{"error": f"Organization {ORG_NAME} not found"} for _ in actions]
+
+    chunks = [actions[i:i + MAX_ACTIONS_PER_BATCH] for i in range(0, len(actions), MAX_ACTIONS_PER_BATCH)]
+    start_time = time.time()
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        chunk_results = list(executor.map(lambda chunk: submit_batch(org_id, chunk), chunks))
+
+    results = [result for chunk_result in chunk_results for result in chunk_result]
+    failed = len([r for r in results if "error" in r])
+    print(f"Action batches: {len(actions)} actions in {len(chunks)} batches, "
+          f"{failed} failed ({time.time() - start_time:.1f}s)")
+    return results
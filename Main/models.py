@@ -7,6 +7,7 @@ SQLAlchemy models for optimized database operations
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from sqlalchemy import Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 import json
 
 db = SQLAlchemy()
@@ -120,6 +121,11 @@ class CircuitHistory(db.Model):
     csv_file_source = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # Changelog range scans, circuit join and keyset order (historical.py)
+        Index('idx_circuit_history_date_circuit', 'change_date', 'circuit_id', 'id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -240,6 +246,13 @@ class NewStore(db.Model):
     city = db.Column(db.String(100))
     state = db.Column(db.String(10))
     project_status = db.Column(db.String(100))
+    # TOD workbook columns (added by add_new_stores_columns.py)
+    sap_number = db.Column(db.String(50))
+    dba = db.Column(db.String(200))
+    address = db.Column(db.String(255))
+    zip = db.Column(db.String(20))
+    store_concept = db.Column(db.String(100))
+    unit_capacity = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -284,6 +297,10 @@ class SwitchPortClient(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('switch_serial', 'port_id', 'mac_address', name='_switch_port_mac_uc'),
+        # Keyset pagination order used by /api/switch-port-clients
+        Index('idx_switch_port_clients_keyset',
+              text("COALESCE(store_name, '')"), text("COALESCE(switch_name, '')"),
+              text("COALESCE(port_id, '')"), 'id'),
     )
     
     def to_dict(self):
@@ -305,6 +322,17 @@ class SwitchPortClient(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class SwitchPortFacet(db.Model):
+    """Store/switch filter values for the switch visibility page, rebuilt after each refresh"""
+    
+    __tablename__ = 'switch_port_facets'
+    
+    switch_serial = db.Column(db.String(50), primary_key=True)
+    store_name = db.Column(db.String(100), primary_key=True)
+    switch_name = db.Column(db.String(100))
+    client_count = db.Column(db.Integer, default=0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class InventoryDevice(db.Model):
     """Meraki device inventory for tracking equipment"""
     
@@ -321,12 +349,18 @@ class InventoryDevice(db.Model):
     lan_ip = db.Column(db.String(45))
     firmware = db.Column(db.String(50))
     product_type = db.Column(db.String(50))
-    tags = db.Column(db.Text)  # JSON string
+    tags = db.Column(JSONB, default=list)  # JSON array of tag strings
+    site_class = db.Column(db.String(10))  # store/hub/lab/voice/test, classified at ingest
     notes = db.Column(db.Text)
     details = db.Column(db.Text)  # JSON string for additional data
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        Index('idx_inventory_devices_tags_gin', 'tags', postgresql_using='gin'),
+        Index('idx_inventory_devices_site_class_org', 'site_class', 'organization'),
+    )
+    
     def to_dict(self):
         return {
             'serial': self.serial,
@@ -340,7 +374,8 @@ class InventoryDevice(db.Model):
             'lanIp': self.lan_ip,
             'firmware': self.firmware,
             'productType': self.product_type,
-            'tags': json.loads(self.tags) if self.tags else [],
+            'tags': self.tags or [],
+            'site_class': self.site_class,
             'notes': self.notes,
             'details': json.loads(self.details) if self.details else {}
         }
@@ -372,6 +407,40 @@ class InventorySummary(db.Model):
             'highlight': self.highlight or ''
         }
 
+class InventorySummaryCube(db.Model):
+    """Pre-aggregated model x organization x EOL-bucket device counts (written nightly)"""
+    
+    __tablename__ = 'inventory_summary_cube'
+    
+    model = db.Column(db.String(50), primary_key=True)
+    organization = db.Column(db.String(200), primary_key=True)
+    device_type = db.Column(db.String(50), nullable=False)
+    device_count = db.Column(db.Integer, nullable=False, default=0)
+    announcement_date = db.Column(db.Date)
+    end_of_sale = db.Column(db.Date)
+    end_of_support = db.Column(db.Date)
+    eol_bucket = db.Column(db.String(10), nullable=False)  # 'eol', 'eos' or 'active'
+    eol_year = db.Column(db.Integer)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    
+    __table_args__ = (
+        Index('idx_inventory_summary_cube_type_bucket', 'device_type', 'eol_bucket', 'eol_year'),
+    )
+    
+    def to_dict(self):
+        return {
+            'model': self.model,
+            'organization': self.organization,
+            'device_type': self.device_type,
+            'device_count': self.device_count,
+            'announcement_date': self.announcement_date.isoformat() if self.announcement_date else None,
+            'end_of_sale': self.end_of_sale.isoformat() if self.end_of_sale else None,
+            'end_of_support': self.end_of_support.isoformat() if self.end_of_support else None,
+            'eol_bucket': self.eol_bucket,
+            'eol_year': self.eol_year,
+            'snapshot_date': self.snapshot_date.isoformat() if self.snapshot_date else None
+        }
+
 class EnrichedCircuit(db.Model):
     """Enriched circuit data with Meraki device information"""
     
@@ -440,8 +509,14 @@ class MerakiInventory(db.Model):
     wan2_speed_label = db.Column(db.String(100))
     device_notes = db.Column(db.Text)
     organization_name = db.Column(db.String(100))
+    site_class = db.Column(db.String(10))  # store/hub/lab/voice/test, classified at ingest
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        Index('idx_meraki_inventory_device_tags_gin', 'device_tags', postgresql_using='gin'),
+        Index('idx_meraki_inventory_site_class', 'site_class'),
+    )
+    
     def to_dict(self):
         return {
             'network_id': self.network_id,
@@ -476,11 +551,16 @@ class PerformanceMetric(db.Model):
     cache_hit = db.Column(db.Boolean, default=False)
     user_agent = db.Column(db.String(255))
     is_monitoring = db.Column(db.Boolean, default=True)
+    db_time_ms = db.Column(db.Integer)
+    redis_hits = db.Column(db.Integer)
+    redis_misses = db.Column(db.Integer)
+    source = db.Column(db.String(20), default='synthetic', server_default='synthetic')  # 'live' = request_timing
     
     __table_args__ = (
         Index('idx_performance_timestamp_endpoint', 'timestamp', 'endpoint_name'),
         Index('idx_performance_endpoint_status', 'endpoint_name', 'response_status'),
         Index('idx_performance_module_timestamp', 'module_category', 'timestamp'),
+        Index('idx_performance_source_timestamp', 'source', 'timestamp'),
     )
     
     def to_dict(self):
@@ -497,7 +577,12 @@ class PerformanceMetric(db.Model):
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
             'module_category': self.module_category,
             'cache_hit': self.cache_hit,
-            'is_monitoring': self.is_monitoring
+            'is_monitoring': self.is_monitoring,
+            'db_query_count': self.db_query_count,
+            'db_time_ms': self.db_time_ms,
+            'redis_hits': self.redis_hits,
+            'redis_misses': self.redis_misses,
+            'source': self.source
         }
 
 class NetworkDevice(db.Model):
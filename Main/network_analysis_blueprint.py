@@ -2,11 +2,13 @@
 """
 Network Analysis Blueprint for DSR Circuits
 Displays network groupings by /16 and /24 networks
+(materialized subnet_rollup_16/24 views, see subnet_index.py)
 """
 
 from flask import Blueprint, render_template, jsonify, request
 from sqlalchemy import text
 from models import db
+import subnet_index
 import json
 from datetime import datetime
 import logging
@@ -29,8 +31,8 @@ def get_network_summary():
         stats_query = text("""
             SELECT 
                 (SELECT COUNT(DISTINCT network_name) FROM network_vlans WHERE network_name NOT ILIKE '%hub%' AND network_name NOT ILIKE '%voice%' AND network_name NOT ILIKE '%lab%') as total_networks,
-                (SELECT COUNT(DISTINCT parent_network) FROM network_vlans WHERE parent_network IS NOT NULL) as unique_24_networks,
-                (SELECT COUNT(*) FROM sites_by_16_network) as shared_16_count,
+                (SELECT COUNT(*) FROM subnet_rollup_24) as unique_24_networks,
+                (SELECT COUNT(*) FROM subnet_rollup_16 WHERE site_count > 1) as shared_16_count,
                 (SELECT COUNT(*) FROM network_vlans) as total_vlans
         """)
         
@@ -54,24 +56,7 @@ def get_networks_by_16():
         network_filter = request.args.get('network', '').strip()
         min_sites = int(request.args.get('min_sites', 2))
         
-        query = text("""
-            SELECT 
-                parent_16_network::text as network_16,
-                site_count,
-                sites,
-                unique_24_networks,
-                all_24_networks
-            FROM sites_by_16_network
-            WHERE site_count >= :min_sites
-            AND (:network_filter = '' OR sites ILIKE :network_pattern OR parent_16_network::text ILIKE :network_pattern)
-            ORDER BY site_count DESC, parent_16_network
-        """)
-        
-        results = db.session.execute(query, {
-            'min_sites': min_sites,
-            'network_filter': network_filter,
-            'network_pattern': f'%{network_filter}%'
-        }).fetchall()
+        results = subnet_index.get_rollup_16(db.session, network_filter, min_sites)
         
         data = []
         for row in results:
@@ -96,23 +81,7 @@ def get_networks_by_24():
         network_filter = request.args.get('network', '').strip()
         min_sites = int(request.args.get('min_sites', 2))
         
-        query = text("""
-            SELECT 
-                parent_network::text as network_24,
-                network_count,
-                networks,
-                total_vlans
-            FROM network_grouping_by_subnet
-            WHERE (:network_filter = '' OR networks ILIKE :network_pattern OR parent_network::text ILIKE :network_pattern)
-            AND network_count >= :min_sites
-            ORDER BY network_count DESC, parent_network
-        """)
-        
-        results = db.session.execute(query, {
-            'network_filter': network_filter,
-            'network_pattern': f'%{network_filter}%',
-            'min_sites': min_sites
-        }).fetchall()
+        results = subnet_index.get_rollup_24(db.session, network_filter, min_sites)
         
         data = []
         for row in results:
@@ -136,13 +105,14 @@ def get_site_network_details(site_name):
             SELECT 
                 network_name,
                 vlan_id,
-                subnet::text as subnet,
-                parent_network::text as parent_24,
+                subnet_cidr::text as subnet,
+                set_masklen(subnet_cidr, 24)::text as parent_24,
                 dhcp_mode,
-                COUNT(DISTINCT parent_network) OVER (PARTITION BY network_name) as unique_24_count
+                (SELECT COUNT(DISTINCT set_masklen(subnet_cidr, 24))
+                 FROM network_vlans WHERE network_name = :site_name) as unique_24_count
             FROM network_vlans
             WHERE network_name = :site_name
-            AND subnet IS NOT NULL
+            AND subnet_cidr IS NOT NULL
             ORDER BY vlan_id
         """)
         
@@ -170,19 +140,7 @@ def get_site_network_details(site_name):
 def get_network_patterns():
     """Get network pattern analysis"""
     try:
-        query = text("""
-            SELECT 
-                parent_network::text as network,
-                sites_using_network,
-                site_list,
-                network_type
-            FROM network_pattern_analysis
-            WHERE sites_using_network > 1
-            ORDER BY sites_using_network DESC
-            LIMIT 100
-        """)
-        
-        results = db.session.execute(query).fetchall()
+        results = subnet_index.get_network_patterns(db.session)
         
         data = []
         for row in results:
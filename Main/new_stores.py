@@ -34,7 +34,7 @@ Key Functions:
 Dependencies:
     - models.py (NewStore, Circuit database models)
     - SQLAlchemy for database operations
-    - pandas for Excel file processing
+    - pandas / openpyxl for Excel file processing (read-only streaming parse)
     - utils.py for safe string handling
 
 Data Processing:
@@ -56,6 +56,7 @@ Features:
 from flask import Blueprint, render_template, jsonify, request
 from models import db, NewStore, Circuit
 from sqlalchemy import func, and_, or_, desc
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import datetime, timedelta, date
 from utils import safe_str
 import pandas as pd
@@ -71,7 +72,32 @@ logger = logging.getLogger(__name__)
 # Create Blueprint
 new_stores_bp = Blueprint('new_stores', __name__)
 
-def generate_record_number(site_name, circuit_purpose):
+RECORD_NUMBER_ATTEMPTS = 20
+
+def record_number_prefix(site_name):
+    """Record number prefix for a site: DISCOUNT + cleaned site name"""
+    # Clean site name - remove spaces and special characters
+    return "DISCOUNT" + ''.join(c for c in site_name.upper() if c.isalnum())[:10]
+
+def load_existing_record_numbers(site_names):
+    """
+    Prefetch every existing record number for the given sites in one query
+    
+    Args:
+        site_names: Site names that record numbers will be generated for
+        
+    Returns:
+        set: Existing record numbers sharing those sites' prefixes
+    """
+    prefixes = {record_number_prefix(site_name) for site_name in site_names}
+    if not prefixes:
+        return set()
+    rows = db.session.query(Circuit.record_number).filter(
+        or_(*[Circuit.record_number.like(f"{prefix}%") for prefix in prefixes])
+    ).all()
+    return {row.record_number for row in rows}
+
+def generate_record_number(site_name, circuit_purpose, existing_numbers=None):
     """
     Generate a unique record number for manually created circuits
     Format: DISCOUNT{SITE}{RANDOM_NUMBER}_BR[-I1 for Secondary]
@@ -79,34 +105,28 @@ def generate_record_number(site_name, circuit_purpose):
     Args:
         site_name: Name of the site
         circuit_purpose: Purpose of the circuit (Primary, Secondary, etc.)
+        existing_numbers: Set from load_existing_record_numbers() when generating
+            several numbers; the new number is added to it. Queried if not given.
         
     Returns:
         str: Generated record number
     """
     try:
-        # Clean site name - remove spaces and special characters
-        clean_site = ''.join(c for c in site_name.upper() if c.isalnum())[:10]
-        
-        # Generate random number (8-10 digits like real record numbers)
-        random_num = ''.join([str(random.randint(0, 9)) for _ in range(random.randint(8, 10))])
+        if existing_numbers is None:
+            existing_numbers = load_existing_record_numbers([site_name])
         
-        # Base record number
-        record_number = f"DISCOUNT{clean_site}{random_num}_BR"
+        prefix = record_number_prefix(site_name)
+        suffix = "_BR" if circuit_purpose.lower() == 'primary' else "_BR-I1"
         
-        # Add suffix for non-primary circuits
-        if circuit_purpose.lower() != 'primary':
-            record_number += "-I1"
+        for _ in range(RECORD_NUMBER_ATTEMPTS):
+            # Generate random number (8-10 digits like real record numbers)
+            random_num = ''.join([str(random.randint(0, 9)) for _ in range(random.randint(8, 10))])
+            record_number = f"{prefix}{random_num}{suffix}"
+            if record_number not in existing_numbers:
+                existing_numbers.add(record_number)
+                return record_number
         
-        # Ensure uniqueness by checking database
-        existing = Circuit.query.filter_by(record_number=record_number).first()
-        if existing:
-            # If collision (rare), try again with different random number
-            random_num = ''.join([str(random.randint(0, 9)) for _ in range(10)])
-            record_number = f"DISCOUNT{clean_site}{random_num}_BR"
-            if circuit_purpose.lower() != 'primary':
-                record_number += "-I1"
-        
-        return record_number
+        raise ValueError(f"No unique record number after {RECORD_NUMBER_ATTEMPTS} attempts")
         
     except Exception as e:
         logger.error(f"Error generating record number: {e}")
@@ -484,6 +504,220 @@ def get_new_store_circuits_with_tod():
         return jsonify({"error": str(e)}), 500
 
 
+HEADER_SCAN_ROWS = 10        # TOD workbooks have a title block above the header row
+UPSERT_BATCH_SIZE = 1000     # rows per INSERT ... ON CONFLICT statement
+EMPTY_VALUES = ['', 'nan', 'none', 'nat']
+
+# Excel column -> new_stores field, checked in order (first rule matching a column wins)
+TOD_COLUMN_RULES = [
+    ('target_opening_date', lambda col, low: col == 'TOD' or ('target' in low and 'date' in low)),
+    ('sap_number', lambda col, low: col == 'SAP #' or 'sap' in low),
+    ('dba', lambda col, low: col == 'DBA' or 'dba' in low),
+    ('address', lambda col, low: col == 'Address' or 'address' in low),
+    ('city', lambda col, low: col == 'City' or 'city' in low),
+    ('state', lambda col, low: col == 'State' or 'state' in low),
+    ('zip', lambda col, low: col == 'Zip' or 'zip' in low),
+    ('region', lambda col, low: col == 'Region' or 'region' in low),
+    ('project_status', lambda col, low: col == 'Project Status' or 'status' in low or 'project' in low),
+    ('store_concept', lambda col, low: col == 'Store Concept' or 'concept' in low),
+    ('unit_capacity', lambda col, low: col == 'Unit Capacity' or 'capacity' in low)
+]
+
+TOD_TEXT_FIELDS = ['region', 'city', 'state', 'project_status', 'sap_number', 'dba',
+                   'address', 'zip', 'store_concept', 'unit_capacity']
+TOD_FIELDS = ['target_opening_date', 'target_opening_date_text'] + TOD_TEXT_FIELDS
+
+def iter_workbook_rows(file_content, filename):
+    """Yield (sheet_row_number, values) from the first sheet of an Excel file"""
+    if filename.lower().endswith('.xlsx'):
+        # Read-only mode streams rows instead of loading the whole workbook
+        from openpyxl import load_workbook
+        workbook = load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+        try:
+            for row_number, values in enumerate(workbook.active.iter_rows(values_only=True), 1):
+                yield row_number, values
+        finally:
+            workbook.close()
+    else:
+        raw = pd.read_excel(io.BytesIO(file_content), header=None)
+        for row_number, values in enumerate(raw.itertuples(index=False, name=None), 1):
+            yield row_number, values
+
+def read_tod_workbook(file_content, filename):
+    """
+    Parse a TOD workbook into a DataFrame
+    
+    The header row is found in the top HEADER_SCAN_ROWS rows: the row with a
+    "Store #" cell, else the first row with 3+ filled cells one of which mentions
+    "store", else row 1. A '_row' column keeps each record's sheet row number for
+    error reporting.
+    """
+    rows = iter_workbook_rows(file_content, filename)
+    scanned = []
+    for row_number, values in rows:
+        scanned.append((row_number, values))
+        if len(scanned) >= HEADER_SCAN_ROWS:
+            break
+    if not scanned:
+        return pd.DataFrame()
+    
+    def cells(values):
+        return [str(v).strip() for v in values if v is not None and str(v).strip()]
+    
+    header_index = next((i for i, (_, values) in enumerate(scanned) if 'Store #' in cells(values)), None)
+    if header_index is None:
+        header_index = next((i for i, (_, values) in enumerate(scanned)
+                             if len(cells(values)) >= 3 and any('store' in c.lower() for c in cells(values))), 0)
+    header = scanned[header_index][1]
+    scanned = scanned[header_index + 1:]
+    
+    # Unique, non-empty column names (like pandas' read_excel)
+    columns = []
+    for position, value in enumerate(header):
+        name = str(value).strip() if value is not None and str(value).strip() else f"Unnamed: {position}"
+        while name in columns:
+            name += '.1'
+        columns.append(name)
+    
+    data = scanned + list(rows)
+    # object dtype keeps integers (SAP #, Zip) from turning into floats next to blank cells
+    df = pd.DataFrame([list(values)[:len(columns)] for _, values in data], columns=columns, dtype=object)
+    df['_row'] = [row_number for row_number, _ in data]
+    return df
+
+def find_store_column(columns):
+    """Store name column: "Store #" if present, else the first store/site/name column"""
+    for col in columns:
+        if str(col).strip() == 'Store #':
+            return col
+    for col in columns:
+        if any(keyword in str(col).lower() for keyword in ['store', 'site', 'name']):
+            return col
+    return None
+
+def map_tod_columns(columns, store_name_col):
+    """Map each new_stores field to its Excel column (the last matching column wins)"""
+    field_columns = {}
+    for col in columns:
+        if col in (store_name_col, '_row'):
+            continue
+        col_str = str(col).strip()
+        for field, matches in TOD_COLUMN_RULES:
+            if matches(col_str, col_str.lower()):
+                field_columns[field] = col
+                break
+    return field_columns
+
+def clean_text_column(series):
+    """Strip values and turn blanks/'nan'/'none' into None"""
+    text = series.astype(str).str.strip()
+    empty = series.isna() | text.str.lower().isin(EMPTY_VALUES)
+    return text.where(~empty, None)
+
+def parse_tod_column(series):
+    """Split a TOD column into (target_opening_date, target_opening_date_text)"""
+    text = clean_text_column(series)
+    is_tbd = text.str.upper() == 'TBD'
+    
+    # Real Excel dates convert in one pass; typed-in strings are parsed individually
+    is_date = series.map(lambda v: isinstance(v, (datetime, date, pd.Timestamp)))
+    parsed = pd.to_datetime(series.where(is_date), errors='coerce')
+    typed = text[text.notna() & ~is_tbd & ~is_date]
+    if not typed.empty:
+        parsed = parsed.fillna(typed.map(lambda v: pd.to_datetime(v, errors='coerce')))
+    
+    dates = parsed.dt.date.astype(object).where(parsed.notna(), None)
+    date_text = text.where(is_tbd, None).where(~is_tbd, 'TBD')
+    unparsed = text.notna() & ~is_tbd & parsed.isna()
+    date_text = date_text.where(~unparsed, text)
+    return dates, date_text
+
+def build_store_records(df, store_name_col):
+    """
+    Validate and normalize all workbook rows at once
+    
+    Returns:
+        tuple: (records DataFrame indexed by site_name, errors, warnings)
+    """
+    field_columns = map_tod_columns(df.columns, store_name_col)
+    
+    stores = pd.DataFrame({'_row': df['_row']})
+    stores['site_name'] = clean_text_column(df[store_name_col]).str.upper()
+    stores = stores[stores['site_name'].notna()]
+    df = df.loc[stores.index]
+    
+    if 'target_opening_date' in field_columns:
+        stores['target_opening_date'], stores['target_opening_date_text'] = \
+            parse_tod_column(df[field_columns['target_opening_date']])
+    else:
+        stores['target_opening_date'] = None
+        stores['target_opening_date_text'] = None
+    for field in TOD_TEXT_FIELDS:
+        stores[field] = clean_text_column(df[field_columns[field]]) if field in field_columns else None
+    
+    # Values that would not fit their new_stores column
+    errors = []
+    invalid = pd.Series(False, index=stores.index)
+    for field in ['site_name', 'target_opening_date_text'] + TOD_TEXT_FIELDS:
+        max_length = NewStore.__table__.c[field].type.length
+        too_long = stores[field].notna() & (stores[field].str.len() > max_length)
+        for row_number, value in stores.loc[too_long, ['_row', field]].itertuples(index=False):
+            errors.append(f"Row {row_number}: {field} '{value[:40]}' is longer than {max_length} characters")
+        invalid |= too_long
+    stores = stores[~invalid]
+    
+    # A store listed more than once: the last row wins as a whole, so a target opening
+    # date is never paired with another row's date text or notes
+    warnings = []
+    duplicated = stores['site_name'].duplicated(keep=False)
+    for site_name, rows in stores[duplicated].groupby('site_name')['_row']:
+        warnings.append(f"{site_name} appears on rows {', '.join(str(r) for r in rows)}; "
+                        f"using row {rows.iloc[-1]}")
+    records = stores.drop_duplicates('site_name', keep='last').set_index('site_name')[TOD_FIELDS]
+    records = records.astype(object).where(records.notna(), None)
+    
+    return records, errors, warnings
+
+def upsert_new_stores(records):
+    """
+    Insert/update all stores with INSERT ... ON CONFLICT (site_name)
+    
+    Existing stores are re-activated; a blank cell never overwrites a stored value.
+    
+    Returns:
+        tuple: (new site names, updated site names)
+    """
+    site_names = list(records.index)
+    existing = {row.site_name for row in db.session.query(NewStore.site_name).filter(
+        NewStore.site_name.in_(site_names))}
+    
+    now = datetime.utcnow()
+    rows = [{
+        'site_name': site_name,
+        **values,
+        'is_active': True,
+        'added_by': 'excel_upload',
+        'added_date': now,
+        'created_at': now,
+        'updated_at': now
+    } for site_name, values in zip(site_names, records.to_dict('records'))]
+    
+    table = NewStore.__table__
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        stmt = pg_insert(table).values(rows[i:i + UPSERT_BATCH_SIZE])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['site_name'],
+            set_={
+                'is_active': True,
+                'updated_at': now,
+                **{field: func.coalesce(stmt.excluded[field], table.c[field]) for field in TOD_FIELDS}
+            }
+        ))
+    
+    new_sites = [name for name in site_names if name not in existing]
+    updated_sites = [name for name in site_names if name in existing]
+    return new_sites, updated_sites
+
 @new_stores_bp.route('/api/new-stores/excel-upload', methods=['POST'])
 def upload_excel_file():
     """
@@ -503,6 +737,9 @@ def upload_excel_file():
     - Store Concept column (optional)
     - Unit Capacity column (optional)
     
+    Processing stages: streaming parse -> whole-sheet validation (one error report,
+    invalid rows skipped) -> one bulk upsert into new_stores.
+    
     Returns:
         JSON response with processing results
     """
@@ -517,169 +754,33 @@ def upload_excel_file():
         if not file.filename.lower().endswith(('.xlsx', '.xls')):
             return jsonify({"error": "File must be an Excel file (.xlsx or .xls)"}), 400
         
-        # Read Excel file - check if headers are in row 4 like the TOD file
+        # Stage 1: parse
+        start_time = datetime.now()
         try:
-            file_content = file.read()
-            # First try reading normally
-            df = pd.read_excel(io.BytesIO(file_content))
-            
-            # Check if first row looks like headers (contains "Store #" or similar)
-            first_row_str = ' '.join(str(val) for val in df.iloc[0].values if pd.notna(val))
-            if 'Store #' not in first_row_str and 'store' not in first_row_str.lower():
-                # Try reading with skiprows=3 (headers in row 4)
-                df = pd.read_excel(io.BytesIO(file_content), skiprows=3)
-                # If first row contains headers, set them properly
-                if any('store' in str(val).lower() for val in df.iloc[0].values if pd.notna(val)):
-                    df.columns = df.iloc[0]
-                    df = df.drop(0).reset_index(drop=True)
+            df = read_tod_workbook(file.read(), file.filename)
         except Exception as e:
             return jsonify({"error": f"Error reading Excel file: {str(e)}"}), 400
         
         if df.empty:
             return jsonify({"error": "Excel file is empty"}), 400
         
-        # Try to find store name column - look for "Store #" first, then fallback to flexible matching
-        store_name_col = None
-        for col in df.columns:
-            if col == 'Store #' or col.strip() == 'Store #':
-                store_name_col = col
-                break
-        
-        # If not found, try flexible matching
-        if store_name_col is None:
-            for col in df.columns:
-                if any(keyword in str(col).lower() for keyword in ['store', 'site', 'name']):
-                    store_name_col = col
-                    break
-        
+        store_name_col = find_store_column(df.columns)
         if store_name_col is None:
             return jsonify({"error": "Could not find store name column. Please ensure there's a column with 'Store #', 'store', 'site', or 'name' in the header."}), 400
         
-        # Process rows
-        added_stores = []
-        skipped_stores = []
-        error_rows = []
-        
-        for index, row in df.iterrows():
-            try:
-                site_name = str(row[store_name_col]).strip().upper()
-                if not site_name or site_name.lower() in ['nan', 'none', '']:
-                    continue
-                
-                # Extract other fields if available
-                target_opening_date = None
-                target_opening_date_text = None
-                region = None
-                city = None
-                state = None
-                project_status = None
-                sap_number = None
-                dba = None
-                address = None
-                zip_code = None
-                store_concept = None
-                unit_capacity = None
-                
-                # Try to find and extract other fields
-                for col in df.columns:
-                    col_str = str(col).strip()
-                    col_lower = col_str.lower()
-                    value = str(row[col]).strip() if pd.notna(row[col]) else ''
-                    
-                    # Check exact matches first
-                    if col_str == 'TOD' or ('target' in col_lower and 'date' in col_lower):
-                        if value and value.lower() not in ['nan', 'none', '']:
-                            if value.upper() == 'TBD':
-                                target_opening_date_text = 'TBD'
-                            else:
-                                try:
-                                    target_opening_date = pd.to_datetime(value).date()
-                                except:
-                                    target_opening_date_text = value
-                    elif col_str == 'SAP #' or 'sap' in col_lower:
-                        sap_number = value if value and value.lower() not in ['nan', 'none', ''] else None
-                    elif col_str == 'DBA' or 'dba' in col_lower:
-                        dba = value if value and value.lower() not in ['nan', 'none', ''] else None
-                    elif col_str == 'Address' or 'address' in col_lower:
-                        address = value if value and value.lower() not in ['nan', 'none', ''] else None
-                    elif col_str == 'City' or 'city' in col_lower:
-                        city = value if value and value.lower() not in ['nan', 'none', ''] else None
-                    elif col_str == 'State' or 'state' in col_lower:
-                        state = value if value and value.lower() not in ['nan', 'none', ''] else None
-                    elif col_str == 'Zip' or 'zip' in col_lower:
-                        zip_code = value if value and value.lower() not in ['nan', 'none', ''] else None
-                    elif col_str == 'Region' or 'region' in col_lower:
-                        region = value if value and value.lower() not in ['nan', 'none', ''] else None
-                    elif col_str == 'Project Status' or ('status' in col_lower or 'project' in col_lower):
-                        project_status = value if value and value.lower() not in ['nan', 'none', ''] else None
-                    elif col_str == 'Store Concept' or 'concept' in col_lower:
-                        store_concept = value if value and value.lower() not in ['nan', 'none', ''] else None
-                    elif col_str == 'Unit Capacity' or 'capacity' in col_lower:
-                        unit_capacity = value if value and value.lower() not in ['nan', 'none', ''] else None
-                
-                # Check if store already exists
-                existing = NewStore.query.filter_by(site_name=site_name).first()
-                
-                if existing:
-                    # Always update existing stores with new data
-                    existing.is_active = True
-                    if target_opening_date is not None:
-                        existing.target_opening_date = target_opening_date
-                    if target_opening_date_text is not None:
-                        existing.target_opening_date_text = target_opening_date_text
-                    if region is not None:
-                        existing.region = region
-                    if city is not None:
-                        existing.city = city
-                    if state is not None:
-                        existing.state = state
-                    if project_status is not None:
-                        existing.project_status = project_status
-                    if sap_number is not None:
-                        existing.sap_number = sap_number
-                    if dba is not None:
-                        existing.dba = dba
-                    if address is not None:
-                        existing.address = address
-                    if zip_code is not None:
-                        existing.zip = zip_code
-                    if store_concept is not None:
-                        existing.store_concept = store_concept
-                    if unit_capacity is not None:
-                        existing.unit_capacity = unit_capacity
-                    existing.updated_at = datetime.utcnow()
-                    added_stores.append(f"{site_name} (updated)")
-                else:
-                    # Create new store entry
-                    new_store = NewStore(
-                        site_name=site_name,
-                        target_opening_date=target_opening_date,
-                        target_opening_date_text=target_opening_date_text,
-                        region=region,
-                        city=city,
-                        state=state,
-                        project_status=project_status,
-                        sap_number=sap_number,
-                        dba=dba,
-                        address=address,
-                        zip=zip_code,
-                        store_concept=store_concept,
-                        unit_capacity=unit_capacity,
-                        added_by='excel_upload'
-                    )
-                    db.session.add(new_store)
-                    added_stores.append(site_name)
-                    
-            except Exception as e:
-                error_rows.append(f"Row {index + 2}: {str(e)}")
+        # Stage 2: validate
+        records, error_rows, warnings = build_store_records(df, store_name_col)
         
+        # Stage 3: upsert
+        new_additions, updated_sites = upsert_new_stores(records) if not records.empty else ([], [])
         db.session.commit()
         
-        # Count updates vs new additions
-        updates = [s for s in added_stores if s.endswith(' (updated)')]
-        new_additions = [s for s in added_stores if not s.endswith(' (updated)')]
+        updates = [f"{site_name} (updated)" for site_name in updated_sites]
+        added_stores = new_additions + updates
+        elapsed = (datetime.now() - start_time).total_seconds()
         
-        print(f"✅ Excel upload processed: {len(new_additions)} new, {len(updates)} updated, {len(error_rows)} errors")
+        print(f"✅ Excel upload processed: {len(new_additions)} new, {len(updates)} updated, "
+              f"{len(error_rows)} errors from {len(df)} rows in {elapsed:.2f}s")
         
         return jsonify({
             "success": True,
@@ -687,6 +788,7 @@ def upload_excel_file():
             "new": new_additions,
             "updated": updates,
             "errors": error_rows,
+            "warnings": warnings,
             "total_added": len(new_additions),
             "total_updated": len(updates),
             "total_errors": len(error_rows)
@@ -16,6 +16,7 @@ import glob
 # Add parent directory to path for imports
 sys.path.insert(0, '/usr/local/bin/Main')
 from config import Config
+from job_ledger import JobRun, phase, begin_phase, record_rows
 
 # Setup logging
 logging.basicConfig(
@@ -114,12 +115,17 @@ def detect_enablements(conn):
         total_enablements = 0
         
         # Clear existing data for reprocessing
+        begin_phase('write')
         cursor.execute("DELETE FROM daily_enablements WHERE date >= CURRENT_DATE - INTERVAL '90 days'")
+        record_rows(deleted=cursor.rowcount)
         cursor.execute("DELETE FROM enablement_summary WHERE summary_date >= CURRENT_DATE - INTERVAL '90 days'")
+        record_rows(deleted=cursor.rowcount)
         cursor.execute("DELETE FROM ready_queue_daily WHERE summary_date >= CURRENT_DATE - INTERVAL '90 days'")
+        record_rows(deleted=cursor.rowcount)
         
         for csv_file in csv_files:
-            circuits_by_record, file_date = process_csv_file(csv_file)
+            with phase('parse'):
+                circuits_by_record, file_date = process_csv_file(csv_file)
             
             if circuits_by_record is None:
                 continue
@@ -217,6 +223,7 @@ def detect_enablements(conn):
                     created_at = NOW()
             """, (file_date, daily_ready_count))
             
+            record_rows(inserted=daily_enablements + 2)  # transitions + enablement_summary + ready_queue_daily
             logger.info(f"Date {file_date}: {daily_enablements} Ready->Enabled transitions, {daily_ready_count} ready")
             
             # Update previous circuits for next iteration
@@ -227,6 +234,7 @@ def detect_enablements(conn):
         logger.info(f"Total Ready->Enabled transitions processed: {total_enablements}")
         
         # Now calculate trends in a separate transaction
+        begin_phase('trends')
         calculate_trends_safe(conn)
         
         return True
@@ -401,5 +409,6 @@ def main():
         return False
 
 if __name__ == "__main__":
-    success = main()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    with JobRun('nightly_enablement_db'):
+        success = main()
+        sys.exit(0 if success else 1)
\ No newline at end of file
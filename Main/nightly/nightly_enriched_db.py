@@ -21,6 +21,7 @@ from thefuzz import fuzz
 # Add parent directory to path for config import
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from job_ledger import JobRun, begin_phase, record_rows
 
 # Setup logging
 logging.basicConfig(
@@ -543,6 +544,7 @@ def enrich_circuits(conn):
     cursor = conn.cursor()
     
     # Get all DSR circuits
+    begin_phase('fetch')
     logger.info("Loading DSR circuit data...")
     dsr_circuits_by_site = get_dsr_circuits(conn)
     logger.info(f"Loaded DSR circuits for {len(dsr_circuits_by_site)} sites")
@@ -588,6 +590,7 @@ def enrich_circuits(conn):
     
     devices = cursor.fetchall()
     logger.info(f"Processing {len(devices)} MX devices")
+    begin_phase('enrich')
     
     updates_made = 0
     inserts_made = 0
@@ -867,6 +870,7 @@ def enrich_circuits(conn):
     deleted_count = cursor.rowcount
     
     conn.commit()
+    record_rows(inserted=inserts_made, updated=updates_made, deleted=deleted_count)
     
     logger.info(f"Enrichment complete: {updates_made} updated, {inserts_made} inserted, {deleted_count} deleted")
     logger.info(f"Preserved {preserved_count} DSR-ARIN matched entries")
@@ -885,6 +889,7 @@ def sync_enriched_to_circuits(conn):
     
     try:
         logger.info("Starting sync of enriched data back to circuits table for non-DSR circuits...")
+        begin_phase('sync')
         
         # Find non-DSR circuits that need updating
         cursor.execute("""
@@ -969,6 +974,7 @@ def sync_enriched_to_circuits(conn):
             execute_batch(cursor, update_query, updates_to_make)
             
             conn.commit()
+            record_rows(updated=len(updates_to_make))
             
             # Log updates
             for update in updates_to_make[:10]:  # Show first 10
@@ -1014,4 +1020,5 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with JobRun('nightly_enriched_db'):
+        main()
\ No newline at end of file
@@ -7,7 +7,6 @@ Replicates the original nightly_inventory_summary.py functionality
 
 import os
 import sys
-import json
 import re
 import requests
 import time
@@ -24,6 +23,9 @@ parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, parent_dir)
 
 from config import Config
+from site_classification import classify_site
+from eol_matcher import EolMatcher, load_eol_records
+from job_ledger import JobRun, begin_phase, record_api_call, record_rows
 # Load environment
 load_dotenv('/usr/local/bin/meraki.env')
 API_KEY = os.getenv("MERAKI_API_KEY")
@@ -52,7 +54,6 @@ os.makedirs(DATA_DIR, exist_ok=True)
 
 def get_db_connection():
     """Get database connection using config"""
-    import re
     match = re.match(r'postgresql://(.+):(.+)@(.+):(\d+)/(.+)', Config.SQLALCHEMY_DATABASE_URI)
     if not match:
         raise ValueError("Invalid database URI")
@@ -75,6 +76,7 @@ def meraki_get_paginated(url_base, key_type='serial'):
         if starting_after:
             url += f"&startingAfter={starting_after}"
         resp = requests.get(url, headers=HEADERS)
+        record_api_call(resp.status_code)
         if resp.status_code == 429:
             wait = int(resp.headers.get('Retry-After', 2))
             logger.warning(f"429 hit, waiting {wait}s")
@@ -109,20 +111,17 @@ def get_inventory(org_id):
     return meraki_get_paginated(url, key_type='serial')
 
 def fetch_eol_data():
-    """Fetch End-of-Life data from enhanced EOL table"""
+    """Fetch End-of-Life data from the EOL tables as a precompiled EolMatcher"""
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Get all EOL data from enhanced table
-        cursor.execute("""
-            SELECT model, announcement_date, end_of_sale, end_of_support
-            FROM meraki_eol_enhanced
-            ORDER BY model
-        """)
+        # Enhanced table first, then meraki_eol / meraki_eol_pdf for models it lacks
+        records = load_eol_records(cursor)
         
         eol_lookup = {}
-        for model, ann_date, eos_date, eol_date in cursor.fetchall():
+        for model, record in records.items():
+            ann_date, eos_date, eol_date = record['announcement_date'], record['end_of_sale'], record['end_of_support']
             eol_lookup[model] = {
                 "Announcement Date": ann_date.strftime('%B %d, %Y') if ann_date else "",
                 "End-of-Sale Date": eos_date.strftime('%B %d, %Y') if eos_date else "",
@@ -132,13 +131,16 @@ def fetch_eol_data():
         cursor.close()
         conn.close()
         
+        if not eol_lookup:
+            raise ValueError("EOL tables are empty")
+        
         logger.info(f"Loaded EOL data for {len(eol_lookup)} models from database")
-        return eol_lookup
+        return EolMatcher(eol_lookup)
         
     except Exception as e:
         logger.error(f"Error fetching EOL data from database: {e}")
         # Fall back to HTML parsing if database fails
-        return fetch_eol_data_html()
+        return EolMatcher(fetch_eol_data_html())
 
 def fetch_eol_data_html():
     """Original HTML-based EOL data fetching as fallback"""
@@ -183,31 +185,10 @@ def normalize_model(m):
     """Normalize model name"""
     return m.strip().upper() if m else ""
 
-def get_eol(model, field, eol_lookup):
-    """Get EOL data for a model with enhanced matching"""
-    model = normalize_model(model)
-    
-    # Direct match
-    if model in eol_lookup:
-        return eol_lookup[model].get(field, "")
-    
-    # For MS220 variants, use base model
-    if model.startswith("MS220-"):
-        # Extract base model (MS220-8P -> MS220-8)
-        base_match = re.match(r'(MS220-\d+)', model)
-        if base_match:
-            base_model = base_match.group(1)
-            if base_model in eol_lookup:
-                return eol_lookup[base_model].get(field, "")
-    
-    # Check if model starts with any known EOL model (but be more specific)
-    for key in eol_lookup:
-        # Only match if the key is followed by a dash, end of string, or is an exact match
-        # This prevents MX67C-NA from matching MX67
-        if model == key or (model.startswith(key) and len(model) > len(key) and model[len(key)] == '-'):
-            return eol_lookup[key].get(field, "")
-    
-    return ""
+def get_eol(model, field, eol_matcher):
+    """Get EOL data for a model (exact, MS220 base, then longest '-' prefix match)"""
+    return eol_matcher.match(model, {}).get(field, "")
+
 def parse_date(date_str):
     """Parse date string to date object"""
     if not date_str or date_str == "N/A":
@@ -223,6 +204,62 @@ def parse_date(date_str):
         pass
     return None
 
+def get_device_type_from_model(model):
+    """Categorize device model into device type (mirrors inventory.py)"""
+    if model.startswith('MR'):
+        return 'Access Points (MR)'
+    elif model.startswith('MS'):
+        return 'Switches (MS)'
+    elif model.startswith('MX'):
+        return 'Security Appliances (MX)'
+    elif model.startswith('MV'):
+        return 'Cameras (MV)'
+    elif model.startswith('MT'):
+        return 'Sensors (MT)'
+    elif model.startswith('Z'):
+        return 'Teleworker Gateway (Z)'
+    else:
+        return 'Other'
+
+def get_eol_bucket(eos_date, eol_date, today):
+    """Classify a model into the eol / eos / active lifecycle bucket"""
+    if eol_date and eol_date <= today:
+        return 'eol'
+    if eos_date and eos_date <= today:
+        return 'eos'
+    return 'active'
+
+def write_inventory_summary_cube(cursor, summary_counter, model_dates, today):
+    """Write the model x org x EOL-bucket cube read by the inventory summary and EOL pages
+    
+    One row per (model, organization) with typed DATE columns and the lifecycle
+    bucket already resolved, so the web pages only need to aggregate counts.
+    """
+    rows = []
+    for model, org_counts in summary_counter.items():
+        ann_date, eos_date, eol_date = model_dates[model]
+        device_type = get_device_type_from_model(model)
+        eol_bucket = get_eol_bucket(eos_date, eol_date, today)
+        eol_year = eol_date.year if eol_date else None
+        for org_name, count in org_counts.items():
+            rows.append((
+                model, org_name, device_type, count,
+                ann_date, eos_date, eol_date,
+                eol_bucket, eol_year, today
+            ))
+    
+    cursor.execute("DELETE FROM inventory_summary_cube")
+    if rows:
+        execute_values(cursor, """
+            INSERT INTO inventory_summary_cube (
+                model, organization, device_type, device_count,
+                announcement_date, end_of_sale, end_of_support,
+                eol_bucket, eol_year, snapshot_date
+            ) VALUES %s
+        """, rows, page_size=1000)
+    
+    logger.info(f"Wrote {len(rows)} inventory summary cube rows")
+
 def create_inventory_tables(conn):
     """Create/verify inventory tables"""
     cursor = conn.cursor()
@@ -240,7 +277,8 @@ def create_inventory_tables(conn):
                 network_name VARCHAR(200),
                 organization VARCHAR(200),
                 product_type VARCHAR(50),
-                tags TEXT,
+                tags JSONB DEFAULT '[]'::jsonb,
+                site_class VARCHAR(10),
                 notes TEXT,
                 lan_ip VARCHAR(45),
                 firmware VARCHAR(50),
@@ -263,11 +301,33 @@ def create_inventory_tables(conn):
             )
         """)
         
+        # Create inventory_summary_cube table if not exists (model x org x EOL bucket)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS inventory_summary_cube (
+                model VARCHAR(50) NOT NULL,
+                organization VARCHAR(200) NOT NULL,
+                device_type VARCHAR(50) NOT NULL,
+                device_count INTEGER NOT NULL DEFAULT 0,
+                announcement_date DATE,
+                end_of_sale DATE,
+                end_of_support DATE,
+                eol_bucket VARCHAR(10) NOT NULL,
+                eol_year INTEGER,
+                snapshot_date DATE NOT NULL DEFAULT CURRENT_DATE,
+                PRIMARY KEY (model, organization)
+            )
+        """)
+        
+        # site_class is classified once here instead of unnesting tags per request
+        cursor.execute("ALTER TABLE inventory_devices ADD COLUMN IF NOT EXISTS site_class VARCHAR(10)")
+        
         # Create indexes
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_devices_serial ON inventory_devices(serial)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_devices_model ON inventory_devices(model)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_devices_organization ON inventory_devices(organization)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_devices_site_class_org ON inventory_devices(site_class, organization)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_summary_model ON inventory_summary(model)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_summary_cube_type_bucket ON inventory_summary_cube(device_type, eol_bucket, eol_year)")
         
         conn.commit()
         logger.info("Inventory tables created/verified")
@@ -284,6 +344,7 @@ def process_inventory(conn):
     
     try:
         # Get all organizations
+        begin_phase('fetch')
         orgs = get_organizations()
         logger.info(f"Found {len(orgs)} organizations")
         
@@ -326,6 +387,8 @@ def process_inventory(conn):
                     if model:
                         summary_counter[model][org_name] += 1
                     
+                    tags = device.get('tags') or []
+                    
                     # Prepare device data
                     device_data = {
                         'serial': serial,
@@ -336,7 +399,8 @@ def process_inventory(conn):
                         'network_name': network_name,
                         'organization': org_name,
                         'product_type': device.get('productType', model),
-                        'tags': json.dumps(device.get('tags', [])) if device.get('tags') else '[]',
+                        'tags': Json(tags),
+                        'site_class': classify_site(tags),
                         'notes': device.get('notes', ''),
                         'lan_ip': device.get('lanIp', ''),
                         'firmware': device.get('firmware', ''),
@@ -354,21 +418,23 @@ def process_inventory(conn):
         # Insert all devices
         if all_devices:
             logger.info(f"Inserting {len(all_devices)} devices into database...")
+            begin_phase('write')
             
             # Clear existing data
             cursor.execute("DELETE FROM inventory_devices")
+            record_rows(deleted=cursor.rowcount)
             
             # Bulk upsert - handle duplicates
             for device in all_devices:
                 cursor.execute("""
                     INSERT INTO inventory_devices (
                         serial, name, model, mac, network_id, network_name,
-                        organization, product_type, tags, notes, lan_ip, 
+                        organization, product_type, tags, site_class, notes, lan_ip, 
                         firmware, details
                     ) VALUES (
                         %(serial)s, %(name)s, %(model)s, %(mac)s, %(network_id)s,
                         %(network_name)s, %(organization)s, %(product_type)s,
-                        %(tags)s, %(notes)s, %(lan_ip)s, %(firmware)s, %(details)s
+                        %(tags)s, %(site_class)s, %(notes)s, %(lan_ip)s, %(firmware)s, %(details)s
                     )
                     ON CONFLICT (serial) DO UPDATE SET
                         name = EXCLUDED.name,
@@ -379,23 +445,30 @@ def process_inventory(conn):
                         organization = EXCLUDED.organization,
                         product_type = EXCLUDED.product_type,
                         tags = EXCLUDED.tags,
+                        site_class = EXCLUDED.site_class,
                         notes = EXCLUDED.notes,
                         lan_ip = EXCLUDED.lan_ip,
                         firmware = EXCLUDED.firmware,
                         details = EXCLUDED.details
                 """, device)
             
+            record_rows(inserted=len(all_devices))
             logger.info(f"Inserted {len(all_devices)} devices")
         
         # Create inventory summary
         logger.info("Creating inventory summary...")
+        begin_phase('summary')
         
         # Clear existing summary
         cursor.execute("DELETE FROM inventory_summary")
+        record_rows(deleted=cursor.rowcount)
         
         # Get today's date for EOL comparisons
         today = datetime.today().date()
         
+        # Resolved EOL dates per model, shared with the summary cube
+        model_dates = {}
+        
         # Process each model
         for model, org_counts in summary_counter.items():
             total_count = sum(org_counts.values())
@@ -404,6 +477,7 @@ def process_inventory(conn):
             ann_date = parse_date(get_eol(model, "Announcement Date", eol_data))
             eos_date = parse_date(get_eol(model, "End-of-Sale Date", eol_data))
             eol_date = parse_date(get_eol(model, "End-of-Support Date", eol_data))
+            model_dates[model] = (ann_date, eos_date, eol_date)
             
             # Determine highlight status
             highlight = ""
@@ -429,8 +503,12 @@ def process_inventory(conn):
                 highlight
             ))
         
+        record_rows(inserted=len(summary_counter))
         logger.info(f"Created summary for {len(summary_counter)} models")
         
+        # Pre-aggregated cube for the inventory summary and EOL pages
+        write_inventory_summary_cube(cursor, summary_counter, model_dates, today)
+        
         # Log summary
         logger.info("\nInventory Summary:")
         for model, org_counts in sorted(summary_counter.items()):
@@ -479,4 +557,5 @@ def main():
             conn.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with JobRun('nightly_inventory_db'):
+        main()
\ No newline at end of file
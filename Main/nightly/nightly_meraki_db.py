@@ -7,6 +7,7 @@ Collects Meraki data and stores directly in PostgreSQL database
 import os
 import sys
 import json
+import hashlib
 import requests
 import re
 import time
@@ -17,12 +18,17 @@ from dotenv import load_dotenv
 from datetime import datetime, timezone
 from thefuzz import fuzz
 import psycopg2
-from psycopg2.extras import execute_values
+from psycopg2.extras import execute_values, Json
 import logging
 
 # Add the test directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from site_classification import classify_site
+from site_name_index import SiteNameIndex
+from subnet_index import refresh_subnet_index
+from firewall_rulesets import CREATE_RULESET_TABLES_SQL, canonicalize_rules, ruleset_hash
+from job_ledger import JobRun, begin_phase, record_api_call, record_rows
 
 # Get database URI from config
 SQLALCHEMY_DATABASE_URI = Config.SQLALCHEMY_DATABASE_URI
@@ -276,6 +282,7 @@ def make_api_request(url, api_key, params=None, max_retries=5):
             if make_api_request.successful_requests % 100 == 0:
                 logger.debug(f"Requesting {url} with {make_api_request.current_delay:.3f}s delay")
             resp = requests.get(url, headers=headers, params=params, timeout=30)
+            record_api_call(resp.status_code)
             
             if resp.status_code == 429:  # Rate limited
                 make_api_request.rate_limited_count += 1
@@ -771,9 +778,9 @@ def store_device_in_db(device_data, conn):
             wan1_provider_label, wan1_speed_label,
             wan2_ip, wan2_assignment, wan2_arin_provider, wan2_provider_comparison,
             wan2_provider_label, wan2_speed_label,
-            last_updated
+            site_class, last_updated
         ) VALUES (
-            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
         )
         ON CONFLICT (device_serial) DO UPDATE SET
             organization_name = EXCLUDED.organization_name,
@@ -795,7 +802,9 @@ def store_device_in_db(device_data, conn):
             wan2_provider_comparison = EXCLUDED.wan2_provider_comparison,
             wan2_provider_label = EXCLUDED.wan2_provider_label,
             wan2_speed_label = EXCLUDED.wan2_speed_label,
+            site_class = EXCLUDED.site_class,
             last_updated = EXCLUDED.last_updated
+        RETURNING (xmax = 0) AS inserted
         """
         
         # Extract WAN data
@@ -823,8 +832,13 @@ def store_device_in_db(device_data, conn):
             wan2_data.get("provider_comparison", ""),
             wan2_data.get("provider_label", ""),
             wan2_data.get("speed", ""),
+            classify_site(device_data["device_tags"]),
             datetime.now(timezone.utc)
         ))
+        if cursor.fetchone()[0]:
+            record_rows(inserted=1)
+        else:
+            record_rows(updated=1)
         
         # Also store ARIN data in RDAP cache
         for wan in ['wan1', 'wan2']:
@@ -849,13 +863,172 @@ def store_device_in_db(device_data, conn):
         cursor.close()
         return False
 
+CONFIG_SYNC_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS network_config_sync (
+        network_id VARCHAR(50) PRIMARY KEY,
+        network_name VARCHAR(255),
+        config_hash CHAR(64),
+        last_checked TIMESTAMP,
+        last_fetched TIMESTAMP,
+        last_changed TIMESTAMP
+    )
+"""
+
+# Networks re-fetched each night regardless of the change feed, oldest first,
+# so every network is verified against the API about once a week
+CONFIG_VERIFY_FRACTION = 7
+CONFIG_FEED_MAX_DAYS = 365  # Meraki keeps a year of configuration changes
+CONFIG_WRITE_BATCH = 100  # Networks per bulk write/commit
+
+def get_changed_network_ids(org_id, since):
+    """Network IDs with configuration changes since `since` (None if the feed is unusable)"""
+    if not since or (datetime.utcnow() - since).days >= CONFIG_FEED_MAX_DAYS:
+        return None
+    
+    url = f"{BASE_URL}/organizations/{org_id}/configurationChanges"
+    params = {'t0': since.strftime('%Y-%m-%dT%H:%M:%SZ'), 'perPage': 5000}
+    changed = set()
+    
+    while url:
+        changes, headers = make_api_request(url, MERAKI_API_KEY, params)
+        if not headers or not isinstance(changes, list):
+            return None
+        changed.update(change['networkId'] for change in changes if change.get('networkId'))
+        
+        next_links = [link['url'] for link in requests.utils.parse_header_links(headers.get('Link', ''))
+                      if link.get('rel') == 'next']
+        url = next_links[0] if next_links and changes else None
+        params = None  # The next link already carries the query string
+    
+    return changed
+
+def build_network_config_rows(network_id, network_name, vlans, ports):
+    """Turn fetched VLAN/port lists into network_vlans, network_dhcp_options and network_wan_ports rows"""
+    vlan_rows, dhcp_rows, port_rows = [], [], []
+    
+    for vlan in vlans:
+        # Store VLAN configuration
+        vlan_id = vlan.get('id')
+        if not vlan_id or vlan_id == '' or not str(vlan_id).isdigit():
+            logger.warning(f"Skipping VLAN with invalid ID '{vlan_id}' in network {network_name}")
+            continue
+        
+        # Extract DHCP data from VLAN object
+        dhcp_relay_servers = vlan.get('dhcpRelayServerIps', [])
+        reserved_ip_ranges = vlan.get('reservedIpRanges', [])
+        fixed_ip_assignments = vlan.get('fixedIpAssignments', {})
+        vlan_rows.append((
+            network_id, network_name, vlan_id, vlan.get('name', ''),
+            vlan.get('applianceIp'), vlan.get('subnet'), vlan.get('mask'),
+            vlan.get('dhcpHandling', ''), vlan.get('dhcpLeaseTime', '86400'),
+            vlan.get('dhcpBootOptionsEnabled', False),
+            vlan.get('dhcpBootNextServer'), vlan.get('dhcpBootFilename'),
+            ','.join(dhcp_relay_servers) if dhcp_relay_servers else None,
+            vlan.get('dnsNameservers', ''),
+            json.dumps(reserved_ip_ranges) if reserved_ip_ranges else None,
+            json.dumps(fixed_ip_assignments) if fixed_ip_assignments else None
+        ))
+        
+        for option in vlan.get('dhcpOptions', []) or []:
+            dhcp_rows.append((
+                network_id, vlan_id,
+                option.get('code'), option.get('type'), option.get('value')
+            ))
+    
+    for port in ports:
+        port_number = port.get('number')
+        if port_number is None:
+            continue
+        port_rows.append((
+            network_id, network_name, port_number,
+            port.get('enabled', True), port.get('wanEnabled', 'not configured') == 'enabled',
+            port.get('accessPolicy'), port.get('vlan'),
+            port.get('allowedVlans')
+        ))
+    
+    return vlan_rows, dhcp_rows, port_rows
+
+def write_network_configs(cursor, changed_configs):
+    """Bulk write VLAN/DHCP/WAN port rows for networks whose configuration changed"""
+    vlan_rows, dhcp_rows, port_rows = [], [], []
+    for network_id, network_name, vlans, ports in changed_configs:
+        rows = build_network_config_rows(network_id, network_name, vlans, ports)
+        vlan_rows.extend(rows[0])
+        dhcp_rows.extend(rows[1])
+        port_rows.extend(rows[2])
+    
+    if vlan_rows:
+        execute_values(cursor, """
+            INSERT INTO network_vlans (
+                network_id, network_name, vlan_id, name,
+                appliance_ip, subnet, subnet_mask,
+                dhcp_handling, dhcp_lease_time,
+                dhcp_boot_options_enabled, dhcp_boot_next_server, dhcp_boot_filename,
+                dhcp_relay_server_ips, dns_nameservers,
+                reserved_ip_ranges, fixed_ip_assignments
+            ) VALUES %s
+            ON CONFLICT (network_id, vlan_id) DO UPDATE SET
+                network_name = EXCLUDED.network_name,
+                name = EXCLUDED.name,
+                appliance_ip = EXCLUDED.appliance_ip,
+                subnet = EXCLUDED.subnet,
+                subnet_mask = EXCLUDED.subnet_mask,
+                dhcp_handling = EXCLUDED.dhcp_handling,
+                dhcp_lease_time = EXCLUDED.dhcp_lease_time,
+                dhcp_boot_options_enabled = EXCLUDED.dhcp_boot_options_enabled,
+                dhcp_boot_next_server = EXCLUDED.dhcp_boot_next_server,
+                dhcp_boot_filename = EXCLUDED.dhcp_boot_filename,
+                dhcp_relay_server_ips = EXCLUDED.dhcp_relay_server_ips,
+                dns_nameservers = EXCLUDED.dns_nameservers,
+                reserved_ip_ranges = EXCLUDED.reserved_ip_ranges,
+                fixed_ip_assignments = EXCLUDED.fixed_ip_assignments,
+                updated_at = CURRENT_TIMESTAMP
+        """, vlan_rows)
+    
+    # DHCP options have no natural key: replace them for the changed networks
+    cursor.execute("DELETE FROM network_dhcp_options WHERE network_id = ANY(%s)",
+                   ([config[0] for config in changed_configs],))
+    if dhcp_rows:
+        execute_values(cursor, """
+            INSERT INTO network_dhcp_options (network_id, vlan_id, code, type, value)
+            VALUES %s
+        """, dhcp_rows)
+    
+    if port_rows:
+        execute_values(cursor, """
+            INSERT INTO network_wan_ports (
+                network_id, network_name, port_number,
+                enabled, wan_enabled, access_policy,
+                vlan, allowed_vlans
+            ) VALUES %s
+            ON CONFLICT (network_id, port_number) DO UPDATE SET
+                network_name = EXCLUDED.network_name,
+                enabled = EXCLUDED.enabled,
+                wan_enabled = EXCLUDED.wan_enabled,
+                access_policy = EXCLUDED.access_policy,
+                vlan = EXCLUDED.vlan,
+                allowed_vlans = EXCLUDED.allowed_vlans,
+                updated_at = CURRENT_TIMESTAMP
+        """, port_rows)
+    
+    return len(vlan_rows), len(dhcp_rows), len(port_rows)
+
 def collect_vlan_dhcp_data(org_id, networks, conn):
-    """Collect VLAN and DHCP configuration data from Meraki networks"""
+    """Collect VLAN and DHCP configuration data from Meraki networks
+    
+    Only networks that appear in the organization configuration-changes feed since the
+    last run, have never been collected, or are due for their weekly verification are
+    fetched. A content hash per network (network_config_sync) decides whether the fetched
+    configuration is written; changed networks are written in bulk.
+    """
     try:
         cursor = conn.cursor()
+        cursor.execute(CONFIG_SYNC_TABLE_SQL)
+        run_started = datetime.utcnow()
         
         # Track statistics
         networks_processed = 0
+        networks_changed = 0
         vlans_collected = 0
         dhcp_options_collected = 0
         wan_ports_collected = 0
@@ -864,156 +1037,122 @@ def collect_vlan_dhcp_data(org_id, networks, conn):
         mx_networks = []
         for network in networks:
             product_types = network.get('productTypes', [])
-            if 'appliance' in product_types:
+            if 'appliance' in product_types and network.get('id'):
                 mx_networks.append(network)
         
         logger.info(f"Found {len(mx_networks)} networks with MX appliances to collect VLAN data from")
         
-        # Process each network
+        cursor.execute("SELECT network_id, config_hash, last_checked, last_fetched FROM network_config_sync")
+        sync_state = {row[0]: row[1:] for row in cursor.fetchall()}
+        
+        # Decide which networks need fetching
+        known = [n for n in mx_networks if sync_state.get(n['id'], (None,))[0]]
+        unknown_ids = {n['id'] for n in mx_networks} - {n['id'] for n in known}
+        since = min((sync_state[n['id']][1] for n in known if sync_state[n['id']][1]), default=None)
+        changed_ids = get_changed_network_ids(org_id, since)
+        
+        if changed_ids is None:
+            logger.info("Configuration changes feed unavailable or too old - fetching all MX networks")
+            fetch_ids = {n['id'] for n in mx_networks}
+        else:
+            verify_count = -(-len(known) // CONFIG_VERIFY_FRACTION)
+            oldest = sorted(known, key=lambda n: sync_state[n['id']][2] or datetime.min)[:verify_count]
+            fetch_ids = unknown_ids | (changed_ids & {n['id'] for n in known}) | {n['id'] for n in oldest}
+            logger.info(f"Config changes since {since}: {len(changed_ids)} networks in feed; fetching "
+                       f"{len(fetch_ids)} ({len(unknown_ids)} new, {len(oldest)} weekly verification)")
+        
+        # Networks skipped via the feed are confirmed current as of this run
+        skipped_ids = [n['id'] for n in mx_networks if n['id'] not in fetch_ids]
+        if skipped_ids:
+            cursor.execute("""
+                UPDATE network_config_sync SET last_checked = %s WHERE network_id = ANY(%s)
+            """, (run_started, skipped_ids))
+        
+        changed_configs = []
+        sync_rows = []
+        failed_batches = 0
+        
+        def flush():
+            """Write the pending batch; a failed batch is rolled back and dropped (refetched next run)"""
+            nonlocal networks_changed, vlans_collected, dhcp_options_collected, wan_ports_collected, failed_batches
+            try:
+                counts = write_network_configs(cursor, changed_configs) if changed_configs else (0, 0, 0)
+                if sync_rows:
+                    execute_values(cursor, """
+                        INSERT INTO network_config_sync (
+                            network_id, network_name, config_hash, last_checked, last_fetched, last_changed
+                        ) VALUES %s
+                        ON CONFLICT (network_id) DO UPDATE SET
+                            network_name = EXCLUDED.network_name,
+                            config_hash = EXCLUDED.config_hash,
+                            last_checked = EXCLUDED.last_checked,
+                            last_fetched = EXCLUDED.last_fetched,
+                            last_changed = COALESCE(EXCLUDED.last_changed, network_config_sync.last_changed)
+                    """, sync_rows)
+                conn.commit()
+                vlans_collected += counts[0]
+                dhcp_options_collected += counts[1]
+                wan_ports_collected += counts[2]
+                networks_changed += len(changed_configs)
+            except psycopg2.Error as e:
+                conn.rollback()
+                failed_batches += 1
+                logger.error(f"Failed to write VLAN/DHCP batch of {len(sync_rows)} networks, rolled back: {e}")
+            finally:
+                changed_configs.clear()
+                sync_rows.clear()
+        
+        # Process each network that needs fetching
         for network in mx_networks:
-            network_id = network.get('id')
+            network_id = network['id']
             network_name = network.get('name', '')
-            
-            if not network_id:
+            if network_id not in fetch_ids:
                 continue
                 
             try:
-                # Collect VLANs
-                url = f"{BASE_URL}/networks/{network_id}/appliance/vlans"
-                vlans = make_api_request_simple(url, MERAKI_API_KEY)
-                
-                if vlans and isinstance(vlans, list):
-                    logger.info(f"Found {len(vlans)} VLANs in network {network_name}")
-                    
-                    for vlan in vlans:
-                        # Store VLAN configuration
-                        vlan_id = vlan.get('id')
-                        if not vlan_id or vlan_id == '' or not str(vlan_id).isdigit():
-                            logger.warning(f"Skipping VLAN with invalid ID '{vlan_id}' in network {network_name}")
-                            continue
-                        
-                        # Extract DHCP data from VLAN object
-                        dhcp_handling = vlan.get('dhcpHandling', '')
-                        dhcp_relay_servers = vlan.get('dhcpRelayServerIps', [])
-                        dhcp_options = vlan.get('dhcpOptions', [])
-                        reserved_ip_ranges = vlan.get('reservedIpRanges', [])
-                        fixed_ip_assignments = vlan.get('fixedIpAssignments', {})
-                        try:
-                            # Insert VLAN data
-                            cursor.execute("""
-                                INSERT INTO network_vlans (
-                                    network_id, network_name, vlan_id, name,
-                                    appliance_ip, subnet, subnet_mask,
-                                    dhcp_handling, dhcp_lease_time,
-                                    dhcp_boot_options_enabled, dhcp_boot_next_server, dhcp_boot_filename,
-                                    dhcp_relay_server_ips, dns_nameservers,
-                                    reserved_ip_ranges, fixed_ip_assignments
-                                ) VALUES (
-                                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                                )
-                                ON CONFLICT (network_id, vlan_id) DO UPDATE SET
-                                    name = EXCLUDED.name,
-                                    appliance_ip = EXCLUDED.appliance_ip,
-                                    subnet = EXCLUDED.subnet,
-                                    subnet_mask = EXCLUDED.subnet_mask,
-                                    dhcp_handling = EXCLUDED.dhcp_handling,
-                                    dhcp_lease_time = EXCLUDED.dhcp_lease_time,
-                                    dhcp_boot_options_enabled = EXCLUDED.dhcp_boot_options_enabled,
-                                    dhcp_boot_next_server = EXCLUDED.dhcp_boot_next_server,
-                                    dhcp_boot_filename = EXCLUDED.dhcp_boot_filename,
-                                    dhcp_relay_server_ips = EXCLUDED.dhcp_relay_server_ips,
-                                    dns_nameservers = EXCLUDED.dns_nameservers,
-                                    reserved_ip_ranges = EXCLUDED.reserved_ip_ranges,
-                                    fixed_ip_assignments = EXCLUDED.fixed_ip_assignments,
-                                    updated_at = CURRENT_TIMESTAMP
-                            """, (
-                                network_id, network_name, vlan_id, vlan.get('name', ''),
-                                vlan.get('applianceIp'), vlan.get('subnet'), vlan.get('mask'),
-                                dhcp_handling, vlan.get('dhcpLeaseTime', '86400'),
-                                vlan.get('dhcpBootOptionsEnabled', False),
-                                vlan.get('dhcpBootNextServer'), vlan.get('dhcpBootFilename'),
-                                ','.join(dhcp_relay_servers) if dhcp_relay_servers else None,
-                                vlan.get('dnsNameservers', ''),
-                                json.dumps(reserved_ip_ranges) if reserved_ip_ranges else None,
-                                json.dumps(fixed_ip_assignments) if fixed_ip_assignments else None
-                            ))
-                            vlans_collected += 1
-                        except Exception as vlan_error:
-                            logger.error(f"Error inserting VLAN {vlan_id} for network {network_name}: {vlan_error}")
-                            conn.rollback()  # Rollback just this transaction
-                            cursor = conn.cursor()  # Get a new cursor after rollback
-                            continue
-                        
-                        # Store DHCP options
-                        if dhcp_options:
-                            for option in dhcp_options:
-                                cursor.execute("""
-                                    INSERT INTO network_dhcp_options (
-                                        network_id, vlan_id, code, type, value
-                                    ) VALUES (%s, %s, %s, %s, %s)
-                                    ON CONFLICT DO NOTHING
-                                """, (
-                                    network_id, vlan_id,
-                                    option.get('code'), option.get('type'), option.get('value')
-                                ))
-                                dhcp_options_collected += 1
-                
-                # Collect WAN ports
-                url = f"{BASE_URL}/networks/{network_id}/appliance/ports"
-                ports = make_api_request_simple(url, MERAKI_API_KEY)
+                # Collect VLANs and WAN ports; a failed call leaves the stored config untouched
+                vlans, vlan_headers = make_api_request(f"{BASE_URL}/networks/{network_id}/appliance/vlans", MERAKI_API_KEY)
+                ports, port_headers = make_api_request(f"{BASE_URL}/networks/{network_id}/appliance/ports", MERAKI_API_KEY)
+                if not vlan_headers or not port_headers:
+                    logger.warning(f"Could not fetch VLAN/port configuration for network {network_name}")
+                    continue
+                vlans = vlans if isinstance(vlans, list) else []
+                ports = ports if isinstance(ports, list) else []
                 
-                if ports and isinstance(ports, list):
-                    for port in ports:
-                        port_number = port.get('number')
-                        if port_number is None:
-                            continue
-                            
-                        cursor.execute("""
-                            INSERT INTO network_wan_ports (
-                                network_id, network_name, port_number,
-                                enabled, wan_enabled, access_policy,
-                                vlan, allowed_vlans
-                            ) VALUES (
-                                %s, %s, %s, %s, %s, %s, %s, %s
-                            )
-                            ON CONFLICT (network_id, port_number) DO UPDATE SET
-                                enabled = EXCLUDED.enabled,
-                                wan_enabled = EXCLUDED.wan_enabled,
-                                access_policy = EXCLUDED.access_policy,
-                                vlan = EXCLUDED.vlan,
-                                allowed_vlans = EXCLUDED.allowed_vlans,
-                                updated_at = CURRENT_TIMESTAMP
-                        """, (
-                            network_id, network_name, port_number,
-                            port.get('enabled', True), port.get('wanEnabled', 'not configured') == 'enabled',
-                            port.get('accessPolicy'), port.get('vlan'),
-                            port.get('allowedVlans')
-                        ))
-                        wan_ports_collected += 1
+                config_hash = hashlib.sha256(json.dumps(
+                    {'name': network_name, 'vlans': vlans, 'ports': ports},
+                    sort_keys=True, separators=(',', ':')
+                ).encode('utf-8')).hexdigest()
                 
+                changed = sync_state.get(network_id, (None,))[0] != config_hash
+                if changed:
+                    logger.info(f"Configuration changed for network {network_name}: "
+                               f"{len(vlans)} VLANs, {len(ports)} ports")
+                    changed_configs.append((network_id, network_name, vlans, ports))
+                sync_rows.append((network_id, network_name, config_hash, run_started, run_started,
+                                  run_started if changed else None))
                 networks_processed += 1
-                conn.commit()  # Commit after each network to prevent data loss
-                
-                # Rate limiting handled by adaptive make_api_request
                 
             except KeyboardInterrupt:
                 logger.info("\nKeyboard interrupt received during VLAN collection...")
                 raise
             except Exception as e:
                 logger.error(f"Error collecting VLAN data for network {network_name}: {e}")
-                conn.rollback()  # Rollback on error
-                cursor = conn.cursor()  # Get a new cursor after rollback
                 continue
+            
+            if len(sync_rows) >= CONFIG_WRITE_BATCH:
+                flush()
         
-        # Commit changes
-        conn.commit()
+        flush()
         
-        logger.info(f"VLAN/DHCP collection complete: {networks_processed} networks, "
+        logger.info(f"VLAN/DHCP collection complete: {networks_processed} networks fetched, "
+                   f"{networks_changed} changed, {len(skipped_ids)} skipped, "
                    f"{vlans_collected} VLANs, {dhcp_options_collected} DHCP options, "
-                   f"{wan_ports_collected} WAN ports")
+                   f"{wan_ports_collected} WAN ports written, {failed_batches} failed batches "
+                   f"({(datetime.utcnow() - run_started).total_seconds():.0f}s)")
         
         cursor.close()
-        return True
+        return failed_batches == 0
         
     except Exception as e:
         logger.error(f"Error in VLAN/DHCP collection: {e}")
@@ -1022,13 +1161,25 @@ def collect_vlan_dhcp_data(org_id, networks, conn):
         return False
 
 def collect_firewall_rules(org_id, networks, conn):
-    """Collect L3 firewall rules from all MX networks and store in database"""
+    """Collect L3 firewall rules from all MX networks and store in database
+    
+    Rulesets are canonicalized and hashed (firewall_rulesets.py). Each distinct ruleset
+    is stored once and networks reference it by hash; networks whose hash is unchanged
+    since the last run are skipped, so firewall_rules is only rewritten on change.
+    """
     try:
         cursor = conn.cursor()
+        cursor.execute(CREATE_RULESET_TABLES_SQL)
         
         # Track statistics
         networks_processed = 0
+        networks_changed = 0
         rules_collected = 0
+        unchanged_network_ids = []
+        
+        # Current ruleset hash per network from the last run
+        cursor.execute("SELECT network_id, network_name, ruleset_hash FROM network_firewall_rulesets")
+        known_rulesets = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
         
         # Filter networks with MX devices (that have firewall rules)
         mx_networks = []
@@ -1054,39 +1205,61 @@ def collect_firewall_rules(org_id, networks, conn):
                 
                 if response and isinstance(response, dict):
                     rules = response.get('rules', [])
+                    canonical_rules = canonicalize_rules(rules)
+                    rules_hash = ruleset_hash(canonical_rules)
+                    networks_processed += 1
+                    
+                    if known_rulesets.get(network_id) == (network_name, rules_hash):
+                        unchanged_network_ids.append(network_id)
+                        continue
+                    
+                    logger.info(f"Firewall ruleset changed for network {network_name}: "
+                               f"{len(rules)} rules, hash {rules_hash[:12]}")
+                    
+                    # Store the ruleset once, then point the network at it
+                    cursor.execute("""
+                        INSERT INTO firewall_rulesets (ruleset_hash, rules, rule_count)
+                        VALUES (%s, %s, %s)
+                        ON CONFLICT (ruleset_hash) DO UPDATE SET last_seen = NOW()
+                    """, (rules_hash, Json(canonical_rules), len(canonical_rules)))
+                    cursor.execute("""
+                        INSERT INTO network_firewall_rulesets (
+                            network_id, network_name, ruleset_hash, rule_count, changed_at, last_synced
+                        ) VALUES (%s, %s, %s, %s, NOW(), NOW())
+                        ON CONFLICT (network_id) DO UPDATE SET
+                            network_name = EXCLUDED.network_name,
+                            ruleset_hash = EXCLUDED.ruleset_hash,
+                            rule_count = EXCLUDED.rule_count,
+                            changed_at = CASE WHEN network_firewall_rulesets.ruleset_hash = EXCLUDED.ruleset_hash
+                                              THEN network_firewall_rulesets.changed_at ELSE NOW() END,
+                            last_synced = NOW()
+                    """, (network_id, network_name, rules_hash, len(canonical_rules)))
+                    networks_changed += 1
                     
                     if rules:
-                        logger.info(f"Found {len(rules)} firewall rules in network {network_name}")
-                        
-                        # Clear existing rules for this network
+                        # Replace the editable per-rule rows for this network
                         cursor.execute(
                             "DELETE FROM firewall_rules WHERE network_id = %s",
                             (network_id,)
                         )
                         
-                        # Insert new rules
-                        for i, rule in enumerate(rules):
-                            cursor.execute("""
-                                INSERT INTO firewall_rules (
-                                    network_id, network_name, rule_order, comment, policy,
-                                    protocol, src_port, src_cidr, dest_port, dest_cidr,
-                                    syslog_enabled, rule_type, is_template, template_source,
-                                    created_at, updated_at, last_synced
-                                ) VALUES (
-                                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                                    NOW(), NOW(), NOW()
-                                )
-                            """, (
-                                network_id, network_name, i + 1,
-                                rule.get('comment', ''), rule.get('policy', 'allow'),
-                                rule.get('protocol', 'any'), rule.get('srcPort', 'Any'),
-                                rule.get('srcCidr', 'Any'), rule.get('destPort', 'Any'),
-                                rule.get('destCidr', 'Any'), rule.get('syslogEnabled', False),
-                                'l3', False, None  # is_template=False for individual networks
-                            ))
-                            rules_collected += 1
-                
-                networks_processed += 1
+                        execute_values(cursor, """
+                            INSERT INTO firewall_rules (
+                                network_id, network_name, rule_order, comment, policy,
+                                protocol, src_port, src_cidr, dest_port, dest_cidr,
+                                syslog_enabled, rule_type, is_template, template_source,
+                                created_at, updated_at, last_synced
+                            ) VALUES %s
+                        """, [(
+                            network_id, network_name, i + 1,
+                            rule.get('comment', ''), rule.get('policy', 'allow'),
+                            rule.get('protocol', 'any'), rule.get('srcPort', 'Any'),
+                            rule.get('srcCidr', 'Any'), rule.get('destPort', 'Any'),
+                            rule.get('destCidr', 'Any'), rule.get('syslogEnabled', False),
+                            'l3', False, None  # is_template=False for individual networks
+                        ) for i, rule in enumerate(rules)],
+                        template='(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW(), NOW())')
+                        rules_collected += len(rules)
                 
                 # Rate limiting handled by adaptive make_api_request
                 
@@ -1097,11 +1270,26 @@ def collect_firewall_rules(org_id, networks, conn):
                 logger.error(f"Error collecting firewall rules for network {network_name}: {e}")
                 continue
         
+        # Unchanged networks only get their sync time bumped
+        if unchanged_network_ids:
+            cursor.execute("""
+                UPDATE network_firewall_rulesets SET last_synced = NOW()
+                WHERE network_id = ANY(%s)
+            """, (unchanged_network_ids,))
+            cursor.execute("""
+                UPDATE firewall_rulesets SET last_seen = NOW()
+                WHERE ruleset_hash IN (
+                    SELECT DISTINCT ruleset_hash FROM network_firewall_rulesets
+                    WHERE network_id = ANY(%s)
+                )
+            """, (unchanged_network_ids,))
+        
         # Commit changes
         conn.commit()
         
         logger.info(f"Firewall rules collection complete: {networks_processed} networks processed, "
-                   f"{rules_collected} rules collected")
+                   f"{networks_changed} changed, {len(unchanged_network_ids)} unchanged, "
+                   f"{rules_collected} rules written")
         
         cursor.close()
         return True
@@ -1124,6 +1312,7 @@ def main():
     logger.info("Starting Meraki MX Inventory collection with database integration")
     
     try:
+        begin_phase('fetch')
         org_id = get_organization_id()
         logger.info(f"Using Organization ID: {org_id}")
         
@@ -1166,6 +1355,7 @@ def main():
         logger.info(f"Processing all {len(networks)} networks")
         
         devices_processed = 0
+        begin_phase('devices')
         
         for net in networks:
             net_name = (net.get('name') or "").strip()
@@ -1264,6 +1454,7 @@ def main():
         
         # Collect VLAN and DHCP configurations
         logger.info("Starting VLAN/DHCP collection...")
+        begin_phase('vlan_dhcp')
         try:
             vlan_success = collect_vlan_dhcp_data(org_id, networks, conn)
             if vlan_success:
@@ -1273,8 +1464,21 @@ def main():
         except Exception as e:
             logger.error(f"Error collecting VLAN/DHCP data: {e}")
         
+        # Rebuild the cidr subnet index and /16, /24 rollups read by the subnets pages
+        begin_phase('subnet_index')
+        try:
+            cursor = conn.cursor()
+            subnets_updated = refresh_subnet_index(cursor)
+            conn.commit()
+            cursor.close()
+            logger.info(f"Subnet index refreshed: {subnets_updated} subnets updated")
+        except Exception as e:
+            logger.error(f"Error refreshing subnet index: {e}")
+            conn.rollback()
+        
         # Check for new stores that now have Meraki networks
         logger.info("Checking for new stores that now have Meraki networks...")
+        begin_phase('new_stores')
         try:
             cursor = conn.cursor()
             
@@ -1289,36 +1493,27 @@ def main():
             if active_new_stores:
                 logger.info(f"Checking {len(active_new_stores)} active new stores against Meraki networks")
                 
-                # Get all network names (strip and uppercase for comparison)
-                network_names_upper = set()
-                for net in networks:
-                    net_name = (net.get('name') or "").strip().upper()
-                    if net_name:
-                        network_names_upper.add(net_name)
+                # Index network names once; each store is then a hash lookup by name/store code
+                network_index = SiteNameIndex((net.get('name'), net.get('name')) for net in networks)
                 
-                stores_found = 0
+                found_stores = []
                 for store_id, site_name in active_new_stores:
-                    site_name_upper = site_name.upper()
-                    
-                    # Check if this store name appears in any network name
-                    found_in_meraki = False
-                    for net_name in network_names_upper:
-                        if site_name_upper in net_name:
-                            found_in_meraki = True
-                            break
-                    
-                    if found_in_meraki:
-                        # Update the store record - mark as found in Meraki
-                        cursor.execute("""
-                            UPDATE new_stores 
-                            SET is_active = FALSE, 
-                                meraki_network_found = TRUE, 
-                                meraki_found_date = NOW(),
-                                updated_at = NOW()
-                            WHERE id = %s
-                        """, (store_id,))
-                        stores_found += 1
-                        logger.info(f"New store '{site_name}' found in Meraki - deactivating from new stores list")
+                    matches = network_index.lookup(site_name)
+                    if matches:
+                        found_stores.append(store_id)
+                        logger.info(f"New store '{site_name}' found in Meraki as '{matches[0]}' - deactivating from new stores list")
+                
+                if found_stores:
+                    # Mark the stores as found in Meraki
+                    cursor.execute("""
+                        UPDATE new_stores 
+                        SET is_active = FALSE, 
+                            meraki_network_found = TRUE, 
+                            meraki_found_date = NOW(),
+                            updated_at = NOW()
+                        WHERE id = ANY(%s)
+                    """, (found_stores,))
+                stores_found = len(found_stores)
                 
                 if stores_found > 0:
                     logger.info(f"Deactivated {stores_found} new stores that now have Meraki networks")
@@ -1332,6 +1527,7 @@ def main():
         
         # Collect firewall rules from all MX networks
         logger.info("Starting firewall rules collection...")
+        begin_phase('firewall')
         try:
             firewall_success = collect_firewall_rules(org_id, networks, conn)
             if firewall_success:
@@ -1342,6 +1538,7 @@ def main():
             logger.error(f"Error collecting firewall rules: {e}")
         
         # Save IP cache to database for future use
+        begin_phase('write')
         if ip_cache:
             logger.info(f"Saving {len(ip_cache)} IP lookups to RDAP cache")
             cursor = conn.cursor()
@@ -1379,8 +1576,9 @@ def main():
 
 if __name__ == "__main__":
     try:
-        success = main()
-        sys.exit(0 if success else 1)
+        with JobRun('nightly_meraki_db'):
+            success = main()
+            sys.exit(0 if success else 1)
     except KeyboardInterrupt:
         logger.info("\nScript terminated by user")
         sys.exit(130)  # Standard exit code for Ctrl-C
\ No newline at end of file
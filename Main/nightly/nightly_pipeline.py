@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Nightly Pipeline Orchestrator
+=============================
+
+Runs the nightly jobs as one dependency graph instead of fixed cron offsets.
+A stage starts as soon as every stage it depends on has succeeded, so
+independent jobs (EOL, switch visibility) run alongside the DSR pull and
+Meraki collection, and enrichment never starts on a half-collected inventory.
+
+    dsr_pull            -> enablement, history
+    dsr_pull + meraki   -> enrichment
+    eol                 -> inventory
+    switch_visibility   (independent)
+
+Stages that call the Meraki dashboard API (meraki, switch_visibility, inventory)
+share the 'meraki_api' resource. Each has its own rate limiter sized for the whole
+~10 req/s org budget, so at most RESOURCE_LIMITS['meraki_api'] of them run at once.
+
+Each stage runs its existing script as a subprocess, appending to the same
+/var/log file the cron entry used. Per stage the orchestrator records status,
+exit code, duration and row counts (before/after) of the tables the stage writes
+in nightly_pipeline_runs / nightly_pipeline_stages.
+
+A stage whose dependency failed is marked 'blocked' and not run. --resume starts
+a new run linked to the latest run (if it failed) and skips every stage that
+already succeeded there, so only the failed stage and its dependents run again.
+
+Usage:
+    python3 nightly_pipeline.py                      # full pipeline
+    python3 nightly_pipeline.py --resume             # re-run failed/blocked stages of the latest run
+    python3 nightly_pipeline.py --only eol inventory # selected stages (dependencies assumed done)
+    python3 nightly_pipeline.py --dry-run            # print the execution plan
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import psycopg2
+from psycopg2.extras import Json
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('/var/log/nightly-pipeline.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+PYTHON = '/usr/bin/python3'
+SCRIPT_DIR = '/usr/local/bin/Main'
+MAX_PARALLEL = 4                # Stages running at once
+STAGE_TIMEOUT = 4 * 60 * 60     # Kill a stage after 4 hours
+
+# Stages holding the same resource never exceed its limit (Meraki allows ~10 req/s per org)
+RESOURCE_LIMITS = {
+    'meraki_api': 1
+}
+
+# name: script, log file (as in updated_crontab.txt), dependencies, shared resources,
+# tables counted before/after
+STAGES = {
+    'dsr_pull': {
+        'script': 'nightly_dsr_pull_db_with_override.py',
+        'log': '/var/log/dsr-pull-db.log',
+        'depends_on': [],
+        'tables': ['circuits']
+    },
+    'meraki': {
+        'script': 'nightly_meraki_db.py',
+        'log': '/var/log/meraki-mx-db.log',
+        'depends_on': [],
+        'resources': ['meraki_api'],
+        'tables': ['meraki_inventory']
+    },
+    'enrichment': {
+        'script': 'nightly_enriched_incremental_db.py',
+        'log': '/var/log/nightly-enriched-incremental-db.log',
+        'depends_on': ['dsr_pull', 'meraki'],
+        'tables': ['enriched_circuits']
+    },
+    'eol': {
+        'script': 'comprehensive_eol_tracker.py',
+        'log': '/var/log/enhanced-eol.log',
+        'depends_on': [],
+        'tables': ['meraki_eol_enhanced']
+    },
+    'switch_visibility': {
+        'script': 'nightly_switch_visibility_db.py',
+        'log': '/var/log/switch-visibility-db.log',
+        'depends_on': [],
+        'resources': ['meraki_api'],
+        'tables': ['switch_port_clients']
+    },
+    'inventory': {
+        'script': 'nightly_inventory_db.py',
+        'log': '/var/log/nightly-inventory-db.log',
+        'depends_on': ['eol'],
+        'resources': ['meraki_api'],
+        'tables': ['inventory_devices', 'inventory_summary']
+    },
+    'enablement': {
+        'script': 'nightly_enablement_db.py',
+        'log': '/var/log/nightly-enablement-db.log',
+        'depends_on': ['dsr_pull'],
+        'tables': ['daily_enablements']
+    },
+    'history': {
+        'script': 'nightly_circuit_history.py',
+        'log': '/var/log/circuit-history.log',
+        'depends_on': ['dsr_pull'],
+        'tables': ['circuit_history']
+    }
+}
+
+CREATE_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS nightly_pipeline_runs (
+        id SERIAL PRIMARY KEY,
+        started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        finished_at TIMESTAMP,
+        status VARCHAR(20) NOT NULL DEFAULT 'running',
+        resumed_from INTEGER REFERENCES nightly_pipeline_runs(id),
+        stages_requested TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS nightly_pipeline_stages (
+        id SERIAL PRIMARY KEY,
+        run_id INTEGER NOT NULL REFERENCES nightly_pipeline_runs(id) ON DELETE CASCADE,
+        stage VARCHAR(50) NOT NULL,
+        script VARCHAR(255),
+        status VARCHAR(20) NOT NULL,
+        exit_code INTEGER,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        duration_seconds NUMERIC(10, 2),
+        rows_before JSONB,
+        rows_after JSONB,
+        rows_changed INTEGER,
+        error TEXT,
+        UNIQUE (run_id, stage)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_nightly_pipeline_stages_stage
+        ON nightly_pipeline_stages(stage, started_at DESC);
+"""
+
+def get_db_connection():
+    """Get database connection using config"""
+    return psycopg2.connect(Config.SQLALCHEMY_DATABASE_URI)
+
+def validate_graph(stages):
+    """Topological order of the stages; raises ValueError on unknown or cyclic dependencies"""
+    order = []
+    state = {}  # name -> 'visiting' | 'done'
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+        state[name] = 'visiting'
+        for dep in stages[name]['depends_on']:
+            if dep not in stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+            visit(dep, path + [name])
+        state[name] = 'done'
+        order.append(name)
+
+    for name in stages:
+        visit(name, [])
+    return order
+
+def count_rows(conn, tables):
+    """Row count per table; None for a table that does not exist (yet)"""
+    counts = {}
+    with conn.cursor() as cursor:
+        for table in tables:
+            cursor.execute("SELECT to_regclass(%s)", (table,))
+            if cursor.fetchone()[0] is None:
+                counts[table] = None
+                continue
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+    conn.commit()
+    return counts
+
+def rows_changed(before, after):
+    """Net row change across a stage's tables"""
+    return sum((after.get(table) or 0) - (before.get(table) or 0) for table in after)
+
+class PipelineRecorder:
+    """Writes runs and stage results; one connection, used from the main thread only"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_TABLES_SQL)
+        conn.commit()
+
+    def last_failed_run(self):
+        """(run_id, {stage: status}) of the latest run if it failed, or (None, {})"""
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, status FROM nightly_pipeline_runs
+                ORDER BY started_at DESC LIMIT 1
+            """)
+            row = cursor.fetchone()
+            if not row or row[1] != 'failed':
+                return None, {}
+            cursor.execute("""
+                SELECT stage, status FROM nightly_pipeline_stages WHERE run_id = %s
+            """, (row[0],))
+            return row[0], dict(cursor.fetchall())
+
+    def start_run(self, stages, resumed_from=None):
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO nightly_pipeline_runs (resumed_from, stages_requested)
+                VALUES (%s, %s) RETURNING id
+            """, (resumed_from, ','.join(stages)))
+            run_id = cursor.fetchone()[0]
+        self.conn.commit()
+        return run_id
+
+    def record_stage(self, run_id, name, result):
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO nightly_pipeline_stages
+                    (run_id, stage, script, status, exit_code, started_at, finished_at,
+                     duration_seconds, rows_before, rows_after, rows_changed, error)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s::jsonb, %s, %s)
+                ON CONFLICT (run_id, stage) DO UPDATE SET
+                    status = EXCLUDED.status,
+                    exit_code = EXCLUDED.exit_code,
+                    started_at = EXCLUDED.started_at,
+                    finished_at = EXCLUDED.finished_at,
+                    duration_seconds = EXCLUDED.duration_seconds,
+                    rows_before = EXCLUDED.rows_before,
+                    rows_after = EXCLUDED.rows_after,
+                    rows_changed = EXCLUDED.rows_changed,
+                    error = EXCLUDED.error
+            """, (
+                run_id, name, STAGES[name]['script'], result['status'], result.get('exit_code'),
+                result.get('started_at'), result.get('finished_at'), result.get('duration'),
+                Json(result['rows_before']) if result.get('rows_before') is not None else None,
+                Json(result['rows_after']) if result.get('rows_after') is not None else None,
+                result.get('rows_changed'), result.get('error')
+            ))
+        self.conn.commit()
+
+    def finish_run(self, run_id, status):
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE nightly_pipeline_runs
+                SET status = %s, finished_at = NOW()
+                WHERE id = %s
+            """, (status, run_id))
+        self.conn.commit()
+
+def run_stage(name, run_id, script_dir, timeout):
+    """Run one stage's script, appending its output to the stage log. Called from worker threads."""
+    stage = STAGES[name]
+    script = os.path.join(script_dir, stage['script'])
+    started_at = datetime.now()
+    started = time.perf_counter()
+    result = {'status': 'failed', 'exit_code': None, 'error': None, 'started_at': started_at}
+
+    try:
+        with open(stage['log'], 'a') as log_file:
+            log_file.write(f"\n===== nightly_pipeline stage '{name}' started {started_at} =====\n")
+            log_file.flush()
+            process = subprocess.run(
+                [PYTHON, script],
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                cwd=os.path.dirname(script),
+                env=dict(os.environ, NIGHTLY_PIPELINE_RUN_ID=str(run_id)),  # links job_ledger runs
+                timeout=timeout
+            )
+        result['exit_code'] = process.returncode
+        if process.returncode == 0:
+            result['status'] = 'succeeded'
+        else:
+            result['error'] = f"exit code {process.returncode} (see {stage['log']})"
+    except subprocess.TimeoutExpired:
+        result['error'] = f"timed out after {timeout}s"
+    except Exception as e:
+        result['error'] = str(e)
+
+    result['finished_at'] = datetime.now()
+    result['duration'] = round(time.perf_counter() - started, 2)
+    return result
+
+class Pipeline:
+    """
+    Runs the stage graph
+
+    Args:
+        selected: stages to run this time (others are treated as already done)
+        skip: stages already succeeded in the run being resumed
+    """
+
+    def __init__(self, recorder, selected, skip=(), script_dir=SCRIPT_DIR,
+                 max_parallel=MAX_PARALLEL, timeout=STAGE_TIMEOUT):
+        self.recorder = recorder
+        self.selected = [name for name in validate_graph(STAGES) if name in selected]
+        self.skip = set(skip)
+        self.script_dir = script_dir
+        self.max_parallel = max_parallel
+        self.timeout = timeout
+        self.status = {}
+
+    def dependencies(self, name):
+        """Dependencies that are part of this run (unselected ones are assumed done)"""
+        return [dep for dep in STAGES[name]['depends_on'] if dep in self.selected]
+
+    @staticmethod
+    def resources_available(name, running_names):
+        """True if starting `name` keeps every shared resource within RESOURCE_LIMITS"""
+        for resource in STAGES[name].get('resources', []):
+            in_use = sum(1 for other in running_names if resource in STAGES[other].get('resources', []))
+            if in_use >= RESOURCE_LIMITS.get(resource, 1):
+                return False
+        return True
+
+    def run(self, run_id):
+        """Run every selected stage; returns True when none failed or was blocked"""
+        pending = []
+        for name in self.selected:
+            if name in self.skip:
+                self.status[name] = 'skipped'
+                self.recorder.record_stage(run_id, name, {'status': 'skipped'})
+                logger.info(f"⏭️  {name}: succeeded in the resumed run, skipping")
+            else:
+                pending.append(name)
+
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            while pending or running:
+                for name in list(pending):
+                    deps = [self.status.get(dep) for dep in self.dependencies(name)]
+                    if any(dep in ('failed', 'blocked') for dep in deps):
+                        pending.remove(name)
+                        self.status[name] = 'blocked'
+                        failed = [dep for dep in self.dependencies(name) if self.status[dep] in ('failed', 'blocked')]
+                        self.recorder.record_stage(run_id, name, {
+                            'status': 'blocked',
+                            'error': f"dependency failed: {', '.join(failed)}"
+                        })
+                        logger.warning(f"⛔ {name}: blocked by {', '.join(failed)}")
+                    elif (all(dep in ('succeeded', 'skipped') for dep in deps)
+                          and len(running) < self.max_parallel
+                          and self.resources_available(name, [other for other, _ in running.values()])):
+                        pending.remove(name)
+                        rows_before = count_rows(self.recorder.conn, STAGES[name]['tables'])
+                        self.status[name] = 'running'
+                        self.recorder.record_stage(run_id, name, {
+                            'status': 'running', 'started_at': datetime.now(), 'rows_before': rows_before
+                        })
+                        logger.info(f"▶️  {name}: starting {STAGES[name]['script']}")
+                        future = executor.submit(run_stage, name, run_id, self.script_dir, self.timeout)
+                        running[future] = (name, rows_before)
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, rows_before = running.pop(future)
+                    result = future.result()
+                    result['rows_before'] = rows_before
+                    try:
+                        result['rows_after'] = count_rows(self.recorder.conn, STAGES[name]['tables'])
+                        result['rows_changed'] = rows_changed(rows_before, result['rows_after'])
+                    except psycopg2.Error as e:
+                        self.recorder.conn.rollback()
+                        logger.warning(f"{name}: row count failed: {e}")
+                    self.status[name] = result['status']
+                    self.recorder.record_stage(run_id, name, result)
+                    if result['status'] == 'succeeded':
+                        logger.info(f"✅ {name}: {result['duration']}s, rows {rows_before} -> {result.get('rows_after')}")
+                    else:
+                        logger.error(f"❌ {name}: {result['error']} after {result['duration']}s")
+
+        return all(status in ('succeeded', 'skipped') for status in self.status.values())
+
+def print_plan(selected, skip):
+    """Dependency levels: stages on one level can run in parallel"""
+    level = {}
+    for name in validate_graph(STAGES):
+        if name in selected:
+            deps = [dep for dep in STAGES[name]['depends_on'] if dep in selected]
+            level[name] = max((level[dep] + 1 for dep in deps), default=0)
+    for number in sorted(set(level.values())):
+        names = [
+            f"{name}{' (skip)' if name in skip else ''}"
+            for name in level if level[name] == number
+        ]
+        print(f"  level {number}: {', '.join(names)}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the nightly jobs as a dependency graph')
+    parser.add_argument('--resume', action='store_true', help='Re-run only what failed or was blocked in the latest run')
+    parser.add_argument('--only', nargs='+', choices=list(STAGES), help='Run only these stages')
+    parser.add_argument('--max-parallel', type=int, default=MAX_PARALLEL, help='Stages running at once')
+    parser.add_argument('--script-dir', default=SCRIPT_DIR, help='Directory containing the nightly scripts')
+    parser.add_argument('--timeout', type=int, default=STAGE_TIMEOUT, help='Per-stage timeout in seconds')
+    parser.add_argument('--dry-run', action='store_true', help='Print the execution plan and exit')
+    args = parser.parse_args()
+
+    selected = args.only or list(STAGES)
+    validate_graph(STAGES)
+
+    conn = get_db_connection()
+    try:
+        recorder = PipelineRecorder(conn)
+
+        resumed_from, skip = None, set()
+        if args.resume:
+            resumed_from, previous = recorder.last_failed_run()
+            if resumed_from is None:
+                logger.info("Latest pipeline run did not fail; nothing to resume")
+                return True
+            skip = {name for name, status in previous.items() if status in ('succeeded', 'skipped')}
+            if not args.only:
+                selected = list(previous) or selected
+            logger.info(f"Resuming run {resumed_from}: skipping {', '.join(sorted(skip)) or 'nothing'}")
+
+        if args.dry_run:
+            print("Execution plan:")
+            print_plan(selected, skip)
+            return True
+
+        run_id = recorder.start_run(selected, resumed_from)
+        logger.info(f"🚀 Nightly pipeline run {run_id} started ({len(selected)} stages, max {args.max_parallel} parallel)")
+        started = time.perf_counter()
+
+        pipeline = Pipeline(recorder, selected, skip, args.script_dir, args.max_parallel, args.timeout)
+        success = pipeline.run(run_id)
+        recorder.finish_run(run_id, 'succeeded' if success else 'failed')
+
+        logger.info(f"{'✅' if success else '❌'} Nightly pipeline run {run_id} finished in "
+                    f"{time.perf_counter() - started:.0f}s: "
+                    + ', '.join(f"{name}={status}" for name, status in pipeline.status.items()))
+        if not success:
+            logger.info("Re-run failed stages with: nightly_pipeline.py --resume")
+        return success
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
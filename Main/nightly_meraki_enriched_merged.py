@@ -18,12 +18,16 @@ from dotenv import load_dotenv
 from datetime import datetime, timezone
 from thefuzz import fuzz
 import psycopg2
-from psycopg2.extras import execute_values, execute_batch
+from psycopg2.extras import execute_values, execute_batch, Json
 import logging
 
 # Add the test directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from site_classification import classify_site
+from site_name_index import SiteNameIndex
+from subnet_index import refresh_subnet_index
+from firewall_rulesets import CREATE_RULESET_TABLES_SQL, canonicalize_rules, ruleset_hash
 
 # Get database URI from config
 SQLALCHEMY_DATABASE_URI = Config.SQLALCHEMY_DATABASE_URI
@@ -760,9 +764,9 @@ def store_device_in_db(device_data, conn):
             wan1_provider_label, wan1_speed_label,
             wan2_ip, wan2_assignment, wan2_arin_provider, wan2_provider_comparison,
             wan2_provider_label, wan2_speed_label,
-            last_updated
+            site_class, last_updated
         ) VALUES (
-            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
         )
         ON CONFLICT (device_serial) DO UPDATE SET
             organization_name = EXCLUDED.organization_name,
@@ -784,6 +788,7 @@ def store_device_in_db(device_data, conn):
             wan2_provider_comparison = EXCLUDED.wan2_provider_comparison,
             wan2_provider_label = EXCLUDED.wan2_provider_label,
             wan2_speed_label = EXCLUDED.wan2_speed_label,
+            site_class = EXCLUDED.site_class,
             last_updated = EXCLUDED.last_updated
         """
         
@@ -812,6 +817,7 @@ def store_device_in_db(device_data, conn):
             wan2_data.get("provider_comparison", ""),
             wan2_data.get("provider_label", ""),
             wan2_data.get("speed", ""),
+            classify_site(device_data["device_tags"]),
             datetime.now(timezone.utc)
         ))
         
@@ -1002,13 +1008,25 @@ def collect_vlan_dhcp_data(org_id, networks, conn):
         return False
 
 def collect_firewall_rules(org_id, networks, conn):
-    """Collect L3 firewall rules from all MX networks and store in database"""
+    """Collect L3 firewall rules from all MX networks and store in database
+    
+    Rulesets are canonicalized and hashed (firewall_rulesets.py). Each distinct ruleset
+    is stored once and networks reference it by hash; networks whose hash is unchanged
+    since the last run are skipped, so firewall_rules is only rewritten on change.
+    """
     try:
         cursor = conn.cursor()
+        cursor.execute(CREATE_RULESET_TABLES_SQL)
         
         # Track statistics
         networks_processed = 0
+        networks_changed = 0
         rules_collected = 0
+        unchanged_network_ids = []
+        
+        # Current ruleset hash per network from the last run
+        cursor.execute("SELECT network_id, network_name, ruleset_hash FROM network_firewall_rulesets")
+        known_rulesets = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
         
         # Filter networks with MX devices (that have firewall rules)
         mx_networks = []
@@ -1034,39 +1052,61 @@ def collect_firewall_rules(org_id, networks, conn):
                 
                 if response and isinstance(response, dict):
                     rules = response.get('rules', [])
+                    canonical_rules = canonicalize_rules(rules)
+                    rules_hash = ruleset_hash(canonical_rules)
+                    networks_processed += 1
+                    
+                    if known_rulesets.get(network_id) == (network_name, rules_hash):
+                        unchanged_network_ids.append(network_id)
+                        continue
+                    
+                    logger.info(f"Firewall ruleset changed for network {network_name}: "
+                               f"{len(rules)} rules, hash {rules_hash[:12]}")
+                    
+                    # Store the ruleset once, then point the network at it
+                    cursor.execute("""
+                        INSERT INTO firewall_rulesets (ruleset_hash, rules, rule_count)
+                        VALUES (%s, %s, %s)
+                        ON CONFLICT (ruleset_hash) DO UPDATE SET last_seen = NOW()
+                    """, (rules_hash, Json(canonical_rules), len(canonical_rules)))
+                    cursor.execute("""
+                        INSERT INTO network_firewall_rulesets (
+                            network_id, network_name, ruleset_hash, rule_count, changed_at, last_synced
+                        ) VALUES (%s, %s, %s, %s, NOW(), NOW())
+                        ON CONFLICT (network_id) DO UPDATE SET
+                            network_name = EXCLUDED.network_name,
+                            ruleset_hash = EXCLUDED.ruleset_hash,
+                            rule_count = EXCLUDED.rule_count,
+                            changed_at = CASE WHEN network_firewall_rulesets.ruleset_hash = EXCLUDED.ruleset_hash
+                                              THEN network_firewall_rulesets.changed_at ELSE NOW() END,
+                            last_synced = NOW()
+                    """, (network_id, network_name, rules_hash, len(canonical_rules)))
+                    networks_changed += 1
                     
                     if rules:
-                        logger.info(f"Found {len(rules)} firewall rules in network {network_name}")
-                        
-                        # Clear existing rules for this network
+                        # Replace the editable per-rule rows for this network
                         cursor.execute(
                             "DELETE FROM firewall_rules WHERE network_id = %s",
                             (network_id,)
                         )
                         
-                        # Insert new rules
-                        for i, rule in enumerate(rules):
-                            cursor.execute("""
-                                INSERT INTO firewall_rules (
-                                    network_id, network_name, rule_order, comment, policy,
-                                    protocol, src_port, src_cidr, dest_port, dest_cidr,
-                                    syslog_enabled, rule_type, is_template, template_source,
-                                    created_at, updated_at, last_synced
-                                ) VALUES (
-                                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                                    NOW(), NOW(), NOW()
-                                )
-                            """, (
-                                network_id, network_name, i + 1,
-                                rule.get('comment', ''), rule.get('policy', 'allow'),
-                                rule.get('protocol', 'any'), rule.get('srcPort', 'Any'),
-                                rule.get('srcCidr', 'Any'), rule.get('destPort', 'Any'),
-                                rule.get('destCidr', 'Any'), rule.get('syslogEnabled', False),
-                                'l3', False, None  # is_template=False for individual networks
-                            ))
-                            rules_collected += 1
-                
-                networks_processed += 1
+                        execute_values(cursor, """
+                            INSERT INTO firewall_rules (
+                                network_id, network_name, rule_order, comment, policy,
+                                protocol, src_port, src_cidr, dest_port, dest_cidr,
+                                syslog_enabled, rule_type, is_template, template_source,
+                                created_at, updated_at, last_synced
+                            ) VALUES %s
+                        """, [(
+                            network_id, network_name, i + 1,
+                            rule.get('comment', ''), rule.get('policy', 'allow'),
+                            rule.get('protocol', 'any'), rule.get('srcPort', 'Any'),
+                            rule.get('srcCidr', 'Any'), rule.get('destPort', 'Any'),
+                            rule.get('destCidr', 'Any'), rule.get('syslogEnabled', False),
+                            'l3', False, None  # is_template=False for individual networks
+                        ) for i, rule in enumerate(rules)],
+                        template='(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW(), NOW())')
+                        rules_collected += len(rules)
                 
                 # Rate limiting handled by adaptive make_api_request
                 
@@ -1077,11 +1117,26 @@ def collect_firewall_rules(org_id, networks, conn):
                 logger.error(f"Error collecting firewall rules for network {network_name}: {e}")
                 continue
         
+        # Unchanged networks only get their sync time bumped
+        if unchanged_network_ids:
+            cursor.execute("""
+                UPDATE network_firewall_rulesets SET last_synced = NOW()
+                WHERE network_id = ANY(%s)
+            """, (unchanged_network_ids,))
+            cursor.execute("""
+                UPDATE firewall_rulesets SET last_seen = NOW()
+                WHERE ruleset_hash IN (
+                    SELECT DISTINCT ruleset_hash FROM network_firewall_rulesets
+                    WHERE network_id = ANY(%s)
+                )
+            """, (unchanged_network_ids,))
+        
         # Commit changes
         conn.commit()
         
         logger.info(f"Firewall rules collection complete: {networks_processed} networks processed, "
-                   f"{rules_collected} rules collected")
+                   f"{networks_changed} changed, {len(unchanged_network_ids)} unchanged, "
+                   f"{rules_collected} rules written")
         
         cursor.close()
         return True
@@ -1789,6 +1844,17 @@ def main():
         except Exception as e:
             logger.error(f"Error collecting VLAN/DHCP data: {e}")
         
+        # Rebuild the cidr subnet index and /16, /24 rollups read by the subnets pages
+        try:
+            cursor = conn.cursor()
+            subnets_updated = refresh_subnet_index(cursor)
+            conn.commit()
+            cursor.close()
+            logger.info(f"Subnet index refreshed: {subnets_updated} subnets updated")
+        except Exception as e:
+            logger.error(f"Error refreshing subnet index: {e}")
+            conn.rollback()
+        
         # Check for new stores that now have Meraki networks
         logger.info("Checking for new stores that now have Meraki networks...")
         try:
@@ -1805,36 +1871,27 @@ def main():
             if active_new_stores:
                 logger.info(f"Checking {len(active_new_stores)} active new stores against Meraki networks")
                 
-                # Get all network names (strip and uppercase for comparison)
-                network_names_upper = set()
-                for net in networks:
-                    net_name = (net.get('name') or "").strip().upper()
-                    if net_name:
-                        network_names_upper.add(net_name)
+                # Index network names once; each store is then a hash lookup by name/store code
+                network_index = SiteNameIndex((net.get('name'), net.get('name')) for net in networks)
                 
-                stores_found = 0
+                found_stores = []
                 for store_id, site_name in active_new_stores:
-                    site_name_upper = site_name.upper()
-                    
-                    # Check if this store name appears in any network name
-                    found_in_meraki = False
-                    for net_name in network_names_upper:
-                        if site_name_upper in net_name:
-                            found_in_meraki = True
-                            break
-                    
-                    if found_in_meraki:
-                        # Update the store record - mark as found in Meraki
-                        cursor.execute("""
-                            UPDATE new_stores 
-                            SET is_active = FALSE, 
-                                meraki_network_found = TRUE, 
-                                meraki_found_date = NOW(),
-                                updated_at = NOW()
-                            WHERE id = %s
-                        """, (store_id,))
-                        stores_found += 1
-                        logger.info(f"New store '{site_name}' found in Meraki - deactivating from new stores list")
+                    matches = network_index.lookup(site_name)
+                    if matches:
+                        found_stores.append(store_id)
+                        logger.info(f"New store '{site_name}' found in Meraki as '{matches[0]}' - deactivating from new stores list")
+                
+                if found_stores:
+                    # Mark the stores as found in Meraki
+                    cursor.execute("""
+                        UPDATE new_stores 
+                        SET is_active = FALSE, 
+                            meraki_network_found = TRUE, 
+                            meraki_found_date = NOW(),
+                            updated_at = NOW()
+                        WHERE id = ANY(%s)
+                    """, (found_stores,))
+                stores_found = len(found_stores)
                 
                 if stores_found > 0:
                     logger.info(f"Deactivated {stores_found} new stores that now have Meraki networks")
@@ -0,0 +1,1136 @@
+"""
+MAC ADDRESS MANUFACTURER LOOKUP (IEEE OUI / MA-M / MA-S)
+=======================================================
+
+Purpose:
+    - Resolve MAC addresses to manufacturers from the IEEE registries
+    - Longest-prefix match across MA-S (36-bit), MA-M (28-bit) and MA-L/OUI (24-bit)
+    - Vectorized bulk lookup for enriching switch_port_clients in one pass
+
+Registry Files (offline, in Config.OUI_REGISTRY_DIR):
+    - oui.csv    MA-L assignments (https://standards-oui.ieee.org/oui/oui.csv)
+    - mam.csv    MA-M assignments (https://standards-oui.ieee.org/oui28/mam.csv)
+    - oui36.csv  MA-S assignments (https://standards-oui.ieee.org/oui36/oui36.csv)
+    Any missing file is skipped. The parsed index is cached as oui_index.npz next to
+    the registry files and rebuilt when a registry file is newer than the cache.
+
+Index:
+    One sorted numpy array of prefixes per prefix length plus a parallel array of
+    vendor ids. Lookups use searchsorted, longest prefix first. The index is built
+    once per process (get_oui_index()).
+
+Usage:
+    python3 oui_lookup.py --build              # parse registry files, write cache
+    python3 oui_lookup.py --lookup 00:18:0a:12:34:56
+    python3 oui_lookup.py --enrich             # bulk update switch_port_clients.manufacturer
+
+Used By:
+    - switch_visibility.py (get_mac_manufacturer)
+    - nightly_switch_visibility_db.py
+"""
+
+import os
+import re
+import csv
+import time
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_MANUFACTURER = 'Unknown'
+
+# Registry file name -> prefix length in bits
+REGISTRY_FILES = (
+    ('oui36.csv', 36),  # MA-S
+    ('mam.csv', 28),    # MA-M
+    ('oui.csv', 24),    # MA-L
+)
+INDEX_CACHE_FILE = 'oui_index.npz'
+
+MAC_BITS = 48
+NON_HEX = re.compile(r'[^0-9a-fA-F]')
+
+# Hand-maintained prefixes used before the IEEE registry was imported. They are
+# merged into the index as 24-bit entries wherever the registry has no entry, so
+# lookups never regress when the registry files are missing.
+FALLBACK_OUI_PREFIXES = {
+    '00:18:0a': 'Cisco Meraki',
+    '00:23:ac': 'Cisco',
+    '00:0c:29': 'VMware',
+    'f4:ce:46': 'HP',
+    '00:50:56': 'VMware',
+    '00:1b:21': 'Intel',
+    '00:15:5d': 'Microsoft',
+    '00:0d:3a': 'Microsoft',
+    '00:17:88': 'Philips',
+    '00:1a:a0': 'Dell',
+    '00:21:9b': 'Dell',
+    '00:22:19': 'Dell',
+    '00:24:e8': 'Dell',
+    '00:25:64': 'Dell',
+    '98:90:96': 'Dell',
+    'b0:83:fe': 'Dell',
+    'd0:94:66': 'Dell',
+    'f8:b1:56': 'HP',
+    'f8:bc:12': 'Dell',
+    '00:08:74': 'Dell',
+    '00:0b:db': 'Dell',
+    '00:0f:1f': 'Dell',
+    '00:11:43': 'Dell',
+    '00:12:3f': 'Dell',
+    '00:13:72': 'Dell',
+    '00:14:22': 'Dell',
+    '00:15:c5': 'Dell',
+    '00:16:f0': 'Dell',
+    '00:18:8b': 'Dell',
+    '00:19:b9': 'Dell',
+    '00:1c:23': 'Dell',
+    '00:1d:09': 'Dell',
+    '00:1e:4f': 'Dell',
+    '00:1e:c9': 'Dell',
+    '00:21:70': 'Dell',
+    '00:23:ae': 'Dell',
+    '14:b3:1f': 'Dell',
+    '18:03:73': 'Dell',
+    '18:66:da': 'Dell',
+    '1c:40:24': 'Dell',
+    '20:04:0f': 'Dell',
+    '24:6e:96': 'Dell',
+    '28:f1:0e': 'Dell',
+    '34:17:eb': 'Dell',
+    '44:a8:42': 'Dell',
+    '50:9a:4c': 'Dell',
+    '54:9f:35': 'Dell',
+    '5c:f9:dd': 'Dell',
+    '74:86:7a': 'Dell',
+    '74:e6:e2': 'Dell',
+    '78:2b:cb': 'Dell',
+    '84:2b:2b': 'Dell',
+    '84:7b:eb': 'Dell',
+    '90:b1:1c': 'Dell',
+    'a4:1f:72': 'Dell',
+    'a4:ba:db': 'Dell',
+    'b8:2a:72': 'Dell',
+    'b8:ac:6f': 'Dell',
+    'bc:30:5b': 'Dell',
+    'd0:67:e5': 'Dell',
+    'd4:81:d7': 'Dell',
+    'd4:ae:52': 'Dell',
+    'e0:db:55': 'Dell',
+    'ec:f4:bb': 'Dell',
+    'f0:1f:af': 'Dell',
+    'f4:8e:38': 'Dell',
+    'f8:db:88': 'Dell',
+    '5c:26:0a': 'HP',
+    '3c:d9:2b': 'HP',
+    '94:57:a5': 'HP',
+    'fc:15:b4': 'HP',
+    '70:5a:0f': 'HP',
+    '00:21:5a': 'HP',
+    '00:23:7d': 'HP',
+    '00:25:b3': 'HP',
+    '1c:98:ec': 'HP',
+    '2c:27:d7': 'HP',
+    '40:b0:34': 'HP',
+    '64:51:06': 'HP',
+    '78:e7:d1': 'HP',
+    'a0:b3:cc': 'HP',
+    'b4:b5:2f': 'HP',
+    'c4:34:6b': 'HP',
+    'd8:9d:67': 'HP',
+    'ec:8e:b5': 'HP',
+    'c8:cb:b8': 'HP',
+    '30:e1:71': 'HP',
+    '00:30:c1': 'HP',
+    '00:1b:78': 'HP',
+    '00:1e:0b': 'HP',
+    'd4:c9:ef': 'HP',
+    '00:9c:02': 'HP',
+    '68:b5:99': 'HP',
+    '38:63:bb': 'HP',
+    '9c:8e:99': 'HP',
+    'a0:8c:fd': 'HP',
+    'a0:d3:c1': 'HP',
+    'ac:16:2d': 'HP',
+    '3c:52:82': 'HP',
+    '00:0a:57': 'HP',
+    'ec:b1:d7': 'HP',
+    '10:60:4b': 'HP',
+    '00:17:08': 'HP',
+    '00:1a:4b': 'HP',
+    '00:1f:29': 'HP',
+    '00:24:81': 'HP',
+    'f0:92:1c': 'HP',
+    '00:50:8b': 'HP',
+    '08:00:09': 'HP',
+    '00:01:e6': 'HP',
+    '00:02:a5': 'HP',
+    '00:04:ea': 'HP',
+    '00:08:02': 'HP',
+    '00:08:83': 'HP',
+    '00:10:83': 'HP',
+    '00:10:e3': 'HP',
+    '00:11:0a': 'HP',
+    '00:11:85': 'HP',
+    '00:12:79': 'HP',
+    '00:13:21': 'HP',
+    '00:14:38': 'HP',
+    '00:14:c2': 'HP',
+    '00:15:60': 'HP',
+    '00:16:35': 'HP',
+    '00:18:fe': 'HP',
+    '00:19:bb': 'HP',
+    '00:1b:3f': 'HP',
+    '00:1c:2e': 'HP',
+    '00:1c:c4': 'HP',
+    '00:1d:73': 'HP',
+    '00:1f:fe': 'HP',
+    '00:22:64': 'HP',
+    '00:25:61': 'HP',
+    '00:26:55': 'HP',
+    '00:26:f1': 'HP',
+    '00:30:6e': 'HP',
+    '00:40:17': 'HP',
+    '00:60:b0': 'HP',
+    '00:80:a0': 'HP',
+    '08:2e:5f': 'HP',
+    '18:a9:05': 'HP',
+    '1c:c1:de': 'HP',
+    '28:92:4a': 'HP',
+    '2c:23:3a': 'HP',
+    '2c:41:38': 'HP',
+    '2c:59:e5': 'HP',
+    '2c:76:8a': 'HP',
+    '30:8d:99': 'HP',
+    '3c:4a:92': 'HP',
+    '3c:a8:2a': 'HP',
+    '48:0f:cf': 'HP',
+    '48:df:37': 'HP',
+    '4c:39:09': 'HP',
+    '50:65:f3': 'HP',
+    '58:20:b1': 'HP',
+    '5c:8a:38': 'HP',
+    '5c:b9:01': 'HP',
+    '64:31:50': 'HP',
+    '6c:3b:e5': 'HP',
+    '6c:c2:17': 'HP',
+    '74:46:a0': 'HP',
+    '78:0c:b8': 'HP',
+    '78:48:59': 'HP',
+    '78:ac:c0': 'HP',
+    '78:e3:b5': 'HP',
+    '80:01:84': 'HP',
+    '80:c1:6e': 'HP',
+    '80:ce:62': 'HP',
+    '80:e8:2c': 'HP',
+    '84:34:97': 'HP',
+    '88:51:fb': 'HP',
+    '88:b1:11': 'HP',
+    '8c:dc:d4': 'HP',
+    '90:1b:0e': 'HP',
+    '90:e7:c4': 'HP',
+    '94:18:82': 'HP',
+    '98:4b:e1': 'HP',
+    '98:e7:f4': 'HP',
+    '9c:b6:54': 'HP',
+    '9c:dc:71': 'HP',
+    'a0:1d:48': 'HP',
+    'a0:2b:b8': 'HP',
+    'a0:48:1c': 'HP',
+    'a4:5d:36': 'HP',
+    'a8:bd:27': 'HP',
+    'ac:b3:13': 'HP',
+    'b0:5a:da': 'HP',
+    'b4:99:ba': 'HP',
+    'b8:af:67': 'HP',
+    'bc:ea:fa': 'HP',
+    'c0:91:34': 'HP',
+    'c8:b5:ad': 'HP',
+    'c8:d3:ff': 'HP',
+    'd0:7e:28': 'HP',
+    'd0:bf:9c': 'HP',
+    'd4:85:64': 'HP',
+    'd8:b1:2a': 'HP',
+    'd8:d3:85': 'HP',
+    'dc:4a:3e': 'HP',
+    'e0:07:1b': 'HP',
+    'e4:11:5b': 'HP',
+    'e8:39:35': 'HP',
+    'e8:b2:ac': 'HP',
+    'e8:f7:24': 'HP',
+    'ec:eb:b8': 'HP',
+    'f4:03:43': 'HP',
+    'f4:39:09': 'HP',
+    'fc:3f:db': 'HP',
+    '00:1f:f3': 'Apple',
+    '00:23:32': 'Apple',
+    '00:23:df': 'Apple',
+    '00:25:4b': 'Apple',
+    '00:25:bc': 'Apple',
+    '00:26:08': 'Apple',
+    '00:26:4a': 'Apple',
+    '00:26:b0': 'Apple',
+    '00:26:bb': 'Apple',
+    '00:3e:e1': 'Apple',
+    '00:50:e4': 'Apple',
+    '00:61:71': 'Apple',
+    '00:88:65': 'Apple',
+    '00:a0:40': 'Apple',
+    '00:c6:10': 'Apple',
+    '00:cd:fe': 'Apple',
+    '00:d8:3b': 'Apple',
+    '00:db:70': 'Apple',
+    '00:f4:b9': 'Apple',
+    '00:f7:6f': 'Apple',
+    '04:0c:ce': 'Apple',
+    '04:15:52': 'Apple',
+    '04:1e:64': 'Apple',
+    '04:26:65': 'Apple',
+    '04:48:9a': 'Apple',
+    '04:4b:ed': 'Apple',
+    '04:52:f3': 'Apple',
+    '04:54:53': 'Apple',
+    '04:d3:cf': 'Apple',
+    '04:db:56': 'Apple',
+    '04:e5:36': 'Apple',
+    '04:f1:3e': 'Apple',
+    '04:f7:e4': 'Apple',
+    '08:00:07': 'Apple',
+    '08:66:98': 'Apple',
+    '08:6d:41': 'Apple',
+    '08:70:45': 'Apple',
+    '08:74:02': 'Apple',
+    '08:f4:ab': 'Apple',
+    '08:f6:9c': 'Apple',
+    '0c:15:39': 'Apple',
+    '0c:30:21': 'Apple',
+    '0c:3e:9f': 'Apple',
+    '0c:4d:e9': 'Apple',
+    '0c:51:01': 'Apple',
+    '0c:74:c2': 'Apple',
+    '0c:77:1a': 'Apple',
+    '0c:bc:9f': 'Apple',
+    '0c:d7:46': 'Apple',
+    '0c:f3:46': 'Apple',
+    '10:1c:0c': 'Apple',
+    '10:40:f3': 'Apple',
+    '10:41:7f': 'Apple',
+    '10:93:e9': 'Apple',
+    '10:94:bb': 'Apple',
+    '10:9a:dd': 'Apple',
+    '10:dd:b1': 'Apple',
+    '14:10:9f': 'Apple',
+    '14:5a:05': 'Apple',
+    '14:8f:c6': 'Apple',
+    '14:99:e2': 'Apple',
+    '14:bd:61': 'Apple',
+    '14:c2:13': 'Apple',
+    '18:20:32': 'Apple',
+    '18:34:51': 'Apple',
+    '18:65:90': 'Apple',
+    '18:9e:fc': 'Apple',
+    '18:af:61': 'Apple',
+    '18:af:8f': 'Apple',
+    '18:e7:f4': 'Apple',
+    '18:ee:69': 'Apple',
+    '18:f1:d8': 'Apple',
+    '18:f6:43': 'Apple',
+    '1c:1a:c0': 'Apple',
+    '1c:36:bb': 'Apple',
+    '1c:5c:f2': 'Apple',
+    '1c:91:48': 'Apple',
+    '1c:9e:46': 'Apple',
+    '1c:ab:a7': 'Apple',
+    '1c:e6:2b': 'Apple',
+    '20:3c:ae': 'Apple',
+    '20:78:f0': 'Apple',
+    '20:7d:74': 'Apple',
+    '20:9b:cd': 'Apple',
+    '20:a2:e4': 'Apple',
+    '20:ab:37': 'Apple',
+    '20:c9:d0': 'Apple',
+    '20:ee:28': 'Apple',
+    '24:1e:eb': 'Apple',
+    '24:24:0c': 'Apple',
+    '24:5b:a7': 'Apple',
+    '24:a0:74': 'Apple',
+    '24:a2:e1': 'Apple',
+    '24:ab:81': 'Apple',
+    '24:e3:14': 'Apple',
+    '24:f0:94': 'Apple',
+    '24:f6:77': 'Apple',
+    '28:0b:5c': 'Apple',
+    '28:37:37': 'Apple',
+    '28:5a:eb': 'Apple',
+    '28:6a:b8': 'Apple',
+    '28:6a:ba': 'Apple',
+    '28:a0:2b': 'Apple',
+    '28:cf:da': 'Apple',
+    '28:cf:e9': 'Apple',
+    '28:e0:2c': 'Apple',
+    '28:e1:4c': 'Apple',
+    '28:e7:cf': 'Apple',
+    '28:ed:6a': 'Apple',
+    '28:f0:76': 'Apple',
+    '2c:1f:23': 'Apple',
+    '2c:20:0b': 'Apple',
+    '2c:33:61': 'Apple',
+    '2c:b4:3a': 'Apple',
+    '2c:be:08': 'Apple',
+    '2c:f0:a2': 'Apple',
+    '2c:f0:ee': 'Apple',
+    '30:10:e4': 'Apple',
+    '30:35:ad': 'Apple',
+    '30:63:6b': 'Apple',
+    '30:90:ab': 'Apple',
+    '30:f7:c5': 'Apple',
+    '34:08:bc': 'Apple',
+    '34:12:98': 'Apple',
+    '34:15:9e': 'Apple',
+    '34:36:3b': 'Apple',
+    '34:51:c9': 'Apple',
+    '34:7c:25': 'Apple',
+    '34:a3:95': 'Apple',
+    '34:ab:37': 'Apple',
+    '34:c0:59': 'Apple',
+    '34:e2:fd': 'Apple',
+    '38:0f:4a': 'Apple',
+    '38:48:4c': 'Apple',
+    '38:53:9c': 'Apple',
+    '38:66:f0': 'Apple',
+    '38:71:de': 'Apple',
+    '38:b5:4d': 'Apple',
+    '38:c9:86': 'Apple',
+    '38:ca:da': 'Apple',
+    '38:f9:d3': 'Apple',
+    '3c:07:54': 'Apple',
+    '3c:0e:23': 'Apple',
+    '3c:15:c2': 'Apple',
+    '3c:2e:f9': 'Apple',
+    '3c:2e:ff': 'Apple',
+    '3c:ab:8e': 'Apple',
+    '3c:d0:f8': 'Apple',
+    '3c:e0:72': 'Apple',
+    '40:30:04': 'Apple',
+    '40:33:1a': 'Apple',
+    '40:3c:fc': 'Apple',
+    '40:4d:7f': 'Apple',
+    '40:6c:8f': 'Apple',
+    '40:83:1d': 'Apple',
+    '40:98:ad': 'Apple',
+    '40:a6:d9': 'Apple',
+    '40:b3:95': 'Apple',
+    '40:bc:60': 'Apple',
+    '40:cb:c0': 'Apple',
+    '40:d3:2d': 'Apple',
+    '44:00:10': 'Apple',
+    '44:2a:60': 'Apple',
+    '44:4c:0c': 'Apple',
+    '44:d8:84': 'Apple',
+    '44:fb:42': 'Apple',
+    '48:43:7c': 'Apple',
+    '48:4b:aa': 'Apple',
+    '48:60:bc': 'Apple',
+    '48:74:6e': 'Apple',
+    '48:a1:95': 'Apple',
+    '48:bf:6b': 'Apple',
+    '48:d7:05': 'Apple',
+    '48:e9:f1': 'Apple',
+    '4c:32:75': 'Apple',
+    '4c:57:ca': 'Apple',
+    '4c:74:bf': 'Apple',
+    '4c:7c:5f': 'Apple',
+    '4c:8d:79': 'Apple',
+    '4c:b1:99': 'Apple',
+    '50:32:37': 'Apple',
+    '50:7a:55': 'Apple',
+    '50:82:d5': 'Apple',
+    '50:ea:d6': 'Apple',
+    '50:ed:3c': 'Apple',
+    '54:26:96': 'Apple',
+    '54:33:cb': 'Apple',
+    '54:4e:90': 'Apple',
+    '54:72:4f': 'Apple',
+    '54:9f:13': 'Apple',
+    '54:ae:27': 'Apple',
+    '54:e4:3a': 'Apple',
+    '54:ea:a8': 'Apple',
+    '58:1f:aa': 'Apple',
+    '58:40:4e': 'Apple',
+    '58:55:ca': 'Apple',
+    '58:7f:57': 'Apple',
+    '58:b0:35': 'Apple',
+    '58:e2:8f': 'Apple',
+    '5c:1d:d9': 'Apple',
+    '5c:59:48': 'Apple',
+    '5c:5f:67': 'Apple',
+    '5c:8d:4e': 'Apple',
+    '5c:95:ae': 'Apple',
+    '5c:96:9d': 'Apple',
+    '5c:97:f3': 'Apple',
+    '5c:ad:cf': 'Apple',
+    '5c:e9:1e': 'Apple',
+    '5c:f5:da': 'Apple',
+    '5c:f7:e6': 'Apple',
+    '5c:f9:38': 'Apple',
+    '60:03:08': 'Apple',
+    '60:33:4b': 'Apple',
+    '60:69:44': 'Apple',
+    '60:8c:4a': 'Apple',
+    '60:92:17': 'Apple',
+    '60:a3:7d': 'Apple',
+    '60:c5:47': 'Apple',
+    '60:d9:c7': 'Apple',
+    '60:f4:45': 'Apple',
+    '60:f8:1d': 'Apple',
+    '60:fa:cd': 'Apple',
+    '60:fb:42': 'Apple',
+    '60:fe:c5': 'Apple',
+    '64:20:0c': 'Apple',
+    '64:4b:f0': 'Apple',
+    '64:76:ba': 'Apple',
+    '64:9a:be': 'Apple',
+    '64:a3:cb': 'Apple',
+    '64:a5:c3': 'Apple',
+    '64:b0:a6': 'Apple',
+    '64:b9:e8': 'Apple',
+    '64:e6:82': 'Apple',
+    '68:09:27': 'Apple',
+    '68:5b:35': 'Apple',
+    '68:64:4b': 'Apple',
+    '68:96:7b': 'Apple',
+    '68:9c:70': 'Apple',
+    '68:a8:6d': 'Apple',
+    '68:ab:1e': 'Apple',
+    '68:ae:20': 'Apple',
+    '68:ce:0d': 'Apple',
+    '68:d9:3c': 'Apple',
+    '68:db:ca': 'Apple',
+    '68:ee:96': 'Apple',
+    '68:ef:43': 'Apple',
+    '68:fb:7e': 'Apple',
+    '6c:19:c0': 'Apple',
+    '6c:3e:6d': 'Apple',
+    '6c:40:08': 'Apple',
+    '6c:4d:73': 'Apple',
+    '6c:70:9f': 'Apple',
+    '6c:72:e7': 'Apple',
+    '6c:8d:c1': 'Apple',
+    '6c:94:f8': 'Apple',
+    '6c:96:cf': 'Apple',
+    '6c:ab:31': 'Apple',
+    '6c:c2:6b': 'Apple',
+    '6c:e8:5c': 'Apple',
+    '70:11:24': 'Apple',
+    '70:14:a6': 'Apple',
+    '70:3e:ac': 'Apple',
+    '70:48:0f': 'Apple',
+    '70:56:81': 'Apple',
+    '70:73:cb': 'Apple',
+    '70:81:eb': 'Apple',
+    '70:a2:b3': 'Apple',
+    '70:cd:60': 'Apple',
+    '70:de:e2': 'Apple',
+    '70:e7:2c': 'Apple',
+    '70:ec:e4': 'Apple',
+    '70:ef:00': 'Apple',
+    '70:f0:87': 'Apple',
+    '74:1b:b2': 'Apple',
+    '74:81:14': 'Apple',
+    '74:8d:08': 'Apple',
+    '74:e1:b6': 'Apple',
+    '74:e2:f5': 'Apple',
+    '78:28:ca': 'Apple',
+    '78:31:c1': 'Apple',
+    '78:3a:84': 'Apple',
+    '78:4f:43': 'Apple',
+    '78:67:d7': 'Apple',
+    '78:6c:1c': 'Apple',
+    '78:7e:61': 'Apple',
+    '78:88:6d': 'Apple',
+    '78:9f:70': 'Apple',
+    '78:a3:e4': 'Apple',
+    '78:bf:db': 'Apple',
+    '78:ca:39': 'Apple',
+    '78:d7:5f': 'Apple',
+    '78:fd:94': 'Apple',
+    '7c:01:91': 'Apple',
+    '7c:04:d0': 'Apple',
+    '7c:11:be': 'Apple',
+    '7c:5c:f8': 'Apple',
+    '7c:6d:62': 'Apple',
+    '7c:6d:f8': 'Apple',
+    '7c:c3:a1': 'Apple',
+    '7c:c5:37': 'Apple',
+    '7c:d1:c3': 'Apple',
+    '7c:f0:5f': 'Apple',
+    '7c:fa:df': 'Apple',
+    '80:00:6e': 'Apple',
+    '80:19:34': 'Apple',
+    '80:49:71': 'Apple',
+    '80:6c:1b': 'Apple',
+    '80:92:9f': 'Apple',
+    '80:b0:3d': 'Apple',
+    '80:be:05': 'Apple',
+    '80:d6:05': 'Apple',
+    '80:e6:50': 'Apple',
+    '80:ea:96': 'Apple',
+    '80:ed:2c': 'Apple',
+    '84:29:99': 'Apple',
+    '84:38:35': 'Apple',
+    '84:78:8b': 'Apple',
+    '84:85:06': 'Apple',
+    '84:89:ad': 'Apple',
+    '84:8e:0c': 'Apple',
+    '84:a1:34': 'Apple',
+    '84:b1:53': 'Apple',
+    '84:fc:fe': 'Apple',
+    '88:1f:a1': 'Apple',
+    '88:53:95': 'Apple',
+    '88:63:df': 'Apple',
+    '88:69:08': 'Apple',
+    '88:c6:63': 'Apple',
+    '88:cb:87': 'Apple',
+    '88:e8:7f': 'Apple',
+    '88:e9:fe': 'Apple',
+    '8c:00:6d': 'Apple',
+    '8c:29:37': 'Apple',
+    '8c:2d:aa': 'Apple',
+    '8c:58:77': 'Apple',
+    '8c:79:67': 'Apple',
+    '8c:7b:9d': 'Apple',
+    '8c:7c:92': 'Apple',
+    '8c:85:90': 'Apple',
+    '8c:8e:f2': 'Apple',
+    '8c:8f:e9': 'Apple',
+    '8c:fa:ba': 'Apple',
+    '90:27:e4': 'Apple',
+    '90:3c:92': 'Apple',
+    '90:60:f1': 'Apple',
+    '90:72:40': 'Apple',
+    '90:84:0d': 'Apple',
+    '90:8d:6c': 'Apple',
+    '90:b0:ed': 'Apple',
+    '90:b9:31': 'Apple',
+    '90:c1:c6': 'Apple',
+    '90:fd:61': 'Apple',
+    '94:94:26': 'Apple',
+    '94:bf:2d': 'Apple',
+    '94:e9:6a': 'Apple',
+    '94:f6:65': 'Apple',
+    '98:01:a7': 'Apple',
+    '98:03:d8': 'Apple',
+    '98:10:e8': 'Apple',
+    '98:46:0a': 'Apple',
+    '98:5a:eb': 'Apple',
+    '98:9e:63': 'Apple',
+    '98:b8:e3': 'Apple',
+    '98:ca:33': 'Apple',
+    '98:d6:bb': 'Apple',
+    '98:e0:d9': 'Apple',
+    '98:f0:ab': 'Apple',
+    '98:fa:e3': 'Apple',
+    '98:fe:94': 'Apple',
+    '9c:04:eb': 'Apple',
+    '9c:20:7b': 'Apple',
+    '9c:29:3f': 'Apple',
+    '9c:35:eb': 'Apple',
+    '9c:4f:da': 'Apple',
+    '9c:84:bf': 'Apple',
+    '9c:f3:87': 'Apple',
+    '9c:f4:8e': 'Apple',
+    '9c:fc:01': 'Apple',
+    'a0:18:28': 'Apple',
+    'a0:3b:e3': 'Apple',
+    'a0:4e:a7': 'Apple',
+    'a0:99:9b': 'Apple',
+    'a0:d7:95': 'Apple',
+    'a0:ed:cd': 'Apple',
+    'a4:5e:60': 'Apple',
+    'a4:67:06': 'Apple',
+    'a4:83:e7': 'Apple',
+    'a4:b1:97': 'Apple',
+    'a4:b8:05': 'Apple',
+    'a4:c3:61': 'Apple',
+    'a4:d1:8c': 'Apple',
+    'a4:d1:d2': 'Apple',
+    'a4:d9:31': 'Apple',
+    'a4:f1:e8': 'Apple',
+    'a8:20:66': 'Apple',
+    'a8:5b:78': 'Apple',
+    'a8:5c:2c': 'Apple',
+    'a8:66:7f': 'Apple',
+    'a8:6b:ad': 'Apple',
+    'a8:88:08': 'Apple',
+    'a8:8e:24': 'Apple',
+    'a8:96:8a': 'Apple',
+    'a8:bb:cf': 'Apple',
+    'a8:be:27': 'Apple',
+    'a8:fa:d8': 'Apple',
+    'ac:1f:74': 'Apple',
+    'ac:29:3a': 'Apple',
+    'ac:3c:0b': 'Apple',
+    'ac:5f:3e': 'Apple',
+    'ac:61:ea': 'Apple',
+    'ac:7f:3e': 'Apple',
+    'ac:87:a3': 'Apple',
+    'ac:bc:32': 'Apple',
+    'ac:cf:5c': 'Apple',
+    'ac:de:48': 'Apple',
+    'ac:e4:b5': 'Apple',
+    'ac:fd:ec': 'Apple',
+    'b0:19:c6': 'Apple',
+    'b0:34:95': 'Apple',
+    'b0:48:1a': 'Apple',
+    'b0:65:bd': 'Apple',
+    'b0:70:2d': 'Apple',
+    'b0:9f:ba': 'Apple',
+    'b0:ca:68': 'Apple',
+    'b4:18:d1': 'Apple',
+    'b4:8b:19': 'Apple',
+    'b4:f0:ab': 'Apple',
+    'b4:f6:1c': 'Apple',
+    'b8:09:8a': 'Apple',
+    'b8:17:c2': 'Apple',
+    'b8:41:a4': 'Apple',
+    'b8:44:d9': 'Apple',
+    'b8:53:ac': 'Apple',
+    'b8:5d:0a': 'Apple',
+    'b8:63:4d': 'Apple',
+    'b8:78:2e': 'Apple',
+    'b8:8d:12': 'Apple',
+    'b8:c7:5d': 'Apple',
+    'b8:e8:56': 'Apple',
+    'b8:f6:b1': 'Apple',
+    'b8:ff:61': 'Apple',
+    'bc:3b:af': 'Apple',
+    'bc:4c:c4': 'Apple',
+    'bc:52:b7': 'Apple',
+    'bc:54:36': 'Apple',
+    'bc:67:78': 'Apple',
+    'bc:6c:21': 'Apple',
+    'bc:92:6b': 'Apple',
+    'bc:9f:ef': 'Apple',
+    'bc:a9:20': 'Apple',
+    'bc:fe:8c': 'Apple',
+    'c0:1a:da': 'Apple',
+    'c0:63:94': 'Apple',
+    'c0:84:7a': 'Apple',
+    'c0:9f:42': 'Apple',
+    'c0:a5:3e': 'Apple',
+    'c0:ce:cd': 'Apple',
+    'c0:d0:12': 'Apple',
+    'c0:f2:fb': 'Apple',
+    'c4:2c:03': 'Apple',
+    'c4:b3:01': 'Apple',
+    'c8:1e:e7': 'Apple',
+    'c8:2a:14': 'Apple',
+    'c8:33:4b': 'Apple',
+    'c8:3c:85': 'Apple',
+    'c8:6f:1d': 'Apple',
+    'c8:69:cd': 'Apple',
+    'c8:85:50': 'Apple',
+    'c8:b5:b7': 'Apple',
+    'c8:bc:c8': 'Apple',
+    'c8:d0:83': 'Apple',
+    'c8:e0:eb': 'Apple',
+    'c8:f6:50': 'Apple',
+    'cc:08:8d': 'Apple',
+    'cc:08:e0': 'Apple',
+    'cc:20:e8': 'Apple',
+    'cc:25:ef': 'Apple',
+    'cc:29:f5': 'Apple',
+    'cc:2d:b7': 'Apple',
+    'cc:44:63': 'Apple',
+    'cc:4b:73': 'Apple',
+    'cc:78:5f': 'Apple',
+    'cc:c7:60': 'Apple',
+    'd0:03:4b': 'Apple',
+    'd0:23:db': 'Apple',
+    'd0:25:98': 'Apple',
+    'd0:33:11': 'Apple',
+    'd0:4f:7e': 'Apple',
+    'd0:65:ca': 'Apple',
+    'd0:a6:37': 'Apple',
+    'd0:c5:f3': 'Apple',
+    'd0:cd:e1': 'Apple',
+    'd0:d2:b0': 'Apple',
+    'd0:e1:40': 'Apple',
+    'd4:61:9d': 'Apple',
+    'd4:9a:20': 'Apple',
+    'd4:f4:6f': 'Apple',
+    'd8:00:4d': 'Apple',
+    'd8:1c:79': 'Apple',
+    'd8:1d:72': 'Apple',
+    'd8:30:62': 'Apple',
+    'd8:8f:76': 'Apple',
+    'd8:96:95': 'Apple',
+    'd8:9e:3f': 'Apple',
+    'd8:a2:5e': 'Apple',
+    'd8:bb:2c': 'Apple',
+    'd8:cf:9c': 'Apple',
+    'd8:d1:cb': 'Apple',
+    'dc:0c:5c': 'Apple',
+    'dc:2b:2a': 'Apple',
+    'dc:2b:61': 'Apple',
+    'dc:37:14': 'Apple',
+    'dc:3e:f8': 'Apple',
+    'dc:41:5f': 'Apple',
+    'dc:56:e7': 'Apple',
+    'dc:86:d8': 'Apple',
+    'dc:9b:9c': 'Apple',
+    'dc:a4:ca': 'Apple',
+    'dc:a9:04': 'Apple',
+    'e0:5f:45': 'Apple',
+    'e0:66:78': 'Apple',
+    'e0:ac:cb': 'Apple',
+    'e0:b5:2d': 'Apple',
+    'e0:b9:ba': 'Apple',
+    'e0:c7:67': 'Apple',
+    'e0:c9:7a': 'Apple',
+    'e0:f5:c6': 'Apple',
+    'e0:f8:47': 'Apple',
+    'e4:25:e7': 'Apple',
+    'e4:8b:7f': 'Apple',
+    'e4:98:bb': 'Apple',
+    'e4:9a:dc': 'Apple',
+    'e4:c6:3d': 'Apple',
+    'e4:ce:8f': 'Apple',
+    'e4:e4:ab': 'Apple',
+    'e8:04:0b': 'Apple',
+    'e8:06:88': 'Apple',
+    'e8:80:2e': 'Apple',
+    'e8:8d:28': 'Apple',
+    'ec:35:86': 'Apple',
+    'ec:85:2f': 'Apple',
+    'ec:a8:6b': 'Apple',
+    'f0:18:98': 'Apple',
+    'f0:24:75': 'Apple',
+    'f0:5c:d5': 'Apple',
+    'f0:72:8c': 'Apple',
+    'f0:79:60': 'Apple',
+    'f0:99:bf': 'Apple',
+    'f0:b4:79': 'Apple',
+    'f0:b5:d1': 'Apple',
+    'f0:c1:f1': 'Apple',
+    'f0:cb:a1': 'Apple',
+    'f0:d1:a9': 'Apple',
+    'f0:db:e2': 'Apple',
+    'f0:db:f8': 'Apple',
+    'f0:dc:e2': 'Apple',
+    'f0:f6:1c': 'Apple',
+    'f4:0f:24': 'Apple',
+    'f4:1b:a1': 'Apple',
+    'f4:37:b7': 'Apple',
+    'f4:f1:5a': 'Apple',
+    'f4:f9:51': 'Apple',
+    'f8:03:77': 'Apple',
+    'f8:1e:df': 'Apple',
+    'f8:27:93': 'Apple',
+    'f8:2d:7c': 'Apple',
+    'f8:38:80': 'Apple',
+    'f8:62:14': 'Apple',
+    'f8:95:ea': 'Apple',
+    'f8:a9:d0': 'Apple',
+    'f8:e9:4e': 'Apple',
+    'f8:ff:0b': 'Apple',
+    'fc:25:3f': 'Apple',
+    'fc:e9:98': 'Apple',
+    'fc:fc:48': 'Apple',
+    '48:25:67': 'Epson',
+    'c8:1c:fe': 'SHARP',
+    '74:5d:22': 'SHARP',
+    'e8:80:88': 'Texas Instruments',
+    'e4:55:a8': 'Dedicated Computing',
+    '00:07:4d': 'Zebra Technologies',
+    '6c:24:08': 'Texas Instruments',
+    'e8:05:dc': 'D-Link',
+    '10:1e:da': 'Zebra Technologies',
+    'a4:60:11': 'Verifone',
+    '0c:7b:c8': 'Hon Hai Precision',
+    '88:a4:c2': 'Cisco Meraki',
+    '2c:ff:65': 'Texas Instruments',
+    '00:22:ee': 'Zebra Technologies',
+    '60:95:32': 'Zebra Technologies',
+    '78:8c:77': 'Lexmark',
+    '90:2e:16': 'Cisco Meraki',
+    'ec:64:c9': 'Texas Instruments',
+    '30:c6:f7': 'Texas Instruments',
+    '78:b8:d6': 'Zebra Technologies'
+}
+
+_index = None
+_index_lock = threading.Lock()
+
+def parse_mac(mac):
+    """Parse a MAC address in any common notation to a 48-bit int, or None"""
+    if not mac:
+        return None
+    digits = NON_HEX.sub('', str(mac))
+    if len(digits) != 12:
+        return None
+    return int(digits, 16)
+
+class OuiIndex:
+    """Longest-prefix MAC vendor index over sorted per-length prefix arrays"""
+    
+    def __init__(self, tiers, vendors):
+        # tiers: list of (bits, prefixes uint64 sorted, vendor ids int32), longest prefix first
+        self.tiers = sorted(tiers, key=lambda tier: tier[0], reverse=True)
+        self.vendors = list(vendors)
+    
+    @classmethod
+    def from_entries(cls, entries):
+        """Build from an iterable of (bits, prefix_int, vendor_name)"""
+        vendor_ids = {}
+        by_bits = {}
+        for bits, prefix, vendor in entries:
+            vendor_id = vendor_ids.setdefault(vendor, len(vendor_ids))
+            by_bits.setdefault(bits, {})[prefix] = vendor_id
+        
+        tiers = []
+        for bits, mapping in by_bits.items():
+            prefixes = np.fromiter(mapping.keys(), dtype=np.uint64, count=len(mapping))
+            ids = np.fromiter(mapping.values(), dtype=np.int32, count=len(mapping))
+            order = np.argsort(prefixes)
+            tiers.append((bits, prefixes[order], ids[order]))
+        
+        vendors = [None] * len(vendor_ids)
+        for vendor, vendor_id in vendor_ids.items():
+            vendors[vendor_id] = vendor
+        return cls(tiers, vendors)
+    
+    def __len__(self):
+        return sum(len(prefixes) for _, prefixes, _ in self.tiers)
+    
+    def lookup_values(self, values):
+        """Vectorized lookup of 48-bit MAC ints; returns vendor ids (-1 when unknown)"""
+        values = np.asarray(values, dtype=np.uint64)
+        result = np.full(values.shape, -1, dtype=np.int32)
+        
+        for bits, prefixes, ids in self.tiers:
+            if not len(prefixes):
+                continue
+            pending = result < 0
+            if not pending.any():
+                break
+            keys = values[pending] >> np.uint64(MAC_BITS - bits)
+            positions = np.searchsorted(prefixes, keys)
+            positions[positions >= len(prefixes)] = len(prefixes) - 1
+            matched = prefixes[positions] == keys
+            pending_idx = np.flatnonzero(pending)
+            result[pending_idx[matched]] = ids[positions[matched]]
+        
+        return result
+    
+    def lookup(self, mac, default=UNKNOWN_MANUFACTURER):
+        """Look up a single MAC address"""
+        value = parse_mac(mac)
+        if value is None:
+            return default
+        vendor_id = self.lookup_values([value])[0]
+        return self.vendors[vendor_id] if vendor_id >= 0 else default
+    
+    def bulk_lookup(self, macs, default=UNKNOWN_MANUFACTURER):
+        """Look up many MAC addresses at once; returns a list aligned with macs"""
+        values = np.zeros(len(macs), dtype=np.uint64)
+        valid = np.zeros(len(macs), dtype=bool)
+        for i, mac in enumerate(macs):
+            value = parse_mac(mac)
+            if value is not None:
+                values[i] = value
+                valid[i] = True
+        
+        vendor_ids = np.full(len(macs), -1, dtype=np.int32)
+        if valid.any():
+            vendor_ids[valid] = self.lookup_values(values[valid])
+        
+        vendors = self.vendors
+        return [vendors[v] if v >= 0 else default for v in vendor_ids.tolist()]
+    
+    def save(self, path):
+        """Save the index as a compressed .npz file"""
+        # Vendor names as one newline-joined UTF-8 buffer so the file loads without pickle
+        vendor_blob = '\n'.join(vendor.replace('\n', ' ') for vendor in self.vendors).encode('utf-8')
+        arrays = {'vendors': np.frombuffer(vendor_blob, dtype=np.uint8)}
+        for bits, prefixes, ids in self.tiers:
+            arrays[f'prefixes_{bits}'] = prefixes
+            arrays[f'ids_{bits}'] = ids
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+    
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save()"""
+        with np.load(path) as data:
+            vendors = data['vendors'].tobytes().decode('utf-8').split('\n')
+            tiers = []
+            for name in data.files:
+                if name.startswith('prefixes_'):
+                    bits = int(name.split('_')[1])
+                    tiers.append((bits, data[name], data[f'ids_{bits}']))
+        return cls(tiers, vendors)
+
+def read_registry_file(path, bits):
+    """Yield (bits, prefix_int, vendor) from an IEEE registry CSV"""
+    hex_digits = bits // 4
+    with open(path, newline='', encoding='utf-8', errors='replace') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if len(row) < 3 or row[0] == 'Registry':
+                continue
+            assignment = row[1].strip()
+            vendor = ' '.join(row[2].split())
+            if len(assignment) != hex_digits or not vendor:
+                continue
+            try:
+                yield bits, int(assignment, 16), vendor
+            except ValueError:
+                continue
+
+def fallback_entries():
+    """Yield FALLBACK_OUI_PREFIXES as (bits, prefix_int, vendor) 24-bit entries"""
+    for prefix, vendor in FALLBACK_OUI_PREFIXES.items():
+        yield 24, int(prefix.replace(':', ''), 16), vendor
+
+def build_oui_index(registry_dir=None):
+    """Parse the registry files in registry_dir into an OuiIndex"""
+    registry_dir = registry_dir or Config.OUI_REGISTRY_DIR
+    entries = []
+    
+    for filename, bits in REGISTRY_FILES:
+        path = os.path.join(registry_dir, filename)
+        if not os.path.exists(path):
+            logger.warning(f"OUI registry file not found: {path}")
+            continue
+        count = len(entries)
+        entries.extend(read_registry_file(path, bits))
+        logger.info(f"Loaded {len(entries) - count} prefixes from {filename}")
+    
+    # Registry entries win over the fallback for the same 24-bit prefix
+    registry_24 = {prefix for bits, prefix, _ in entries if bits == 24}
+    entries.extend(e for e in fallback_entries() if e[1] not in registry_24)
+    
+    return OuiIndex.from_entries(entries)
+
+def registry_mtime(registry_dir):
+    """Newest modification time of the registry files (0 if none exist)"""
+    mtimes = [
+        os.path.getmtime(os.path.join(registry_dir, filename))
+        for filename, _ in REGISTRY_FILES
+        if os.path.exists(os.path.join(registry_dir, filename))
+    ]
+    return max(mtimes) if mtimes else 0
+
+def load_oui_index(registry_dir=None):
+    """Load the cached index if it is current, otherwise rebuild (and re-cache) it"""
+    registry_dir = registry_dir or Config.OUI_REGISTRY_DIR
+    cache_path = os.path.join(registry_dir, INDEX_CACHE_FILE)
+    
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= registry_mtime(registry_dir):
+        try:
+            return OuiIndex.load(cache_path)
+        except Exception as e:
+            logger.warning(f"Could not load OUI index cache {cache_path}: {e}")
+    
+    index = build_oui_index(registry_dir)
+    if registry_mtime(registry_dir):
+        try:
+            index.save(cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write OUI index cache {cache_path}: {e}")
+    return index
+
+def get_oui_index():
+    """Process-wide OUI index, loaded on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                start = time.time()
+                _index = load_oui_index()
+                logger.info(f"OUI index ready: {len(_index)} prefixes in {time.time() - start:.2f}s")
+    return _index
+
+def lookup_manufacturer(mac):
+    """Get the manufacturer for one MAC address ('Unknown' if not registered)"""
+    return get_oui_index().lookup(mac)
+
+def bulk_lookup_manufacturers(macs):
+    """Get manufacturers for a list of MAC addresses in one vectorized pass"""
+    return get_oui_index().bulk_lookup(macs)
+
+def enrich_switch_port_clients(conn, batch_size=10000):
+    """Re-resolve switch_port_clients.manufacturer for every row, writing only changes"""
+    from psycopg2.extras import execute_values
+    
+    start = time.time()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, mac_address, manufacturer FROM switch_port_clients")
+    rows = cursor.fetchall()
+    
+    manufacturers = bulk_lookup_manufacturers([row[1] for row in rows])
+    changes = [
+        (row[0], manufacturer)
+        for row, manufacturer in zip(rows, manufacturers)
+        if manufacturer != row[2]
+    ]
+    lookup_time = time.time() - start
+    
+    if changes:
+        execute_values(cursor, """
+            UPDATE switch_port_clients AS s
+            SET manufacturer = v.manufacturer
+            FROM (VALUES %s) AS v(id, manufacturer)
+            WHERE s.id = v.id
+        """, changes, page_size=batch_size)
+    conn.commit()
+    cursor.close()
+    
+    logger.info(f"Resolved {len(rows)} MACs in {lookup_time:.2f}s, updated {len(changes)} manufacturers "
+                f"({time.time() - start:.2f}s total)")
+    return len(changes)
+
+def main():
+    parser = argparse.ArgumentParser(description='IEEE OUI registry import and MAC manufacturer lookup')
+    parser.add_argument('--registry-dir', default=Config.OUI_REGISTRY_DIR,
+                        help='Directory containing oui.csv / mam.csv / oui36.csv')
+    parser.add_argument('--build', action='store_true', help='Parse registry files and write the index cache')
+    parser.add_argument('--lookup', metavar='MAC', help='Look up a single MAC address')
+    parser.add_argument('--enrich', action='store_true', help='Bulk update switch_port_clients.manufacturer')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    global _index
+    if args.build:
+        start = time.time()
+        _index = build_oui_index(args.registry_dir)
+        _index.save(os.path.join(args.registry_dir, INDEX_CACHE_FILE))
+        logger.info(f"Built OUI index with {len(_index)} prefixes in {time.time() - start:.2f}s")
+    else:
+        _index = load_oui_index(args.registry_dir)
+    
+    if args.lookup:
+        print(f"{args.lookup}: {_index.lookup(args.lookup)}")
+    
+    if args.enrich:
+        import psycopg2
+        match = re.match(r'postgresql://(.+):(.+)@(.+):(\d+)/(.+)', Config.SQLALCHEMY_DATABASE_URI)
+        if not match:
+            raise ValueError("Invalid database URI")
+        user, password, host, port, database = match.groups()
+        conn = psycopg2.connect(host=host, port=int(port), database=database, user=user, password=password)
+        try:
+            enrich_switch_port_clients(conn)
+        finally:
+            conn.close()
+
+if __name__ == '__main__':
+    main()
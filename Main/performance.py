@@ -5,7 +5,7 @@ Displays API endpoint performance metrics and trends
 """
 
 from flask import Blueprint, render_template, jsonify, request
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, text
 from datetime import datetime, timedelta
 import json
 
@@ -14,6 +14,166 @@ from models import db, PerformanceMetric
 # Create blueprint
 performance_bp = Blueprint('performance', __name__)
 
+# Anomaly detection (robust statistics - latencies are long-tailed, not normal)
+ANOMALY_BASELINE_DAYS = 7
+ANOMALY_RECENT_HOURS = 1
+ANOMALY_MIN_BASELINE_SAMPLES = 20
+ANOMALY_Z_THRESHOLD = 3.5      # Robust z-score: (ms - p50) / (1.4826 * MAD)
+ANOMALY_IQR_FENCE = 3.0        # Also beyond Tukey's far-out fence: q3 + 3 * IQR
+ANOMALY_MIN_DELTA_MS = 50      # Ignore regressions smaller than this above the median
+ANOMALY_LIMIT = 20
+ANOMALY_SOURCE = 'synthetic'   # Baselines never mix live and synthetic samples
+
+# One round trip: per-endpoint baseline percentiles and MAD over the baseline window
+# (excluding the recent window), joined to recent requests; anomalous samples are
+# aggregated per endpoint as JSON.
+ANOMALY_QUERY = text("""
+    WITH base AS (
+        SELECT endpoint_name, query_execution_time_ms AS ms
+        FROM performance_metrics
+        WHERE timestamp >= :baseline_start
+        AND timestamp < :recent_start
+        AND response_status = 200
+        AND source = :source
+    ),
+    baseline AS (
+        SELECT
+            endpoint_name,
+            COUNT(*) AS samples,
+            percentile_cont(0.25) WITHIN GROUP (ORDER BY ms) AS q1,
+            percentile_cont(0.50) WITHIN GROUP (ORDER BY ms) AS p50,
+            percentile_cont(0.75) WITHIN GROUP (ORDER BY ms) AS q3,
+            percentile_cont(0.95) WITHIN GROUP (ORDER BY ms) AS p95,
+            percentile_cont(0.99) WITHIN GROUP (ORDER BY ms) AS p99
+        FROM base
+        GROUP BY endpoint_name
+        HAVING COUNT(*) >= :min_samples
+    ),
+    spread AS (
+        -- MAD scaled to sigma, falling back to IQR / 1.349 and a 1ms floor when
+        -- latencies are nearly constant
+        SELECT
+            b.endpoint_name,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY abs(base.ms - b.p50)) AS mad,
+            GREATEST(
+                1.4826 * percentile_cont(0.5) WITHIN GROUP (ORDER BY abs(base.ms - b.p50)),
+                (b.q3 - b.q1) / 1.349,
+                1.0
+            ) AS scale
+        FROM base
+        JOIN baseline b ON b.endpoint_name = base.endpoint_name
+        GROUP BY b.endpoint_name, b.p50, b.q1, b.q3
+    ),
+    recent AS (
+        SELECT
+            m.endpoint_name,
+            m.timestamp,
+            m.query_execution_time_ms AS ms,
+            m.response_status,
+            m.error_message,
+            (m.query_execution_time_ms - b.p50) / s.scale AS deviation,
+            m.query_execution_time_ms >= b.q3 + :iqr_fence * (b.q3 - b.q1)
+                AND m.query_execution_time_ms - b.p50 >= :min_delta AS beyond_fence
+        FROM performance_metrics m
+        JOIN baseline b ON b.endpoint_name = m.endpoint_name
+        JOIN spread s ON s.endpoint_name = m.endpoint_name
+        WHERE m.timestamp >= :recent_start
+        AND m.source = :source
+    )
+    SELECT
+        b.endpoint_name,
+        b.samples,
+        b.q1, b.p50, b.q3, b.p95, b.p99,
+        s.mad,
+        s.scale,
+        COUNT(*) AS recent_samples,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY r.ms) AS recent_p50,
+        COALESCE(
+            json_agg(json_build_object(
+                'timestamp', r.timestamp,
+                'execution_time', r.ms,
+                'status', r.response_status,
+                'error', r.error_message,
+                'deviation', r.deviation
+            ) ORDER BY r.deviation DESC) FILTER (WHERE r.deviation >= :z_threshold AND r.beyond_fence),
+            '[]'
+        ) AS anomalies
+    FROM baseline b
+    JOIN spread s ON s.endpoint_name = b.endpoint_name
+    JOIN recent r ON r.endpoint_name = b.endpoint_name
+    GROUP BY b.endpoint_name, b.samples, b.q1, b.p50, b.q3, b.p95, b.p99, s.mad, s.scale
+""")
+
+def find_performance_anomalies(session, baseline_days=ANOMALY_BASELINE_DAYS, recent_hours=ANOMALY_RECENT_HOURS,
+                               z_threshold=ANOMALY_Z_THRESHOLD, source=ANOMALY_SOURCE):
+    """Slow recent requests and regressed endpoints against robust per-endpoint baselines
+
+    A request is anomalous when its robust z-score is >= z_threshold, it lies beyond
+    the q3 + 3*IQR fence, and it is at least ANOMALY_MIN_DELTA_MS above the median.
+    An endpoint has regressed when its recent median exceeds its baseline p95 by the
+    same margin over the median. Baseline and recent samples both come from
+    `source` ('synthetic' checks or 'live' request_timing rows).
+    """
+    now = datetime.utcnow()
+    recent_start = now - timedelta(hours=recent_hours)
+    rows = session.execute(ANOMALY_QUERY, {
+        'baseline_start': recent_start - timedelta(days=baseline_days),
+        'recent_start': recent_start,
+        'min_samples': ANOMALY_MIN_BASELINE_SAMPLES,
+        'iqr_fence': ANOMALY_IQR_FENCE,
+        'min_delta': ANOMALY_MIN_DELTA_MS,
+        'z_threshold': z_threshold,
+        'source': source
+    }).fetchall()
+
+    anomalies = []
+    regressions = []
+    for row in rows:
+        baseline = {
+            'baseline_p50': round(row.p50, 2),
+            'baseline_p95': round(row.p95, 2),
+            'baseline_p99': round(row.p99, 2),
+            'baseline_iqr': round(row.q3 - row.q1, 2),
+            'baseline_mad': round(row.mad, 2),
+            'baseline_samples': row.samples
+        }
+        threshold = max(row.p50 + z_threshold * row.scale,
+                        row.q3 + ANOMALY_IQR_FENCE * (row.q3 - row.q1),
+                        row.p50 + ANOMALY_MIN_DELTA_MS)
+
+        anomaly_list = row.anomalies if isinstance(row.anomalies, list) else json.loads(row.anomalies)
+        for sample in anomaly_list:
+            anomalies.append(dict(
+                baseline,
+                endpoint=row.endpoint_name,
+                timestamp=sample['timestamp'],
+                execution_time=sample['execution_time'],
+                baseline_avg=baseline['baseline_p50'],  # Kept for existing consumers
+                threshold=round(threshold, 2),
+                deviation=round(sample['deviation'], 2),
+                status=sample['status'],
+                error=sample['error']
+            ))
+
+        if row.recent_p50 > row.p95 and row.recent_p50 - row.p50 >= ANOMALY_MIN_DELTA_MS:
+            regressions.append(dict(
+                baseline,
+                endpoint=row.endpoint_name,
+                recent_p50=round(row.recent_p50, 2),
+                recent_samples=row.recent_samples,
+                deviation=round((row.recent_p50 - row.p50) / row.scale, 2)
+            ))
+
+    # Most extreme first
+    anomalies.sort(key=lambda x: x['deviation'], reverse=True)
+    regressions.sort(key=lambda x: x['deviation'], reverse=True)
+    return anomalies, regressions, len(rows)
+
+def filter_source(query):
+    """Limit a metrics query to ?source=live|synthetic (both when omitted)"""
+    source = request.args.get('source')
+    return query.filter(PerformanceMetric.source == source) if source else query
+
 @performance_bp.route('/performance')
 def performance_dashboard():
     """Main performance monitoring dashboard"""
@@ -27,7 +187,7 @@ def get_current_performance():
         cutoff = datetime.utcnow() - timedelta(hours=1)
         
         # Get average performance by endpoint
-        metrics = db.session.query(
+        metrics = filter_source(db.session.query(
             PerformanceMetric.endpoint_name,
             PerformanceMetric.module_category,
             func.avg(PerformanceMetric.query_execution_time_ms).label('avg_time'),
@@ -35,11 +195,15 @@ def get_current_performance():
             func.min(PerformanceMetric.query_execution_time_ms).label('min_time'),
             func.count().label('sample_count'),
             func.avg(PerformanceMetric.data_size_bytes).label('avg_size'),
-            func.sum(func.cast(PerformanceMetric.response_status != 200, db.Integer)).label('error_count')
+            func.sum(func.cast(PerformanceMetric.response_status != 200, db.Integer)).label('error_count'),
+            func.avg(PerformanceMetric.db_time_ms).label('avg_db_time'),
+            func.avg(PerformanceMetric.db_query_count).label('avg_db_queries'),
+            func.sum(PerformanceMetric.redis_hits).label('redis_hits'),
+            func.sum(PerformanceMetric.redis_misses).label('redis_misses')
         ).filter(
             PerformanceMetric.timestamp >= cutoff,
             PerformanceMetric.is_monitoring == True
-        ).group_by(
+        )).group_by(
             PerformanceMetric.endpoint_name,
             PerformanceMetric.module_category
         ).all()
@@ -57,7 +221,11 @@ def get_current_performance():
                 'min_time': round(metric.min_time, 2) if metric.min_time else 0,
                 'samples': metric.sample_count,
                 'avg_size_kb': round(metric.avg_size / 1024, 2) if metric.avg_size else 0,
-                'error_rate': round(error_rate, 2)
+                'error_rate': round(error_rate, 2),
+                'avg_db_time': round(metric.avg_db_time, 2) if metric.avg_db_time is not None else None,
+                'avg_db_queries': round(metric.avg_db_queries, 1) if metric.avg_db_queries is not None else None,
+                'redis_hits': metric.redis_hits or 0,
+                'redis_misses': metric.redis_misses or 0
             })
         
         # Sort by average time descending
@@ -129,59 +297,115 @@ def get_endpoint_history(endpoint):
 
 @performance_bp.route('/api/performance/anomalies')
 def get_performance_anomalies():
-    """Get recent performance anomalies"""
+    """Get recent performance anomalies and endpoint regressions (single query)"""
     try:
-        # Calculate baseline stats for last 7 days
-        baseline_cutoff = datetime.utcnow() - timedelta(days=7)
-        recent_cutoff = datetime.utcnow() - timedelta(hours=1)
+        baseline_days = int(request.args.get('days', ANOMALY_BASELINE_DAYS))
+        recent_hours = int(request.args.get('hours', ANOMALY_RECENT_HOURS))
+        z_threshold = float(request.args.get('z', ANOMALY_Z_THRESHOLD))
+        source = request.args.get('source', ANOMALY_SOURCE)
+        if source not in ('live', 'synthetic'):
+            return jsonify({'success': False, 'error': 'source must be live or synthetic'}), 400
         
-        # Get baseline statistics per endpoint
-        baselines = db.session.query(
-            PerformanceMetric.endpoint_name,
-            func.avg(PerformanceMetric.query_execution_time_ms).label('avg_time'),
-            func.stddev(PerformanceMetric.query_execution_time_ms).label('std_dev')
-        ).filter(
-            PerformanceMetric.timestamp >= baseline_cutoff,
-            PerformanceMetric.response_status == 200
-        ).group_by(
-            PerformanceMetric.endpoint_name
-        ).all()
+        anomalies, regressions, endpoints_checked = find_performance_anomalies(
+            db.session, baseline_days, recent_hours, z_threshold, source
+        )
+        
+        return jsonify({
+            'success': True,
+            'anomalies': anomalies[:ANOMALY_LIMIT],
+            'regressions': regressions,
+            'endpoints_checked': endpoints_checked,
+            'method': {
+                'baseline_days': baseline_days,
+                'recent_hours': recent_hours,
+                'z_threshold': z_threshold,
+                'source': source,
+                'iqr_fence': ANOMALY_IQR_FENCE,
+                'min_delta_ms': ANOMALY_MIN_DELTA_MS
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@performance_bp.route('/api/performance/sql')
+def get_sql_profile():
+    """Top SQL statements and routes by total DB time (from sql_profiler)"""
+    try:
+        hours = int(request.args.get('hours', 24))
+        limit = min(int(request.args.get('limit', 20)), 100)
+        cutoff = datetime.utcnow() - timedelta(hours=hours)
         
-        anomalies = []
+        if db.session.execute(text("SELECT to_regclass('sql_profile_stats')")).scalar() is None:
+            return jsonify({'success': True, 'statements': [], 'routes': []})
         
-        # Check recent metrics against baselines
-        for baseline in baselines:
-            if baseline.std_dev and baseline.std_dev > 0:
-                # Define anomaly as > 2 standard deviations from mean
-                threshold = baseline.avg_time + (2 * baseline.std_dev)
-                
-                # Find recent slow queries
-                slow_queries = PerformanceMetric.query.filter(
-                    PerformanceMetric.endpoint_name == baseline.endpoint_name,
-                    PerformanceMetric.timestamp >= recent_cutoff,
-                    PerformanceMetric.query_execution_time_ms > threshold
-                ).all()
-                
-                for query in slow_queries:
-                    deviation = (query.query_execution_time_ms - baseline.avg_time) / baseline.std_dev
-                    
-                    anomalies.append({
-                        'endpoint': query.endpoint_name,
-                        'timestamp': query.timestamp.isoformat(),
-                        'execution_time': query.query_execution_time_ms,
-                        'baseline_avg': round(baseline.avg_time, 2),
-                        'threshold': round(threshold, 2),
-                        'deviation': round(deviation, 2),
-                        'status': query.response_status,
-                        'error': query.error_message
-                    })
+        statements = db.session.execute(text("""
+            WITH top AS (
+                SELECT
+                    fingerprint,
+                    MIN(statement) AS statement,
+                    array_agg(DISTINCT route) AS routes,
+                    SUM(calls) AS calls,
+                    SUM(total_ms) AS total_ms,
+                    MAX(max_ms) AS max_ms,
+                    SUM(slow_calls) AS slow_calls
+                FROM sql_profile_stats
+                WHERE bucket >= :cutoff
+                GROUP BY fingerprint
+                ORDER BY SUM(total_ms) DESC
+                LIMIT :limit
+            )
+            SELECT top.*, p.plan, p.captured_at AS plan_captured_at, p.duration_ms AS plan_duration_ms
+            FROM top
+            LEFT JOIN LATERAL (
+                SELECT plan, captured_at, duration_ms
+                FROM sql_slow_query_plans
+                WHERE fingerprint = top.fingerprint
+                ORDER BY captured_at DESC
+                LIMIT 1
+            ) p ON TRUE
+            ORDER BY top.total_ms DESC
+        """), {'cutoff': cutoff, 'limit': limit}).fetchall()
         
-        # Sort by deviation (most extreme first)
-        anomalies.sort(key=lambda x: abs(x['deviation']), reverse=True)
+        routes = db.session.execute(text("""
+            SELECT
+                route,
+                SUM(calls) AS statements,
+                COUNT(DISTINCT fingerprint) AS distinct_statements,
+                SUM(total_ms) AS total_ms,
+                SUM(slow_calls) AS slow_calls
+            FROM sql_profile_stats
+            WHERE bucket >= :cutoff
+            GROUP BY route
+            ORDER BY SUM(total_ms) DESC
+            LIMIT :limit
+        """), {'cutoff': cutoff, 'limit': limit}).fetchall()
         
         return jsonify({
             'success': True,
-            'anomalies': anomalies[:20]  # Limit to top 20
+            'statements': [{
+                'fingerprint': row.fingerprint,
+                'statement': row.statement,
+                'routes': list(row.routes),
+                'calls': row.calls,
+                'total_ms': round(row.total_ms, 1),
+                'avg_ms': round(row.total_ms / row.calls, 2) if row.calls else 0,
+                'max_ms': round(row.max_ms, 1),
+                'slow_calls': row.slow_calls,
+                'plan': row.plan,
+                'plan_captured_at': row.plan_captured_at.isoformat() if row.plan_captured_at else None,
+                'plan_duration_ms': round(row.plan_duration_ms, 1) if row.plan_duration_ms else None
+            } for row in statements],
+            'routes': [{
+                'route': row.route,
+                'statements': row.statements,
+                'distinct_statements': row.distinct_statements,
+                'total_ms': round(row.total_ms, 1),
+                'slow_calls': row.slow_calls
+            } for row in routes]
         })
         
     except Exception as e:
@@ -190,6 +414,73 @@ def get_performance_anomalies():
             'error': str(e)
         }), 500
 
+@performance_bp.route('/api/performance/jobs')
+def get_job_runs():
+    """Nightly job runs and phase durations per job (from job_ledger)"""
+    try:
+        days = min(int(request.args.get('days', 30)), 365)
+        job = request.args.get('job')
+
+        if db.session.execute(text("SELECT to_regclass('job_runs')")).scalar() is None:
+            return jsonify({'success': True, 'jobs': []})
+
+        rows = db.session.execute(text(f"""
+            SELECT
+                r.id, r.job_name, r.started_at, r.status, r.duration_seconds,
+                r.api_calls, r.api_429s, r.rows_inserted, r.rows_updated, r.rows_deleted, r.error,
+                COALESCE(
+                    json_object_agg(p.phase, p.duration_seconds ORDER BY p.started_at)
+                        FILTER (WHERE p.phase IS NOT NULL),
+                    '{{}}'::json
+                ) AS phases
+            FROM job_runs r
+            LEFT JOIN job_run_phases p ON p.run_id = r.id
+            WHERE r.started_at >= NOW() - :days * INTERVAL '1 day'
+            {'AND r.job_name = :job' if job else ''}
+            GROUP BY r.id
+            ORDER BY r.job_name, r.started_at
+        """), {'days': days, 'job': job}).fetchall()
+
+        jobs = {}
+        for row in rows:
+            jobs.setdefault(row.job_name, []).append({
+                'run_id': row.id,
+                'started_at': row.started_at.isoformat(),
+                'status': row.status,
+                'duration': float(row.duration_seconds) if row.duration_seconds is not None else None,
+                'api_calls': row.api_calls,
+                'api_429s': row.api_429s,
+                'rows_inserted': row.rows_inserted,
+                'rows_updated': row.rows_updated,
+                'rows_deleted': row.rows_deleted,
+                'error': row.error,
+                'phases': {name: float(seconds) for name, seconds in row.phases.items() if seconds is not None}
+            })
+
+        summary = []
+        for job_name, runs in jobs.items():
+            durations = sorted(run['duration'] for run in runs if run['status'] == 'succeeded' and run['duration'])
+            median = durations[len(durations) // 2] if durations else None
+            latest = runs[-1]
+            summary.append({
+                'job_name': job_name,
+                'runs': runs,
+                'latest': latest,
+                'failed_runs': sum(1 for run in runs if run['status'] == 'failed'),
+                'median_duration': median,
+                # Latest run vs. the window median: > 0 means the job is getting slower
+                'slowdown_pct': round((latest['duration'] - median) / median * 100, 1)
+                    if median and latest['duration'] else None
+            })
+
+        return jsonify({'success': True, 'days': days, 'jobs': summary})
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @performance_bp.route('/api/performance/summary')
 def get_performance_summary():
     """Get overall performance summary statistics"""
@@ -203,7 +494,7 @@ def get_performance_summary():
         summary = {}
         
         for period_name, cutoff in [('hour', hour_ago), ('day', day_ago), ('week', week_ago)]:
-            stats = db.session.query(
+            stats = filter_source(db.session.query(
                 func.avg(PerformanceMetric.query_execution_time_ms).label('avg_time'),
                 func.percentile_cont(0.5).within_group(
                     PerformanceMetric.query_execution_time_ms
@@ -217,7 +508,7 @@ def get_performance_summary():
             ).filter(
                 PerformanceMetric.timestamp >= cutoff,
                 PerformanceMetric.is_monitoring == True
-            ).first()
+            )).first()
             
             error_rate = (stats.error_count / stats.total_requests * 100) if stats.total_requests > 0 else 0
             
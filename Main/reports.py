@@ -19,6 +19,7 @@ import pandas as pd
 import glob
 from datetime import datetime, timedelta
 import logging
+from sql_profiler import ProfilingConnection
 
 # Create blueprint
 reports_bp = Blueprint('reports', __name__)
@@ -516,7 +517,8 @@ def daily_enablement_data():
         match = re.match(r'postgresql://(.+):(.+)@(.+):(\d+)/(.+)', Config.SQLALCHEMY_DATABASE_URI)
         user, password, host, port, database = match.groups()
         
-        conn = psycopg2.connect(host=host, port=int(port), database=database, user=user, password=password)
+        conn = psycopg2.connect(host=host, port=int(port), database=database, user=user, password=password,
+                                connection_factory=ProfilingConnection)
         cursor = conn.cursor()
         
         # Build query based on parameters
@@ -906,7 +908,8 @@ def ready_queue_data():
         match = re.match(r'postgresql://(.+):(.+)@(.+):(\d+)/(.+)', Config.SQLALCHEMY_DATABASE_URI)
         user, password, host, port, database = match.groups()
         
-        conn = psycopg2.connect(host=host, port=int(port), database=database, user=user, password=password)
+        conn = psycopg2.connect(host=host, port=int(port), database=database, user=user, password=password,
+                                connection_factory=ProfilingConnection)
         cursor = conn.cursor()
         
         # Get ready queue data and enablements data
@@ -989,7 +992,8 @@ def enablement_details_list():
         match = re.match(r'postgresql://(.+):(.+)@(.+):(\d+)/(.+)', Config.SQLALCHEMY_DATABASE_URI)
         user, password, host, port, database = match.groups()
         
-        conn = psycopg2.connect(host=host, port=int(port), database=database, user=user, password=password)
+        conn = psycopg2.connect(host=host, port=int(port), database=database, user=user, password=password,
+                                connection_factory=ProfilingConnection)
         cursor = conn.cursor()
         
         # Build query based on parameters
@@ -1164,7 +1168,8 @@ def closure_attribution_data():
         match = re.match(r'postgresql://(.+):(.+)@(.+):(\d+)/(.+)', Config.SQLALCHEMY_DATABASE_URI)
         user, password, host, port, database = match.groups()
         
-        conn = psycopg2.connect(host=host, port=int(port), database=database, user=user, password=password)
+        conn = psycopg2.connect(host=host, port=int(port), database=database, user=user, password=password,
+                                connection_factory=ProfilingConnection)
         cursor = conn.cursor()
         
         # Build the WHERE clause based on parameters
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Request timing middleware for DSR Circuits
+Records every real request into performance_metrics (source = 'live')
+
+Per request:
+    - Wall time (before_request -> teardown_request)
+    - DB time and query count (sql_profiler hooks: SQLAlchemy engines and
+      psycopg2 connections opened with ProfilingConnection)
+    - Redis read hits/misses (clients from config.get_redis_connection report
+      through InstrumentedRedis.observer)
+    - Response size, status, blueprint, url rule and unhandled exception text
+
+Samples go to an in-memory buffer; a background thread inserts them in batches
+every FLUSH_INTERVAL seconds (or sooner once FLUSH_BATCH_SIZE are waiting), so a
+request never waits on the metrics insert. If the database is unavailable the
+buffer keeps the newest MAX_BUFFERED samples and drops the oldest.
+
+The hourly synthetic checks (performance_monitor.py, nightly/hourly_api_performance.py)
+keep writing source = 'synthetic'; the dashboard can filter with ?source=live.
+
+Settings (app.config): REQUEST_TIMING_ENABLED (default True),
+REQUEST_TIMING_SAMPLE_RATE (0.0-1.0, default 1.0), SQL_PROFILER_ENABLED (see sql_profiler.py)
+"""
+
+import json
+import time
+import logging
+import atexit
+import random
+import threading
+from collections import deque
+from datetime import datetime
+
+from flask import g, request, has_request_context
+
+from config import InstrumentedRedis
+from models import db, PerformanceMetric
+import sql_profiler  # SQLAlchemy/psycopg2 hooks fill db_ms and db_queries
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 10         # Seconds between background flushes
+FLUSH_BATCH_SIZE = 200      # Flush early once this many samples are waiting
+MAX_BUFFERED = 10000        # Oldest samples are dropped beyond this
+MAX_PARAMS_LENGTH = 1000
+EXCLUDED_ENDPOINTS = {'static'}
+
+REDIS_READ_COMMANDS = {'GET', 'MGET', 'HGET', 'HMGET', 'HGETALL', 'EXISTS'}
+
+class MetricsBuffer:
+    """Thread-safe sample buffer with a lazily started background flusher"""
+
+    def __init__(self):
+        self.samples = deque(maxlen=MAX_BUFFERED)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.app = None
+        self.stats = {'recorded': 0, 'flushed': 0, 'flush_errors': 0, 'dropped': 0}
+
+    def add(self, sample, app):
+        with self.lock:
+            if len(self.samples) == MAX_BUFFERED:
+                self.stats['dropped'] += 1  # append() evicts the oldest sample
+            self.samples.append(sample)
+            self.stats['recorded'] += 1
+            pending = len(self.samples)
+            if not (self.thread and self.thread.is_alive()):
+                self.app = app
+                self.thread = threading.Thread(target=self.run, name='request-timing-flusher', daemon=True)
+                self.thread.start()
+        if pending >= FLUSH_BATCH_SIZE:
+            self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(FLUSH_INTERVAL)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Insert everything buffered; samples go back to the buffer if the insert fails"""
+        with self.lock:
+            batch = list(self.samples)
+            self.samples.clear()
+        if not batch or self.app is None:
+            return
+
+        with self.app.app_context():
+            try:
+                db.session.execute(PerformanceMetric.__table__.insert(), batch)
+                db.session.commit()
+                self.stats['flushed'] += len(batch)
+            except Exception as e:
+                db.session.rollback()
+                self.stats['flush_errors'] += 1
+                with self.lock:
+                    # Failed batch goes back in front of anything recorded meanwhile; if that
+                    # overflows, drop the oldest (extendleft on a full deque would drop the newest)
+                    pending = batch + list(self.samples)
+                    dropped = max(0, len(pending) - MAX_BUFFERED)
+                    self.samples = deque(pending[dropped:], maxlen=MAX_BUFFERED)
+                    self.stats['dropped'] += dropped
+                logger.warning(f"Request timing flush failed ({len(batch) - dropped} samples kept, "
+                               f"{dropped} oldest dropped): {e}")
+            finally:
+                db.session.remove()
+
+metrics_buffer = MetricsBuffer()
+
+def _timing():
+    """Per-request counters, or None outside a timed request"""
+    if not has_request_context():
+        return None
+    return g.get('request_timing')
+
+def _record_redis_read(command, result):
+    timing = _timing()
+    if timing is None or command not in REDIS_READ_COMMANDS:
+        return
+    if command in ('MGET', 'HMGET'):
+        hits = sum(1 for value in result or [] if value is not None)
+        timing['redis_hits'] += hits
+        timing['redis_misses'] += len(result or []) - hits
+    elif result in (None, 0, {}):
+        timing['redis_misses'] += 1
+    else:
+        timing['redis_hits'] += 1
+
+def _request_params():
+    if not request.args:
+        return None
+    params = json.dumps(request.args.to_dict(flat=True))
+    return params[:MAX_PARAMS_LENGTH]
+
+def init_request_timing(app):
+    """Register the timing hooks on the app (and configure sql_profiler, which feeds them)"""
+    sql_profiler.init_sql_profiler(app)
+    if not app.config.get('REQUEST_TIMING_ENABLED', True):
+        return
+    sample_rate = app.config.get('REQUEST_TIMING_SAMPLE_RATE', 1.0)
+
+    InstrumentedRedis.observer = _record_redis_read
+    atexit.register(metrics_buffer.flush)
+
+    @app.before_request
+    def start_request_timing():
+        if request.endpoint in EXCLUDED_ENDPOINTS or random.random() >= sample_rate:
+            return
+        g.request_timing = {
+            'started': time.perf_counter(),
+            'timestamp': datetime.utcnow(),
+            'db_ms': 0.0,
+            'db_queries': 0,
+            'redis_hits': 0,
+            'redis_misses': 0,
+            'status': None,
+            'size': None
+        }
+
+    @app.after_request
+    def capture_response(response):
+        timing = _timing()
+        if timing is not None:
+            timing['status'] = response.status_code
+            timing['size'] = None if response.is_streamed else response.content_length
+        return response
+
+    @app.teardown_request
+    def record_request_timing(exc):
+        timing = _timing()
+        if timing is None:
+            return
+        g.request_timing = None
+
+        endpoint_name = request.url_rule.rule if request.url_rule else '<unmatched>'
+        metrics_buffer.add({
+            'endpoint_name': endpoint_name[:255],
+            'endpoint_method': request.method,
+            'endpoint_params': _request_params(),
+            'query_execution_time_ms': int((time.perf_counter() - timing['started']) * 1000),
+            'data_size_bytes': timing['size'],
+            'data_rows_returned': None,
+            'response_status': timing['status'] or 500,
+            'error_message': str(exc)[:1000] if exc else None,
+            'timestamp': timing['timestamp'],
+            'module_category': request.blueprint or 'app',
+            'db_query_count': timing['db_queries'],
+            'db_time_ms': int(timing['db_ms']),
+            'redis_hits': timing['redis_hits'],
+            'redis_misses': timing['redis_misses'],
+            'cache_hit': timing['redis_hits'] > 0 and timing['redis_misses'] == 0,
+            'user_agent': request.user_agent.string[:255] if request.user_agent else None,
+            'is_monitoring': True,
+            'source': 'live'
+        }, app)
@@ -0,0 +1,64 @@
+"""
+SITE CLASSIFICATION FROM DEVICE TAGS
+====================================
+
+Purpose:
+    - Classify a device/site once at ingest into store/hub/lab/voice/test
+    - Replaces per-request unnest(tags) + LIKE '%hub%' pattern filters on
+      inventory_devices and meraki_inventory with an indexed site_class column
+
+Used By:
+    - nightly/nightly_inventory_db.py (inventory_devices.site_class)
+    - nightly/nightly_meraki_db.py (meraki_inventory.site_class)
+    - inventory.py, dsrcircuits_blueprint.py (page filters)
+
+Classification:
+    A tag containing 'hub' wins over 'lab', then 'voice', then 'test', matching
+    the order of the original LIKE filters. Anything else is a 'store'.
+    create_site_class_columns.sql contains the same rules as a SQL CASE for backfill.
+"""
+
+import json
+
+SITE_CLASS_STORE = 'store'
+SITE_CLASS_HUB = 'hub'
+SITE_CLASS_LAB = 'lab'
+SITE_CLASS_VOICE = 'voice'
+SITE_CLASS_TEST = 'test'
+
+# Checked in order - first substring match wins
+SITE_CLASS_PRECEDENCE = (SITE_CLASS_HUB, SITE_CLASS_LAB, SITE_CLASS_VOICE, SITE_CLASS_TEST)
+
+# Classes the inventory pages have always hidden (hub/lab/voice tags)
+INVENTORY_VISIBLE_CLASSES = (SITE_CLASS_STORE, SITE_CLASS_TEST)
+
+def normalize_tags(tags):
+    """Return tags as a list of strings from a list, JSON text or space separated text"""
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = tags.strip()
+        if not tags or tags == 'null':
+            return []
+        try:
+            parsed = json.loads(tags)
+        except (json.JSONDecodeError, TypeError):
+            parsed = tags.split()
+        tags = parsed if isinstance(parsed, list) else [parsed]
+    return [str(tag) for tag in tags if tag]
+
+def classify_site(tags):
+    """
+    Classify a device/site from its tags
+    
+    Args:
+        tags: list of tags, JSON array text, or None
+    
+    Returns:
+        One of 'hub', 'lab', 'voice', 'test' or 'store'
+    """
+    lowered = [tag.lower() for tag in normalize_tags(tags)]
+    for site_class in SITE_CLASS_PRECEDENCE:
+        if any(site_class in tag for tag in lowered):
+            return site_class
+    return SITE_CLASS_STORE
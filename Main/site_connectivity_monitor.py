@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+SITE CONNECTIVITY MONITOR - ASYNC MULTI-SITE ENGINE
+===================================================
+
+Purpose:
+    - Watch hundreds of networks at once (e.g. every store in a VLAN migration wave)
+      instead of one network per ConnectivityMonitor process
+    - Keep a per-site state machine (up / degraded / down) in memory
+    - Record every state transition in site_connectivity_transitions and push it to
+      browsers over a server-sent-events stream
+
+How It Works:
+    1. One asyncio loop (background thread) shares a single httpx.AsyncClient
+    2. Sites that are due are polled together through the organization-wide
+       endpoints, NETWORKS_PER_REQUEST networks per call:
+           GET /organizations/{orgId}/devices/statuses?networkIds[]=...
+           GET /organizations/{orgId}/appliance/uplink/statuses?networkIds[]=...
+       Every call goes through the process-wide Meraki rate budget
+    3. Each site's observation is classified:
+           down     - MX offline, or no WAN uplink active/ready
+           degraded - any device offline/alerting, or a WAN uplink failed
+           up       - everything online
+    4. A new state must be observed CONFIRMATIONS times in a row before the site
+       transitions (filters single-poll blips)
+    5. Poll intervals adapt to state: healthy sites are polled slowly, degraded/down
+       sites and sites with an unconfirmed change are polled quickly
+
+Endpoints (site_monitor_bp):
+    GET  /api/connectivity-monitor/sites        - current state of every watched site
+    POST /api/connectivity-monitor/watch        - {network_ids, duration}
+    POST /api/connectivity-monitor/unwatch      - {network_ids}
+    GET  /api/connectivity-monitor/transitions  - recorded transitions (?network_id=&limit=)
+    GET  /api/connectivity-monitor/stream       - SSE: snapshot, then transition events
+
+Used By:
+    - vlan_migration_scheduler.py (watches each wave's networks while it migrates)
+    - CLI: python3 site_connectivity_monitor.py --network-ids L_1,L_2 --duration 1800
+"""
+
+import json
+import time
+import queue
+import asyncio
+import argparse
+import threading
+from datetime import datetime
+
+import httpx
+from flask import Blueprint, jsonify, request, Response, stream_with_context
+from psycopg2.extras import execute_values, Json
+
+from meraki_action_batches import rate_budget, get_organization_id, get_headers, BASE_URL
+from vlan_migration_db import get_db_connection
+
+site_monitor_bp = Blueprint('site_monitor', __name__)
+
+# Seconds between polls for a site in each state
+POLL_INTERVALS = {
+    'unknown': 0,
+    'up': 60,
+    'degraded': 20,
+    'down': 15
+}
+PENDING_POLL_INTERVAL = 10   # while a state change is waiting for confirmation
+RETRY_POLL_INTERVAL = 30     # after an API failure for the site's chunk
+
+# Consecutive observations required before entering a state
+CONFIRMATIONS = {
+    'up': 2,
+    'degraded': 2,
+    'down': 2
+}
+
+NETWORKS_PER_REQUEST = 50
+MAX_CONCURRENT_REQUESTS = 4
+DEFAULT_WATCH_SECONDS = 3600
+MAX_RETRIES = 5
+TICK_SECONDS = 1
+SSE_HEARTBEAT_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+CREATE_TRANSITIONS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS site_connectivity_transitions (
+        id SERIAL PRIMARY KEY,
+        network_id VARCHAR(50) NOT NULL,
+        network_name VARCHAR(255),
+        from_state VARCHAR(20) NOT NULL,
+        to_state VARCHAR(20) NOT NULL,
+        reason TEXT,
+        details JSONB,
+        occurred_at TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+    CREATE INDEX IF NOT EXISTS idx_site_connectivity_transitions_network
+        ON site_connectivity_transitions (network_id, occurred_at DESC);
+"""
+
+def classify_site(devices, uplinks):
+    """Derive (state, reason, details) from a network's device and uplink statuses"""
+    appliances = [d for d in devices if d.get('productType') == 'appliance']
+    offline = [d for d in devices if d.get('status') in ('offline', 'alerting')]
+    wan_links = [u for u in uplinks if u.get('status') != 'not connected']
+    usable_links = [u for u in wan_links if u.get('status') in ('active', 'ready')]
+    failed_links = [u for u in wan_links if u.get('status') == 'failed']
+
+    details = {
+        'devices': len(devices),
+        'devices_offline': [d.get('name') or d.get('serial') for d in offline],
+        'uplinks': {u.get('interface'): u.get('status') for u in wan_links}
+    }
+
+    if not devices:
+        return 'down', 'No device status reported', details
+    if appliances and all(d.get('status') == 'offline' for d in appliances):
+        return 'down', 'MX offline', details
+    if wan_links and not usable_links:
+        return 'down', 'All WAN uplinks failed', details
+    if failed_links:
+        return 'degraded', f"Uplink failed: {', '.join(u.get('interface', '?') for u in failed_links)}", details
+    if offline:
+        return 'degraded', f"{len(offline)} of {len(devices)} devices offline/alerting", details
+    return 'up', 'All devices online', details
+
+class SiteState:
+    """In-memory state machine for one watched network"""
+
+    def __init__(self, network_id, name, expires_at):
+        self.network_id = network_id
+        self.name = name
+        self.expires_at = expires_at
+        self.state = 'unknown'
+        self.since = datetime.now()
+        self.reason = None
+        self.details = {}
+        self.pending_state = None
+        self.pending_count = 0
+        self.next_poll = 0
+        self.last_polled = None
+
+    def observe(self, observed, reason, details):
+        """Apply one observation; returns a transition dict when the state changes"""
+        self.last_polled = datetime.now()
+        self.details = details
+
+        if observed == self.state:
+            self.pending_state = None
+            self.pending_count = 0
+            self.reason = reason
+            return None
+
+        if observed == self.pending_state:
+            self.pending_count += 1
+        else:
+            self.pending_state = observed
+            self.pending_count = 1
+
+        # The first observation of a newly watched site establishes its state directly
+        if self.state != 'unknown' and self.pending_count < CONFIRMATIONS[observed]:
+            return None
+
+        transition = {
+            'network_id': self.network_id,
+            'network_name': self.name,
+            'from_state': self.state,
+            'to_state': observed,
+            'reason': reason,
+            'details': details,
+            'occurred_at': self.last_polled.isoformat()
+        }
+        self.state = observed
+        self.since = self.last_polled
+        self.reason = reason
+        self.pending_state = None
+        self.pending_count = 0
+        return transition
+
+    def poll_interval(self):
+        if self.pending_state:
+            return PENDING_POLL_INTERVAL
+        return POLL_INTERVALS[self.state]
+
+    def to_dict(self):
+        return {
+            'network_id': self.network_id,
+            'name': self.name,
+            'state': self.state,
+            'since': self.since.isoformat(),
+            'reason': self.reason,
+            'pending_state': self.pending_state,
+            'details': self.details,
+            'last_polled': self.last_polled.isoformat() if self.last_polled else None,
+            'watch_expires': datetime.fromtimestamp(self.expires_at).isoformat()
+        }
+
+def record_transitions(transitions):
+    """Insert state transitions into site_connectivity_transitions"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(CREATE_TRANSITIONS_TABLE_SQL)
+        execute_values(cursor, """
+            INSERT INTO site_connectivity_transitions
+                (network_id, network_name, from_state, to_state, reason, details, occurred_at)
+            VALUES %s
+        """, [(t['network_id'], t['network_name'], t['from_state'], t['to_state'],
+               t['reason'], Json(t['details']), t['occurred_at']) for t in transitions])
+        conn.commit()
+
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_transitions(network_id=None, limit=200):
+    """Most recent recorded transitions, optionally for one network"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(CREATE_TRANSITIONS_TABLE_SQL)
+        cursor.execute("""
+            SELECT network_id, network_name, from_state, to_state, reason, details, occurred_at
+            FROM site_connectivity_transitions
+            WHERE (%s IS NULL OR network_id = %s)
+            ORDER BY occurred_at DESC
+            LIMIT %s
+        """, (network_id, network_id, limit))
+        rows = cursor.fetchall()
+        conn.commit()
+
+        return [{
+            'network_id': row[0],
+            'network_name': row[1],
+            'from_state': row[2],
+            'to_state': row[3],
+            'reason': row[4],
+            'details': row[5],
+            'occurred_at': row[6].isoformat()
+        } for row in rows]
+
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_network_names(network_ids):
+    """Network names for IDs from meraki_inventory (IDs not found keep their ID as name)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            SELECT DISTINCT network_id, network_name
+            FROM meraki_inventory
+            WHERE network_id = ANY(%s)
+        """, (list(network_ids),))
+        names = dict(cursor.fetchall())
+        return [{'id': network_id, 'name': names.get(network_id, network_id)} for network_id in network_ids]
+
+    finally:
+        cursor.close()
+        conn.close()
+
+class SiteConnectivityEngine:
+    """Polls all watched sites from one asyncio loop and publishes state transitions"""
+
+    def __init__(self):
+        self.sites = {}
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.thread = None
+        self.org_id = None
+        self.stats = {'polls': 0, 'api_calls': 0, 'api_errors': 0, 'transitions': 0}
+
+    def watch(self, networks, duration=DEFAULT_WATCH_SECONDS):
+        """Start (or extend) watching networks: list of {'id', 'name'}"""
+        expires_at = time.time() + duration
+        with self.lock:
+            for network in networks:
+                site = self.sites.get(network['id'])
+                if site:
+                    site.expires_at = max(site.expires_at, expires_at)
+                else:
+                    self.sites[network['id']] = SiteState(network['id'], network['name'], expires_at)
+        self.start()
+
+    def unwatch(self, network_ids):
+        with self.lock:
+            for network_id in network_ids:
+                self.sites.pop(network_id, None)
+
+    def snapshot(self):
+        with self.lock:
+            return [site.to_dict() for site in self.sites.values()]
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def publish(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A stalled browser must not block the engine; drop it
+                self.unsubscribe(subscriber)
+
+    def start(self):
+        """Start the polling loop in a background thread if it is not running"""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
+            self.thread.start()
+
+    async def run(self):
+        """Main loop: poll due sites until nothing is left to watch"""
+        self.org_id = self.org_id or await asyncio.to_thread(get_organization_id)
+        if not self.org_id:
+            print("Site connectivity monitor: organization not found")
+            return
+
+        limits = httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS,
+                              max_keepalive_connections=MAX_CONCURRENT_REQUESTS)
+        async with httpx.AsyncClient(headers=get_headers(), timeout=30, limits=limits) as client:
+            while True:
+                now = time.time()
+                with self.lock:
+                    for network_id in [n for n, s in self.sites.items() if s.expires_at <= now]:
+                        del self.sites[network_id]
+                    if not self.sites:
+                        self.thread = None
+                        return
+                    due = [site for site in self.sites.values() if site.next_poll <= now]
+
+                if due:
+                    await self.poll(client, due)
+                await asyncio.sleep(TICK_SECONDS)
+
+    async def get_all(self, client, url, params):
+        """GET every page of an organization endpoint within the shared rate budget"""
+        results = []
+        while url:
+            for attempt in range(MAX_RETRIES):
+                await asyncio.to_thread(rate_budget.acquire)
+                self.stats['api_calls'] += 1
+                response = await client.get(url, params=params)
+                if response.status_code == 429:
+                    rate_budget.penalize(int(response.headers.get('Retry-After', 2 ** attempt)))
+                    continue
+                response.raise_for_status()
+                break
+            else:
+                raise httpx.HTTPError(f"Max retries exceeded for {url}")
+
+            results.extend(response.json())
+            next_link = response.links.get('next')
+            url = next_link['url'] if next_link else None
+            params = None  # the next link already carries the query
+        return results
+
+    async def poll_chunk(self, client, sites):
+        """Poll one chunk of sites; returns transitions"""
+        network_ids = [site.network_id for site in sites]
+        params = [('networkIds[]', network_id) for network_id in network_ids] + [('perPage', 1000)]
+        org_url = f"{BASE_URL}/organizations/{self.org_id}"
+
+        try:
+            devices, appliances = await asyncio.gather(
+                self.get_all(client, f"{org_url}/devices/statuses", params),
+                self.get_all(client, f"{org_url}/appliance/uplink/statuses", params)
+            )
+        except (httpx.HTTPError, ValueError) as e:
+            self.stats['api_errors'] += 1
+            print(f"Site connectivity monitor: poll failed for {len(sites)} sites: {e}")
+            retry_at = time.time() + RETRY_POLL_INTERVAL
+            for site in sites:
+                site.next_poll = retry_at
+            return []
+
+        devices_by_network = {}
+        for device in devices:
+            devices_by_network.setdefault(device.get('networkId'), []).append(device)
+        uplinks_by_network = {}
+        for appliance in appliances:
+            uplinks_by_network.setdefault(appliance.get('networkId'), []).extend(appliance.get('uplinks') or [])
+
+        transitions = []
+        now = time.time()
+        with self.lock:
+            for site in sites:
+                state, reason, details = classify_site(devices_by_network.get(site.network_id, []),
+                                                       uplinks_by_network.get(site.network_id, []))
+                transition = site.observe(state, reason, details)
+                if transition:
+                    transitions.append(transition)
+                site.next_poll = now + site.poll_interval()
+        return transitions
+
+    async def poll(self, client, due):
+        """Poll all due sites, NETWORKS_PER_REQUEST per request, chunks in parallel"""
+        self.stats['polls'] += 1
+        chunks = [due[i:i + NETWORKS_PER_REQUEST] for i in range(0, len(due), NETWORKS_PER_REQUEST)]
+        chunk_transitions = await asyncio.gather(*(self.poll_chunk(client, chunk) for chunk in chunks))
+        transitions = [t for chunk in chunk_transitions for t in chunk]
+        if not transitions:
+            return
+
+        self.stats['transitions'] += len(transitions)
+        try:
+            await asyncio.to_thread(record_transitions, transitions)
+        except Exception as e:
+            print(f"Site connectivity monitor: could not record transitions: {e}")
+        for transition in transitions:
+            self.publish({'event': 'transition', 'data': transition})
+
+site_monitor = SiteConnectivityEngine()
+
+@site_monitor_bp.route('/api/connectivity-monitor/sites', methods=['GET'])
+def get_monitored_sites():
+    """Current state of every watched site"""
+    sites = site_monitor.snapshot()
+    counts = {}
+    for site in sites:
+        counts[site['state']] = counts.get(site['state'], 0) + 1
+    return jsonify({
+        'sites': sorted(sites, key=lambda s: s['name'] or ''),
+        'counts': counts,
+        'stats': site_monitor.stats
+    })
+
+@site_monitor_bp.route('/api/connectivity-monitor/watch', methods=['POST'])
+def watch_sites():
+    """Start watching networks"""
+    try:
+        data = request.json or {}
+        network_ids = data.get('network_ids', [])
+        if not network_ids:
+            return jsonify({'error': 'No networks selected'}), 400
+
+        site_monitor.watch(get_network_names(network_ids),
+                           duration=int(data.get('duration', DEFAULT_WATCH_SECONDS)))
+        return jsonify({'status': 'watching', 'networks_count': len(network_ids)})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@site_monitor_bp.route('/api/connectivity-monitor/unwatch', methods=['POST'])
+def unwatch_sites():
+    """Stop watching networks"""
+    network_ids = (request.json or {}).get('network_ids', [])
+    site_monitor.unwatch(network_ids)
+    return jsonify({'status': 'ok', 'networks_count': len(network_ids)})
+
+@site_monitor_bp.route('/api/connectivity-monitor/transitions', methods=['GET'])
+def get_site_transitions():
+    """Recorded state transitions"""
+    try:
+        return jsonify({'transitions': get_transitions(
+            request.args.get('network_id'),
+            min(request.args.get('limit', 200, type=int), 5000)
+        )})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@site_monitor_bp.route('/api/connectivity-monitor/stream', methods=['GET'])
+def stream_site_transitions():
+    """Server-sent events: a snapshot of all sites, then each transition as it happens"""
+    subscriber = site_monitor.subscribe()
+
+    def generate():
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(site_monitor.snapshot())}\n\n"
+            while True:
+                try:
+                    event = subscriber.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            site_monitor.unsubscribe(subscriber)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-site connectivity monitor')
+    parser.add_argument('--network-ids', required=True, help='Comma-separated network IDs to watch')
+    parser.add_argument('--duration', type=int, default=1800,
+                        help='Monitoring duration in seconds (default: 1800/30min)')
+
+    args = parser.parse_args()
+
+    network_ids = [n.strip() for n in args.network_ids.split(',') if n.strip()]
+    subscriber = site_monitor.subscribe()
+    site_monitor.watch(get_network_names(network_ids), duration=args.duration)
+    print(f"Watching {len(network_ids)} networks for {args.duration} seconds")
+
+    deadline = time.time() + args.duration
+    while time.time() < deadline:
+        try:
+            event = subscriber.get(timeout=5)
+        except queue.Empty:
+            continue
+        t = event['data']
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {t['network_name']}: "
+              f"{t['from_state']} → {t['to_state']} ({t['reason']})")
+
+    counts = {}
+    for site in site_monitor.snapshot():
+        counts[site['state']] = counts.get(site['state'], 0) + 1
+    print(f"\nFinal states: {counts}")
+    print(f"API calls: {site_monitor.stats['api_calls']}, transitions: {site_monitor.stats['transitions']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+SITE NAME INDEX - O(1) STORE CODE LOOKUPS
+=========================================
+
+Purpose:
+    - Match store/site names (new_stores.site_name, circuits.site_name, ...) against
+      Meraki network names without scanning every network for every store
+    - Built once per run from (name, value) pairs; each lookup is a dict hit
+
+Normalization:
+    - Names are upper-cased and runs of spaces/underscores/dashes collapse to one space,
+      so "azp_30" and "AZP  30" both become "AZP 30"
+    - Store codes (2-4 letters followed by 1-4 digits, optional letter suffix) are
+      tokenized out of every name: "AZP 30", "AZP30", "AZP-30" and
+      "AZP 30 - Phoenix Warehouse" all yield the code "AZP 30"; leading zeros are
+      normalized ("AZP 8" == "AZP 08")
+
+Lookups:
+    - exact: the normalized full name
+    - code: the normalized store code found in the name
+    lookup() tries exact first, then code. Names without a store code only match exactly.
+
+Used By:
+    - nightly/nightly_meraki_db.py (new store go-live detection)
+    - nightly_meraki_enriched_merged.py (new store go-live detection)
+
+Not Used By:
+    - circuits-by-site joins in nightly_enriched_db.py / nightly_meraki_enriched_merged.py:
+      already one dict lookup on the exact site name, and switching them to store-code
+      matching would change which circuits enrich which network
+    - find_matching_circuit() in nightly/nightly_meraki_enriched_merged_production.py:
+      its fallback is a fuzz.ratio similarity match, which an exact/code index cannot answer
+"""
+
+import re
+
+STORE_CODE_PATTERN = re.compile(r'(?<![A-Z0-9])([A-Z]{2,4}) ?(\d{1,4})([A-Z]?)(?![A-Z0-9])')
+SEPARATOR_PATTERN = re.compile(r'[\s_\-]+')
+
+def normalize_site_name(name):
+    """Upper-case a name and collapse whitespace/underscore/dash runs to single spaces"""
+    if not name:
+        return ''
+    return SEPARATOR_PATTERN.sub(' ', str(name).upper()).strip()
+
+def extract_store_codes(name):
+    """All normalized store codes in a name, e.g. 'AZP30 / AZP 31' -> ['AZP 30', 'AZP 31']"""
+    return [f"{prefix} {int(number):02d}{suffix}"
+            for prefix, number, suffix in STORE_CODE_PATTERN.findall(normalize_site_name(name))]
+
+def normalize_store_code(name):
+    """The store code a site name refers to, or None if it is not a store code"""
+    normalized = normalize_site_name(name)
+    match = STORE_CODE_PATTERN.fullmatch(normalized)
+    if not match:
+        return None
+    prefix, number, suffix = match.groups()
+    return f"{prefix} {int(number):02d}{suffix}"
+
+class SiteNameIndex:
+    """
+    Hash index from site names and store codes to values (network IDs, rows, ...)
+
+    Args:
+        entries: iterable of (name, value) pairs, e.g. (network_name, network_id)
+    """
+
+    def __init__(self, entries=()):
+        self.exact = {}
+        self.codes = {}
+        self.size = 0
+        for name, value in entries:
+            self.add(name, value)
+
+    @classmethod
+    def from_names(cls, names):
+        """Index names that map to themselves"""
+        return cls((name, name) for name in names)
+
+    def add(self, name, value):
+        normalized = normalize_site_name(name)
+        if not normalized:
+            return
+        self.exact.setdefault(normalized, []).append(value)
+        for code in set(extract_store_codes(normalized)):
+            self.codes.setdefault(code, []).append(value)
+        self.size += 1
+
+    def lookup_exact(self, site_name):
+        return self.exact.get(normalize_site_name(site_name), [])
+
+    def lookup_code(self, site_name):
+        code = normalize_store_code(site_name)
+        return self.codes.get(code, []) if code else []
+
+    def lookup(self, site_name):
+        """Values whose name equals site_name, else whose store code matches site_name's"""
+        return self.lookup_exact(site_name) or self.lookup_code(site_name)
+
+    def first(self, site_name, default=None):
+        values = self.lookup(site_name)
+        return values[0] if values else default
+
+    def __contains__(self, site_name):
+        return bool(self.lookup(site_name))
+
+    def __len__(self):
+        return self.size
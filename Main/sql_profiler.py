@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+SQL profiler for DSR Circuits
+Attributes every SQL statement run inside a request to the active route
+
+Hooks:
+    - SQLAlchemy: before/after_cursor_execute events on every Engine (ORM and text())
+    - psycopg2: connections opened with connection_factory=ProfilingConnection
+      (inventory.py, tags.py, reports.py) time each cursor execute(), whatever
+      cursor_factory the caller uses (RealDictCursor, DictCursor, ...)
+
+Each statement is normalized to a fingerprint (literals -> ?, IN lists collapsed)
+and counted per (hour, route, fingerprint). Statements slower than SLOW_QUERY_MS
+that are plain SELECTs get an EXPLAIN (ANALYZE, BUFFERS) captured on a separate
+connection, at most once per fingerprint per EXPLAIN_COOLDOWN seconds.
+
+A single background thread upserts the counters into sql_profile_stats every
+FLUSH_INTERVAL seconds and runs the queued EXPLAINs into sql_slow_query_plans;
+requests never wait on either. Statements outside a request (nightly jobs,
+background threads) are not profiled.
+
+The per-request totals also feed request_timing's db_time_ms / db_query_count.
+Settings (app.config): SQL_PROFILER_ENABLED (default True)
+"""
+
+import re
+import time
+import queue
+import hashlib
+import threading
+from datetime import datetime
+
+import psycopg2
+import psycopg2.extras
+import psycopg2.extensions
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import Config
+
+SLOW_QUERY_MS = 250         # Capture a plan for SELECTs slower than this
+EXPLAIN_COOLDOWN = 3600     # Seconds before the same fingerprint is explained again
+EXPLAIN_TIMEOUT_MS = 15000  # statement_timeout for the EXPLAIN ANALYZE re-run
+MAX_PENDING_EXPLAINS = 20
+FLUSH_INTERVAL = 30
+MAX_STATEMENT_LENGTH = 4000
+
+enabled = True
+
+def fingerprint_statement(statement):
+    """(fingerprint, normalized statement) - literals and parameter lists collapsed"""
+    normalized = re.sub(r"'(?:[^']|'')*'", '?', statement)
+    normalized = re.sub(r'%\(\w+\)s|%s|(?<!:):\w+\b|\$\d+', '?', normalized)
+    normalized = re.sub(r'\b\d+(?:\.\d+)?\b', '?', normalized)
+    normalized = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?...)', normalized)
+    normalized = re.sub(r'\s+', ' ', normalized).strip()
+    return hashlib.md5(normalized.encode()).hexdigest()[:16], normalized[:MAX_STATEMENT_LENGTH]
+
+def is_explainable(statement):
+    """Only plain reads are re-run under EXPLAIN ANALYZE"""
+    head = statement.lstrip().upper()
+    if not head.startswith(('SELECT', 'WITH')):
+        return False
+    return not re.search(r'\b(INSERT|UPDATE|DELETE|MERGE|FOR\s+UPDATE|FOR\s+SHARE|NEXTVAL|SETVAL)\b', head)
+
+class SqlProfiler:
+    """In-memory per-route statement counters, slow-plan queue and background writer"""
+
+    def __init__(self):
+        self.counters = {}  # (bucket, route, fingerprint) -> [calls, total_ms, max_ms, slow_calls, statement]
+        self.lock = threading.Lock()
+        self.explains = queue.Queue(maxsize=MAX_PENDING_EXPLAINS)
+        self.explained_at = {}
+        self.thread = None
+        self.tables_ready = False
+
+    def record(self, statement, duration_ms, executed_sql=None):
+        """Count one statement for the current route; queue a plan capture if slow"""
+        if not has_request_context():
+            return
+        timing = g.get('request_timing')
+        if timing is not None:
+            timing['db_ms'] += duration_ms
+            timing['db_queries'] += 1
+        if not enabled:
+            return
+
+        route = request.url_rule.rule if request.url_rule else request.path
+        fingerprint, normalized = fingerprint_statement(statement)
+        bucket = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        slow = duration_ms >= SLOW_QUERY_MS
+
+        with self.lock:
+            counter = self.counters.get((bucket, route, fingerprint))
+            if counter is None:
+                counter = self.counters[(bucket, route, fingerprint)] = [0, 0.0, 0.0, 0, normalized]
+            counter[0] += 1
+            counter[1] += duration_ms
+            counter[2] = max(counter[2], duration_ms)
+            counter[3] += 1 if slow else 0
+            explain = (slow and executed_sql and is_explainable(executed_sql)
+                       and time.time() - self.explained_at.get(fingerprint, 0) > EXPLAIN_COOLDOWN)
+            if explain:
+                self.explained_at[fingerprint] = time.time()
+            if not (self.thread and self.thread.is_alive()):
+                self.thread = threading.Thread(target=self.run, name='sql-profiler-writer', daemon=True)
+                self.thread.start()
+
+        if explain:
+            try:
+                self.explains.put_nowait((route, fingerprint, duration_ms, executed_sql))
+            except queue.Full:
+                pass
+
+    def run(self):
+        """Writer loop: run queued EXPLAINs as they arrive, flush counters every FLUSH_INTERVAL"""
+        next_flush = time.time() + FLUSH_INTERVAL
+        while True:
+            try:
+                job = self.explains.get(timeout=max(0.1, next_flush - time.time()))
+            except queue.Empty:
+                job = None
+            try:
+                if job:
+                    self.capture_plan(*job)
+                if time.time() >= next_flush:
+                    self.flush()
+                    next_flush = time.time() + FLUSH_INTERVAL
+            except Exception as e:
+                print(f"SQL profiler writer error: {e}")
+
+    def connect(self):
+        # Plain psycopg2 connection: the profiler's own statements are never profiled
+        conn = psycopg2.connect(Config.SQLALCHEMY_DATABASE_URI)
+        if not self.tables_ready:
+            cursor = conn.cursor()
+            create_tables(cursor)
+            conn.commit()
+            cursor.close()
+            self.tables_ready = True
+        return conn
+
+    def flush(self):
+        """Upsert the accumulated counters into sql_profile_stats"""
+        with self.lock:
+            counters = self.counters
+            self.counters = {}
+        if not counters:
+            return
+
+        rows = [(bucket, route[:255], fingerprint, statement, calls, total_ms, max_ms, slow_calls)
+                for (bucket, route, fingerprint), (calls, total_ms, max_ms, slow_calls, statement) in counters.items()]
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO sql_profile_stats
+                    (bucket, route, fingerprint, statement, calls, total_ms, max_ms, slow_calls)
+                VALUES %s
+                ON CONFLICT (bucket, route, fingerprint) DO UPDATE SET
+                    calls = sql_profile_stats.calls + EXCLUDED.calls,
+                    total_ms = sql_profile_stats.total_ms + EXCLUDED.total_ms,
+                    max_ms = GREATEST(sql_profile_stats.max_ms, EXCLUDED.max_ms),
+                    slow_calls = sql_profile_stats.slow_calls + EXCLUDED.slow_calls
+            """, rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def capture_plan(self, route, fingerprint, duration_ms, executed_sql):
+        """Re-run a slow SELECT under EXPLAIN (ANALYZE, BUFFERS) in a rolled-back transaction"""
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET LOCAL statement_timeout = %s", (EXPLAIN_TIMEOUT_MS,))
+            try:
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + executed_sql)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            except psycopg2.Error as e:
+                plan = f"EXPLAIN failed: {e}"
+            conn.rollback()
+
+            cursor.execute("""
+                INSERT INTO sql_slow_query_plans (route, fingerprint, duration_ms, statement, plan)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (route[:255], fingerprint, duration_ms, executed_sql[:MAX_STATEMENT_LENGTH], plan))
+            conn.commit()
+        finally:
+            conn.close()
+
+profiler = SqlProfiler()
+
+def create_tables(cursor):
+    """Create the profiler tables"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sql_profile_stats (
+            bucket TIMESTAMP NOT NULL,
+            route VARCHAR(255) NOT NULL,
+            fingerprint VARCHAR(16) NOT NULL,
+            statement TEXT,
+            calls INTEGER NOT NULL DEFAULT 0,
+            total_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+            max_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+            slow_calls INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket, route, fingerprint)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sql_slow_query_plans (
+            id SERIAL PRIMARY KEY,
+            captured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            route VARCHAR(255),
+            fingerprint VARCHAR(16),
+            duration_ms DOUBLE PRECISION,
+            statement TEXT,
+            plan TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sql_profile_stats_fingerprint ON sql_profile_stats(fingerprint, bucket)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sql_slow_query_plans_fingerprint ON sql_slow_query_plans(fingerprint, captured_at DESC)")
+
+def _executed_sql(cursor):
+    """Statement as sent to the server (parameters bound), when the driver exposes it"""
+    query = getattr(cursor, 'query', None)
+    if isinstance(query, bytes):
+        return query.decode('utf-8', 'replace')
+    return query
+
+# ---------------------------------------------------------------------------
+# SQLAlchemy hooks
+# ---------------------------------------------------------------------------
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault('sql_profiler_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('sql_profiler_start')
+    if starts:
+        duration_ms = (time.perf_counter() - starts.pop()) * 1000
+        profiler.record(statement, duration_ms, None if executemany else _executed_sql(cursor))
+
+# ---------------------------------------------------------------------------
+# psycopg2 hooks
+# ---------------------------------------------------------------------------
+
+class ProfilingCursorMixin:
+    """Times execute()/executemany() and reports them to the profiler"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            statement = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+            profiler.record(statement, (time.perf_counter() - started) * 1000, _executed_sql(self))
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            statement = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+            profiler.record(statement, (time.perf_counter() - started) * 1000)
+
+_profiling_cursor_classes = {}
+
+def profiling_cursor_class(cursor_class):
+    """cursor_class with ProfilingCursorMixin in front (cached per class)"""
+    if cursor_class not in _profiling_cursor_classes:
+        _profiling_cursor_classes[cursor_class] = type(
+            'Profiling' + cursor_class.__name__, (ProfilingCursorMixin, cursor_class), {}
+        )
+    return _profiling_cursor_classes[cursor_class]
+
+class ProfilingConnection(psycopg2.extensions.connection):
+    """psycopg2 connection whose cursors report to the SQL profiler
+
+    Usage: psycopg2.connect(..., connection_factory=ProfilingConnection)
+    """
+
+    def cursor(self, *args, **kwargs):
+        cursor_class = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = profiling_cursor_class(cursor_class)
+        return super().cursor(*args, **kwargs)
+
+def init_sql_profiler(app):
+    """Enable or disable profiling from app config (hooks are registered at import)"""
+    global enabled
+    enabled = app.config.get('SQL_PROFILER_ENABLED', True)
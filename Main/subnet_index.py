@@ -0,0 +1,282 @@
+"""
+SUBNET INDEX - CIDR STORAGE, ROLLUPS AND CONTAINMENT QUERIES
+============================================================
+
+Purpose:
+    - Store each network_vlans subnet as a PostgreSQL cidr (subnet_cidr) with a GiST
+      index, so prefix questions use the index instead of ILIKE on text
+    - Materialize the /16 and /24 rollups the subnets pages read; they are refreshed
+      after the nightly VLAN collection instead of being regrouped on every request
+    - Containment (<<=, >>=), overlap (&&) and free-space queries
+
+Tables / Views:
+    network_vlans.subnet_cidr  - network(subnet::inet), backfilled by refresh_subnet_index()
+    subnet_rollup_24           - one row per /24: sites, VLAN count, network type
+    subnet_rollup_16           - one row per /16: sites, /24s in use
+    Both rollups skip 172.0.0.0/8 and hub/voice/lab networks, like the subnets page stats.
+
+Filters:
+    A filter that looks like an address or prefix ("10.4", "10.4.0.0/16", "10.4.2.1")
+    becomes a cidr and is matched with && against the rollup network; anything else is
+    matched against the site names.
+
+Used By:
+    - nightly/nightly_meraki_db.py, nightly_meraki_enriched_merged.py (refresh after VLAN collection)
+    - subnets_blueprint.py, network_analysis_blueprint.py
+    - CLI: python3 subnet_index.py  (create + refresh now)
+    - create_subnet_index.sql  (same objects, for a fresh database before the first nightly run)
+"""
+
+import re
+import ipaddress
+from sqlalchemy import text
+
+MAX_FREE_BLOCKS = 4096   # free-space results are capped; a /8 split into /24s is 65536 blocks
+DEFAULT_OVERLAP_LIMIT = 1000
+
+# Only strings inet accepts (octets 0-255, mask 0-32), so the backfill cast cannot fail
+OCTET_PATTERN = r'(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)'
+SUBNET_PATTERN = rf'^{OCTET_PATTERN}(\.{OCTET_PATTERN}){{3}}/(3[0-2]|[12]?\d)$'
+PARTIAL_ADDRESS_PATTERN = re.compile(r'^\d{1,3}(\.\d{1,3}){0,3}\.?$')
+
+CREATE_SUBNET_INDEX_SQL = r"""
+    ALTER TABLE network_vlans ADD COLUMN IF NOT EXISTS subnet_cidr CIDR;
+    CREATE INDEX IF NOT EXISTS idx_network_vlans_subnet_cidr
+        ON network_vlans USING gist (subnet_cidr inet_ops);
+
+    CREATE MATERIALIZED VIEW IF NOT EXISTS subnet_rollup_24 AS
+    SELECT set_masklen(subnet_cidr, 24) AS parent_network,
+           COUNT(DISTINCT network_name) AS network_count,
+           string_agg(DISTINCT network_name, ', ' ORDER BY network_name) AS networks,
+           array_agg(DISTINCT network_name ORDER BY network_name) AS network_list,
+           COUNT(*) AS total_vlans,
+           CASE
+               WHEN set_masklen(subnet_cidr, 24) <<= '10.0.0.0/8' THEN 'Private 10/8'
+               WHEN set_masklen(subnet_cidr, 24) <<= '192.168.0.0/16' THEN 'Private 192.168/16'
+               ELSE 'Public'
+           END AS network_type
+    FROM network_vlans
+    WHERE subnet_cidr IS NOT NULL
+      AND family(subnet_cidr) = 4
+      AND NOT subnet_cidr <<= '172.0.0.0/8'
+      AND network_name NOT ILIKE '%hub%'
+      AND network_name NOT ILIKE '%voice%'
+      AND network_name NOT ILIKE '%lab%'
+    GROUP BY set_masklen(subnet_cidr, 24);
+
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_subnet_rollup_24_network
+        ON subnet_rollup_24 (parent_network);
+    CREATE INDEX IF NOT EXISTS idx_subnet_rollup_24_gist
+        ON subnet_rollup_24 USING gist (parent_network inet_ops);
+
+    CREATE MATERIALIZED VIEW IF NOT EXISTS subnet_rollup_16 AS
+    SELECT set_masklen(parent_network, 16) AS parent_16_network,
+           COUNT(DISTINCT site) AS site_count,
+           string_agg(DISTINCT site, ', ' ORDER BY site) AS sites,
+           array_agg(DISTINCT site ORDER BY site) AS site_list,
+           COUNT(DISTINCT parent_network) AS unique_24_networks,
+           array_to_string(array_agg(DISTINCT parent_network ORDER BY parent_network), ', ')
+               AS all_24_networks
+    FROM subnet_rollup_24, unnest(network_list) AS site
+    GROUP BY set_masklen(parent_network, 16);
+
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_subnet_rollup_16_network
+        ON subnet_rollup_16 (parent_16_network);
+    CREATE INDEX IF NOT EXISTS idx_subnet_rollup_16_gist
+        ON subnet_rollup_16 USING gist (parent_16_network inet_ops);
+"""
+
+BACKFILL_SUBNET_CIDR_SQL = rf"""
+    UPDATE network_vlans
+    SET subnet_cidr = CASE WHEN subnet ~ '{SUBNET_PATTERN}' THEN network(subnet::inet) END
+    WHERE subnet_cidr IS DISTINCT FROM
+          (CASE WHEN subnet ~ '{SUBNET_PATTERN}' THEN network(subnet::inet) END)
+"""
+
+def refresh_subnet_index(cursor):
+    """Backfill subnet_cidr and refresh both rollups (DB-API cursor; caller commits)
+
+    The /16 rollup is built from the /24 one, so /24 is refreshed first. Refreshes are
+    CONCURRENTLY so the subnets pages keep reading the previous rollup meanwhile.
+    Returns the number of network_vlans rows whose subnet_cidr changed.
+    """
+    cursor.execute(CREATE_SUBNET_INDEX_SQL)
+    cursor.execute(BACKFILL_SUBNET_CIDR_SQL)
+    changed = cursor.rowcount
+    cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY subnet_rollup_24")
+    cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY subnet_rollup_16")
+    return changed
+
+def parse_prefix(value):
+    """Filter text -> normalized IPv4 prefix string, or None if it is not an address
+
+    Partial dotted addresses cover their octets: "10" -> 10.0.0.0/8, "10.4" -> 10.4.0.0/16.
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    if PARTIAL_ADDRESS_PATTERN.match(value):
+        octets = value.rstrip('.').split('.')
+        value = '.'.join(octets + ['0'] * (4 - len(octets))) + f'/{8 * len(octets)}'
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        return None
+    return str(network) if network.version == 4 else None
+
+def free_blocks(prefix, used, size, limit=MAX_FREE_BLOCKS):
+    """Unused /size blocks inside prefix, given the subnets in use (strings or networks)
+
+    Returns (blocks, truncated). Used subnets larger than a block or straddling the
+    prefix are handled; blocks partially used are not free.
+    """
+    prefix = ipaddress.ip_network(prefix, strict=False)
+    if size < prefix.prefixlen:
+        raise ValueError(f"Block size /{size} is larger than {prefix}")
+
+    free = [prefix]
+    for subnet in ipaddress.collapse_addresses(ipaddress.ip_network(u, strict=False) for u in used):
+        remaining = []
+        for block in free:
+            if subnet.supernet_of(block):
+                continue
+            if block.supernet_of(subnet):
+                remaining.extend(block.address_exclude(subnet))
+            else:
+                remaining.append(block)
+        free = remaining
+
+    blocks = []
+    for block in sorted(free):
+        if block.prefixlen > size:
+            continue
+        for candidate in block.subnets(new_prefix=size):
+            if len(blocks) >= limit:
+                return blocks, True
+            blocks.append(str(candidate))
+    return blocks, False
+
+def _filter_clause(network_filter, network_column, sites_column):
+    """WHERE fragment and params for a page filter (prefix overlap or site name)"""
+    prefix = parse_prefix(network_filter)
+    if prefix:
+        return f"{network_column} && CAST(:prefix AS cidr)", {'prefix': prefix}
+    if network_filter:
+        return f"{sites_column} ILIKE :network_pattern", {'network_pattern': f'%{network_filter}%'}
+    return "TRUE", {}
+
+def get_rollup_16(conn, network_filter='', min_sites=1):
+    where, params = _filter_clause(network_filter, 'parent_16_network', 'sites')
+    params['min_sites'] = min_sites
+    return conn.execute(text(f"""
+        SELECT parent_16_network::text AS network_16, site_count, sites,
+               unique_24_networks, all_24_networks
+        FROM subnet_rollup_16
+        WHERE site_count >= :min_sites AND {where}
+        ORDER BY site_count DESC, parent_16_network
+    """), params).fetchall()
+
+def get_rollup_24(conn, network_filter='', min_sites=1):
+    where, params = _filter_clause(network_filter, 'parent_network', 'networks')
+    params['min_sites'] = min_sites
+    return conn.execute(text(f"""
+        SELECT parent_network::text AS network_24, network_count, networks, total_vlans
+        FROM subnet_rollup_24
+        WHERE network_count >= :min_sites AND {where}
+        ORDER BY network_count DESC, parent_network
+    """), params).fetchall()
+
+def get_shared_16_count(conn):
+    """/16 networks used by more than one site"""
+    return conn.execute(text(
+        "SELECT COUNT(*) FROM subnet_rollup_16 WHERE site_count > 1"
+    )).scalar() or 0
+
+def get_network_patterns(conn, limit=100):
+    """/24 networks reused across sites, most shared first"""
+    return conn.execute(text("""
+        SELECT parent_network::text AS network, network_count AS sites_using_network,
+               networks AS site_list, network_type
+        FROM subnet_rollup_24
+        WHERE network_count > 1
+        ORDER BY network_count DESC, parent_network
+        LIMIT :limit
+    """), {'limit': limit}).fetchall()
+
+def get_site_subnets(conn, site_name):
+    """A site's VLAN subnets with their /24 and the site's distinct /24 count"""
+    return conn.execute(text("""
+        SELECT vlan_id, name, subnet_cidr::text AS subnet,
+               set_masklen(subnet_cidr, 24)::text AS parent_24,
+               dhcp_handling, appliance_ip,
+               (SELECT COUNT(DISTINCT set_masklen(subnet_cidr, 24))
+                FROM network_vlans WHERE network_name = :site_name) AS unique_24_count
+        FROM network_vlans
+        WHERE network_name = :site_name AND subnet_cidr IS NOT NULL
+        ORDER BY vlan_id
+    """), {'site_name': site_name}).fetchall()
+
+def get_prefix_sites(conn, prefix):
+    """Sites with a VLAN subnet overlapping prefix (inside it or containing it)"""
+    return conn.execute(text("""
+        SELECT network_name,
+               array_agg(subnet_cidr::text ORDER BY subnet_cidr) AS subnets,
+               array_agg(vlan_id ORDER BY subnet_cidr) AS vlan_ids
+        FROM network_vlans
+        WHERE subnet_cidr && CAST(:prefix AS cidr)
+        GROUP BY network_name
+        ORDER BY network_name
+    """), {'prefix': prefix}).fetchall()
+
+def get_overlapping_subnets(conn, site_name=None, prefix=None, limit=DEFAULT_OVERLAP_LIMIT):
+    """Pairs of VLAN subnets at different sites that overlap
+
+    Optionally restricted to one site's subnets and/or subnets overlapping prefix.
+    Each pair is reported once (site names in order) unless site_name is given.
+    """
+    return conn.execute(text("""
+        SELECT a.network_name AS site, a.vlan_id, a.subnet_cidr::text AS subnet,
+               b.network_name AS other_site, b.vlan_id AS other_vlan_id,
+               b.subnet_cidr::text AS other_subnet
+        FROM network_vlans a
+        JOIN network_vlans b
+          ON b.subnet_cidr && a.subnet_cidr
+         AND b.network_name <> a.network_name
+        WHERE a.subnet_cidr IS NOT NULL
+          AND (CAST(:site_name AS text) IS NULL AND a.network_name < b.network_name
+               OR a.network_name = :site_name)
+          AND (CAST(:prefix AS cidr) IS NULL OR a.subnet_cidr && CAST(:prefix AS cidr))
+        ORDER BY a.subnet_cidr, a.network_name, b.network_name
+        LIMIT :limit
+    """), {'site_name': site_name, 'prefix': prefix, 'limit': limit}).fetchall()
+
+def get_free_space(conn, prefix, size=24, limit=MAX_FREE_BLOCKS):
+    """Unused /size blocks in prefix, given every VLAN subnet overlapping it"""
+    used = [row[0] for row in conn.execute(text("""
+        SELECT DISTINCT subnet_cidr::text FROM network_vlans
+        WHERE subnet_cidr && CAST(:prefix AS cidr)
+    """), {'prefix': prefix})]
+    blocks, truncated = free_blocks(prefix, used, size, limit)
+    return blocks, truncated, len(used)
+
+def main():
+    import time
+    from vlan_migration_db import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        started = time.time()
+        cursor = conn.cursor()
+        changed = refresh_subnet_index(cursor)
+        conn.commit()
+        cursor.execute("SELECT COUNT(*) FROM subnet_rollup_24")
+        rollup_24 = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM subnet_rollup_16")
+        rollup_16 = cursor.fetchone()[0]
+        print(f"Subnet index refreshed in {time.time() - started:.1f}s: {changed} subnets updated, "
+              f"{rollup_24} /24 and {rollup_16} /16 networks")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
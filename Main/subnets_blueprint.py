@@ -1,6 +1,10 @@
 """
 Subnets Blueprint - Network VLAN Analysis Module
 Shows subnet groupings by /16 and /24 networks with filtering
+
+Groupings come from the subnet_rollup_16/24 materialized views and prefix questions
+(which sites use a prefix, overlapping subnets, free space) from the GiST-indexed
+network_vlans.subnet_cidr column - see subnet_index.py
 """
 
 from flask import Blueprint, render_template, jsonify, request
@@ -8,7 +12,11 @@ import logging
 import os
 from models import db, NetworkVlan
 from sqlalchemy import func, distinct, and_, or_
-from sqlalchemy.sql import text
+from subnet_index import (
+    parse_prefix, get_rollup_16, get_rollup_24, get_shared_16_count, get_network_patterns,
+    get_site_subnets, get_prefix_sites, get_overlapping_subnets, get_free_space,
+    DEFAULT_OVERLAP_LIMIT, MAX_FREE_BLOCKS
+)
 
 logger = logging.getLogger(__name__)
 
@@ -39,10 +47,7 @@ def subnets_page():
             .scalar() or 0
         
         # Count shared /16 networks
-        shared_16_query = text("""
-            SELECT COUNT(*) FROM sites_by_16_network
-        """)
-        shared_16_count = db.session.execute(shared_16_query).scalar() or 0
+        shared_16_count = get_shared_16_count(db.session)
         
         return render_template('subnets.html',
                             total_networks=total_networks,
@@ -61,25 +66,8 @@ def api_networks_by_16():
         network_filter = request.args.get('network', '').strip()
         min_sites = int(request.args.get('min_sites', 1))
         
-        # Query the sites_by_16_network view
-        query = text("""
-            SELECT 
-                parent_16_network::text as network_16,
-                site_count,
-                sites,
-                unique_24_networks,
-                all_24_networks
-            FROM sites_by_16_network
-            WHERE site_count >= :min_sites
-            AND (:network_filter = '' OR sites ILIKE :network_pattern OR parent_16_network::text ILIKE :network_pattern)
-            ORDER BY site_count DESC, parent_16_network
-        """)
-        
-        results = db.session.execute(query, {
-            'min_sites': min_sites,
-            'network_filter': network_filter,
-            'network_pattern': f'%{network_filter}%'
-        }).fetchall()
+        # Query the materialized /16 rollup
+        results = get_rollup_16(db.session, network_filter, min_sites)
         
         data = []
         for row in results:
@@ -104,24 +92,8 @@ def api_networks_by_24():
         network_filter = request.args.get('network', '').strip()
         min_sites = int(request.args.get('min_sites', 1))
         
-        # Query the network_grouping_by_subnet view
-        query = text("""
-            SELECT 
-                parent_network::text as network_24,
-                network_count,
-                networks,
-                total_vlans
-            FROM network_grouping_by_subnet
-            WHERE (:network_filter = '' OR networks ILIKE :network_pattern OR parent_network::text ILIKE :network_pattern)
-            AND network_count >= :min_sites
-            ORDER BY network_count DESC, parent_network
-        """)
-        
-        results = db.session.execute(query, {
-            'network_filter': network_filter,
-            'network_pattern': f'%{network_filter}%',
-            'min_sites': min_sites
-        }).fetchall()
+        # Query the materialized /24 rollup
+        results = get_rollup_24(db.session, network_filter, min_sites)
         
         data = []
         for row in results:
@@ -141,32 +113,8 @@ def api_networks_by_24():
 def api_site_network_details(site_name):
     """Get detailed network information for a specific site"""
     try:
-        # Get VLANs for the site
-        vlans_query = text("""
-            SELECT 
-                network_name,
-                vlan_id,
-                name,
-                subnet::text as subnet,
-                parent_network::text as parent_24,
-                dhcp_handling,
-                appliance_ip
-            FROM network_vlans
-            WHERE network_name = :site_name
-            AND subnet IS NOT NULL
-            ORDER BY vlan_id
-        """)
-        
-        # Get unique /24 count separately
-        count_query = text("""
-            SELECT COUNT(DISTINCT parent_network) as unique_24_count
-            FROM network_vlans
-            WHERE network_name = :site_name
-            AND parent_network IS NOT NULL
-        """)
-        
-        results = db.session.execute(vlans_query, {'site_name': site_name}).fetchall()
-        count_result = db.session.execute(count_query, {'site_name': site_name}).fetchone()
+        # VLANs for the site with their /24 and the site's unique /24 count
+        results = get_site_subnets(db.session, site_name)
         
         data = []
         for row in results:
@@ -182,7 +130,7 @@ def api_site_network_details(site_name):
         return jsonify({
             'site_name': site_name,
             'vlans': data,
-            'unique_24_count': count_result.unique_24_count if count_result else 0
+            'unique_24_count': results[0].unique_24_count if results else 0
         })
     except Exception as e:
         logger.error(f"Error getting site details: {str(e)}")
@@ -192,19 +140,7 @@ def api_site_network_details(site_name):
 def api_network_patterns():
     """Get network pattern analysis"""
     try:
-        query = text("""
-            SELECT 
-                parent_network::text as network,
-                sites_using_network,
-                site_list,
-                network_type
-            FROM network_pattern_analysis
-            WHERE sites_using_network > 1
-            ORDER BY sites_using_network DESC
-            LIMIT 100
-        """)
-        
-        results = db.session.execute(query).fetchall()
+        results = get_network_patterns(db.session)
         
         data = []
         for row in results:
@@ -230,25 +166,9 @@ def export_subnet_data(export_type):
         min_sites = int(request.args.get('min_sites', 1))
         
         if view_type == 'by16':
-            query = text("""
-                SELECT * FROM sites_by_16_network
-                WHERE site_count >= :min_sites
-                AND (:network_filter = '' OR sites ILIKE :network_pattern OR parent_16_network::text ILIKE :network_pattern)
-                ORDER BY site_count DESC
-            """)
+            results = get_rollup_16(db.session, network_filter.strip(), min_sites)
         else:  # by24
-            query = text("""
-                SELECT * FROM network_grouping_by_subnet
-                WHERE network_count >= :min_sites
-                AND (:network_filter = '' OR networks ILIKE :network_pattern OR parent_network::text ILIKE :network_pattern)
-                ORDER BY network_count DESC
-            """)
-        
-        results = db.session.execute(query, {
-            'min_sites': min_sites,
-            'network_filter': network_filter,
-            'network_pattern': f'%{network_filter}%'
-        }).fetchall()
+            results = get_rollup_24(db.session, network_filter.strip(), min_sites)
         
         if export_type == 'excel':
             # Return Excel format - tabular with individual site columns
@@ -360,4 +280,82 @@ def export_subnet_data(export_type):
         
     except Exception as e:
         logger.error(f"Error exporting subnet data: {str(e)}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@subnets_bp.route('/api/prefix')
+def api_prefix_sites():
+    """Which sites use a prefix: VLAN subnets inside or containing ?prefix="""
+    try:
+        prefix = parse_prefix(request.args.get('prefix', ''))
+        if not prefix:
+            return jsonify({'error': 'prefix must be an IPv4 address or prefix, e.g. 10.4.0.0/16'}), 400
+        
+        results = get_prefix_sites(db.session, prefix)
+        
+        data = []
+        for row in results:
+            data.append({
+                'site_name': row.network_name,
+                'subnets': row.subnets,
+                'vlan_ids': row.vlan_ids
+            })
+        
+        return jsonify({'prefix': prefix, 'data': data, 'total': len(data)})
+    except Exception as e:
+        logger.error(f"Error getting sites for prefix: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@subnets_bp.route('/api/overlaps')
+def api_overlapping_subnets():
+    """Overlapping VLAN subnets between different sites, optionally for one ?site= or ?prefix="""
+    try:
+        site_name = request.args.get('site', '').strip() or None
+        prefix_arg = request.args.get('prefix', '').strip()
+        prefix = parse_prefix(prefix_arg)
+        if prefix_arg and not prefix:
+            return jsonify({'error': 'prefix must be an IPv4 address or prefix, e.g. 10.4.0.0/16'}), 400
+        limit = min(int(request.args.get('limit', DEFAULT_OVERLAP_LIMIT)), DEFAULT_OVERLAP_LIMIT * 10)
+        
+        results = get_overlapping_subnets(db.session, site_name, prefix, limit)
+        
+        data = []
+        for row in results:
+            data.append({
+                'site_name': row.site,
+                'vlan_id': row.vlan_id,
+                'subnet': row.subnet,
+                'other_site': row.other_site,
+                'other_vlan_id': row.other_vlan_id,
+                'other_subnet': row.other_subnet
+            })
+        
+        return jsonify({'data': data, 'total': len(data), 'truncated': len(data) >= limit})
+    except Exception as e:
+        logger.error(f"Error finding overlapping subnets: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@subnets_bp.route('/api/free-space')
+def api_free_space():
+    """Unused blocks of ?size= (default /24) inside ?prefix="""
+    try:
+        prefix = parse_prefix(request.args.get('prefix', ''))
+        if not prefix:
+            return jsonify({'error': 'prefix must be an IPv4 address or prefix, e.g. 10.4.0.0/16'}), 400
+        size = int(request.args.get('size', 24))
+        if not int(prefix.split('/')[1]) <= size <= 32:
+            return jsonify({'error': f'size must be between /{prefix.split("/")[1]} and /32'}), 400
+        
+        blocks, truncated, used_count = get_free_space(db.session, prefix, size)
+        
+        return jsonify({
+            'prefix': prefix,
+            'size': size,
+            'used_subnets': used_count,
+            'free_blocks': blocks,
+            'total': len(blocks),
+            'truncated': truncated,
+            'max_blocks': MAX_FREE_BLOCKS
+        })
+    except Exception as e:
+        logger.error(f"Error computing free space: {str(e)}")
+        return jsonify({'error': str(e)}), 500
@@ -1,5 +1,16 @@
 """
 System Health Blueprint - Server statistics and system information
+
+Metrics are collected by a background HealthSampler thread, not per request:
+- Fast metrics (CPU, memory, load, disk/network I/O rates, process count) every
+  SAMPLE_INTERVAL seconds into an in-memory ring buffer (HISTORY_SIZE points) that
+  also backs the sparkline history endpoint
+- Slow metrics (partitions, interfaces, database, services, AWX, git) every
+  SLOW_SAMPLE_INTERVAL seconds
+- Everything comes from psutil and /proc; the only subprocess is one batched
+  `systemctl show` per slow sample (no shell)
+- The sampler starts on the first API request and stops after IDLE_TIMEOUT
+  seconds without one, so an unwatched page costs nothing
 """
 
 import os
@@ -8,8 +19,11 @@ import platform
 import subprocess
 import socket
 import json
+import time
+import threading
+from collections import deque
 from datetime import datetime, timedelta
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, request, current_app
 from sqlalchemy import create_engine, text
 import sys
 import os
@@ -18,14 +32,39 @@ from config import Config
 
 system_health_bp = Blueprint('system_health', __name__)
 
-def run_command(command):
-    """Run shell command and return output"""
+SAMPLE_INTERVAL = 5         # Seconds between fast samples
+SLOW_SAMPLE_INTERVAL = 60   # Seconds between slow samples (database, services, ...)
+HISTORY_SIZE = 720          # Fast samples kept for sparklines (1 hour at 5s)
+IDLE_TIMEOUT = 300          # Stop sampling after this long without a request
+
+MONITORED_SERVICES = [
+    'dsrcircuits.service', 
+    'postgresql.service', 
+    'redis.service', 
+    'nginx.service',
+    'gitea.service',      # Git service
+    'k3s.service'         # K3s (includes AWX)
+]
+
+def run_command(args):
+    """Run a command (argument list, no shell) and return its output"""
     try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=10)
+        result = subprocess.run(args, capture_output=True, text=True, timeout=10)
         return result.stdout.strip() if result.returncode == 0 else None
     except (subprocess.TimeoutExpired, Exception):
         return None
 
+def read_cpu_model():
+    """CPU model name from /proc/cpuinfo"""
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return 'Unknown'
+
 def get_system_info():
     """Get comprehensive system information"""
     info = {}
@@ -91,7 +130,7 @@ def get_cpu_info():
     cpu_info['count_logical'] = psutil.cpu_count(logical=True)
     cpu_info['count_physical'] = psutil.cpu_count(logical=False)
     
-    # CPU usage (non-blocking for faster response)
+    # CPU usage since the previous call (i.e. over the last sample interval)
     cpu_info['usage_percent'] = psutil.cpu_percent(interval=None)  # Non-blocking
     cpu_info['usage_per_cpu'] = psutil.cpu_percent(interval=None, percpu=True)  # Non-blocking
     
@@ -119,11 +158,7 @@ def get_cpu_info():
     }
     
     # CPU model info from /proc/cpuinfo
-    try:
-        cpu_model = run_command("grep 'model name' /proc/cpuinfo | head -1 | cut -d':' -f2")
-        cpu_info['model'] = cpu_model.strip() if cpu_model else 'Unknown'
-    except:
-        cpu_info['model'] = 'Unknown'
+    cpu_info['model'] = read_cpu_model()
     
     return cpu_info
 
@@ -174,20 +209,25 @@ def get_disk_info():
     
     # Disk I/O statistics
     try:
-        disk_io = psutil.disk_io_counters()
-        io_stats = {
-            'read_count': disk_io.read_count,
-            'write_count': disk_io.write_count,
-            'read_bytes': disk_io.read_bytes,
-            'write_bytes': disk_io.write_bytes,
-            'read_time': disk_io.read_time,
-            'write_time': disk_io.write_time
-        }
+        io_stats = get_disk_info_io(psutil.disk_io_counters())
     except:
         io_stats = None
     
     return {'partitions': disks, 'io_stats': io_stats}
 
+def get_disk_info_io(disk_io):
+    """Disk I/O counters as a dict"""
+    if not disk_io:
+        return None
+    return {
+        'read_count': disk_io.read_count,
+        'write_count': disk_io.write_count,
+        'read_bytes': disk_io.read_bytes,
+        'write_bytes': disk_io.write_bytes,
+        'read_time': disk_io.read_time,
+        'write_time': disk_io.write_time
+    }
+
 def get_network_info():
     """Get network interface information"""
     interfaces = []
@@ -234,22 +274,27 @@ def get_network_info():
     
     # Network I/O statistics
     try:
-        net_io = psutil.net_io_counters()
-        io_stats = {
-            'bytes_sent': net_io.bytes_sent,
-            'bytes_recv': net_io.bytes_recv,
-            'packets_sent': net_io.packets_sent,
-            'packets_recv': net_io.packets_recv,
-            'errin': net_io.errin,
-            'errout': net_io.errout,
-            'dropin': net_io.dropin,
-            'dropout': net_io.dropout
-        }
+        io_stats = get_network_info_io(psutil.net_io_counters())
     except:
         io_stats = None
     
     return {'interfaces': interfaces, 'io_stats': io_stats}
 
+def get_network_info_io(net_io):
+    """Network I/O counters as a dict"""
+    if not net_io:
+        return None
+    return {
+        'bytes_sent': net_io.bytes_sent,
+        'bytes_recv': net_io.bytes_recv,
+        'packets_sent': net_io.packets_sent,
+        'packets_recv': net_io.packets_recv,
+        'errin': net_io.errin,
+        'errout': net_io.errout,
+        'dropin': net_io.dropin,
+        'dropout': net_io.dropout
+    }
+
 def get_process_info():
     """Get running process information (optimized)"""
     # Just get total count for speed
@@ -319,72 +364,201 @@ def get_database_info():
         }
 
 def get_service_info():
-    """Get systemd service information"""
-    services = [
-        'dsrcircuits.service', 
-        'postgresql.service', 
-        'redis.service', 
-        'nginx.service',
-        'gitea.service',      # Git service
-        'k3s.service'         # K3s (includes AWX)
-    ]
+    """Get systemd service information (one `systemctl show` for all services)"""
+    output = run_command(['systemctl', 'show', *MONITORED_SERVICES,
+                          '--property=Id,MainPID,ActiveState,LoadState,SubState'])
+    
+    # One block of KEY=value lines per unit, separated by blank lines, in argument order
+    blocks = output.split('\n\n') if output else []
     service_status = []
     
-    for service in services:
-        try:
-            result = run_command(f"systemctl is-active {service}")
-            status = result if result else 'unknown'
-            
-            # Get detailed info
-            result = run_command(f"systemctl show {service} --property=MainPID,ActiveState,LoadState,SubState")
-            details = {}
-            if result:
-                for line in result.split('\n'):
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        details[key] = value
-            
-            service_status.append({
-                'name': service,
-                'status': status,
-                'details': details
-            })
-        except:
-            service_status.append({
-                'name': service,
-                'status': 'unknown',
-                'details': {}
-            })
+    for index, service in enumerate(MONITORED_SERVICES):
+        details = {}
+        if index < len(blocks):
+            for line in blocks[index].split('\n'):
+                if '=' in line:
+                    key, value = line.split('=', 1)
+                    details[key] = value
+        details.pop('Id', None)
+        
+        service_status.append({
+            'name': service,
+            'status': details.get('ActiveState') or 'unknown',
+            'details': details
+        })
     
     return service_status
 
-def get_awx_info():
-    """Get AWX/Ansible information (lightweight)"""
-    try:
-        # Quick k3s service check only
-        k3s_status = run_command("systemctl is-active k3s.service")
+def get_awx_info(services):
+    """Get AWX/Ansible information (lightweight, from the k3s service status)"""
+    k3s_status = next((s['status'] for s in services if s['name'] == 'k3s.service'), 'unknown')
+    return {
+        'k3s_service': k3s_status,
+        'pods': [],  # Skip expensive kubectl calls
+        'web_status': 'skipped',  # Skip slow web checks
+        'cluster_accessible': k3s_status == 'active'
+    }
+
+def get_git_info(services):
+    """Get Git/Gitea service information (lightweight, from the gitea service status)"""
+    gitea_status = next((s['status'] for s in services if s['name'] == 'gitea.service'), 'unknown')
+    return {
+        'service_status': gitea_status,
+        'web_status': 'skipped',  # Skip slow web checks
+        'repo_accessible': gitea_status == 'active',
+        'version': 'Unknown'
+    }
+
+def rate(current, previous, elapsed):
+    """Per-second rate between two counter readings"""
+    if previous is None or elapsed <= 0 or current < previous:
+        return 0
+    return (current - previous) / elapsed
+
+class HealthSampler:
+    """Background collector: latest full snapshot plus a ring buffer of fast samples"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sample_lock = threading.Lock()  # One sample() at a time (previous_io, slow)
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.snapshot = None
+        self.snapshot_at = 0
+        self.slow = {}
+        self.slow_at = 0
+        self.previous_io = None
+        self.last_request = 0
+        self.thread = None
+        self.app = None
+        psutil.cpu_percent(interval=None)  # Prime so the first sample measures a real interval
+
+    def touch(self, app):
+        """Record a request and make sure the sampler is running"""
+        self.last_request = time.time()
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.app = app
+            self.thread = threading.Thread(target=self.run, name='system-health-sampler', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        """Sample every SAMPLE_INTERVAL seconds until nobody has asked for IDLE_TIMEOUT"""
+        while time.time() - self.last_request < IDLE_TIMEOUT:
+            started = time.time()
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"System health sampler error: {e}")
+            time.sleep(max(0, SAMPLE_INTERVAL - (time.time() - started)))
+        with self.lock:
+            self.thread = None
+            self.snapshot = None  # Don't serve it once nothing keeps it current
+
+    def sample_slow(self):
+        services = get_service_info()
+        with self.app.app_context():
+            database = get_database_info()
         return {
-            'k3s_service': k3s_status if k3s_status else 'unknown',
-            'pods': [],  # Skip expensive kubectl calls
-            'web_status': 'skipped',  # Skip slow web checks
-            'cluster_accessible': k3s_status == 'active'
+            'system': get_system_info(),
+            'disk_partitions': get_disk_info()['partitions'],
+            'network_interfaces': get_network_info()['interfaces'],
+            'database': database,
+            'services': services,
+            'awx': get_awx_info(services),
+            'git': get_git_info(services)
         }
-    except Exception as e:
-        return {'error': str(e)}
 
-def get_git_info():
-    """Get Git/Gitea service information (lightweight)"""
-    try:
-        # Quick service check only
-        gitea_status = run_command("systemctl is-active gitea.service")
-        return {
-            'service_status': gitea_status if gitea_status else 'unknown',
-            'web_status': 'skipped',  # Skip slow web checks
-            'repo_accessible': gitea_status == 'active',
-            'version': 'Unknown'
+    def sample(self):
+        """Collect one fast sample (and the slow metrics when they are due)"""
+        with self.sample_lock:
+            self._sample()
+
+    def _sample(self):
+        now = time.time()
+        if now - self.slow_at >= SLOW_SAMPLE_INTERVAL or not self.slow:
+            self.slow = self.sample_slow()
+            self.slow_at = now
+
+        cpu = get_cpu_info()
+        memory = get_memory_info()
+        processes = get_process_info()
+        load_avg = os.getloadavg()
+        disk_io = psutil.disk_io_counters()
+        net_io = psutil.net_io_counters()
+
+        previous = self.previous_io
+        elapsed = now - previous['time'] if previous else 0
+        point = {
+            'timestamp': datetime.fromtimestamp(now).isoformat(),
+            'cpu': cpu['usage_percent'],
+            'memory': memory['percent'],
+            'swap': memory['swap']['percent'],
+            'load_1min': load_avg[0],
+            'processes': processes['total_count'],
+            'disk_read_bps': rate(disk_io.read_bytes, previous and previous['disk_read'], elapsed) if disk_io else 0,
+            'disk_write_bps': rate(disk_io.write_bytes, previous and previous['disk_write'], elapsed) if disk_io else 0,
+            'net_sent_bps': rate(net_io.bytes_sent, previous and previous['net_sent'], elapsed) if net_io else 0,
+            'net_recv_bps': rate(net_io.bytes_recv, previous and previous['net_recv'], elapsed) if net_io else 0
+        }
+        self.previous_io = {
+            'time': now,
+            'disk_read': disk_io.read_bytes if disk_io else None,
+            'disk_write': disk_io.write_bytes if disk_io else None,
+            'net_sent': net_io.bytes_sent if net_io else None,
+            'net_recv': net_io.bytes_recv if net_io else None
         }
-    except Exception as e:
-        return {'error': str(e)}
+
+        system = dict(self.slow['system'])
+        system['load_avg'] = {'1min': load_avg[0], '5min': load_avg[1], '15min': load_avg[2]}
+        snapshot = {
+            'timestamp': point['timestamp'],
+            'system': system,
+            'cpu': cpu,
+            'memory': memory,
+            'disk': {'partitions': self.slow['disk_partitions'], 'io_stats': get_disk_info_io(disk_io)},
+            'network': {'interfaces': self.slow['network_interfaces'], 'io_stats': get_network_info_io(net_io)},
+            'processes': processes,
+            'database': self.slow['database'],
+            'services': self.slow['services'],
+            'awx': self.slow['awx'],
+            'git': self.slow['git']
+        }
+
+        with self.lock:
+            self.history.append(point)
+            self.snapshot = snapshot
+            self.snapshot_at = now
+
+    def current_snapshot(self):
+        """The stored snapshot, or None when there is none or it is older than 2 sample intervals"""
+        with self.lock:
+            if self.snapshot is None or time.time() - self.snapshot_at > 2 * SAMPLE_INTERVAL:
+                return None
+            return self.snapshot
+
+    def latest(self):
+        """Most recent full snapshot (sampled inline if the sampler has not run or fallen behind)"""
+        snapshot = self.current_snapshot()
+        if snapshot is None:
+            with self.sample_lock:
+                # Another request may have sampled while we waited
+                snapshot = self.current_snapshot()
+                if snapshot is None:
+                    self._sample()
+                    with self.lock:
+                        snapshot = self.snapshot
+        return snapshot
+
+    def get_history(self, minutes=None):
+        with self.lock:
+            points = list(self.history)
+        if minutes:
+            cutoff = (datetime.now() - timedelta(minutes=minutes)).isoformat()
+            points = [p for p in points if p['timestamp'] >= cutoff]
+        return points
+
+health_sampler = HealthSampler()
 
 @system_health_bp.route('/system-health')
 def system_health_page():
@@ -393,55 +567,43 @@ def system_health_page():
 
 @system_health_bp.route('/api/system-health/all')
 def system_health_data():
-    """Get all system health data"""
+    """Get all system health data (latest background sample)"""
+    health_sampler.touch(current_app._get_current_object())
+    snapshot = health_sampler.latest()
+    return jsonify(dict(snapshot, sample_interval=SAMPLE_INTERVAL))
+
+@system_health_bp.route('/api/system-health/history')
+def system_health_history():
+    """Fast-sample history for sparklines (?minutes=N, default all buffered)"""
+    health_sampler.touch(current_app._get_current_object())
+    minutes = request.args.get('minutes', type=int)
     return jsonify({
-        'timestamp': datetime.now().isoformat(),
-        'system': get_system_info(),
-        'cpu': get_cpu_info(),
-        'memory': get_memory_info(),
-        'disk': get_disk_info(),
-        'network': get_network_info(),
-        'processes': get_process_info(),
-        'database': get_database_info(),
-        'services': get_service_info(),
-        'awx': get_awx_info(),
-        'git': get_git_info()
+        'interval': SAMPLE_INTERVAL,
+        'points': health_sampler.get_history(minutes)
     })
 
 @system_health_bp.route('/api/system-health/summary')
 def system_health_summary():
     """Get system health summary for other pages (fast version)"""
-    # Quick system stats only
-    memory = psutil.virtual_memory()
-    cpu_count = psutil.cpu_count()
-    load_avg = os.getloadavg()
-    hostname = socket.gethostname()
-    
-    # Get uptime quickly
-    try:
-        with open('/proc/uptime', 'r') as f:
-            uptime_seconds = float(f.readline().split()[0])
-            uptime_delta = timedelta(seconds=uptime_seconds)
-            uptime = str(uptime_delta).split('.')[0]
-    except:
-        uptime = 'Unknown'
-    
-    # Quick CPU usage (non-blocking)
-    cpu_usage = psutil.cpu_percent(interval=None)
+    health_sampler.touch(current_app._get_current_object())
+    snapshot = health_sampler.latest()
+    memory = snapshot['memory']
+    cpu_count = snapshot['cpu']['count']
+    load_1min = snapshot['system']['load_avg']['1min']
     
     # Calculate simple health score
     health_score = 100
     alerts = []
     
     # Memory check
-    if memory.percent > 85:
+    if memory['percent'] > 85:
         health_score -= 20
-        alerts.append(f"High memory usage: {memory.percent:.1f}%")
+        alerts.append(f"High memory usage: {memory['percent']:.1f}%")
     
     # Load average check
-    if load_avg[0] > cpu_count * 2:
+    if load_1min > cpu_count * 2:
         health_score -= 15
-        alerts.append(f"High system load: {load_avg[0]:.2f}")
+        alerts.append(f"High system load: {load_1min:.2f}")
     
     health_score = max(0, health_score)
     
@@ -450,11 +612,11 @@ def system_health_summary():
         'status': 'healthy' if health_score >= 80 else 'warning' if health_score >= 60 else 'critical',
         'alerts': alerts,
         'summary': {
-            'hostname': hostname,
-            'os': platform.system(),
-            'uptime': uptime,
-            'cpu_usage': cpu_usage,
-            'memory_usage': memory.percent,
-            'load_avg': load_avg[0]
+            'hostname': snapshot['system']['hostname'],
+            'os': snapshot['system']['system'],
+            'uptime': snapshot['system']['uptime'],
+            'cpu_usage': snapshot['cpu']['usage_percent'],
+            'memory_usage': memory['percent'],
+            'load_avg': load_1min
         }
-    })
\ No newline at end of file
+    })
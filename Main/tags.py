@@ -11,6 +11,9 @@ import time
 from datetime import datetime
 from dotenv import load_dotenv
 from config import Config
+from sql_profiler import ProfilingConnection
+from site_classification import classify_site
+from meraki_action_batches import device_update_action, run_action_batches
 import json
 
 # Load environment variables
@@ -36,7 +39,8 @@ def get_db_connection():
         port=int(port),
         database=database,
         user=user,
-        password=password
+        password=password,
+        connection_factory=ProfilingConnection
     )
 
 def make_api_request(url, method='GET', data=None, max_retries=3):
@@ -190,9 +194,9 @@ def update_device_tags(device_serial):
         try:
             cursor.execute("""
                 UPDATE meraki_inventory 
-                SET device_tags = %s, last_updated = NOW()
+                SET device_tags = %s, site_class = %s, last_updated = NOW()
                 WHERE device_serial = %s
-            """, (tags, device_serial))  # Pass list directly for PostgreSQL array
+            """, (tags, classify_site(tags), device_serial))  # Pass list directly for PostgreSQL array
             conn.commit()
             
             return jsonify({
@@ -247,9 +251,9 @@ def update_network_tags(network_name):
                 # Update database
                 cursor.execute("""
                     UPDATE meraki_inventory 
-                    SET device_tags = %s, last_updated = NOW()
+                    SET device_tags = %s, site_class = %s, last_updated = NOW()
                     WHERE device_serial = %s
-                """, (tags, device_serial))  # Pass list directly for PostgreSQL array
+                """, (tags, classify_site(tags), device_serial))  # Pass list directly for PostgreSQL array
                 success_count += 1
             else:
                 error_count += 1
@@ -275,35 +279,84 @@ def update_network_tags(network_name):
 
 @tags_bp.route('/api/tags/bulk', methods=['PUT'])
 def bulk_update_tags():
-    """Update tags for multiple networks/devices"""
+    """Update tags for multiple networks/devices
+    
+    Devices for all networks are fetched in one query and the tag writes go out
+    through Meraki action batches instead of one PUT per device.
+    """
     data = request.get_json()
     updates = data.get('updates', [])  # List of {network_name, tags}
     
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("""
+            SELECT network_name, device_serial 
+            FROM meraki_inventory 
+            WHERE network_name = ANY(%s) AND device_model LIKE 'MX%%'
+        """, ([update.get('network_name') for update in updates],))
+        
+        network_devices = {}
+        for network_name, device_serial in cursor.fetchall():
+            network_devices.setdefault(network_name, []).append(device_serial)
+        
+        actions = []
+        action_targets = []  # (update index, device_serial, tags) per action
+        for index, update in enumerate(updates):
+            tags = update.get('tags', [])
+            for device_serial in network_devices.get(update.get('network_name'), []):
+                actions.append(device_update_action(device_serial, {'tags': tags}))
+                action_targets.append((index, device_serial, tags))
+        
+        device_results = [{'success_count': 0, 'errors': []} for _ in updates]
+        updated_rows = []
+        for (index, device_serial, tags), result in zip(action_targets, run_action_batches(actions)):
+            if 'error' in result:
+                device_results[index]['errors'].append(f"{device_serial}: {result['error']}")
+            else:
+                device_results[index]['success_count'] += 1
+                updated_rows.append((device_serial, tags, classify_site(tags)))
+        
+        # Update database for every device Meraki accepted
+        if updated_rows:
+            psycopg2.extras.execute_values(cursor, """
+                UPDATE meraki_inventory AS mi
+                SET device_tags = v.tags, site_class = v.site_class, last_updated = NOW()
+                FROM (VALUES %s) AS v(device_serial, tags, site_class)
+                WHERE mi.device_serial = v.device_serial
+            """, updated_rows, template='(%s, %s::text[], %s)')
+        conn.commit()
+        
+    except Exception as e:
+        conn.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+    
     success_count = 0
     error_count = 0
     results = []
     
-    for update in updates:
+    for update, device_result in zip(updates, device_results):
         network_name = update.get('network_name')
-        tags = update.get('tags', [])
-        
-        # Use the network update endpoint
-        response = update_network_tags(network_name)
-        result_data = response[0].get_json() if isinstance(response, tuple) else response.get_json()
+        message = f"Updated {device_result['success_count']} devices, {len(device_result['errors'])} errors"
         
-        if result_data.get('success'):
+        if network_name in network_devices and not device_result['errors']:
             success_count += 1
             results.append({
                 'network_name': network_name,
                 'success': True,
-                'message': result_data.get('message')
+                'message': message
             })
         else:
             error_count += 1
             results.append({
                 'network_name': network_name,
                 'success': False,
-                'error': result_data.get('error')
+                'error': 'No devices found for network' if network_name not in network_devices
+                         else f"{message}: {'; '.join(device_result['errors'])}"
             })
     
     return jsonify({
@@ -22,6 +22,12 @@ try:
 except ImportError:
     db_available = False
 
+from vlan_migration_db import get_schedule_status
+from vlan_migration_scheduler import (
+    start_schedule, summarize_schedule, get_schedule_logs, recover_interrupted_schedules,
+    DEFAULT_WAVE_SIZE, DEFAULT_MAX_CONCURRENCY
+)
+
 # Load environment variables
 load_dotenv('/usr/local/bin/meraki.env')
 API_KEY = os.getenv('MERAKI_API_KEY')
@@ -29,6 +35,16 @@ ORG_ID = '436883'  # DTC-Store-Inventory-All (production stores)
 
 vlan_migration_bp = Blueprint('vlan_migration', __name__)
 
+@vlan_migration_bp.record_once
+def recover_schedules(state):
+    """Schedules run in-process: close out any left running by a previous process"""
+    try:
+        recovered = recover_interrupted_schedules()
+        if recovered:
+            print(f"Marked interrupted VLAN migration schedules: {', '.join(recovered)}")
+    except Exception as e:
+        print(f"Error recovering VLAN migration schedules: {e}")
+
 # Global migration jobs tracker
 migration_jobs = {}
 
@@ -413,6 +429,63 @@ def start_migration():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@vlan_migration_bp.route('/api/vlan-migration/schedule', methods=['POST'])
+def start_migration_schedule():
+    """Schedule migrations for many networks in waves (parallel within a wave)"""
+    try:
+        data = request.json or {}
+        network_ids = data.get('network_ids') or None
+        if not network_ids and data.get('all') is not True:
+            return jsonify({'error': 'Provide network_ids, or all=true to migrate every legacy network'}), 400
+        
+        # TEST MODE: Control via environment variable
+        TEST_MODE = os.getenv('VLAN_MIGRATION_TEST_MODE', 'true').lower() == 'true'
+        if TEST_MODE:
+            allowed_network = 'L_3790904986339115852'  # TST 01
+            if network_ids != [allowed_network]:
+                return jsonify({
+                    'error': 'Test Mode: Only TST 01 can be migrated. Set VLAN_MIGRATION_TEST_MODE=false for production',
+                    'allowed_network': 'TST 01'
+                }), 403
+        
+        schedule_id, waves = start_schedule(
+            network_ids=network_ids,
+            wave_size=data.get('wave_size', DEFAULT_WAVE_SIZE),
+            max_concurrency=data.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+            dry_run=bool(data.get('dry_run', False)),
+            halt_on_failure=bool(data.get('halt_on_failure', True)),
+            created_by=session.get('user', 'anonymous')
+        )
+        
+        return jsonify({
+            'schedule_id': schedule_id,
+            'status': 'started' if waves else 'completed',
+            'networks_count': sum(len(wave) for wave in waves),
+            'waves': [[network['name'] for network in wave] for wave in waves]
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@vlan_migration_bp.route('/api/vlan-migration/schedule/<schedule_id>', methods=['GET'])
+def get_migration_schedule(schedule_id):
+    """Get wave and per-network status of a migration schedule"""
+    try:
+        schedule = get_schedule_status(schedule_id)
+        if not schedule:
+            return jsonify({'error': 'Schedule not found'}), 404
+        
+        since = request.args.get('since', 0, type=int)
+        console_logs, log_index = get_schedule_logs(schedule_id, since)
+        
+        schedule = summarize_schedule(schedule)
+        schedule['console_logs'] = console_logs
+        schedule['log_index'] = log_index
+        return jsonify(schedule)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @vlan_migration_bp.route('/api/vlan-migration/status/<job_id>', methods=['GET'])
 def get_migration_status(job_id):
     """Get status of migration job"""
@@ -10,6 +10,15 @@ This script performs a complete VLAN migration by:
 4. Creating new VLANs with same settings
 5. Restoring all references with new VLAN IDs
 
+Execution:
+- Backup reads run concurrently over a pooled session
+- Writes go through Meraki action batches; each VLAN's delete + re-create is
+  one ordered, atomic batch, so no fixed sleeps are needed between them
+- Every step is checkpointed in vlan_migration_checkpoints; re-running an
+  interrupted migration resumes after the last completed step (--restart to
+  start over)
+- Per-phase timings are included in the report
+
 Author: Claude
 Date: July 2025
 """
@@ -20,10 +29,16 @@ import json
 import requests
 import time
 import argparse
+import psycopg2
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 import copy
 
+from meraki_action_batches import submit_batch, run_action_batches, rate_budget
+from vlan_migration_db import load_checkpoints, save_checkpoint, clear_checkpoints
+
 # Load environment
 load_dotenv('/usr/local/bin/meraki.env')
 API_KEY = os.getenv("MERAKI_API_KEY")
@@ -64,440 +79,470 @@ IP_CHANGES = {
     }
 }
 
+# Temporary VLANs that hold port assignments while the legacy VLANs are re-created
+TEMP_VLAN_MAPPING = {
+    1: 999,     # Data ports to temp VLAN
+    101: 998,   # Voice to temp VLAN
+    801: 997,   # IoT to temp VLAN
+    201: 996    # Credit card to temp VLAN
+}
+
+BACKUP_WORKERS = 6      # concurrent read-only GETs during backup (Meraki allows 10/s per org)
+MAX_RETRIES = 5
+
+class MigrationStepError(Exception):
+    """Raised when a migration step's writes fail; the step is left un-checkpointed"""
+    pass
+
 class CompleteVlanMigrator:
-    def __init__(self, network_id, dry_run=False):
-        """Initialize complete VLAN migrator"""
+    def __init__(self, network_id, dry_run=False, resume=True, log_callback=None):
+        """Initialize complete VLAN migrator
+
+        log_callback, if given, receives every log line (used by the multi-network scheduler).
+        """
         self.network_id = network_id
+        self.log_callback = log_callback
         self.dry_run = dry_run
         self.log_entries = []
         self.start_time = datetime.now()
         self.backup_data = {}
-        
+        self.step_timings = []  # (phase, step, seconds, status)
+        self.checkpoints_enabled = not dry_run
+
+        # Pooled HTTP session shared by all API calls (and the concurrent backup reads)
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=BACKUP_WORKERS, pool_maxsize=BACKUP_WORKERS)
+        self.session.mount('https://', adapter)
+
         # Get network info
         self.network_info = self.get_network_info()
+        if not self.network_info:
+            raise MigrationStepError(f"Could not read network {network_id}")
         self.org_id = self.network_info['organizationId']
-        
+
         self.log(f"Complete VLAN Migrator initialized for {self.network_info['name']}")
         self.log(f"Mode: {'DRY RUN' if dry_run else 'LIVE'}")
-    
+
+        self.checkpoints = self.load_checkpoints(resume)
+
     def log(self, message, level="INFO"):
         """Log a message with timestamp"""
         timestamp = datetime.now().strftime("%H:%M:%S")
         log_entry = f"[{timestamp}] {level}: {message}"
         self.log_entries.append(log_entry)
-        print(log_entry)
-    
+        print(log_entry, flush=True)
+        if self.log_callback:
+            self.log_callback(log_entry)
+
     def make_api_request(self, url, method='GET', data=None):
-        """Make API request with error handling"""
+        """Make API request with error handling (retries on 429 using Retry-After)"""
         if self.dry_run and method in ['POST', 'PUT', 'DELETE']:
             self.log(f"DRY RUN: Would {method} to {url}", "DRY_RUN")
             if data:
                 self.log(f"DRY RUN: With data: {json.dumps(data, indent=2)}", "DRY_RUN")
             return {'dry_run': True}
-        
-        try:
-            if method == 'GET':
-                response = requests.get(url, headers=HEADERS, timeout=30)
-            elif method == 'POST':
-                response = requests.post(url, headers=HEADERS, json=data, timeout=30)
-            elif method == 'PUT':
-                response = requests.put(url, headers=HEADERS, json=data, timeout=30)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=HEADERS, timeout=30)
-            
-            response.raise_for_status()
-            return response.json() if response.text else None
-        except requests.exceptions.RequestException as e:
-            self.log(f"API Error: {e}", "ERROR")
-            if hasattr(e, 'response') and hasattr(e.response, 'text'):
-                self.log(f"Response: {e.response.text}", "ERROR")
-            return None
-    
+
+        for attempt in range(MAX_RETRIES):
+            try:
+                # Shared with action batches and any other migrations running in this process
+                rate_budget.acquire()
+                response = self.session.request(method, url, json=data, timeout=30)
+                if response.status_code == 429:
+                    wait_time = int(response.headers.get('Retry-After', 2 ** attempt))
+                    self.log(f"Rate limited, retrying in {wait_time}s", "WARNING")
+                    rate_budget.penalize(wait_time)
+                    continue
+
+                response.raise_for_status()
+                return response.json() if response.text else None
+            except requests.exceptions.RequestException as e:
+                self.log(f"API Error: {e}", "ERROR")
+                if hasattr(e, 'response') and hasattr(e.response, 'text'):
+                    self.log(f"Response: {e.response.text}", "ERROR")
+                return None
+
+        self.log(f"API Error: max retries exceeded for {url}", "ERROR")
+        return None
+
     def get_network_info(self):
         """Get network information"""
         url = f"{BASE_URL}/networks/{self.network_id}"
         return self.make_api_request(url)
-    
+
+    def load_checkpoints(self, resume):
+        """Load completed steps from a previous (interrupted) run of this migration"""
+        if self.dry_run:
+            return {}
+
+        try:
+            if not resume:
+                clear_checkpoints(self.network_id)
+                self.log("Starting fresh migration (previous checkpoints cleared)")
+                return {}
+
+            checkpoints = load_checkpoints(self.network_id)
+        except psycopg2.Error as e:
+            self.log(f"Checkpoint database unavailable, migration will not be resumable: {e}", "WARNING")
+            self.checkpoints_enabled = False
+            return {}
+
+        if checkpoints.get('complete', {}).get('status') == 'completed':
+            # The last migration of this network finished - this is a new run
+            clear_checkpoints(self.network_id)
+            return {}
+
+        completed = [step for step, cp in checkpoints.items() if cp['status'] == 'completed']
+        if completed:
+            self.log(f"Resuming migration: {len(completed)} steps already completed")
+        return checkpoints
+
+    def save_checkpoint(self, step, status, phase=None, data=None, duration=None):
+        """Persist a step's status; never lets a checkpoint failure break the migration"""
+        if not self.checkpoints_enabled:
+            return
+
+        try:
+            save_checkpoint(self.network_id, step, status, phase, data, duration)
+        except psycopg2.Error as e:
+            self.log(f"Could not save checkpoint for {step}: {e}", "WARNING")
+
+    def run_step(self, phase, step, func):
+        """Run one migration step unless a previous run already completed it"""
+        checkpoint = self.checkpoints.get(step)
+        if checkpoint and checkpoint['status'] == 'completed':
+            self.log(f"  ↷ Skipping {step} (completed in previous run)")
+            self.step_timings.append((phase, step, 0.0, 'skipped'))
+            return checkpoint['data']
+
+        self.save_checkpoint(step, 'running', phase)
+        started = time.time()
+        try:
+            data = func()
+        except Exception:
+            duration = time.time() - started
+            self.step_timings.append((phase, step, duration, 'failed'))
+            self.save_checkpoint(step, 'failed', phase, duration=duration)
+            raise
+
+        duration = time.time() - started
+        self.step_timings.append((phase, step, duration, 'completed'))
+        self.save_checkpoint(step, 'completed', phase, data, duration)
+        self.checkpoints[step] = {'phase': phase, 'status': 'completed', 'data': data, 'duration': duration}
+        return data
+
+    def apply_actions(self, actions, description, atomic=False):
+        """Apply write actions through Meraki action batches; raises if any action fails
+
+        atomic=True submits the actions as one ordered all-or-nothing batch (for dependent
+        writes); otherwise they are spread over parallel batches.
+        """
+        if not actions:
+            return 0
+
+        if self.dry_run:
+            for action in actions:
+                self.log(f"DRY RUN: Would {action['operation']} {action['resource']}", "DRY_RUN")
+                if action.get('body'):
+                    self.log(f"DRY RUN: With data: {json.dumps(action['body'], indent=2)}", "DRY_RUN")
+            return len(actions)
+
+        if atomic:
+            results = submit_batch(self.org_id, actions, split_on_failure=False)
+        else:
+            results = run_action_batches(actions, org_id=self.org_id)
+
+        errors = [(action, result['error']) for action, result in zip(actions, results) if 'error' in result]
+        for action, error in errors:
+            self.log(f"  ✗ {action['operation']} {action['resource']}: {error}", "ERROR")
+        if errors:
+            raise MigrationStepError(f"{description}: {len(errors)} of {len(actions)} actions failed")
+        return len(actions)
+
+    def vlan_body(self, old_vlan, new_id, include_id=True):
+        """VLAN settings for re-creating/updating a VLAN from its backup"""
+        # Check if IP changes are required for this VLAN
+        if new_id in IP_CHANGES:
+            ip_config = IP_CHANGES[new_id]
+            subnet = ip_config['new_subnet']
+            appliance_ip = ip_config['new_ip']
+        else:
+            # Keep original IP configuration
+            subnet = old_vlan.get('subnet')
+            appliance_ip = old_vlan.get('applianceIp')
+
+        vlan_data = {
+            'id': new_id if include_id else None,
+            'name': old_vlan.get('name', f'VLAN {new_id}'),
+            'subnet': subnet,
+            'applianceIp': appliance_ip,
+            'groupPolicyId': old_vlan.get('groupPolicyId'),
+            'dhcpHandling': old_vlan.get('dhcpHandling', 'Run a DHCP server'),
+            'dhcpLeaseTime': old_vlan.get('dhcpLeaseTime', '1 day'),
+            'dhcpBootOptionsEnabled': old_vlan.get('dhcpBootOptionsEnabled', False),
+            'dnsNameservers': old_vlan.get('dnsNameservers', 'upstream_dns'),
+            'dhcpOptions': old_vlan.get('dhcpOptions', []),
+            'reservedIpRanges': old_vlan.get('reservedIpRanges', []),
+            'fixedIpAssignments': old_vlan.get('fixedIpAssignments', {}),
+            'vpnNatSubnet': old_vlan.get('vpnNatSubnet')
+        }
+
+        # Remove None values
+        return {k: v for k, v in vlan_data.items() if v is not None}
+
+    def port_updates(self, port, vlan_mapping, map_ranges=True):
+        """VLAN changes for a switch/MX port given an old->new VLAN mapping"""
+        updates = {}
+
+        # Access / native VLAN
+        if port.get('vlan') in vlan_mapping:
+            updates['vlan'] = vlan_mapping[port['vlan']]
+
+        # Voice VLAN (switch ports only)
+        if port.get('voiceVlan') in vlan_mapping:
+            updates['voiceVlan'] = vlan_mapping[port['voiceVlan']]
+
+        # Allowed VLANs for trunk ports
+        if port.get('type') == 'trunk' and port.get('allowedVlans'):
+            allowed = port['allowedVlans']
+            if allowed != 'all':
+                new_allowed = self.update_vlan_list(allowed, vlan_mapping, map_ranges)
+                if new_allowed != allowed:
+                    updates['allowedVlans'] = new_allowed
+
+        return updates
+
+    def switch_port_actions(self, vlan_mapping, map_ranges=True):
+        """Action batch updates moving every affected switch port per vlan_mapping"""
+        actions = []
+        for switch_serial, switch_data in self.backup_data['switch_ports'].items():
+            switch_name = switch_data['device']['name']
+            switch_actions = []
+            for port in switch_data['ports']:
+                updates = self.port_updates(port, vlan_mapping, map_ranges)
+                if updates:
+                    switch_actions.append({
+                        'resource': f"/devices/{switch_serial}/switch/ports/{port['portId']}",
+                        'operation': 'update',
+                        'body': updates
+                    })
+            if switch_actions:
+                self.log(f"  {len(switch_actions)} ports to update on {switch_name}")
+            actions.extend(switch_actions)
+        return actions
+
+    def mx_port_actions(self, vlan_mapping, map_ranges=True):
+        """Action batch updates moving every affected MX port per vlan_mapping"""
+        actions = []
+        for port in self.backup_data['mx_ports']:
+            updates = self.port_updates(port, vlan_mapping, map_ranges)
+            if updates:
+                # Include all required fields
+                actions.append({
+                    'resource': f"/networks/{self.network_id}/appliance/ports/{port['number']}",
+                    'operation': 'update',
+                    'body': {
+                        'enabled': port.get('enabled', True),
+                        'type': port.get('type', 'access'),
+                        'dropUntaggedTraffic': port.get('dropUntaggedTraffic', False),
+                        **updates
+                    }
+                })
+        return actions
+
     def take_complete_backup(self):
-        """Take complete backup of all configurations"""
+        """Take complete backup of all configurations (independent reads run concurrently)"""
         self.log("\n" + "="*60)
         self.log("Taking complete configuration backup...")
         self.log("="*60)
-        
-        # Backup VLANs
-        self.log("Backing up VLANs...")
-        url = f"{BASE_URL}/networks/{self.network_id}/appliance/vlans"
-        self.backup_data['vlans'] = self.make_api_request(url)
+
+        network_url = f"{BASE_URL}/networks/{self.network_id}"
+        reads = {
+            'vlans': f"{network_url}/appliance/vlans",
+            'firewall_rules': f"{network_url}/appliance/firewall/l3FirewallRules",
+            'group_policies': f"{network_url}/groupPolicies",
+            'devices': f"{network_url}/devices",
+            'mx_ports': f"{network_url}/appliance/ports",
+            'syslog': f"{network_url}/syslogServers"
+        }
+
+        with ThreadPoolExecutor(max_workers=BACKUP_WORKERS) as executor:
+            futures = {key: executor.submit(self.make_api_request, url) for key, url in reads.items()}
+            results = {key: future.result() for key, future in futures.items()}
+
+            missing = [key for key in ('vlans', 'firewall_rules', 'devices', 'mx_ports') if results[key] is None]
+            if missing:
+                raise MigrationStepError(f"Backup failed, could not read: {', '.join(missing)}")
+
+            # Switch ports depend on the device list, but switches are independent of each other
+            switches = [d for d in results['devices'] if d['model'].startswith('MS')]
+            port_futures = {
+                switch['serial']: executor.submit(
+                    self.make_api_request, f"{BASE_URL}/devices/{switch['serial']}/switch/ports")
+                for switch in switches
+            }
+
+            self.backup_data['switch_ports'] = {}
+            for switch in switches:
+                ports = port_futures[switch['serial']].result()
+                if ports is None:
+                    raise MigrationStepError(f"Backup failed, could not read ports for {switch['name']}")
+                self.backup_data['switch_ports'][switch['serial']] = {
+                    'device': switch,
+                    'ports': ports
+                }
+                self.log(f"  ✓ Backed up {len(ports)} ports for {switch['name']}")
+
+        self.backup_data['vlans'] = results['vlans']
+        self.backup_data['firewall_rules'] = results['firewall_rules']
+        self.backup_data['group_policies'] = results['group_policies'] or []
+        self.backup_data['mx_ports'] = results['mx_ports']
+        self.backup_data['syslog'] = results['syslog']
+
         self.log(f"  ✓ Backed up {len(self.backup_data['vlans'])} VLANs")
-        
-        # Backup firewall rules
-        self.log("Backing up firewall rules...")
-        url = f"{BASE_URL}/networks/{self.network_id}/appliance/firewall/l3FirewallRules"
-        self.backup_data['firewall_rules'] = self.make_api_request(url)
         self.log(f"  ✓ Backed up {len(self.backup_data['firewall_rules']['rules'])} firewall rules")
-        
-        # Backup group policies
-        self.log("Backing up group policies...")
-        url = f"{BASE_URL}/networks/{self.network_id}/groupPolicies"
-        self.backup_data['group_policies'] = self.make_api_request(url)
         self.log(f"  ✓ Backed up {len(self.backup_data['group_policies'])} group policies")
-        
-        # Backup switch ports
-        self.log("Backing up switch configurations...")
-        url = f"{BASE_URL}/networks/{self.network_id}/devices"
-        devices = self.make_api_request(url)
-        switches = [d for d in devices if d['model'].startswith('MS')]
-        
-        self.backup_data['switch_ports'] = {}
-        for switch in switches:
-            url = f"{BASE_URL}/devices/{switch['serial']}/switch/ports"
-            ports = self.make_api_request(url)
-            self.backup_data['switch_ports'][switch['serial']] = {
-                'device': switch,
-                'ports': ports
-            }
-            self.log(f"  ✓ Backed up {len(ports)} ports for {switch['name']}")
-        
-        # Backup MX ports
-        self.log("Backing up MX ports...")
-        url = f"{BASE_URL}/networks/{self.network_id}/appliance/ports"
-        self.backup_data['mx_ports'] = self.make_api_request(url)
         self.log(f"  ✓ Backed up {len(self.backup_data['mx_ports'])} MX ports")
-        
-        # Backup syslog
-        self.log("Backing up syslog configuration...")
-        url = f"{BASE_URL}/networks/{self.network_id}/syslogServers"
-        self.backup_data['syslog'] = self.make_api_request(url)
-        
+
         # Save backup to file
         backup_filename = f"complete_vlan_backup_{self.network_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         with open(backup_filename, 'w') as f:
             json.dump(self.backup_data, f, indent=2)
         self.log(f"\n✓ Complete backup saved to {backup_filename}")
-    
+
+        return self.backup_data
+
+    def get_current_vlan_ids(self):
+        """IDs of the VLANs currently configured on the MX (used to make steps re-runnable)"""
+        if self.dry_run:
+            return {v['id'] for v in self.backup_data['vlans']}
+
+        vlans = self.make_api_request(f"{BASE_URL}/networks/{self.network_id}/appliance/vlans")
+        if vlans is None:
+            raise MigrationStepError("Could not read current VLANs")
+        return {v['id'] for v in vlans}
+
     def clear_vlan_references(self):
         """Clear all VLAN references before deletion"""
         self.log("\n" + "="*60)
         self.log("Clearing VLAN references...")
         self.log("="*60)
-        
-        # Step 1: Clear firewall rules
-        self.log("\nStep 1: Clearing firewall rules...")
-        url = f"{BASE_URL}/networks/{self.network_id}/appliance/firewall/l3FirewallRules"
-        result = self.make_api_request(url, method='PUT', data={'rules': []})
-        if result:
+
+        backup_vlan_ids = {v['id'] for v in self.backup_data['vlans']}
+
+        def clear_firewall():
+            self.log("\nStep 1: Clearing firewall rules...")
+            self.apply_actions([{
+                'resource': f"/networks/{self.network_id}/appliance/firewall/l3FirewallRules",
+                'operation': 'update',
+                'body': {'rules': []}
+            }], "Clearing firewall rules")
             self.log("  ✓ Firewall rules cleared")
-        
-        # Step 2: Update switch ports to temporary VLAN
-        self.log("\nStep 2: Moving switch ports to temporary VLANs...")
-        temp_vlan_mapping = {
-            1: 999,     # Data ports to temp VLAN
-            101: 998,   # Voice to temp VLAN
-            801: 997,   # IoT to temp VLAN
-            201: 996    # Credit card to temp VLAN
-        }
-        
-        # First create temporary VLANs
-        for old_id, temp_id in temp_vlan_mapping.items():
-            # Check if VLAN exists in backup
-            if any(v['id'] == old_id for v in self.backup_data['vlans']):
-                self.log(f"  Creating temporary VLAN {temp_id}...")
-                vlan_data = {
-                    'id': temp_id,
-                    'name': f'TEMP_{old_id}',
-                    'subnet': f'192.168.{temp_id-900}.0/24',
-                    'applianceIp': f'192.168.{temp_id-900}.1'
-                }
-                url = f"{BASE_URL}/networks/{self.network_id}/appliance/vlans"
-                self.make_api_request(url, method='POST', data=vlan_data)
-        
-        # Update switch ports
-        for switch_serial, switch_data in self.backup_data['switch_ports'].items():
-            switch_name = switch_data['device']['name']
-            update_count = 0
-            
-            for port in switch_data['ports']:
-                port_id = port['portId']
-                updates = {}
-                
-                # Check access VLAN
-                if port.get('vlan') in temp_vlan_mapping:
-                    updates['vlan'] = temp_vlan_mapping[port['vlan']]
-                
-                # Check voice VLAN
-                if port.get('voiceVlan') in temp_vlan_mapping:
-                    updates['voiceVlan'] = temp_vlan_mapping[port['voiceVlan']]
-                
-                # Update allowed VLANs for trunk ports
-                if port.get('type') == 'trunk' and port.get('allowedVlans'):
-                    allowed = port['allowedVlans']
-                    if allowed != 'all':
-                        # Parse and update VLAN list properly
-                        vlan_parts = []
-                        for part in allowed.split(','):
-                            part = part.strip()
-                            if part in ['1', '101', '801', '201']:
-                                # Replace with temp VLAN
-                                vlan_parts.append(str(temp_vlan_mapping[int(part)]))
-                            else:
-                                # Keep other VLANs as-is
-                                vlan_parts.append(part)
-                        updates['allowedVlans'] = ','.join(vlan_parts)
-                
-                if updates:
-                    url = f"{BASE_URL}/devices/{switch_serial}/switch/ports/{port_id}"
-                    result = self.make_api_request(url, method='PUT', data=updates)
-                    if result:
-                        update_count += 1
-            
-            if update_count > 0:
-                self.log(f"  ✓ Updated {update_count} ports on {switch_name}")
-        
-        # Step 3: Update MX ports
-        self.log("\nStep 3: Updating MX ports to temporary VLANs...")
-        mx_update_count = 0
-        
-        for port in self.backup_data['mx_ports']:
-            port_num = port['number']
-            updates = {}
-            
-            # Check native VLAN
-            if port.get('vlan') in temp_vlan_mapping:
-                updates['vlan'] = temp_vlan_mapping[port['vlan']]
-            
-            # Update allowed VLANs for trunk ports
-            if port.get('type') == 'trunk' and port.get('allowedVlans'):
-                allowed = port['allowedVlans']
-                if allowed != 'all':
-                    # Parse and update VLAN list properly
-                    vlan_parts = []
-                    for part in allowed.split(','):
-                        part = part.strip()
-                        if part in ['1', '101', '801', '201']:
-                            # Replace with temp VLAN
-                            vlan_parts.append(str(temp_vlan_mapping[int(part)]))
-                        else:
-                            # Keep other VLANs as-is
-                            vlan_parts.append(part)
-                    updates['allowedVlans'] = ','.join(vlan_parts)
-            
-            if updates:
-                # Include all required fields
-                update_data = {
-                    'enabled': port.get('enabled', True),
-                    'type': port.get('type', 'access'),
-                    'dropUntaggedTraffic': port.get('dropUntaggedTraffic', False),
-                    **updates
-                }
-                
-                url = f"{BASE_URL}/networks/{self.network_id}/appliance/ports/{port_num}"
-                result = self.make_api_request(url, method='PUT', data=update_data)
-                if result:
-                    mx_update_count += 1
-        
-        if mx_update_count > 0:
-            self.log(f"  ✓ Updated {mx_update_count} MX ports")
-        
-        return temp_vlan_mapping
-    
+
+        def create_temp_vlans():
+            self.log("\nStep 2: Creating temporary VLANs...")
+            current_ids = self.get_current_vlan_ids()
+            actions = []
+            for old_id, temp_id in TEMP_VLAN_MAPPING.items():
+                # Only needed for VLANs present in the backup; skip any left from an interrupted run
+                if old_id in backup_vlan_ids and temp_id not in current_ids:
+                    self.log(f"  Creating temporary VLAN {temp_id}...")
+                    actions.append({
+                        'resource': f"/networks/{self.network_id}/appliance/vlans",
+                        'operation': 'create',
+                        'body': {
+                            'id': temp_id,
+                            'name': f'TEMP_{old_id}',
+                            'subnet': f'192.168.{temp_id-900}.0/24',
+                            'applianceIp': f'192.168.{temp_id-900}.1'
+                        }
+                    })
+            self.apply_actions(actions, "Creating temporary VLANs")
+
+        def move_switch_ports():
+            self.log("\nStep 3: Moving switch ports to temporary VLANs...")
+            count = self.apply_actions(self.switch_port_actions(TEMP_VLAN_MAPPING, map_ranges=False), "Moving switch ports")
+            self.log(f"  ✓ Updated {count} switch ports")
+
+        def move_mx_ports():
+            self.log("\nStep 4: Updating MX ports to temporary VLANs...")
+            count = self.apply_actions(self.mx_port_actions(TEMP_VLAN_MAPPING, map_ranges=False), "Moving MX ports")
+            if count > 0:
+                self.log(f"  ✓ Updated {count} MX ports")
+
+        self.run_step('clear', 'clear_firewall', clear_firewall)
+        self.run_step('clear', 'create_temp_vlans', create_temp_vlans)
+        self.run_step('clear', 'move_switch_ports_to_temp', move_switch_ports)
+        self.run_step('clear', 'move_mx_ports_to_temp', move_mx_ports)
+
+        return TEMP_VLAN_MAPPING
+
     def migrate_vlans(self):
-        """Migrate VLANs with new IDs"""
+        """Migrate VLANs with new IDs (each VLAN's delete + re-create is one atomic batch)"""
         self.log("\n" + "="*60)
         self.log("Migrating VLANs to new IDs...")
         self.log("="*60)
-        
+
         migrated_vlans = {}
-        
+        current_ids = None
+
         for old_vlan in self.backup_data['vlans']:
             old_id = old_vlan['id']
-            
-            if old_id in VLAN_MAPPING:
-                new_id = VLAN_MAPPING[old_id]
-                
+
+            if old_id not in VLAN_MAPPING:
+                continue
+            new_id = VLAN_MAPPING[old_id]
+
+            if old_id == new_id and old_id not in IP_CHANGES:
+                # VLAN ID doesn't change and no IP changes needed
+                self.log(f"\nVLAN {old_id} - No change needed")
+                migrated_vlans[old_id] = new_id
+                continue
+
+            step = f"migrate_vlan_{old_id}"
+            if self.checkpoints.get(step, {}).get('status') != 'completed' and current_ids is None:
+                current_ids = self.get_current_vlan_ids()
+
+            def migrate(old_vlan=old_vlan, old_id=old_id, new_id=new_id):
                 if old_id != new_id:
                     self.log(f"\nMigrating VLAN {old_id} → {new_id}")
-                    
-                    # Delete old VLAN
-                    self.log(f"  Deleting VLAN {old_id}...")
-                    url = f"{BASE_URL}/networks/{self.network_id}/appliance/vlans/{old_id}"
-                    result = self.make_api_request(url, method='DELETE')
-                    
-                    # Check if deletion was successful (DELETE returns empty response on success)
-                    if not self.dry_run:
-                        # Verify VLAN was deleted
-                        time.sleep(1)
-                        check_url = f"{BASE_URL}/networks/{self.network_id}/appliance/vlans"
-                        vlans = self.make_api_request(check_url)
-                        if vlans and any(v['id'] == old_id for v in vlans):
-                            self.log(f"  ✗ Failed to delete VLAN {old_id}", "ERROR")
-                            continue
-                    
-                    time.sleep(2)
-                    
-                    # Create new VLAN with all settings
-                    self.log(f"  Creating VLAN {new_id}...")
-                    
-                    # Check if IP changes are required for this VLAN
+                    if not self.dry_run and new_id in current_ids and old_id not in current_ids:
+                        # Batch applied before an interruption, checkpoint was not recorded
+                        self.log(f"  ✓ VLAN {new_id} already exists")
+                        return new_id
+
                     if new_id in IP_CHANGES:
                         self.log(f"    Applying IP changes for VLAN {new_id}")
-                        ip_config = IP_CHANGES[new_id]
-                        subnet = ip_config['new_subnet']
-                        appliance_ip = ip_config['new_ip']
-                    else:
-                        # Keep original IP configuration
-                        subnet = old_vlan.get('subnet')
-                        appliance_ip = old_vlan.get('applianceIp')
-                    
-                    vlan_data = {
-                        'id': new_id,
-                        'name': old_vlan.get('name', f'VLAN {new_id}'),
-                        'subnet': subnet,
-                        'applianceIp': appliance_ip,
-                        'groupPolicyId': old_vlan.get('groupPolicyId'),
-                        'dhcpHandling': old_vlan.get('dhcpHandling', 'Run a DHCP server'),
-                        'dhcpLeaseTime': old_vlan.get('dhcpLeaseTime', '1 day'),
-                        'dhcpBootOptionsEnabled': old_vlan.get('dhcpBootOptionsEnabled', False),
-                        'dnsNameservers': old_vlan.get('dnsNameservers', 'upstream_dns'),
-                        'dhcpOptions': old_vlan.get('dhcpOptions', []),
-                        'reservedIpRanges': old_vlan.get('reservedIpRanges', []),
-                        'fixedIpAssignments': old_vlan.get('fixedIpAssignments', {}),
-                        'vpnNatSubnet': old_vlan.get('vpnNatSubnet')
-                    }
-                    
-                    # Remove None values
-                    vlan_data = {k: v for k, v in vlan_data.items() if v is not None}
-                    
-                    url = f"{BASE_URL}/networks/{self.network_id}/appliance/vlans"
-                    result = self.make_api_request(url, method='POST', data=vlan_data)
-                    
-                    if result:
-                        self.log(f"  ✓ Created VLAN {new_id}")
-                        migrated_vlans[old_id] = new_id
-                    
-                    time.sleep(1)
-                else:
-                    # VLAN ID doesn't change, but check for IP changes
-                    if old_id == 800 and old_id in IP_CHANGES:
-                        self.log(f"\nVLAN {old_id} - Updating IP configuration...")
-                        
-                        # Update VLAN 800 with new IP configuration
-                        ip_config = IP_CHANGES[old_id]
-                        vlan_data = {
-                            'name': old_vlan.get('name', f'VLAN {old_id}'),
-                            'subnet': ip_config['new_subnet'],
-                            'applianceIp': ip_config['new_ip'],
-                            'groupPolicyId': old_vlan.get('groupPolicyId'),
-                            'dhcpHandling': old_vlan.get('dhcpHandling', 'Run a DHCP server'),
-                            'dhcpLeaseTime': old_vlan.get('dhcpLeaseTime', '1 day'),
-                            'dhcpBootOptionsEnabled': old_vlan.get('dhcpBootOptionsEnabled', False),
-                            'dnsNameservers': old_vlan.get('dnsNameservers', 'upstream_dns'),
-                            'dhcpOptions': old_vlan.get('dhcpOptions', []),
-                            'reservedIpRanges': old_vlan.get('reservedIpRanges', []),
-                            'fixedIpAssignments': old_vlan.get('fixedIpAssignments', {}),
-                            'vpnNatSubnet': old_vlan.get('vpnNatSubnet')
+                    self.apply_actions([
+                        {
+                            'resource': f"/networks/{self.network_id}/appliance/vlans/{old_id}",
+                            'operation': 'destroy',
+                            'body': {}
+                        },
+                        {
+                            'resource': f"/networks/{self.network_id}/appliance/vlans",
+                            'operation': 'create',
+                            'body': self.vlan_body(old_vlan, new_id)
                         }
-                        
-                        # Remove None values
-                        vlan_data = {k: v for k, v in vlan_data.items() if v is not None}
-                        
-                        url = f"{BASE_URL}/networks/{self.network_id}/appliance/vlans/{old_id}"
-                        result = self.make_api_request(url, method='PUT', data=vlan_data)
-                        
-                        if result:
-                            self.log(f"  ✓ Updated VLAN {old_id} IP configuration")
-                        
-                        time.sleep(1)
-                    else:
-                        # VLAN ID doesn't change and no IP changes needed
-                        self.log(f"\nVLAN {old_id} - No change needed")
-                    
-                    migrated_vlans[old_id] = new_id
-        
+                    ], f"Migrating VLAN {old_id}", atomic=True)
+                    self.log(f"  ✓ Deleted VLAN {old_id} and created VLAN {new_id}")
+                else:
+                    # VLAN ID doesn't change, only its IP configuration
+                    self.log(f"\nVLAN {old_id} - Updating IP configuration...")
+                    self.apply_actions([{
+                        'resource': f"/networks/{self.network_id}/appliance/vlans/{old_id}",
+                        'operation': 'update',
+                        'body': self.vlan_body(old_vlan, new_id, include_id=False)
+                    }], f"Updating VLAN {old_id}")
+                    self.log(f"  ✓ Updated VLAN {old_id} IP configuration")
+                return new_id
+
+            migrated_vlans[old_id] = self.run_step('migrate', step, migrate)
+
         return migrated_vlans
-    
-    def restore_configurations(self, temp_vlan_mapping):
-        """Restore all configurations with new VLAN IDs"""
-        self.log("\n" + "="*60)
-        self.log("Restoring configurations with new VLAN IDs...")
-        self.log("="*60)
-        
-        # Step 1: Update switch ports to new VLANs
-        self.log("\nStep 1: Updating switch ports to new VLAN IDs...")
-        
-        for switch_serial, switch_data in self.backup_data['switch_ports'].items():
-            switch_name = switch_data['device']['name']
-            update_count = 0
-            
-            for port in switch_data['ports']:
-                port_id = port['portId']
-                updates = {}
-                
-                # Update access VLAN
-                if port.get('vlan') in VLAN_MAPPING:
-                    updates['vlan'] = VLAN_MAPPING[port['vlan']]
-                
-                # Update voice VLAN
-                if port.get('voiceVlan') in VLAN_MAPPING:
-                    updates['voiceVlan'] = VLAN_MAPPING[port['voiceVlan']]
-                
-                # Update allowed VLANs for trunk ports
-                if port.get('type') == 'trunk' and port.get('allowedVlans'):
-                    allowed = port['allowedVlans']
-                    if allowed != 'all':
-                        # Update VLAN IDs in allowed list
-                        new_allowed = self.update_vlan_list(allowed)
-                        if new_allowed != allowed:
-                            updates['allowedVlans'] = new_allowed
-                
-                if updates:
-                    url = f"{BASE_URL}/devices/{switch_serial}/switch/ports/{port_id}"
-                    result = self.make_api_request(url, method='PUT', data=updates)
-                    if result:
-                        update_count += 1
-            
-            if update_count > 0:
-                self.log(f"  ✓ Updated {update_count} ports on {switch_name}")
-        
-        # Step 2: Update MX ports
-        self.log("\nStep 2: Updating MX ports to new VLAN IDs...")
-        mx_update_count = 0
-        
-        for port in self.backup_data['mx_ports']:
-            port_num = port['number']
-            updates = {}
-            
-            # Update native VLAN
-            if port.get('vlan') in VLAN_MAPPING:
-                updates['vlan'] = VLAN_MAPPING[port['vlan']]
-            
-            # Update allowed VLANs for trunk ports
-            if port.get('type') == 'trunk' and port.get('allowedVlans'):
-                allowed = port['allowedVlans']
-                if allowed != 'all':
-                    new_allowed = self.update_vlan_list(allowed)
-                    if new_allowed != allowed:
-                        updates['allowedVlans'] = new_allowed
-            
-            if updates:
-                # Include all required fields
-                update_data = {
-                    'enabled': port.get('enabled', True),
-                    'type': port.get('type', 'access'),
-                    'dropUntaggedTraffic': port.get('dropUntaggedTraffic', False),
-                    **updates
-                }
-                
-                url = f"{BASE_URL}/networks/{self.network_id}/appliance/ports/{port_num}"
-                result = self.make_api_request(url, method='PUT', data=update_data)
-                if result:
-                    mx_update_count += 1
-        
-        if mx_update_count > 0:
-            self.log(f"  ✓ Updated {mx_update_count} MX ports")
-        
-        # Step 3: Apply firewall rules with new VLAN IDs
-        self.log("\nStep 3: Applying NEO 07 firewall template...")
-        
+
+    def get_firewall_template_rules(self):
+        """Load the NEO 07 firewall template rules"""
         # Load 54-rule NEO 07 firewall template (no default rule - Meraki will auto-add)
         neo07_template_file = 'neo07_54_rule_template_20250710_105817.json'
         try:
@@ -525,71 +570,109 @@ class CompleteVlanMigrator:
                 else:
                     self.log("  Could not get NEO 07 rules, using original rules", "ERROR")
                     template_rules = self.backup_data['firewall_rules']['rules']
-        
+
         # Convert clean NEO 07 rules for this store
         updated_rules = []
-        
+
         for rule in template_rules:
             new_rule = copy.deepcopy(rule)
-            
+
             # Convert NEO 07 IP ranges to this store's IP ranges
             if 'srcCidr' in new_rule and new_rule['srcCidr']:
                 src = new_rule['srcCidr']
                 # Convert NEO 07 IPs (10.24.38.x) to this store's test IPs (10.1.32.x)
                 src = src.replace('10.24.38.', '10.1.32.')
                 new_rule['srcCidr'] = src
-            
+
             # Convert destination CIDR
             if 'destCidr' in new_rule and new_rule['destCidr']:
                 dst = new_rule['destCidr']
                 # Convert NEO 07 IPs (10.24.38.x) to this store's test IPs (10.1.32.x)
                 dst = dst.replace('10.24.38.', '10.1.32.')
                 new_rule['destCidr'] = dst
-            
+
             updated_rules.append(new_rule)
-        
+
         self.log(f"  Processed {len(updated_rules)} template rules (no policy object issues, Meraki will auto-add default)")
-        
-        url = f"{BASE_URL}/networks/{self.network_id}/appliance/firewall/l3FirewallRules"
-        result = self.make_api_request(url, method='PUT', data={'rules': updated_rules})
-        
-        if result:
+        return updated_rules
+
+    def restore_configurations(self, temp_vlan_mapping):
+        """Restore all configurations with new VLAN IDs"""
+        self.log("\n" + "="*60)
+        self.log("Restoring configurations with new VLAN IDs...")
+        self.log("="*60)
+
+        def restore_switch_ports():
+            self.log("\nStep 1: Updating switch ports to new VLAN IDs...")
+            count = self.apply_actions(self.switch_port_actions(VLAN_MAPPING), "Restoring switch ports")
+            self.log(f"  ✓ Updated {count} switch ports")
+
+        def restore_mx_ports():
+            self.log("\nStep 2: Updating MX ports to new VLAN IDs...")
+            count = self.apply_actions(self.mx_port_actions(VLAN_MAPPING), "Restoring MX ports")
+            if count > 0:
+                self.log(f"  ✓ Updated {count} MX ports")
+
+        def apply_firewall_template():
+            self.log("\nStep 3: Applying NEO 07 firewall template...")
+            updated_rules = self.get_firewall_template_rules()
+            self.apply_actions([{
+                'resource': f"/networks/{self.network_id}/appliance/firewall/l3FirewallRules",
+                'operation': 'update',
+                'body': {'rules': updated_rules}
+            }], "Applying firewall template")
             self.log(f"  ✓ Applied {len(updated_rules)} NEO 07 firewall template rules")
-        
-        # Step 4: Delete temporary VLANs
-        self.log("\nStep 4: Cleaning up temporary VLANs...")
-        for old_id, temp_id in temp_vlan_mapping.items():
-            url = f"{BASE_URL}/networks/{self.network_id}/appliance/vlans/{temp_id}"
-            result = self.make_api_request(url, method='DELETE')
-            if result:
+
+        def delete_temp_vlans():
+            self.log("\nStep 4: Cleaning up temporary VLANs...")
+            if self.dry_run:
+                backup_vlan_ids = {v['id'] for v in self.backup_data['vlans']}
+                temp_ids = [temp_id for old_id, temp_id in temp_vlan_mapping.items() if old_id in backup_vlan_ids]
+            else:
+                current_ids = self.get_current_vlan_ids()
+                temp_ids = [temp_id for temp_id in temp_vlan_mapping.values() if temp_id in current_ids]
+            self.apply_actions([{
+                'resource': f"/networks/{self.network_id}/appliance/vlans/{temp_id}",
+                'operation': 'destroy',
+                'body': {}
+            } for temp_id in temp_ids], "Deleting temporary VLANs")
+            for temp_id in temp_ids:
                 self.log(f"  ✓ Deleted temporary VLAN {temp_id}")
-            time.sleep(1)
-    
-    def update_vlan_list(self, vlan_list_str):
-        """Update a comma-separated VLAN list with new IDs"""
+
+        self.run_step('restore', 'restore_switch_ports', restore_switch_ports)
+        self.run_step('restore', 'restore_mx_ports', restore_mx_ports)
+        self.run_step('restore', 'apply_firewall_template', apply_firewall_template)
+        self.run_step('restore', 'delete_temp_vlans', delete_temp_vlans)
+
+    def update_vlan_list(self, vlan_list_str, vlan_mapping=VLAN_MAPPING, map_ranges=True):
+        """Update a comma-separated VLAN list with new IDs (ranges kept as-is unless map_ranges)"""
         parts = vlan_list_str.split(',')
         new_parts = []
         
         for part in parts:
             part = part.strip()
             if '-' in part:
+                if not map_ranges:
+                    new_parts.append(part)
+                    continue
+                
                 # Range
                 start, end = part.split('-')
                 start_id = int(start)
                 end_id = int(end)
                 
                 # Update start and end if needed
-                if start_id in VLAN_MAPPING:
-                    start_id = VLAN_MAPPING[start_id]
-                if end_id in VLAN_MAPPING:
-                    end_id = VLAN_MAPPING[end_id]
+                if start_id in vlan_mapping:
+                    start_id = vlan_mapping[start_id]
+                if end_id in vlan_mapping:
+                    end_id = vlan_mapping[end_id]
                 
                 new_parts.append(f"{start_id}-{end_id}")
             else:
                 # Single VLAN
                 vlan_id = int(part)
-                if vlan_id in VLAN_MAPPING:
-                    vlan_id = VLAN_MAPPING[vlan_id]
+                if vlan_id in vlan_mapping:
+                    vlan_id = vlan_mapping[vlan_id]
                 new_parts.append(str(vlan_id))
         
         return ','.join(new_parts)
@@ -612,6 +695,9 @@ VLAN Mapping Applied:
             if old_id != new_id:
                 report += f"  VLAN {old_id} → VLAN {new_id}\n"
         
+        report += "\nPhase Timings:\n"
+        report += self.format_timings()
+        
         report += "\nLog Entries:\n"
         report += "\n".join(self.log_entries)
         
@@ -622,11 +708,29 @@ VLAN Mapping Applied:
         
         print(f"\n✓ Report saved to {report_filename}")
     
+    def format_timings(self):
+        """Per-phase and per-step durations for the report"""
+        lines = []
+        phases = []
+        for phase, _, _, _ in self.step_timings:
+            if phase not in phases:
+                phases.append(phase)
+        
+        for phase in phases:
+            steps = [t for t in self.step_timings if t[0] == phase]
+            total = sum(seconds for _, _, seconds, _ in steps)
+            lines.append(f"  {phase:<10} {total:8.1f}s")
+            for _, step, seconds, status in steps:
+                lines.append(f"    {step:<32} {seconds:8.1f}s  {status}")
+        
+        return "\n".join(lines) + "\n"
+    
     def run_migration(self):
-        """Run the complete migration process"""
+        """Run the complete migration process, resuming after the last checkpointed step"""
         try:
-            # Step 1: Take complete backup
-            self.take_complete_backup()
+            # Step 1: Take complete backup (a resumed run reuses the original backup,
+            # since the live config has already been partially migrated)
+            self.backup_data = self.run_step('backup', 'backup', self.take_complete_backup)
             
             # Step 2: Clear all VLAN references
             temp_vlan_mapping = self.clear_vlan_references()
@@ -637,6 +741,10 @@ VLAN Mapping Applied:
             # Step 4: Restore configurations with new VLAN IDs
             self.restore_configurations(temp_vlan_mapping)
             
+            self.save_checkpoint('complete', 'completed', 'complete')
+            
+            self.log("\nPhase timings:\n" + self.format_timings())
+            
             # Generate report
             self.generate_report()
             
@@ -648,6 +756,8 @@ VLAN Mapping Applied:
             
         except Exception as e:
             self.log(f"Migration failed with error: {e}", "ERROR")
+            if self.checkpoints_enabled:
+                self.log("Completed steps are checkpointed - re-run to resume from the failed step", "ERROR")
             self.generate_report()
             return False
 
@@ -655,6 +765,8 @@ def main():
     parser = argparse.ArgumentParser(description='Complete VLAN Number Migration Tool')
     parser.add_argument('--network-id', required=True, help='Target network ID')
     parser.add_argument('--dry-run', action='store_true', help='Perform dry run without making changes')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore checkpoints from an interrupted run and start over')
     
     args = parser.parse_args()
     
@@ -686,7 +798,7 @@ def main():
             print("Skipping confirmation (SKIP_CONFIRMATION set)")
     
     # Run migration
-    migrator = CompleteVlanMigrator(args.network_id, args.dry_run)
+    migrator = CompleteVlanMigrator(args.network_id, args.dry_run, resume=not args.restart)
     success = migrator.run_migration()
     
     sys.exit(0 if success else 1)
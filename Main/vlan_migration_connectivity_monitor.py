@@ -16,6 +16,9 @@ Usage:
     # Continuous monitoring during migration
     python3 vlan_migration_connectivity_monitor.py --network-id <network_id> --action monitor
 
+For watching many networks at once (e.g. a whole migration wave) use
+site_connectivity_monitor.py, which polls all sites from one async engine.
+
 Author: Claude
 Date: July 2025
 """
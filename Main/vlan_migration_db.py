@@ -2,9 +2,11 @@
 """
 Database-based VLAN migration network discovery
 Uses existing database tables to get network and VLAN information
+Also stores per-step migration checkpoints so an interrupted migration can resume
 """
 
 import psycopg2
+from psycopg2.extras import Json, execute_values
 import os
 from dotenv import load_dotenv
 
@@ -134,6 +136,281 @@ def get_networks_from_db():
         cursor.close()
         conn.close()
 
+CREATE_CHECKPOINT_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS vlan_migration_checkpoints (
+        network_id VARCHAR(50) NOT NULL,
+        step VARCHAR(100) NOT NULL,
+        phase VARCHAR(50),
+        status VARCHAR(20) NOT NULL,
+        data JSONB,
+        duration_seconds NUMERIC(10, 2),
+        updated_at TIMESTAMP DEFAULT NOW(),
+        PRIMARY KEY (network_id, step)
+    )
+"""
+
+def load_checkpoints(network_id):
+    """Get saved migration steps for a network as {step: {status, phase, data, duration}}"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(CREATE_CHECKPOINT_TABLE_SQL)
+        cursor.execute("""
+            SELECT step, phase, status, data, duration_seconds
+            FROM vlan_migration_checkpoints
+            WHERE network_id = %s
+        """, (network_id,))
+        checkpoints = {
+            step: {
+                'phase': phase,
+                'status': status,
+                'data': data,
+                'duration': float(duration) if duration is not None else None
+            }
+            for step, phase, status, data, duration in cursor.fetchall()
+        }
+        conn.commit()
+        return checkpoints
+        
+    finally:
+        cursor.close()
+        conn.close()
+
+def save_checkpoint(network_id, step, status, phase=None, data=None, duration=None):
+    """Record the status (and result data) of one migration step"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("""
+            INSERT INTO vlan_migration_checkpoints
+                (network_id, step, phase, status, data, duration_seconds, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            ON CONFLICT (network_id, step) DO UPDATE SET
+                phase = EXCLUDED.phase,
+                status = EXCLUDED.status,
+                data = COALESCE(EXCLUDED.data, vlan_migration_checkpoints.data),
+                duration_seconds = EXCLUDED.duration_seconds,
+                updated_at = NOW()
+        """, (network_id, step, phase, status,
+              Json(data) if data is not None else None, duration))
+        conn.commit()
+        
+    finally:
+        cursor.close()
+        conn.close()
+
+def clear_checkpoints(network_id):
+    """Forget all saved steps for a network so the next migration starts from scratch"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(CREATE_CHECKPOINT_TABLE_SQL)
+        cursor.execute("DELETE FROM vlan_migration_checkpoints WHERE network_id = %s", (network_id,))
+        conn.commit()
+        
+    finally:
+        cursor.close()
+        conn.close()
+
+CREATE_SCHEDULE_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS vlan_migration_schedules (
+        schedule_id VARCHAR(50) PRIMARY KEY,
+        status VARCHAR(20) NOT NULL,
+        wave_size INTEGER NOT NULL,
+        max_concurrency INTEGER NOT NULL,
+        dry_run BOOLEAN DEFAULT FALSE,
+        created_by VARCHAR(100),
+        owner VARCHAR(100),
+        created_at TIMESTAMP DEFAULT NOW(),
+        completed_at TIMESTAMP
+    );
+    ALTER TABLE vlan_migration_schedules ADD COLUMN IF NOT EXISTS owner VARCHAR(100);
+    CREATE TABLE IF NOT EXISTS vlan_migration_schedule_networks (
+        schedule_id VARCHAR(50) NOT NULL REFERENCES vlan_migration_schedules(schedule_id) ON DELETE CASCADE,
+        network_id VARCHAR(50) NOT NULL,
+        network_name VARCHAR(255),
+        wave INTEGER NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        started_at TIMESTAMP,
+        completed_at TIMESTAMP,
+        duration_seconds NUMERIC(10, 2),
+        error TEXT,
+        PRIMARY KEY (schedule_id, network_id)
+    )
+"""
+
+def create_schedule(schedule_id, waves, wave_size, max_concurrency, dry_run=False, created_by=None,
+                    owner=None):
+    """Record a new migration schedule; waves is a list of lists of network dicts
+
+    owner identifies the process running it ("host:pid") so an orphaned schedule can be recovered.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(CREATE_SCHEDULE_TABLES_SQL)
+        cursor.execute("""
+            INSERT INTO vlan_migration_schedules
+                (schedule_id, status, wave_size, max_concurrency, dry_run, created_by, owner)
+            VALUES (%s, 'pending', %s, %s, %s, %s, %s)
+        """, (schedule_id, wave_size, max_concurrency, dry_run, created_by, owner))
+        execute_values(cursor, """
+            INSERT INTO vlan_migration_schedule_networks (schedule_id, network_id, network_name, wave)
+            VALUES %s
+        """, [(schedule_id, network['id'], network['name'], wave_number)
+              for wave_number, wave in enumerate(waves, 1) for network in wave])
+        conn.commit()
+        
+    finally:
+        cursor.close()
+        conn.close()
+
+def update_schedule_status(schedule_id, status):
+    """Set the overall status of a schedule"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("""
+            UPDATE vlan_migration_schedules
+            SET status = %s,
+                completed_at = CASE WHEN %s IN ('completed', 'completed_with_errors', 'halted', 'failed')
+                                    THEN NOW() ELSE completed_at END
+            WHERE schedule_id = %s
+        """, (status, status, schedule_id))
+        conn.commit()
+        
+    finally:
+        cursor.close()
+        conn.close()
+
+def update_schedule_network(schedule_id, network_id, status, duration=None, error=None):
+    """Set the migration status of one network in a schedule"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("""
+            UPDATE vlan_migration_schedule_networks
+            SET status = %s,
+                started_at = CASE WHEN %s = 'running' THEN NOW() ELSE started_at END,
+                completed_at = CASE WHEN %s = 'running' THEN NULL ELSE NOW() END,
+                duration_seconds = %s,
+                error = %s
+            WHERE schedule_id = %s AND network_id = %s
+        """, (status, status, status, duration, error, schedule_id, network_id))
+        conn.commit()
+        
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_active_schedules():
+    """(schedule_id, owner) of every schedule still marked pending or running"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(CREATE_SCHEDULE_TABLES_SQL)
+        cursor.execute("""
+            SELECT schedule_id, owner
+            FROM vlan_migration_schedules
+            WHERE status IN ('pending', 'running')
+        """)
+        schedules = cursor.fetchall()
+        conn.commit()
+        return schedules
+        
+    finally:
+        cursor.close()
+        conn.close()
+
+def mark_schedule_interrupted(schedule_id, error):
+    """Close out a schedule whose process died: running networks fail, the schedule is 'interrupted'
+
+    Pending networks stay pending (they never started); their checkpoints let a new
+    schedule pick the failed ones up where they stopped.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("""
+            UPDATE vlan_migration_schedule_networks
+            SET status = 'failed', completed_at = NOW(), error = %s
+            WHERE schedule_id = %s AND status = 'running'
+        """, (error, schedule_id))
+        failed = cursor.rowcount
+        cursor.execute("""
+            UPDATE vlan_migration_schedules
+            SET status = 'interrupted', completed_at = NOW()
+            WHERE schedule_id = %s AND status IN ('pending', 'running')
+        """, (schedule_id,))
+        conn.commit()
+        return failed
+        
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_schedule_status(schedule_id):
+    """Get a schedule with per-wave network progress, or None if it does not exist"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(CREATE_SCHEDULE_TABLES_SQL)
+        cursor.execute("""
+            SELECT status, wave_size, max_concurrency, dry_run, created_by, created_at, completed_at
+            FROM vlan_migration_schedules
+            WHERE schedule_id = %s
+        """, (schedule_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        status, wave_size, max_concurrency, dry_run, created_by, created_at, completed_at = row
+        
+        cursor.execute("""
+            SELECT wave, network_id, network_name, status, started_at, completed_at,
+                   duration_seconds, error
+            FROM vlan_migration_schedule_networks
+            WHERE schedule_id = %s
+            ORDER BY wave, network_name
+        """, (schedule_id,))
+        
+        waves = {}
+        for wave, network_id, network_name, net_status, started, completed, duration, error in cursor.fetchall():
+            waves.setdefault(wave, []).append({
+                'id': network_id,
+                'name': network_name,
+                'status': net_status,
+                'started_at': started.isoformat() if started else None,
+                'completed_at': completed.isoformat() if completed else None,
+                'duration_seconds': float(duration) if duration is not None else None,
+                'error': error
+            })
+        conn.commit()
+        
+        return {
+            'schedule_id': schedule_id,
+            'status': status,
+            'wave_size': wave_size,
+            'max_concurrency': max_concurrency,
+            'dry_run': dry_run,
+            'created_by': created_by,
+            'created_at': created_at.isoformat() if created_at else None,
+            'completed_at': completed_at.isoformat() if completed_at else None,
+            'waves': [{'wave': wave, 'networks': networks} for wave, networks in sorted(waves.items())]
+        }
+        
+    finally:
+        cursor.close()
+        conn.close()
+
 if __name__ == "__main__":
     # Test the function
     print("Fetching networks from database...")
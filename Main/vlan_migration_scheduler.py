@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+VLAN MIGRATION SCHEDULER - MULTI-NETWORK WAVES
+==============================================
+
+Purpose:
+    - Migrate many networks in one operation instead of one store per invocation
+    - Networks come from vlan_migration_db.get_networks_from_db() (legacy VLANs only)
+      and are split into waves of wave_size networks
+    - Waves run one after another; within a wave up to max_concurrency migrations run
+      in parallel, in-process, so every Meraki call shares one rate budget
+      (meraki_action_batches.rate_budget)
+    - If any network in a wave fails, later waves are not started (halt_on_failure)
+    - Each wave's sites are handed to the site connectivity monitor (if available)
+      so up/degraded/down transitions are recorded while the wave migrates
+
+Progress Tracking:
+    vlan_migration_schedules          - one row per schedule (overall status)
+    vlan_migration_schedule_networks  - per-network wave, status, timings, error
+    Each migration also checkpoints its own steps (vlan_migration_checkpoints), so a
+    failed network can be re-scheduled and resumes where it stopped.
+    Schedules run in the process that started them (owner "host:pid"). After a restart,
+    recover_interrupted_schedules() marks those whose process is gone 'interrupted'.
+
+Used By:
+    - vlan_migration_api.py (/api/vlan-migration/schedule endpoints)
+    - CLI: python3 vlan_migration_scheduler.py --network-ids L_1,L_2 --max-concurrency 3
+           python3 vlan_migration_scheduler.py --all   (every legacy network)
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from vlan_migration_complete import CompleteVlanMigrator
+from vlan_migration_db import (
+    get_networks_from_db, create_schedule, update_schedule_status,
+    update_schedule_network, get_schedule_status, get_active_schedules, mark_schedule_interrupted
+)
+from meraki_action_batches import rate_budget
+
+try:
+    from site_connectivity_monitor import site_monitor
+except ImportError:
+    site_monitor = None
+
+DEFAULT_WAVE_SIZE = 10
+DEFAULT_MAX_CONCURRENCY = 3
+MAX_CONCURRENCY_LIMIT = 5  # more parallel migrations just queue on the shared rate budget
+MAX_LOG_LINES = 5000       # in-memory console lines kept per schedule
+WAVE_WATCH_SECONDS = 7200  # how long the connectivity monitor watches a wave's sites
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+# In-memory console logs per schedule (progress itself lives in the database)
+schedule_logs = {}
+schedule_logs_lock = threading.Lock()
+
+def append_log(schedule_id, network_name, message):
+    with schedule_logs_lock:
+        logs = schedule_logs.setdefault(schedule_id, [])
+        logs.append({
+            'timestamp': datetime.now().isoformat(),
+            'network': network_name,
+            'message': message
+        })
+        if len(logs) > MAX_LOG_LINES:
+            del logs[:len(logs) - MAX_LOG_LINES]
+
+def get_schedule_logs(schedule_id, since=0):
+    """Console lines for a schedule from index `since`; returns (lines, next_index)"""
+    with schedule_logs_lock:
+        logs = schedule_logs.get(schedule_id, [])
+        return logs[since:], len(logs)
+
+def select_networks(network_ids=None):
+    """Networks still on legacy VLANs, optionally restricted to network_ids"""
+    networks = [n for n in get_networks_from_db() if n['needs_migration']]
+    if network_ids:
+        wanted = set(network_ids)
+        networks = [n for n in networks if n['id'] in wanted]
+    return networks
+
+def owner_alive(owner):
+    """Whether the "host:pid" that owns a schedule may still be running it"""
+    host, _, pid = (owner or '').rpartition(':')
+    if not pid.isdigit():
+        return False  # Schedules from before owners were recorded
+    if host != socket.gethostname():
+        return True  # Can't tell from here
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def recover_interrupted_schedules():
+    """Mark schedules left pending/running by a process that no longer exists; returns their ids"""
+    recovered = []
+    for schedule_id, owner in get_active_schedules():
+        if owner == OWNER or owner_alive(owner):
+            continue
+        failed = mark_schedule_interrupted(schedule_id, 'Interrupted: scheduler process exited mid-migration')
+        append_log(schedule_id, 'System', f"Schedule interrupted ({failed} running networks marked failed)")
+        recovered.append(schedule_id)
+    return recovered
+
+def plan_waves(networks, wave_size):
+    """Split networks into consecutive waves of at most wave_size"""
+    return [networks[i:i + wave_size] for i in range(0, len(networks), wave_size)]
+
+def migrate_network(schedule_id, network, dry_run):
+    """Run one network's migration and record its outcome; returns True on success"""
+    name = network['name']
+    update_schedule_network(schedule_id, network['id'], 'running')
+    append_log(schedule_id, name, f"Starting migration for {name}")
+    started = time.time()
+
+    try:
+        migrator = CompleteVlanMigrator(
+            network['id'], dry_run,
+            log_callback=lambda line: append_log(schedule_id, name, line)
+        )
+        success = migrator.run_migration()
+        error = None if success else 'Migration failed - see console log'
+    except Exception as e:
+        success = False
+        error = str(e)
+        append_log(schedule_id, name, f"Migration failed: {e}")
+
+    duration = time.time() - started
+    update_schedule_network(schedule_id, network['id'], 'success' if success else 'failed',
+                            duration=round(duration, 2), error=error)
+    append_log(schedule_id, name, f"{'Completed' if success else 'FAILED'} in {duration:.1f}s")
+    return success
+
+def run_schedule(schedule_id, waves, max_concurrency, dry_run=False, halt_on_failure=True):
+    """Run the waves of a schedule in order; returns the final schedule status"""
+    update_schedule_status(schedule_id, 'running')
+    calls_before = rate_budget.calls
+    status = 'completed'
+
+    try:
+        for wave_number, wave in enumerate(waves, 1):
+            append_log(schedule_id, 'System',
+                       f"Wave {wave_number}/{len(waves)}: {len(wave)} networks, "
+                       f"{min(max_concurrency, len(wave))} at a time")
+            wave_start = time.time()
+            if site_monitor and not dry_run:
+                site_monitor.watch(wave, duration=WAVE_WATCH_SECONDS)
+
+            with ThreadPoolExecutor(max_workers=min(max_concurrency, len(wave))) as executor:
+                results = list(executor.map(lambda n: migrate_network(schedule_id, n, dry_run), wave))
+
+            failed = results.count(False)
+            append_log(schedule_id, 'System',
+                       f"Wave {wave_number} finished in {time.time() - wave_start:.1f}s: "
+                       f"{len(results) - failed} succeeded, {failed} failed")
+
+            if failed:
+                status = 'completed_with_errors'
+                if halt_on_failure and wave_number < len(waves):
+                    status = 'halted'
+                    append_log(schedule_id, 'System', f"Halting: wave {wave_number} had failures")
+                    break
+    except Exception as e:
+        status = 'failed'
+        append_log(schedule_id, 'System', f"Schedule failed: {e}")
+
+    append_log(schedule_id, 'System',
+               f"Schedule {status}: {rate_budget.calls - calls_before} Meraki API calls, "
+               f"{rate_budget.rate_limited} rate limited (process total)")
+    update_schedule_status(schedule_id, status)
+    return status
+
+def start_schedule(network_ids=None, wave_size=DEFAULT_WAVE_SIZE,
+                   max_concurrency=DEFAULT_MAX_CONCURRENCY, dry_run=False,
+                   halt_on_failure=True, created_by=None):
+    """Plan and record a schedule, then run it in a background thread
+
+    Returns (schedule_id, waves).
+    """
+    max_concurrency = max(1, min(int(max_concurrency), MAX_CONCURRENCY_LIMIT))
+    wave_size = max(1, int(wave_size))
+
+    networks = select_networks(network_ids)
+    waves = plan_waves(networks, wave_size)
+    schedule_id = f"schedule_{int(time.time() * 1000)}"
+
+    create_schedule(schedule_id, waves, wave_size, max_concurrency, dry_run, created_by, OWNER)
+    if waves:
+        thread = threading.Thread(
+            target=run_schedule,
+            args=(schedule_id, waves, max_concurrency, dry_run, halt_on_failure)
+        )
+        thread.daemon = True
+        thread.start()
+    else:
+        update_schedule_status(schedule_id, 'completed')
+
+    return schedule_id, waves
+
+def summarize_schedule(schedule):
+    """Add per-wave and overall counts to get_schedule_status() output"""
+    totals = {'pending': 0, 'running': 0, 'success': 0, 'failed': 0}
+    for wave in schedule['waves']:
+        counts = {key: 0 for key in totals}
+        for network in wave['networks']:
+            counts[network['status']] = counts.get(network['status'], 0) + 1
+        wave['counts'] = counts
+
+        if counts['running']:
+            wave['status'] = 'running'
+        elif counts['pending'] == len(wave['networks']):
+            wave['status'] = 'pending'
+        elif counts['failed']:
+            wave['status'] = 'completed_with_errors'
+        else:
+            wave['status'] = 'completed'
+
+        for key in totals:
+            totals[key] += counts.get(key, 0)
+
+    schedule['totals'] = totals
+    schedule['networks_total'] = sum(totals.values())
+    done = totals['success'] + totals['failed']
+    schedule['progress'] = int(done / schedule['networks_total'] * 100) if schedule['networks_total'] else 100
+    return schedule
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-network VLAN migration scheduler')
+    targets = parser.add_mutually_exclusive_group(required=True)
+    targets.add_argument('--network-ids', help='Comma-separated network IDs')
+    targets.add_argument('--all', action='store_true', help='Every network still on legacy VLANs')
+    parser.add_argument('--wave-size', type=int, default=DEFAULT_WAVE_SIZE, help='Networks per wave')
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f'Parallel migrations per wave (max {MAX_CONCURRENCY_LIMIT})')
+    parser.add_argument('--dry-run', action='store_true', help='Perform dry run without making changes')
+    parser.add_argument('--continue-on-failure', action='store_true',
+                        help='Start the next wave even if a network in this wave failed')
+
+    args = parser.parse_args()
+
+    network_ids = [n.strip() for n in args.network_ids.split(',')] if args.network_ids else None
+    networks = select_networks(network_ids)
+    waves = plan_waves(networks, max(1, args.wave_size))
+    max_concurrency = max(1, min(args.max_concurrency, MAX_CONCURRENCY_LIMIT))
+
+    print(f"Scheduling {len(networks)} networks in {len(waves)} waves "
+          f"({max_concurrency} concurrent per wave, {'DRY RUN' if args.dry_run else 'LIVE'})")
+    if not waves:
+        return
+
+    schedule_id = f"schedule_{int(time.time() * 1000)}"
+    create_schedule(schedule_id, waves, args.wave_size, max_concurrency, args.dry_run, 'cli', OWNER)
+    status = run_schedule(schedule_id, waves, max_concurrency, args.dry_run,
+                          halt_on_failure=not args.continue_on_failure)
+
+    schedule = summarize_schedule(get_schedule_status(schedule_id))
+    for wave in schedule['waves']:
+        print(f"Wave {wave['wave']}: {wave['status']} {wave['counts']}")
+        for network in wave['networks']:
+            if network['status'] == 'failed':
+                print(f"  ✗ {network['name']}: {network['error']}")
+    print(f"Schedule {schedule_id}: {status}")
+
+    sys.exit(0 if status == 'completed' else 1)
+
+if __name__ == "__main__":
+    main()
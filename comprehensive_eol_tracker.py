@@ -2,13 +2,15 @@
 """
 Comprehensive EOL Tracker that combines PDF parsing with HTML table scraping
 This ensures we get complete EOL data from all available sources
+
+PDFs are downloaded conditionally and parsed through eol_pdf_cache, so a nightly
+run only downloads and parses PDFs whose content changed
 """
 
 import os
 import sys
 import requests
 from bs4 import BeautifulSoup
-import PyPDF2
 import re
 import logging
 import psycopg2
@@ -26,10 +28,17 @@ logger = logging.getLogger(__name__)
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config import Config
+from eol_pdf_cache import (
+    load_download_manifest, save_download_manifest, download_pdf_conditional,
+    parse_pdfs, prune_cache
+)
 
 EOL_DIR = "/var/www/html/meraki-data/EOL"
 os.makedirs(EOL_DIR, exist_ok=True)
 
+# Cache key for extract_models_from_pdf() results; bump when the extraction changes
+PDF_PARSER_KEY = 'comprehensive_models:v1'
+
 def get_db_connection():
     """Get database connection"""
     match = re.match(r'postgresql://(.+):(.+)@(.+):(\d+)/(.+)', Config.SQLALCHEMY_DATABASE_URI)
@@ -185,29 +194,17 @@ def scrape_eol_html_tables():
     logger.info(f"Found {len(models_from_html)} models from HTML tables")
     return models_from_html
 
-def download_pdf(url, filename):
-    """Download a PDF file"""
-    try:
-        clean_filename = re.sub(r'[^\w\-_\.]', '_', filename)
-        if not clean_filename.endswith('.pdf'):
-            clean_filename += '.pdf'
-        
-        filepath = os.path.join(EOL_DIR, clean_filename)
-        
-        if os.path.exists(filepath):
-            return filepath
-        
-        response = requests.get(url, timeout=60)
-        response.raise_for_status()
-        
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
-        
-        logger.info(f"Downloaded: {clean_filename}")
-        return filepath
-    except Exception as e:
-        logger.error(f"Error downloading {filename}: {e}")
-        return None
+def download_pdf(url, filename, manifest, session=None):
+    """Download a PDF file unless unchanged since the last run (ETag/Last-Modified)
+
+    Returns (filepath, changed); filepath is None on failure.
+    """
+    clean_filename = re.sub(r'[^\w\-_\.]', '_', filename)
+    if not clean_filename.endswith('.pdf'):
+        clean_filename += '.pdf'
+    
+    filepath = os.path.join(EOL_DIR, clean_filename)
+    return download_pdf_conditional(url, filepath, manifest, session)
 
 def extract_models_from_pdf(text, filename):
     """Extract model numbers from PDF text"""
@@ -237,32 +234,31 @@ def extract_models_from_pdf(text, filename):
     
     return list(models)
 
+def parse_pdf_models(pages, filename):
+    """Model list from a PDF's cached page text (runs in an eol_pdf_cache worker)"""
+    text = " ".join(pages[:5])  # Just first 5 pages
+    return extract_models_from_pdf(text, filename)
+
 def process_pdfs():
-    """Process all PDFs to extract model lists"""
+    """Process all PDFs to extract model lists (unchanged PDFs come from the cache)"""
     logger.info("Processing PDFs for model extraction...")
     
     pdf_models = {}
-    pdf_files = [f for f in os.listdir(EOL_DIR) if f.endswith('.pdf')]
+    pdf_files = sorted(f for f in os.listdir(EOL_DIR) if f.endswith('.pdf'))
     
-    for pdf_file in pdf_files:
-        try:
-            filepath = os.path.join(EOL_DIR, pdf_file)
-            with open(filepath, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages[:5]:  # Just first 5 pages
-                    text += page.extract_text() + " "
-            
-            models = extract_models_from_pdf(text, pdf_file)
-            for model in models:
-                if model not in pdf_models:
-                    pdf_models[model] = []
-                pdf_models[model].append(pdf_file)
-                
-        except Exception as e:
-            logger.error(f"Error processing {pdf_file}: {e}")
+    results, stats = parse_pdfs([os.path.join(EOL_DIR, f) for f in pdf_files],
+                                PDF_PARSER_KEY, parse_pdf_models)
     
-    logger.info(f"Found {len(pdf_models)} unique models from PDFs")
+    for pdf_file in pdf_files:
+        for model in results.get(pdf_file, []):
+            if model not in pdf_models:
+                pdf_models[model] = []
+            pdf_models[model].append(pdf_file)
+    
+    removed = prune_cache(stats['hashes'])
+    logger.info(f"Found {len(pdf_models)} unique models from PDFs "
+                f"({stats['parsed']} parsed, {stats['cached']} cached, {stats['failed']} failed, "
+                f"{removed} stale cache entries removed)")
     return pdf_models
 
 def merge_data_sources(html_data, pdf_models):
@@ -387,21 +383,31 @@ def download_all_pdfs():
         return
     
     soup = BeautifulSoup(response.text, 'html.parser')
+    manifest = load_download_manifest()
+    session = requests.Session()
     
     # Find all PDF links
     pdf_count = 0
+    changed_count = 0
+    seen_urls = set()
     for link in soup.find_all('a', href=True):
         if '.pdf' in link['href'].lower():
             pdf_url = urljoin(base_url, link['href'])
+            if pdf_url in seen_urls:
+                continue
+            seen_urls.add(pdf_url)
             filename = os.path.basename(link['href'].split('?')[0])
             
-            result = download_pdf(pdf_url, filename)
-            if result:
+            filepath, changed = download_pdf(pdf_url, filename, manifest, session)
+            if filepath:
                 pdf_count += 1
+            if changed:
+                changed_count += 1
             
             time.sleep(0.5)  # Be nice to the server
     
-    logger.info(f"Downloaded {pdf_count} PDFs")
+    save_download_manifest(manifest)
+    logger.info(f"Checked {pdf_count} PDFs: {changed_count} new or changed")
 
 def main():
     """Main function"""
@@ -32,6 +32,7 @@ class Config:
     JSON_CACHE_DIR = "/var/www/html/json-cache"
     MERAKI_DATA_DIR = "/var/www/html/meraki-data"
     TRACKING_DATA_DIR = "/var/www/html/circuitinfo"
+    OUI_REGISTRY_DIR = "/var/www/html/oui-registry"
     
     # Performance Settings
     JSON_SORT_KEYS = False
@@ -2,11 +2,13 @@
 """
 Enhanced PDF Parser that thoroughly extracts ALL models and dates from EOL PDFs
 This parser is designed to handle various PDF formats and extract all relevant data
+
+Page text and extraction results are cached per PDF content hash (eol_pdf_cache);
+only new or changed PDFs are re-read, in a process pool
 """
 
 import os
 import sys
-import PyPDF2
 import re
 import logging
 import psycopg2
@@ -23,9 +25,13 @@ logger = logging.getLogger(__name__)
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config import Config
+from eol_pdf_cache import get_parsed, parse_pdfs
 
 EOL_DIR = "/var/www/html/meraki-data/EOL"
 
+# Cache key for extract_all_models_and_dates() results; bump when the extraction changes
+PDF_PARSER_KEY = 'enhanced_models_dates:v1'
+
 def get_db_connection():
     """Get database connection"""
     match = re.match(r'postgresql://(.+):(.+)@(.+):(\d+)/(.+)', Config.SQLALCHEMY_DATABASE_URI)
@@ -259,30 +265,23 @@ def extract_all_models_and_dates(text, filename):
     
     return results
 
+def parse_pdf_models_and_dates(pages, filename):
+    """Models and dates from a PDF's cached page text (runs in an eol_pdf_cache worker)"""
+    text = "".join(page + "\n" for page in pages if page)
+    if not text:
+        logger.warning(f"  No text extracted from {filename}")
+        return {}
+    return extract_all_models_and_dates(text, filename)
+
 def process_pdf(filepath):
-    """Process a single PDF file with enhanced extraction"""
+    """Process a single PDF file with enhanced extraction (cached per content hash)"""
     try:
         filename = os.path.basename(filepath)
         logger.info(f"Processing: {filename}")
         
-        # Extract all text from PDF
-        text = ""
-        with open(filepath, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                except Exception as e:
-                    logger.warning(f"  Error extracting page {page_num}: {e}")
-        
-        if not text:
-            logger.warning(f"  No text extracted from {filename}")
-            return {}
-        
-        # Extract models and dates
-        models = extract_all_models_and_dates(text, filename)
+        models, cached = get_parsed(filepath, PDF_PARSER_KEY, parse_pdf_models_and_dates)
+        if cached:
+            logger.info("  Unchanged since last parse, using cached results")
         
         return models
         
@@ -376,14 +375,17 @@ def main():
     # Connect to database
     conn = get_db_connection()
     
-    # Process all PDFs
+    # Process all PDFs (cache hits inline, new/changed PDFs in parallel)
     all_models = {}
+    results, stats = parse_pdfs([os.path.join(EOL_DIR, f) for f in pdf_files],
+                                PDF_PARSER_KEY, parse_pdf_models_and_dates)
+    logger.info(f"Parsed {stats['parsed']} PDFs, {stats['cached']} unchanged from cache, "
+                f"{stats['failed']} failed")
     
     for i, pdf_file in enumerate(pdf_files, 1):
         logger.info(f"\n[{i}/{len(pdf_files)}] {pdf_file}")
         
-        filepath = os.path.join(EOL_DIR, pdf_file)
-        models = process_pdf(filepath)
+        models = results.get(pdf_file, {})
         
         if models:
             logger.info(f"  Extracted {len(models)} models")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+EOL PDF cache - conditional downloads and content-hash keyed text/parse cache
+
+Shared by comprehensive_eol_tracker.py, enhanced_pdf_parser.py and eol_pdf_parser.py so
+a nightly EOL refresh only downloads and parses PDFs that actually changed:
+
+- Downloads send If-None-Match / If-Modified-Since from the last response; a 304
+  keeps the local file. Validators live in EOL_DIR/.downloads.json, keyed by URL.
+- Extracted page text is cached per PDF content hash (SHA-256) in
+  EOL_DIR/.extraction_cache/<hash>.json, together with each parser's results keyed
+  by the parser's key (bump the version in a key when its extraction logic changes).
+- PDFs that miss the cache are extracted and parsed in a process pool.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from datetime import date, datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import requests
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+EOL_DIR = "/var/www/html/meraki-data/EOL"
+CACHE_DIR = os.path.join(EOL_DIR, '.extraction_cache')
+DOWNLOAD_MANIFEST = os.path.join(EOL_DIR, '.downloads.json')
+CACHE_VERSION = 1  # Bump to invalidate every cached extraction (e.g. PyPDF2 upgrade)
+MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+def file_hash(path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return {'__date__': value.isoformat()[:10]}
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+def _json_object_hook(obj):
+    if len(obj) == 1 and '__date__' in obj:
+        return date.fromisoformat(obj['__date__'])
+    return obj
+
+def _write_json(path, data):
+    """Atomically replace path with data (safe with concurrent pool workers)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, default=_json_default)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f, object_hook=_json_object_hook)
+    except (OSError, ValueError):
+        return None
+
+# ---------------------------------------------------------------------------
+# Conditional downloads
+# ---------------------------------------------------------------------------
+
+def load_download_manifest():
+    return _read_json(DOWNLOAD_MANIFEST) or {}
+
+def save_download_manifest(manifest):
+    _write_json(DOWNLOAD_MANIFEST, manifest)
+
+def download_pdf_conditional(url, filepath, manifest, session=None, timeout=60):
+    """Download url to filepath unless the server says it is unchanged
+
+    Returns (filepath, changed); filepath is None on failure. `changed` is True only
+    when the content hash differs from the previous download. The manifest entry for
+    url is updated in place - save it with save_download_manifest() afterwards.
+    """
+    http = session or requests
+    entry = manifest.get(url, {})
+    headers = {}
+    if os.path.exists(filepath) and entry.get('filename') == os.path.basename(filepath):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    try:
+        response = http.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            entry['checked_at'] = datetime.now().isoformat()
+            manifest[url] = entry
+            return filepath, False
+        response.raise_for_status()
+    except Exception as e:
+        logger.error(f"Error downloading {os.path.basename(filepath)}: {e}")
+        return (filepath if os.path.exists(filepath) else None), False
+
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    changed = content_hash != entry.get('sha256') or not os.path.exists(filepath)
+    if changed:
+        tmp_path = filepath + '.part'
+        with open(tmp_path, 'wb') as f:
+            f.write(response.content)
+        os.replace(tmp_path, filepath)
+        logger.info(f"Downloaded: {os.path.basename(filepath)} ({len(response.content)} bytes)")
+
+    manifest[url] = {
+        'filename': os.path.basename(filepath),
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'sha256': content_hash,
+        'checked_at': datetime.now().isoformat()
+    }
+    return filepath, changed
+
+# ---------------------------------------------------------------------------
+# Extraction cache
+# ---------------------------------------------------------------------------
+
+def _entry_path(pdf_hash):
+    return os.path.join(CACHE_DIR, f"{pdf_hash}.json")
+
+def load_cache_entry(pdf_hash):
+    entry = _read_json(_entry_path(pdf_hash))
+    if not entry or entry.get('version') != CACHE_VERSION:
+        return None
+    return entry
+
+def save_cache_entry(entry):
+    _write_json(_entry_path(entry['sha256']), entry)
+
+def extract_pages(path):
+    """Text of every page (empty string for pages PyPDF2 cannot extract)"""
+    pages = []
+    with open(path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page_num, page in enumerate(pdf_reader.pages):
+            try:
+                pages.append(page.extract_text() or '')
+            except Exception as e:
+                logger.warning(f"  Error extracting page {page_num} of {os.path.basename(path)}: {e}")
+                pages.append('')
+    return pages
+
+def get_cached_pages(path, pdf_hash=None):
+    """(pdf_hash, pages, entry) for a PDF, extracting and caching the text on a miss"""
+    pdf_hash = pdf_hash or file_hash(path)
+    entry = load_cache_entry(pdf_hash)
+    if entry is None:
+        entry = {
+            'version': CACHE_VERSION,
+            'sha256': pdf_hash,
+            'filename': os.path.basename(path),
+            'extracted_at': datetime.now().isoformat(),
+            'pages': extract_pages(path),
+            'parsed': {}
+        }
+        save_cache_entry(entry)
+    return pdf_hash, entry['pages'], entry
+
+def get_pdf_text(path, max_pages=None):
+    """Cached equivalent of extracting a PDF's text with PyPDF2 (pages joined by newlines)"""
+    _, pages, _ = get_cached_pages(path)
+    return '\n'.join(pages[:max_pages] if max_pages else pages)
+
+def get_parsed(path, parser_key, parse_func, pdf_hash=None):
+    """parse_func(pages, filename) for a PDF, cached per content hash and parser_key
+
+    parse_func must be a module-level function (it may run in a worker process) and
+    return JSON-serializable data; dates are preserved. Returns (result, was_cached).
+    """
+    pdf_hash, pages, entry = get_cached_pages(path, pdf_hash)
+    if parser_key in entry['parsed']:
+        return entry['parsed'][parser_key], True
+
+    result = parse_func(pages, os.path.basename(path))
+    entry['parsed'][parser_key] = result
+    save_cache_entry(entry)
+    # Round-trip so cached and fresh results look the same (tuples/sets become lists)
+    return json.loads(json.dumps(result, default=_json_default), object_hook=_json_object_hook), False
+
+def _parse_worker(path, parser_key, parse_func, pdf_hash):
+    result, _ = get_parsed(path, parser_key, parse_func, pdf_hash)
+    return result
+
+def parse_pdfs(paths, parser_key, parse_func, max_workers=MAX_WORKERS):
+    """Parsed results for many PDFs: cache hits inline, misses in a process pool
+
+    Returns ({filename: result}, stats) where stats counts cached/parsed/failed PDFs
+    and 'hashes' holds the content hash of every PDF seen (for prune_cache()).
+    A PDF that fails to parse is logged and left out of the results.
+    """
+    results = {}
+    stats = {'cached': 0, 'parsed': 0, 'failed': 0, 'hashes': set()}
+    misses = []
+
+    for path in paths:
+        filename = os.path.basename(path)
+        try:
+            pdf_hash = file_hash(path)
+            entry = load_cache_entry(pdf_hash)
+            stats['hashes'].add(pdf_hash)
+        except OSError as e:
+            logger.error(f"Error reading {filename}: {e}")
+            stats['failed'] += 1
+            continue
+        if entry and parser_key in entry['parsed']:
+            results[filename] = entry['parsed'][parser_key]
+            stats['cached'] += 1
+        else:
+            misses.append((path, pdf_hash))
+
+    if misses:
+        logger.info(f"Parsing {len(misses)} new or changed PDFs "
+                    f"({stats['cached']} unchanged, from cache) with {max_workers} workers")
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_parse_worker, path, parser_key, parse_func, pdf_hash): path
+                       for path, pdf_hash in misses}
+            for future in as_completed(futures):
+                filename = os.path.basename(futures[future])
+                try:
+                    results[filename] = future.result()
+                    stats['parsed'] += 1
+                except Exception as e:
+                    logger.error(f"Error processing {filename}: {e}")
+                    stats['failed'] += 1
+
+    return results, stats
+
+def prune_cache(keep_hashes):
+    """Delete cache entries for PDFs no longer in EOL_DIR; returns the number removed"""
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+    removed = 0
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith('.json') and name[:-5] not in keep_hashes:
+            os.unlink(os.path.join(CACHE_DIR, name))
+            removed += 1
+    return removed
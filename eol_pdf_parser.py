@@ -1,19 +1,20 @@
 #!/usr/bin/env python3
 """
 EOL PDF Parser - Downloads and parses all EOL PDFs to extract model-specific EOL dates
+
+Downloads are conditional (ETag/Last-Modified) and extracted text is cached per PDF
+content hash - see eol_pdf_cache.py
 """
 
 import os
 import sys
 import requests
 from bs4 import BeautifulSoup
-import PyPDF2
 import re
 from datetime import datetime
 import logging
 import psycopg2
 from urllib.parse import urljoin
-import hashlib
 import json
 
 # Setup logging
@@ -30,6 +31,10 @@ os.makedirs(EOL_DIR, exist_ok=True)
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config import Config
+from eol_pdf_cache import (
+    load_download_manifest, save_download_manifest, download_pdf_conditional,
+    file_hash, get_pdf_text
+)
 
 def get_db_connection():
     """Get database connection"""
@@ -88,45 +93,23 @@ def create_eol_pdf_table(conn):
     finally:
         cursor.close()
 
-def download_pdf(url, filename):
-    """Download a PDF file"""
-    try:
-        # Clean filename
-        clean_filename = re.sub(r'[^\w\-_\.]', '_', filename)
-        if not clean_filename.endswith('.pdf'):
-            clean_filename += '.pdf'
-        
-        filepath = os.path.join(EOL_DIR, clean_filename)
-        
-        # Check if already downloaded
-        if os.path.exists(filepath):
-            logger.info(f"Already exists: {clean_filename}")
-            return filepath
-        
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
-        
-        logger.info(f"Downloaded: {clean_filename} ({len(response.content)} bytes)")
-        return filepath
-    except Exception as e:
-        logger.error(f"Error downloading {filename}: {e}")
-        return None
+def download_pdf(url, filename, manifest, session=None):
+    """Download a PDF file unless unchanged since the last run (ETag/Last-Modified)"""
+    # Clean filename
+    clean_filename = re.sub(r'[^\w\-_\.]', '_', filename)
+    if not clean_filename.endswith('.pdf'):
+        clean_filename += '.pdf'
+    
+    filepath = os.path.join(EOL_DIR, clean_filename)
+    filepath, changed = download_pdf_conditional(url, filepath, manifest, session)
+    if filepath and not changed:
+        logger.info(f"Unchanged: {clean_filename}")
+    return filepath
 
 def extract_text_from_pdf(pdf_path):
-    """Extract text from PDF with better error handling"""
+    """Extract text from PDF (cached per content hash) with better error handling"""
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for i, page in enumerate(pdf_reader.pages):
-                try:
-                    text += page.extract_text() + "\n"
-                except Exception as e:
-                    logger.warning(f"Error extracting page {i}: {e}")
-            return text
+        return get_pdf_text(pdf_path)
     except Exception as e:
         logger.error(f"Error reading PDF {pdf_path}: {e}")
         return ""
@@ -263,8 +246,7 @@ def process_pdf(pdf_path, pdf_url, pdf_name, conn):
     
     try:
         # Calculate PDF hash
-        with open(pdf_path, 'rb') as f:
-            pdf_hash = hashlib.sha256(f.read()).hexdigest()
+        pdf_hash = file_hash(pdf_path)
         
         # Check if we've already processed this PDF
         cursor.execute("""
@@ -380,11 +362,13 @@ def main():
         
         # Process PDFs
         total_models = 0
+        manifest = load_download_manifest()
+        session = requests.Session()
         for pdf in pdf_links:
             logger.info(f"\nProcessing: {pdf['filename']}")
             
             # Download PDF
-            pdf_path = download_pdf(pdf['url'], pdf['filename'])
+            pdf_path = download_pdf(pdf['url'], pdf['filename'], manifest, session)
             if not pdf_path:
                 continue
             
@@ -392,6 +376,8 @@ def main():
             count = process_pdf(pdf_path, pdf['url'], pdf['filename'], conn)
             total_models += count
         
+        save_download_manifest(manifest)
+        
         # Summary
         cursor = conn.cursor()
         cursor.execute("""
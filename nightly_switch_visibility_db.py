@@ -9,11 +9,14 @@ Purpose:
 
 Process:
     1. Connect to Meraki API using organization credentials
-    2. Iterate through all networks in the organization
-    3. For each network, get all switches (MS devices)
-    4. For each switch, collect connected client information
-    5. Update database with current port status
-    6. Mark stale entries (not seen in 7 days)
+    2. List all networks and all switches (MS devices) with org-wide calls
+    3. Fetch connected clients for every switch concurrently, paced by
+       the process-wide Meraki rate budget (meraki_action_batches.rate_budget)
+    4. COPY client rows into a temp staging table and merge them with one
+       INSERT ... ON CONFLICT
+    5. Report stale entries (not seen in 7 days) and delete entries older
+       than 30 days in the same transaction
+    6. Record wall time and API call count in switch_visibility_runs
 
 Schedule:
     Runs nightly at 1:30 AM via cron
@@ -23,9 +26,12 @@ Log Output:
 """
 
 import os
+import io
+import csv
 import sys
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import psycopg2
 import psycopg2.extras
@@ -37,9 +43,12 @@ from dotenv import load_dotenv
 # Load environment variables from meraki.env
 load_dotenv('/usr/local/bin/meraki.env')
 
-# Add parent directory to path
+# Add parent directory to path; shared modules (oui_lookup, meraki_action_batches) live in Main/
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Main'))
 from config import Config
+from oui_lookup import lookup_manufacturer
+from meraki_action_batches import rate_budget  # Process-wide Meraki budget shared with the migration scheduler
 
 # Setup logging
 logging.basicConfig(
@@ -57,6 +66,17 @@ MERAKI_API_KEY = os.getenv("MERAKI_API_KEY")
 MERAKI_BASE_URL = 'https://api.meraki.com/api/v1'
 MERAKI_ORG_NAME = 'DTC-Store-Inventory-All'
 
+# Collection settings
+MAX_WORKERS = 8  # Concurrent client fetches
+STALE_DAYS = 7  # Entries not seen for this long are reported as stale
+DELETE_DAYS = 30  # Entries not seen for this long are deleted
+SKIP_NETWORK_KEYWORDS = ['lab', 'test', 'demo', 'temp']
+
+CLIENT_COLUMNS = (
+    'store_name', 'switch_name', 'switch_serial', 'port_id', 'hostname',
+    'ip_address', 'mac_address', 'vlan', 'manufacturer', 'description'
+)
+
 def get_headers(api_key):
     """Get headers for Meraki API requests"""
     return {
@@ -64,27 +84,50 @@ def get_headers(api_key):
         'Content-Type': 'application/json'
     }
 
-def make_api_request(url, api_key, params=None, max_retries=5):
-    """Make a GET request to the Meraki API with retries for rate limiting."""
-    headers = get_headers(api_key)
+def meraki_get(url, params=None, max_retries=5):
+    """GET from the Meraki API within the rate budget. Returns (data, headers) or (None, None)."""
+    headers = get_headers(MERAKI_API_KEY)
     for attempt in range(max_retries):
         try:
+            rate_budget.acquire()
             logger.debug(f"Requesting {url}")
-            resp = requests.get(url, headers=headers, params=params)
+            resp = requests.get(url, headers=headers, params=params, timeout=30)
             if resp.status_code == 429:  # rate limit
-                delay = 2 ** attempt
+                delay = int(resp.headers.get('Retry-After', 2 ** attempt))
                 logger.warning(f"Rate limited. Backing off for {delay}s...")
-                time.sleep(delay)
+                rate_budget.penalize(delay)
                 continue
             resp.raise_for_status()
-            time.sleep(0.5)  # Rate limiting - 2 requests per second max
-            return resp.json()
+            return resp.json(), resp.headers
         except Exception as e:
             if attempt == max_retries - 1:
                 logger.error(f"Failed to fetch {url} after {max_retries} attempts: {e}")
-                return []
+                return None, None
             time.sleep(2 ** attempt)
-    return []
+    return None, None
+
+def make_api_request(url, api_key=None, params=None, max_retries=5):
+    """Make a GET request to the Meraki API with retries for rate limiting."""
+    data, _ = meraki_get(url, params, max_retries)
+    return data if data is not None else []
+
+def get_all_pages(url, params=None):
+    """Follow Meraki Link-header pagination and return all items
+
+    Raises RuntimeError if any page fails: a partial switch or network list would
+    let the run age out clients of switches it never asked about.
+    """
+    items = []
+    while url:
+        data, headers = meraki_get(url, params)
+        if data is None:
+            raise RuntimeError(f"Pagination failed at {url} after {len(items)} items")
+        items.extend(data)
+        next_links = [link['url'] for link in requests.utils.parse_header_links(headers.get('Link', ''))
+                      if link.get('rel') == 'next']
+        url = next_links[0] if next_links and data else None
+        params = None  # The next link already carries the query string
+    return items
 
 def get_db_connection():
     """Get database connection"""
@@ -103,72 +146,8 @@ def get_db_connection():
     )
 
 def get_mac_manufacturer(mac):
-    """Get manufacturer from MAC address OUI"""
-    if not mac:
-        return 'Unknown'
-    
-    # Comprehensive OUI mapping based on actual data
-    mac_prefixes = {
-        # Most common from our data
-        '48:25:67': 'Epson',
-        'c8:1c:fe': 'SHARP',
-        '74:5d:22': 'SHARP',
-        'e8:80:88': 'Texas Instruments',
-        'e4:55:a8': 'Dedicated Computing',
-        '00:07:4d': 'Zebra Technologies',
-        '6c:24:08': 'Texas Instruments',
-        'e8:05:dc': 'D-Link',
-        '10:1e:da': 'Zebra Technologies',
-        'a4:60:11': 'Verifone',
-        '0c:7b:c8': 'Hon Hai Precision',
-        '88:a4:c2': 'Cisco Meraki',
-        '2c:ff:65': 'Texas Instruments',
-        '00:22:ee': 'Zebra Technologies',
-        '60:95:32': 'Zebra Technologies',
-        '78:8c:77': 'Lexmark',
-        '90:2e:16': 'Cisco Meraki',
-        'ec:64:c9': 'Texas Instruments',
-        '30:c6:f7': 'Texas Instruments',
-        '78:b8:d6': 'Zebra Technologies',
-        # Additional common OUIs
-        '00:18:0a': 'Cisco Meraki',
-        '00:23:ac': 'Cisco',
-        '00:0c:29': 'VMware',
-        'f4:ce:46': 'Hewlett Packard',
-        '00:50:56': 'VMware',
-        '00:1b:21': 'Intel',
-        '00:15:5d': 'Microsoft',
-        '00:0d:3a': 'Microsoft',
-        '00:17:88': 'Philips',
-        '00:1a:a0': 'Dell',
-        '00:21:9b': 'Dell',
-        '00:22:19': 'Dell',
-        '00:24:e8': 'Dell',
-        '00:25:64': 'Dell',
-        '98:90:96': 'Dell',
-        'b0:83:fe': 'Dell',
-        'd0:94:66': 'Dell',
-        'f8:b1:56': 'Dell',
-        'f8:bc:12': 'Dell',
-        '5c:26:0a': 'HP',
-        '3c:d9:2b': 'HP',
-        '94:57:a5': 'HP',
-        'fc:15:b4': 'HP',
-        '70:5a:0f': 'HP',
-        '00:1f:f3': 'Apple',
-        '00:23:32': 'Apple',
-        '00:25:4b': 'Apple',
-        '3c:07:54': 'Apple',
-        '60:03:08': 'Apple',
-        '90:27:e4': 'Apple',
-        'a8:20:66': 'Apple',
-        'f0:18:98': 'Apple'
-    }
-    
-    mac_lower = mac.lower()
-    prefix = mac_lower[:8]
-    
-    return mac_prefixes.get(prefix, 'Unknown')
+    """Get manufacturer from MAC address using the IEEE OUI registry index"""
+    return lookup_manufacturer(mac)
 
 def get_organizations():
     """Get all organizations"""
@@ -186,134 +165,193 @@ def get_organization_id_by_name(org_name):
 
 def get_organization_networks(organization_id):
     """Get all networks for an organization with pagination"""
-    networks = []
-    per_page = 1000
-    starting_after = None
-    
-    while True:
-        params = {'perPage': per_page}
-        if starting_after:
-            params['startingAfter'] = starting_after
-        
-        url = f"{MERAKI_BASE_URL}/organizations/{organization_id}/networks"
-        page_networks = make_api_request(url, MERAKI_API_KEY, params)
-        
-        if not page_networks:
-            break
-            
-        networks.extend(page_networks)
-        
-        if len(page_networks) < per_page:
-            break
-            
-        starting_after = page_networks[-1]['id']
-    
-    return networks
+    url = f"{MERAKI_BASE_URL}/organizations/{organization_id}/networks"
+    return get_all_pages(url, {'perPage': 1000})
 
-def get_network_devices(network_id):
-    """Get all devices in a network"""
-    url = f'{MERAKI_BASE_URL}/networks/{network_id}/devices'
-    devices = make_api_request(url, MERAKI_API_KEY)
-    if not devices:
-        logger.warning(f"Failed to get devices for network {network_id}")
-    return devices
+def get_organization_switches(organization_id):
+    """Get every MS switch in the organization in one paginated listing"""
+    url = f"{MERAKI_BASE_URL}/organizations/{organization_id}/devices"
+    devices = get_all_pages(url, {'perPage': 1000, 'productTypes[]': 'switch'})
+    return [device for device in devices if 'MS' in device.get('model', '')]
 
 def get_device_clients(serial):
-    """Get clients connected to a device"""
+    """Get clients connected to a device (None if the request failed)"""
     url = f'{MERAKI_BASE_URL}/devices/{serial}/clients'
-    clients = make_api_request(url, MERAKI_API_KEY)
-    if not clients:
+    clients, _ = meraki_get(url)
+    if clients is None:
         logger.warning(f"Failed to get clients for device {serial}")
     return clients
 
-def process_switch_clients(conn, network_name, device, clients):
-    """Process and store switch client data"""
-    cursor = conn.cursor()
-    processed_count = 0
-    
+def build_client_rows(network_name, device, clients):
+    """Convert a switch's wired clients to switch_port_clients rows keyed by the unique constraint"""
+    rows = {}
     for client in clients:
         # Skip if no switchport info (wireless clients)
         if 'switchport' not in client:
             continue
         
-        try:
-            # Extract client data
-            port_id = client.get('switchport', 'Unknown')
-            hostname = client.get('description', client.get('dhcpHostname', ''))
-            ip_address = client.get('ip', '')
-            mac_address = client.get('mac', '')
-            vlan = client.get('vlan', None)
-            manufacturer = get_mac_manufacturer(mac_address)
-            description = client.get('notes', '')
-            
-            # Insert or update the record
-            cursor.execute("""
-                INSERT INTO switch_port_clients 
-                (store_name, switch_name, switch_serial, port_id, hostname, 
-                 ip_address, mac_address, vlan, manufacturer, description, 
-                 last_seen, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
-                ON CONFLICT (switch_serial, port_id, mac_address) 
-                DO UPDATE SET
-                    store_name = EXCLUDED.store_name,
-                    switch_name = EXCLUDED.switch_name,
-                    hostname = EXCLUDED.hostname,
-                    ip_address = EXCLUDED.ip_address,
-                    vlan = EXCLUDED.vlan,
-                    manufacturer = EXCLUDED.manufacturer,
-                    description = EXCLUDED.description,
-                    last_seen = NOW(),
-                    updated_at = NOW()
-            """, (
-                network_name,
-                device.get('name', ''),
-                device['serial'],
-                port_id,
-                hostname,
-                ip_address,
-                mac_address,
-                vlan,
-                manufacturer,
-                description
-            ))
-            
-            processed_count += 1
+        port_id = client.get('switchport') or 'Unknown'
+        mac_address = client.get('mac') or ''
+        vlan = client.get('vlan')
+        rows[(device['serial'], port_id, mac_address)] = (
+            network_name,
+            device.get('name', ''),
+            device['serial'],
+            port_id,
+            client.get('description') or client.get('dhcpHostname') or '',
+            client.get('ip') or '',
+            mac_address,
+            int(vlan) if str(vlan).isdigit() else None,
+            get_mac_manufacturer(mac_address),
+            client.get('notes') or ''
+        )
+    return rows
+
+def collect_switch_clients(switches, network_names):
+    """Fetch clients for all switches concurrently; returns (rows, failed_serials)"""
+    rows = {}
+    failed = []
+    
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(get_device_clients, switch['serial']): switch for switch in switches}
+        for done, future in enumerate(as_completed(futures), 1):
+            switch = futures[future]
+            clients = future.result()
+            if clients is None:
+                failed.append(switch['serial'])
+            else:
+                rows.update(build_client_rows(network_names[switch['networkId']], switch, clients))
             
-        except Exception as e:
-            logger.error(f"Error processing client {client.get('mac', 'unknown')}: {e}")
-            conn.rollback()
-            continue
+            if done % 500 == 0:
+                logger.info(f"  Fetched clients for {done}/{len(switches)} switches "
+                           f"({rate_budget.calls} API calls so far)")
     
-    conn.commit()
-    return processed_count
+    return list(rows.values()), failed
 
-def mark_stale_entries(conn):
-    """Mark entries as stale if not seen in 7 days"""
+def copy_rows(cursor, table, columns, rows):
+    """Bulk load rows into a table with COPY ... FROM STDIN (CSV)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if value is None else value for value in row])
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buffer
+    )
+
+def merge_switch_clients(conn, rows, run_stats):
+    """Stage client rows via COPY, merge them, and age out stale rows in one transaction"""
     cursor = conn.cursor()
     
-    # For now, we'll just log old entries
-    # In production, you might want to move them to an archive table
     cursor.execute("""
-        SELECT COUNT(*) 
-        FROM switch_port_clients 
-        WHERE last_seen < NOW() - INTERVAL '7 days'
+        CREATE TEMP TABLE switch_port_clients_stage (
+            store_name VARCHAR(100),
+            switch_name VARCHAR(100),
+            switch_serial VARCHAR(50),
+            port_id VARCHAR(20),
+            hostname VARCHAR(200),
+            ip_address VARCHAR(45),
+            mac_address VARCHAR(17),
+            vlan INTEGER,
+            manufacturer VARCHAR(100),
+            description TEXT
+        ) ON COMMIT DROP
     """)
+    copy_rows(cursor, 'switch_port_clients_stage', CLIENT_COLUMNS, rows)
     
-    stale_count = cursor.fetchone()[0]
+    cursor.execute(f"""
+        INSERT INTO switch_port_clients ({', '.join(CLIENT_COLUMNS)}, last_seen, updated_at)
+        SELECT {', '.join(CLIENT_COLUMNS)}, NOW(), NOW()
+        FROM switch_port_clients_stage
+        ON CONFLICT (switch_serial, port_id, mac_address) 
+        DO UPDATE SET
+            store_name = EXCLUDED.store_name,
+            switch_name = EXCLUDED.switch_name,
+            hostname = EXCLUDED.hostname,
+            ip_address = EXCLUDED.ip_address,
+            vlan = EXCLUDED.vlan,
+            manufacturer = EXCLUDED.manufacturer,
+            description = EXCLUDED.description,
+            last_seen = NOW(),
+            updated_at = NOW()
+    """)
+    run_stats['clients_merged'] = cursor.rowcount
     
-    if stale_count > 0:
-        logger.info(f"Found {stale_count} stale entries (not seen in 7 days)")
-        
-        # Optional: Delete very old entries (30+ days)
-        cursor.execute("""
-            DELETE FROM switch_port_clients 
-            WHERE last_seen < NOW() - INTERVAL '30 days'
-        """)
-        deleted_count = cursor.rowcount
-        
-        if deleted_count > 0:
-            logger.info(f"Deleted {deleted_count} entries older than 30 days")
-            conn.commit()
+    # Set-based staleness: report rows unseen for STALE_DAYS, delete rows unseen for DELETE_DAYS
+    cursor.execute("""
+        WITH deleted AS (
+            DELETE FROM switch_port_clients
+            WHERE last_seen < NOW() - make_interval(days => %s)
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FROM deleted),
+            (SELECT COUNT(*) FROM switch_port_clients
+             WHERE last_seen < NOW() - make_interval(days => %s))
+    """, (DELETE_DAYS, STALE_DAYS))
+    run_stats['deleted_count'], run_stats['stale_count'] = cursor.fetchone()
+    
+    record_run(cursor, run_stats)
+    conn.commit()
+    cursor.close()
+
+def record_run(cursor, run_stats):
+    """Record wall time, API calls and row counts for this run"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS switch_visibility_runs (
+            id SERIAL PRIMARY KEY,
+            started_at TIMESTAMP NOT NULL,
+            finished_at TIMESTAMP DEFAULT NOW(),
+            wall_seconds NUMERIC(10, 2),
+            api_calls INTEGER,
+            rate_limited INTEGER,
+            switches INTEGER,
+            failed_switches INTEGER,
+            clients_merged INTEGER,
+            stale_count INTEGER,
+            deleted_count INTEGER
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO switch_visibility_runs (
+            started_at, wall_seconds, api_calls, rate_limited, switches,
+            failed_switches, clients_merged, stale_count, deleted_count
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        run_stats['started_at'], time.time() - run_stats['start_time'],
+        rate_budget.calls, rate_budget.rate_limited, run_stats['switches'],
+        run_stats['failed_switches'], run_stats['clients_merged'],
+        run_stats['stale_count'], run_stats['deleted_count']
+    ))
+
+FACETS_REFRESH_LOCK = 728301  # pg advisory lock key, see Main/switch_visibility.py
+
+def refresh_switch_port_facets(conn):
+    """Rebuild the store/switch filter facets read by /api/switch-port-clients"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS switch_port_facets (
+            switch_serial VARCHAR(50) NOT NULL,
+            store_name VARCHAR(100) NOT NULL,
+            switch_name VARCHAR(100),
+            client_count INTEGER DEFAULT 0,
+            refreshed_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (switch_serial, store_name)
+        )
+    """)
+    # Same advisory lock as Main/switch_visibility.py so a page-load rebuild can't interleave
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (FACETS_REFRESH_LOCK,))
+    cursor.execute("DELETE FROM switch_port_facets")
+    cursor.execute("""
+        INSERT INTO switch_port_facets (store_name, switch_serial, switch_name, client_count, refreshed_at)
+        SELECT COALESCE(store_name, ''), switch_serial, MAX(switch_name), COUNT(*), NOW()
+        FROM switch_port_clients
+        WHERE switch_serial IS NOT NULL
+        GROUP BY COALESCE(store_name, ''), switch_serial
+    """)
+    logger.info(f"Rebuilt switch_port_facets with {cursor.rowcount} switches")
+    conn.commit()
 
 def main():
     """Main execution function"""
@@ -332,60 +370,35 @@ def main():
         
         logger.info(f"Found organization: {MERAKI_ORG_NAME} (ID: {org_id})")
         
-        # Get all networks
+        # Get all networks and switches with org-wide listings
         networks = get_organization_networks(org_id)
-        logger.info(f"Found {len(networks)} networks to process")
+        network_names = {
+            network['id']: network['name'] for network in networks
+            # Skip if network name suggests it's not a store
+            if not any(skip in network['name'].lower() for skip in SKIP_NETWORK_KEYWORDS)
+        }
+        switches = [s for s in get_organization_switches(org_id) if s.get('networkId') in network_names]
+        logger.info(f"Found {len(switches)} switches in {len(network_names)} store networks")
         
-        # Process statistics
-        total_switches = 0
-        total_clients = 0
-        networks_processed = 0
+        # Fetch clients for every switch concurrently within the rate budget
+        rows, failed = collect_switch_clients(switches, network_names)
+        logger.info(f"Collected {len(rows)} wired clients from {len(switches) - len(failed)} switches "
+                   f"({len(failed)} failed, {rate_budget.calls} API calls, "
+                   f"{rate_budget.rate_limited} rate limited)")
         
-        # Process each network
-        for network in networks:
-            network_name = network['name']
-            network_id = network['id']
-            
-            # Skip if network name suggests it's not a store
-            if any(skip in network_name.lower() for skip in ['lab', 'test', 'demo', 'temp']):
-                logger.debug(f"Skipping non-store network: {network_name}")
-                continue
-            
-            logger.info(f"Processing network: {network_name}")
-            
-            # Get all devices in the network
-            devices = get_network_devices(network_id)
-            
-            # Process only switches (MS devices)
-            network_switches = 0
-            network_clients = 0
-            
-            for device in devices:
-                if 'MS' not in device.get('model', ''):
-                    continue
-                
-                switch_name = device.get('name', device['serial'])
-                logger.debug(f"  Processing switch: {switch_name} ({device['serial']})")
-                
-                # Get clients for this switch
-                clients = get_device_clients(device['serial'])
-                
-                if clients:
-                    # Process and store client data
-                    processed = process_switch_clients(conn, network_name, device, clients)
-                    network_clients += processed
-                    logger.debug(f"    Found {processed} wired clients")
-                
-                network_switches += 1
-                total_switches += 1
-            
-            if network_switches > 0:
-                logger.info(f"  Processed {network_switches} switches with {network_clients} clients")
-                networks_processed += 1
-                total_clients += network_clients
+        # Merge clients, age out stale rows and record the run in one transaction
+        run_stats = {
+            'start_time': start_time,
+            'started_at': datetime.fromtimestamp(start_time),
+            'switches': len(switches),
+            'failed_switches': len(failed)
+        }
+        merge_switch_clients(conn, rows, run_stats)
+        logger.info(f"Merged {run_stats['clients_merged']} clients; {run_stats['stale_count']} stale entries "
+                   f"(not seen in {STALE_DAYS} days), deleted {run_stats['deleted_count']} older than {DELETE_DAYS} days")
         
-        # Clean up old entries
-        mark_stale_entries(conn)
+        # Rebuild filter facets for the switch visibility page
+        refresh_switch_port_facets(conn)
         
         # Close database connection
         conn.close()
@@ -393,9 +406,10 @@ def main():
         # Final statistics
         elapsed_time = time.time() - start_time
         logger.info("=== Collection Complete ===")
-        logger.info(f"Networks processed: {networks_processed}")
-        logger.info(f"Total switches: {total_switches}")
-        logger.info(f"Total clients: {total_clients}")
+        logger.info(f"Networks with switches: {len({s['networkId'] for s in switches})}")
+        logger.info(f"Total switches: {len(switches)}")
+        logger.info(f"Total clients: {len(rows)}")
+        logger.info(f"API calls: {rate_budget.calls}")
         logger.info(f"Execution time: {elapsed_time:.2f} seconds")
         
     except Exception as e:
@@ -405,4 +419,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -19,6 +19,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config import config
 from models import db, PerformanceMetric
 from flask import Flask
+from sqlalchemy import text
 
 # Configure logging
 logging.basicConfig(
@@ -31,6 +32,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# request_timing rows (source = 'live') - kept past the 7-day anomaly baseline
+LIVE_RETENTION_DAYS = 14
+
 # Base URL for API calls
 BASE_URL = "http://localhost:5052"
 
@@ -221,6 +225,24 @@ def cleanup_old_metrics(days=90):
         logger.error(f"Error cleaning up old metrics: {e}")
         db.session.rollback()
 
+def cleanup_live_metrics(days=LIVE_RETENTION_DAYS):
+    """Remove request_timing rows (source = 'live') older than specified days
+
+    Live rows arrive at request volume rather than a few per hour, so they are
+    kept only as long as the anomaly baseline (7 days) plus a margin.
+    """
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        # Raw SQL: the source column is added by Main/models.py, not this tree's models.py
+        deleted = db.session.execute(text(
+            "DELETE FROM performance_metrics WHERE source = 'live' AND timestamp < :cutoff"
+        ), {'cutoff': cutoff}).rowcount
+        db.session.commit()
+        logger.info(f"Deleted {deleted} live request metrics older than {days} days")
+    except Exception as e:
+        logger.error(f"Error cleaning up live request metrics: {e}")
+        db.session.rollback()
+
 def main():
     """Main monitoring function"""
     logger.info("Starting performance monitoring run")
@@ -233,6 +255,7 @@ def main():
     with app.app_context():
         # Cleanup old metrics first
         cleanup_old_metrics()
+        cleanup_live_metrics()
         
         # Monitor each endpoint
         for endpoint in ENDPOINTS:
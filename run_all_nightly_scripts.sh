@@ -1,5 +1,7 @@
 #!/bin/bash
-# Run all nightly scripts in order
+# Run all nightly scripts in order (strictly serial)
+# nightly_pipeline.py runs the same jobs as a dependency graph with parallel stages:
+#   /usr/bin/python3 /usr/local/bin/Main/nightly_pipeline.py [--resume]
 
 echo "Starting all nightly scripts at $(date)"
 echo "========================================"
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Parallel Traceroute Orchestrator for Cellular Carrier Detection
+
+traceroute_cellular_detector.py / meraki_traceroute_carrier_detector.py start one
+liveTools traceroute and sleep-poll it to completion before moving to the next WAN,
+so a few hundred private-IP cellular sites take hours. This orchestrator:
+
+- Keeps up to --max-in-flight traceroutes running at once (one per device, since
+  live tools run one job per device at a time), refilling as jobs finish
+- Polls every pending job from one loop, each on its own POLL_INTERVAL schedule,
+  with all Meraki calls spaced to REQUESTS_PER_SECOND (org-wide API limit)
+- Classifies hops through the traceroute_hop_carriers cache table, so a hop IP
+  seen before is classified without another reverse DNS lookup
+- Stores results in cellular_carrier_detection like the single-device scripts
+
+Usage:
+    python3 traceroute_orchestrator.py                    # all MX WANs with private IPs
+    python3 traceroute_orchestrator.py --network "ALB 03" --max-in-flight 10
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import ipaddress
+import requests
+from dotenv import load_dotenv
+from datetime import datetime
+import psycopg2
+from psycopg2.extras import execute_values
+import logging
+
+# Add the test directory to path for imports
+sys.path.append('/usr/local/bin/test')
+from config import Config
+
+# Load environment variables
+load_dotenv('/usr/local/bin/meraki.env')
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('/var/log/traceroute-orchestrator.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Configuration constants
+BASE_URL = "https://api.meraki.com/api/v1"
+MERAKI_API_KEY = os.getenv("MERAKI_API_KEY")
+
+TRACEROUTE_TARGET = '8.8.8.8'
+MAX_IN_FLIGHT = 20          # Concurrent traceroutes (one per device)
+REQUESTS_PER_SECOND = 8     # Stay under Meraki's 10 req/s per org
+POLL_INTERVAL = 3           # Seconds between polls of the same job
+JOB_TIMEOUT = 120           # Give up on a traceroute after this many seconds
+MAX_HOPS = 5                # Cellular carriers show up within the first 5 hops
+HOP_CACHE_DAYS = 30         # Re-resolve cached hop classifications after this
+DNS_TIMEOUT = 3
+
+# Known cellular carrier patterns from DNS names
+CARRIER_DNS_PATTERNS = {
+    'verizon': [
+        'myvzw.com', 'verizonwireless.com', 'vzw.com', 'vzwnet.com',
+        'verizon-gni.net', 'cellco.net', 'verizon.net', 'verizon-'
+    ],
+    'att': [
+        'att.net', 'sbcglobal.net', 'att-inet.com', 'wireless.att.net',
+        'attwireless.net', 'att.com', 'attens.com'
+    ],
+    'tmobile': [
+        't-mobile.com', 'tmobile.com', 'tmo.blackberry.net',
+        'tmus.net', 'metropcs.net', 'sprint.net', 'sprintspectrum.com',
+        'spcsdns.net', 'sprint.com'
+    ]
+}
+
+def get_db_connection():
+    """Get database connection"""
+    return psycopg2.connect(Config.SQLALCHEMY_DATABASE_URI)
+
+def create_tables(cursor):
+    """Create the detection results table and the hop classification cache"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cellular_carrier_detection (
+            id SERIAL PRIMARY KEY,
+            network_name VARCHAR(255) NOT NULL,
+            device_serial VARCHAR(255) NOT NULL,
+            wan_interface VARCHAR(10) NOT NULL,
+            private_ip VARCHAR(45) NOT NULL,
+            public_ip VARCHAR(45),
+            detected_carrier VARCHAR(255),
+            detection_method VARCHAR(255),
+            confidence_score INTEGER,
+            traceroute_hops JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(device_serial, wan_interface)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS traceroute_hop_carriers (
+            hop_ip VARCHAR(45) PRIMARY KEY,
+            hostname VARCHAR(255),
+            carrier VARCHAR(50),
+            classified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def is_private_ip(ip_str):
+    """Check if IP is private"""
+    try:
+        return ipaddress.ip_address(ip_str).is_private
+    except:
+        return False
+
+def get_private_ip_wans(cursor, network_name=None, limit=None):
+    """(network_name, device_serial, wan_interface, private_ip) for every MX WAN on a private IP"""
+    query = """
+        SELECT DISTINCT network_name, device_serial, wan1_ip, wan2_ip
+        FROM meraki_inventory
+        WHERE device_model LIKE 'MX%%'
+        AND device_serial IS NOT NULL
+    """
+    params = []
+    if network_name:
+        query += " AND network_name = %s"
+        params.append(network_name)
+    cursor.execute(query + " ORDER BY network_name", params)
+
+    wans = []
+    for network, serial, wan1_ip, wan2_ip in cursor.fetchall():
+        for wan_interface, ip in (('wan1', wan1_ip), ('wan2', wan2_ip)):
+            if ip and is_private_ip(ip):
+                wans.append((network, serial, wan_interface, ip))
+    return wans[:limit] if limit else wans
+
+class RateLimiter:
+    """Space calls at least 1/rate seconds apart; pause() backs everything off after a 429"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_at = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+    def pause(self, seconds):
+        self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+class HopCarrierCache:
+    """hop IP -> (hostname, carrier), backed by traceroute_hop_carriers"""
+
+    def __init__(self, cursor):
+        cursor.execute("""
+            SELECT hop_ip, hostname, carrier
+            FROM traceroute_hop_carriers
+            WHERE classified_at > NOW() - %s * INTERVAL '1 day'
+        """, (HOP_CACHE_DAYS,))
+        self.entries = {ip: (hostname, carrier) for ip, hostname, carrier in cursor.fetchall()}
+        self.new_entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def classify(self, ip, hostname=None):
+        """(hostname, carrier) for a hop; reverse DNS only for IPs not seen before"""
+        if ip in self.entries:
+            self.hits += 1
+            return self.entries[ip]
+
+        self.misses += 1
+        if not hostname or hostname == 'N/A':
+            hostname = reverse_dns(ip)
+        entry = (hostname, match_carrier(hostname))
+        self.entries[ip] = entry
+        self.new_entries[ip] = entry
+        return entry
+
+    def flush(self, cursor):
+        """Upsert classifications made since the last flush"""
+        if not self.new_entries:
+            return
+        execute_values(cursor, """
+            INSERT INTO traceroute_hop_carriers (hop_ip, hostname, carrier, classified_at)
+            VALUES %s
+            ON CONFLICT (hop_ip) DO UPDATE SET
+                hostname = EXCLUDED.hostname,
+                carrier = EXCLUDED.carrier,
+                classified_at = EXCLUDED.classified_at
+        """, [(ip, hostname, carrier, datetime.now()) for ip, (hostname, carrier) in self.new_entries.items()])
+        self.new_entries = {}
+
+def reverse_dns(ip):
+    """PTR name for an IP, or None"""
+    try:
+        return socket.gethostbyaddr(ip)[0]
+    except (socket.herror, socket.gaierror, socket.timeout, OSError):
+        return None
+
+def match_carrier(hostname):
+    """Carrier whose DNS pattern appears in hostname, or None"""
+    if not hostname:
+        return None
+    hostname_lower = hostname.lower()
+    for carrier, patterns in CARRIER_DNS_PATTERNS.items():
+        if any(pattern in hostname_lower for pattern in patterns):
+            return carrier.upper()
+    return None
+
+def extract_hops(trace_result):
+    """[(hop_number, ip, hostname)] from either liveTools result layout
+
+    Older responses nest hosts under results.hops[].hosts[]; newer ones return
+    results as a flat list of {hop, ip}.
+    """
+    results = trace_result.get('results') if trace_result else None
+    hops = []
+    if isinstance(results, dict):
+        for number, hop in enumerate(results.get('hops', []), 1):
+            for host in hop.get('hosts', []):
+                if host.get('ip') and host.get('ip') != '*':
+                    hops.append((number, host['ip'], host.get('hostname')))
+    elif isinstance(results, list):
+        for hop in results:
+            if hop.get('ip') and hop.get('ip') != '*':
+                hops.append((hop.get('hop', 0), hop['ip'], hop.get('hostname')))
+    return hops
+
+def analyze_traceroute_hops(trace_result, hop_cache):
+    """(carrier, hop_data, confidence) from the first MAX_HOPS hops"""
+    hop_data = []
+    for hop_num, ip, hostname in extract_hops(trace_result):
+        if hop_num > MAX_HOPS:
+            break
+        hostname, carrier = hop_cache.classify(ip, hostname)
+        hop_data.append({
+            'hop': hop_num,
+            'ip': ip,
+            'hostname': hostname,
+            'carrier_detected': carrier
+        })
+        if carrier:
+            confidence = 95 if hop_num <= 2 else 85 if hop_num <= 3 else 75
+            return carrier, hop_data, confidence
+    return None, hop_data, 0
+
+class TracerouteOrchestrator:
+    """Launch, poll and analyze many liveTools traceroutes from one loop"""
+
+    def __init__(self, session, hop_cache, max_in_flight=MAX_IN_FLIGHT,
+                 requests_per_second=REQUESTS_PER_SECOND):
+        self.session = session
+        self.hop_cache = hop_cache
+        self.max_in_flight = max_in_flight
+        self.limiter = RateLimiter(requests_per_second)
+        self.stats = {'launched': 0, 'completed': 0, 'failed': 0, 'timed_out': 0, 'polls': 0}
+
+    def request(self, method, url, data=None):
+        """Rate-limited Meraki call; retries 429s after Retry-After, None on connection errors"""
+        while True:
+            self.limiter.wait()
+            try:
+                response = self.session.request(method, url, json=data, timeout=30)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Meraki API request failed: {e}")
+                return None
+            if response.status_code != 429:
+                return response
+            retry_after = int(response.headers.get('Retry-After', 5))
+            logger.warning(f"Rate limited, backing off {retry_after} seconds")
+            self.limiter.pause(retry_after)
+
+    def launch(self, wan):
+        """Start a traceroute for one WAN; returns the job dict or None"""
+        network_name, serial, wan_interface, private_ip = wan
+        response = self.request('POST', f"{BASE_URL}/devices/{serial}/liveTools/traceRoute",
+                                {'target': TRACEROUTE_TARGET, 'sourceInterface': private_ip})
+        if response is None or response.status_code != 201:
+            logger.error(f"{network_name} {wan_interface}: failed to start traceroute "
+                         f"({response.status_code if response is not None else 'no response'})")
+            self.stats['failed'] += 1
+            return None
+
+        body = response.json()
+        traceroute_id = body.get('traceRouteId') or body.get('tracerouteId')
+        if not traceroute_id:
+            logger.error(f"{network_name} {wan_interface}: no traceroute ID returned")
+            self.stats['failed'] += 1
+            return None
+
+        self.stats['launched'] += 1
+        now = time.monotonic()
+        return {
+            'wan': wan,
+            'url': f"{BASE_URL}/devices/{serial}/liveTools/traceRoute/{traceroute_id}",
+            'started': now,
+            'next_poll': now + POLL_INTERVAL
+        }
+
+    def poll(self, job):
+        """Poll a job once; returns the finished trace result, False if failed, None if pending"""
+        self.stats['polls'] += 1
+        response = self.request('GET', job['url'])
+        if response is None or response.status_code != 200:
+            return None
+
+        trace_result = response.json()
+        status = trace_result.get('status')
+        if status == 'complete':
+            return trace_result
+        if status == 'failed':
+            network_name, _, wan_interface, _ = job['wan']
+            logger.error(f"{network_name} {wan_interface}: traceroute failed: "
+                         f"{trace_result.get('error', 'Unknown error')}")
+            return False
+        return None
+
+    def to_result(self, wan, trace_result):
+        network_name, serial, wan_interface, private_ip = wan
+        carrier, hop_data, confidence = analyze_traceroute_hops(trace_result, self.hop_cache)
+        return {
+            'network_name': network_name,
+            'device_serial': serial,
+            'wan_interface': wan_interface,
+            'private_ip': private_ip,
+            'public_ip': None,
+            'detected_carrier': carrier,
+            'detection_method': 'traceroute_dns' if carrier else None,
+            'confidence_score': confidence,
+            'traceroute_hops': json.dumps(hop_data) if hop_data else None
+        }
+
+    def run(self, wans, on_result=None):
+        """Trace every WAN; returns the detection results (on_result is called as each finishes)"""
+        queue = list(wans)
+        pending = {}  # device serial -> job
+        results = []
+
+        while queue or pending:
+            # Fill free slots, skipping devices that already have a job running
+            deferred = []
+            while queue and len(pending) < self.max_in_flight:
+                wan = queue.pop(0)
+                if wan[1] in pending:
+                    deferred.append(wan)
+                    continue
+                job = self.launch(wan)
+                if job:
+                    pending[wan[1]] = job
+            queue = deferred + queue
+
+            if not pending:
+                continue
+
+            # Sleep until the earliest scheduled poll, then poll everything that is due
+            wait = min(job['next_poll'] for job in pending.values()) - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            now = time.monotonic()
+            for serial, job in list(pending.items()):
+                if job['next_poll'] > now:
+                    continue
+                outcome = self.poll(job)
+                if outcome is None:
+                    if time.monotonic() - job['started'] > JOB_TIMEOUT:
+                        logger.warning(f"{job['wan'][0]} {job['wan'][2]}: traceroute timed out")
+                        self.stats['timed_out'] += 1
+                        del pending[serial]
+                    else:
+                        job['next_poll'] = time.monotonic() + POLL_INTERVAL
+                    continue
+
+                del pending[serial]
+                if outcome is False:
+                    self.stats['failed'] += 1
+                    continue
+
+                self.stats['completed'] += 1
+                result = self.to_result(job['wan'], outcome)
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+        return results
+
+def store_detection_results(cursor, results):
+    """Upsert carrier detection results"""
+    if not results:
+        return
+    execute_values(cursor, """
+        INSERT INTO cellular_carrier_detection (
+            network_name, device_serial, wan_interface, private_ip, public_ip,
+            detected_carrier, detection_method, confidence_score, traceroute_hops
+        ) VALUES %s
+        ON CONFLICT (device_serial, wan_interface) DO UPDATE SET
+            private_ip = EXCLUDED.private_ip,
+            public_ip = EXCLUDED.public_ip,
+            detected_carrier = EXCLUDED.detected_carrier,
+            detection_method = EXCLUDED.detection_method,
+            confidence_score = EXCLUDED.confidence_score,
+            traceroute_hops = EXCLUDED.traceroute_hops,
+            created_at = CURRENT_TIMESTAMP
+    """, [(
+        r['network_name'], r['device_serial'], r['wan_interface'], r['private_ip'], r['public_ip'],
+        r['detected_carrier'], r['detection_method'], r['confidence_score'], r['traceroute_hops']
+    ) for r in results])
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel traceroute cellular carrier detection')
+    parser.add_argument('--network', help='Only trace this network')
+    parser.add_argument('--limit', type=int, help='Trace at most this many WANs')
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT,
+                        help=f'Concurrent traceroutes (default {MAX_IN_FLIGHT})')
+    args = parser.parse_args()
+
+    logger.info("=== Starting Parallel Traceroute Carrier Detection ===")
+
+    if not MERAKI_API_KEY:
+        logger.error("MERAKI_API_KEY not found in environment")
+        return
+
+    socket.setdefaulttimeout(DNS_TIMEOUT)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    create_tables(cursor)
+    conn.commit()
+
+    wans = get_private_ip_wans(cursor, args.network, args.limit)
+    logger.info(f"Found {len(wans)} private-IP WAN interfaces to trace")
+    if not wans:
+        cursor.close()
+        conn.close()
+        return
+
+    hop_cache = HopCarrierCache(cursor)
+    logger.info(f"Loaded {len(hop_cache.entries)} cached hop classifications")
+
+    session = requests.Session()
+    session.headers.update({
+        'X-Cisco-Meraki-API-Key': MERAKI_API_KEY,
+        'Content-Type': 'application/json'
+    })
+
+    orchestrator = TracerouteOrchestrator(session, hop_cache, args.max_in_flight)
+    started = time.monotonic()
+    batch = []
+
+    def on_result(result):
+        if result['detected_carrier']:
+            logger.info(f"  {result['network_name']} {result['wan_interface']}: Detected "
+                        f"{result['detected_carrier']} (confidence: {result['confidence_score']}%)")
+        else:
+            logger.info(f"  {result['network_name']} {result['wan_interface']}: Unable to detect carrier")
+        batch.append(result)
+        if len(batch) >= 50:
+            store_detection_results(cursor, batch)
+            hop_cache.flush(cursor)
+            conn.commit()
+            batch.clear()
+
+    results = orchestrator.run(wans, on_result)
+    store_detection_results(cursor, batch)
+    hop_cache.flush(cursor)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    stats = orchestrator.stats
+    logger.info("\n=== Carrier Detection Summary ===")
+    logger.info(f"WANs traced: {stats['completed']}/{len(wans)} "
+                f"(failed: {stats['failed']}, timed out: {stats['timed_out']}) "
+                f"in {time.monotonic() - started:.0f}s with {stats['polls']} polls")
+    logger.info(f"Carriers detected: {sum(1 for r in results if r['detected_carrier'])}")
+    logger.info(f"Hop cache: {hop_cache.hits} hits, {hop_cache.misses} lookups")
+
+if __name__ == "__main__":
+    main()